@@ -18,6 +18,9 @@ import re
 
 # Import parent directory for models
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_snapshot import describe_snapshot
+from filescan_query import (connect_read, drives_query, duplicates_query, file_info, folder_signatures_query,
+                             iter_rows)
 
 class DuplicateScanThread(QThread):
     """Thread für erweiterte Duplikat-Suche"""
@@ -32,8 +35,9 @@ class DuplicateScanThread(QThread):
         
     def run(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("PRAGMA foreign_keys = ON")
+            # Snapshot (immutable) statt Live-DB: lange Analyse hält keinen WAL-Stand fest
+            conn, snapshot = connect_read(self.db_path, snapshot=True)
+            self.progress.emit(f"Datenquelle: {describe_snapshot(snapshot)}")
             cursor = conn.cursor()
             
             # Extrahiere Optionen
@@ -63,44 +67,6 @@ class DuplicateScanThread(QThread):
             import traceback
             print(traceback.format_exc())
     
-    def build_where_clause(self, include_drives, exclude_drives, include_paths, exclude_paths):
-        """Baut WHERE-Klausel für Laufwerk und Pfad-Filter"""
-        where_clauses = []
-        params = []
-        
-        # Include Laufwerke
-        if include_drives:
-            placeholders = ','.join('?' * len(include_drives))
-            where_clauses.append(f"d.drive_id IN ({placeholders})")
-            params.extend(include_drives)
-        
-        # Exclude Laufwerke
-        if exclude_drives:
-            placeholders = ','.join('?' * len(exclude_drives))
-            where_clauses.append(f"d.drive_id NOT IN ({placeholders})")
-            params.extend(exclude_drives)
-        
-        # Include Pfade
-        if include_paths:
-            path_conditions = []
-            for path in include_paths:
-                path_conditions.append("d.full_path LIKE ?")
-                params.append(f"{path}%")
-            if path_conditions:
-                where_clauses.append(f"({' OR '.join(path_conditions)})")
-        
-        # Exclude Pfade
-        if exclude_paths:
-            for path in exclude_paths:
-                where_clauses.append("d.full_path NOT LIKE ?")
-                params.append(f"{path}%")
-        
-        where_sql = ""
-        if where_clauses:
-            where_sql = "WHERE " + " AND ".join(where_clauses)
-        
-        return where_sql, params
-    
     def is_backup_path(self, path, backup_patterns):
         """Prüft ob ein Pfad ein Backup-Pfad ist"""
         path_lower = path.lower()
@@ -116,93 +82,34 @@ class DuplicateScanThread(QThread):
 
         self.progress.emit("Suche doppelte Dateien...")
 
-        where_clauses, params = self.build_where_clause(include_drives, exclude_drives,
-                                                        include_paths, exclude_paths)
-
-        # Groessen-Filter hinzufuegen
-        extra_clauses = []
-        extra_params = []
-        if min_size > 0:
-            extra_clauses.append("f.size >= ?")
-            extra_params.append(min_size)
-        if max_size is not None:
-            extra_clauses.append("f.size <= ?")
-            extra_params.append(max_size)
-
-        # WHERE zusammenbauen (sauber ohne rstrip)
-        all_clauses = []
-        if where_clauses:
-            all_clauses.append(where_clauses.replace("WHERE ", "", 1))
-        all_clauses.extend(extra_clauses)
-
-        where_sql = ("WHERE " + " AND ".join(all_clauses)) if all_clauses else ""
-        all_params = params + extra_params
-
-        # Hauptabfrage mit CTEs — WHERE in CTE UND aeusserem Query
-        query = f"""
-        WITH duplicate_groups AS (
-            SELECT
-                f.filename,
-                f.extension_id,
-                f.size,
-                COUNT(*) as dup_count,
-                SUM(f.size) as total_size
-            FROM files f
-            JOIN directories d ON f.directory_id = d.id
-            {where_sql}
-            GROUP BY f.filename, f.extension_id, f.size
-            HAVING COUNT(*) > 1
-            ORDER BY total_size DESC
-            LIMIT 1000
-        )
-        SELECT
-            f.id,
-            d.full_path,
-            f.filename,
-            CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END as extension,
-            f.size,
-            f.hash,
-            f.modified_date,
-            dg.dup_count,
-            dg.total_size,
-            dr.name as drive_name
-        FROM duplicate_groups dg
-        JOIN files f ON f.filename = dg.filename
-            AND f.extension_id IS dg.extension_id
-            AND f.size = dg.size
-        JOIN directories d ON f.directory_id = d.id
-        JOIN drives dr ON d.drive_id = dr.id
-        LEFT JOIN extensions e ON f.extension_id = e.id
-        {where_sql}
-        ORDER BY dg.total_size DESC, f.filename, d.full_path
-        """
-
-        # Params fuer CTE + LIMIT ist implizit + Params fuer aeusseres WHERE
-        final_params = all_params + all_params
-        cursor.execute(query, final_params)
-        results = cursor.fetchall()
+        # Gemeinsame Abfrage (filescan_query): höchstens 1000 Gruppen, Filter für Gruppen und Mitglieder
+        conn = cursor.connection
+        query, params = duplicates_query(conn, 'name_size', min_size, limit=1000, max_size=max_size,
+                                         drives=include_drives, exclude_drives=exclude_drives,
+                                         paths=include_paths, exclude_paths=exclude_paths)
 
-        # Gruppiere und markiere Backup-Status
+        # Gruppiere und markiere Backup-Status (Zeilen werden blockweise gelesen)
         grouped = defaultdict(list)
-        for row in results:
-            ext = row[3] or ''
-            key = f"{row[2]}{ext}_{row[4]}"  # filename + extension + size
+        for row in iter_rows(conn, query, params):
+            info = file_info(row)
+            ext = info['extension']
+            key = f"{info['filename']}{ext}_{info['size']}"  # filename + extension + size
 
-            file_info = {
-                'id': row[0],
-                'path': row[1],
-                'filename': row[2],
-                'extension': row[3],
-                'size': row[4],
-                'hash': row[5],
-                'modified': row[6],
-                'count': row[7],
-                'total_size': row[8],
-                'drive': row[9],
-                'is_backup': self.is_backup_path(row[1], backup_patterns),
-                'full_path': os.path.join(row[1], f"{row[2]}{ext}")
+            file_data = {
+                'id': info['id'],
+                'path': info['dir_path'],
+                'filename': info['filename'],
+                'extension': ext,
+                'size': info['size'],
+                'hash': info['hash'],
+                'modified': info['modified_date'],
+                'count': row[1],
+                'total_size': row[2],
+                'drive': info['drive_name'],
+                'is_backup': self.is_backup_path(info['dir_path'], backup_patterns),
+                'full_path': os.path.join(info['dir_path'], f"{info['filename']}{ext}")
             }
-            grouped[key].append(file_info)
+            grouped[key].append(file_data)
         
         # Sortiere Gruppen nach Einsparpotential
         sorted_groups = sorted(grouped.values(), 
@@ -219,28 +126,10 @@ class DuplicateScanThread(QThread):
         
         self.progress.emit("Analysiere Ordner-Strukturen...")
         
-        where_sql, params = self.build_where_clause(include_drives, exclude_drives,
-                                                   include_paths, exclude_paths)
-        
-        # Hole alle Ordner mit ihren Dateien
-        query = f"""
-        SELECT 
-            d.id,
-            d.full_path,
-            dr.name as drive,
-            COUNT(f.id) as file_count,
-            SUM(f.size) as total_size,
-            GROUP_CONCAT(f.filename || CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END || '_' || COALESCE(f.size, 0)) as file_signatures
-        FROM directories d
-        JOIN drives dr ON d.drive_id = dr.id
-        LEFT JOIN files f ON f.directory_id = d.id
-        LEFT JOIN extensions e ON f.extension_id = e.id
-        {where_sql}
-        GROUP BY d.id
-        HAVING file_count > 5  -- Nur Ordner mit mehr als 5 Dateien
-        """
-        
-        cursor.execute(query, params)
+        # Ordner mit ihren Datei-Signaturen (filescan_query)
+        cursor.execute(*folder_signatures_query(cursor.connection, min_files=5,
+                                                drives=include_drives, exclude_drives=exclude_drives,
+                                                paths=include_paths, exclude_paths=exclude_paths))
         folders = cursor.fetchall()
         
         self.progress.emit(f"Vergleiche {len(folders)} Ordner...")
@@ -491,18 +380,11 @@ class AdvancedDuplicateManager(QtWidgets.QMainWindow):
     def load_drives_and_paths(self):
         """Lädt verfügbare Laufwerke"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn, _ = connect_read(self.db_path)
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT d.id, d.name, COUNT(f.id) as file_count
-                FROM drives d
-                LEFT JOIN directories dir ON dir.drive_id = d.id
-                LEFT JOIN files f ON f.directory_id = dir.id
-                GROUP BY d.id
-                ORDER BY d.name
-            """)
+            cursor.execute(*drives_query())
             
-            for drive_id, drive_name, file_count in cursor.fetchall():
+            for drive_id, drive_name, _, file_count in cursor.fetchall():
                 # Include Liste
                 item1 = QtWidgets.QListWidgetItem(f"{drive_name} ({file_count:,} Dateien)")
                 item1.setData(QtCore.Qt.UserRole, drive_id)
@@ -10,6 +10,14 @@ import datetime # Hinzugefügt für Datumskonvertierung
 import ctypes # NEU: Für ShellExecuteW unter Windows
 from PyQt5.QtCore import QThread, pyqtSignal
 
+# Import parent directory for models
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_paths import directory_filter
+from filescan_query import connect_read, file_info, iter_rows, search_query
+
+# Operatoren der Namensfelder -> search_query
+NAME_OPERATORS = {"UND": 'AND', "ODER": 'OR', "NICHT": 'NOT'}
+
 # Helper function zum Öffnen von Dateien plattformabhängig
 def open_file_with_default_app(filepath):
     try:
@@ -95,8 +103,7 @@ class SearchWorker(QThread):
 
     def run(self):
         import sqlite3, datetime, os
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA foreign_keys = ON")  # Foreign Keys aktivieren
+        conn, _ = connect_read(self.db_path)  # Suche liest nur, Live-DB
         (
             path_query, name_queries, name_ops, size_op, size_val1, size_val2, size_unit,
             qdate_val1, qdate_val2, date_op, size_units
@@ -104,98 +111,49 @@ class SearchWorker(QThread):
         min_len = 3
         path_filter_active = len(path_query) >= min_len
         active_name_query_indices = [i for i, q in enumerate(name_queries) if len(q) >= min_len]
-        name_filter_active = bool(active_name_query_indices)
         size_filter_active = (size_op != "Egal")
         date_filter_active = (date_op != "Egal")
-        # Angepasste SQL für optimierte Datenbankstruktur
-        sql_select = """
-            SELECT files.id, drives.name, directories.full_path,
-                   directories.full_path || '/' || files.filename || COALESCE(extensions.name, '') as file_path,
-                   files.size
-        """
-        sql_count = "SELECT COUNT(*)"
-        sql_from_joins = """
-            FROM files
-            JOIN directories ON files.directory_id = directories.id
-            JOIN drives ON directories.drive_id = drives.id
-            LEFT JOIN extensions ON files.extension_id = extensions.id
-        """
-        where_clauses = []
-        params = []
+        # Gemeinsame Abfrage (filescan_query): Suchindex statt LIKE-Full-Scan, Pfade über directory_paths
+        criteria = {}
         if path_filter_active:
-            path_like = '%' + path_query.replace('*', '%') + '%'
-            where_clauses.append("""(
-                drives.name LIKE ? OR
-                directories.full_path LIKE ?
-            )""")
-            params.extend([path_like, path_like])
-        name_filter_sql_parts = []
-        active_ops = []
-        last_active_index = -1
-        for i in active_name_query_indices:
-            if last_active_index != -1:
-                op_combo_index = last_active_index
-                if op_combo_index < len(name_ops):
-                    active_ops.append(name_ops[op_combo_index])
-            last_active_index = i
-        current_op_idx = 0
-        for idx, name_query_idx in enumerate(active_name_query_indices):
-            name_query = name_queries[name_query_idx]
-            name_like = '%' + name_query.replace('*', '%') + '%'
-            sql_part = ""
-            op_before_term = "AND"
-            if idx > 0:
-                if current_op_idx < len(active_ops):
-                    op_before_term = active_ops[current_op_idx]
-                    current_op_idx += 1
-            if op_before_term == "ODER":
-                sql_part += " OR "
-            elif op_before_term == "NICHT":
-                # Angepasst für neue Datenbankstruktur - Suche in filename UND extension
-                sql_part += " AND (files.filename NOT LIKE ? AND COALESCE(extensions.name, '') NOT LIKE ?) "
-                params.extend([name_like, name_like])
-                name_filter_sql_parts.append(sql_part)
-                continue
-            else:
-                if idx > 0:
-                    sql_part += " AND "
-            # Angepasst für neue Datenbankstruktur - Suche in filename UND extension  
-            sql_part += " (files.filename LIKE ? OR COALESCE(extensions.name, '') LIKE ?) "
-            params.extend([name_like, name_like])
-            if op_before_term != "NICHT":
-                name_filter_sql_parts.append(sql_part)
-        if name_filter_sql_parts:
-            full_name_filter_sql = " ".join(name_filter_sql_parts).strip()
-            if full_name_filter_sql.startswith("AND "):
-                full_name_filter_sql = full_name_filter_sql[4:]
-            elif full_name_filter_sql.startswith("OR "):
-                full_name_filter_sql = full_name_filter_sql[3:]
-            where_clauses.append(f"({full_name_filter_sql})")
+            criteria['path_text'] = path_query
+        # Operator vor einem Begriff = Auswahl hinter dem vorherigen aktiven Begriff
+        terms = []
+        for position, name_query_idx in enumerate(active_name_query_indices):
+            op = "UND"
+            if position > 0:
+                previous = active_name_query_indices[position - 1]
+                if previous < len(name_ops):
+                    op = name_ops[previous]
+            terms.append((NAME_OPERATORS.get(op, 'AND'), name_queries[name_query_idx]))
+        if terms:
+            criteria['terms'] = terms
         if size_filter_active:
             multiplier = size_units.get(size_unit, 1)
-            size_bytes1 = size_val1 * multiplier
-            size_bytes2 = size_val2 * multiplier
-            op_sql = ""
-            if size_op == ">": op_sql = "files.size > ?"
-            elif size_op == "<": op_sql = "files.size < ?"
-            elif size_op == "=": op_sql = "files.size = ?"
-            elif size_op == "Zwischen": op_sql = "files.size BETWEEN ? AND ?"
-            if op_sql:
-                where_clauses.append(op_sql)
-                params.append(size_bytes1)
-                if size_op == "Zwischen":
-                    if size_bytes2 < size_bytes1: size_bytes1, size_bytes2 = size_bytes2, size_bytes1
-                    params.append(size_bytes2)
-        sql_where = ""
-        if where_clauses:
-            sql_where = " WHERE " + " AND ".join(where_clauses)
-        sql_count_query = sql_count + sql_from_joins + sql_where
+            size_kind = 'between' if size_op == "Zwischen" else size_op
+            criteria['size'] = (size_kind, size_val1 * multiplier, size_val2 * multiplier)
+        if date_filter_active:
+            # Datumsfilter in SQL über idx_files_mtime (Tagesgrenzen in lokaler Zeit, Epoch-ns).
+            # Zeilen ohne mtime_ns (Altbestand vor dem nächsten Scan) werden unten im Python geprüft.
+            filter_dt1 = datetime.date(qdate_val1.year(), qdate_val1.month(), qdate_val1.day())
+            filter_dt2 = datetime.date(qdate_val2.year(), qdate_val2.month(), qdate_val2.day())
+            if date_op == "Zwischen" and filter_dt2 < filter_dt1:
+                filter_dt1, filter_dt2 = filter_dt2, filter_dt1
+            def day_start_ns(day):
+                return int(datetime.datetime.combine(day, datetime.time()).timestamp()) * 1_000_000_000
+            one_day = datetime.timedelta(days=1)
+            if date_op == "Nach":
+                criteria['mtime'] = (day_start_ns(filter_dt1 + one_day), None)
+            elif date_op == "Vor":
+                criteria['mtime'] = (None, day_start_ns(filter_dt1))
+            elif date_op == "Am":
+                criteria['mtime'] = (day_start_ns(filter_dt1), day_start_ns(filter_dt1 + one_day))
+            else:
+                criteria['mtime'] = (day_start_ns(filter_dt1), day_start_ns(filter_dt2 + one_day))
         result_count = -1
         warnung_gesetzt = False
         try:
-            cursor = conn.cursor()
-            cursor.execute(sql_count_query, tuple(params))
-            result_count = cursor.fetchone()[0]
+            result_count = conn.execute(*search_query(conn, count=True, **criteria)).fetchone()[0]
         except Exception:
             conn.close()
             self.finished.emit([], 0, False)
@@ -204,22 +162,23 @@ class SearchWorker(QThread):
             warnung_gesetzt = True
         db_results = []
         if result_count >= 0:
-            sql_main_query = sql_select + sql_from_joins + sql_where
             try:
-                cursor = conn.cursor()
-                cursor.execute(sql_main_query, tuple(params))
-                db_results = cursor.fetchall()
+                # Zeilen blockweise lesen; Form wie bisher (id, Laufwerk, Ordner, Dateipfad, Größe, mtime_ns)
+                for row in iter_rows(conn, *search_query(conn, **criteria)):
+                    info = file_info(row)
+                    db_results.append((info['id'], info['drive_name'], info['dir_path'], info['file_path'],
+                                       info['size'], info['mtime_ns']))
             except Exception:
                 conn.close()
                 self.finished.emit([], 0, warnung_gesetzt)
                 return
         filtered_results = []
         if date_filter_active and db_results:
-            filter_dt1 = datetime.date(qdate_val1.year(), qdate_val1.month(), qdate_val1.day())
-            filter_dt2 = datetime.date(qdate_val2.year(), qdate_val2.month(), qdate_val2.day())
-            if date_op == "Zwischen" and filter_dt2 < filter_dt1:
-                filter_dt1, filter_dt2 = filter_dt2, filter_dt1
             for idx, row_data in enumerate(db_results):
+                if row_data[5] is not None:
+                    # Bereits in SQL gefiltert
+                    filtered_results.append(row_data)
+                    continue
                 drive_part = str(row_data[1])
                 dir_part = str(row_data[2])
                 file_path = str(row_data[3])  # Bereits vollständiger Pfad aus JOIN
@@ -653,7 +612,10 @@ class MainWindow(QtWidgets.QMainWindow):
                     except: cell = QtWidgets.QTableWidgetItem("-")
                 elif col == 6:
                     try:
-                        mtime_timestamp = os.path.getmtime(full_path)
+                        if row_data[5] is not None:
+                            mtime_timestamp = row_data[5] / 1_000_000_000
+                        else:
+                            mtime_timestamp = os.path.getmtime(full_path)
                         dt_object = datetime.datetime.fromtimestamp(mtime_timestamp)
                         display_item_str = dt_object.strftime("%Y-%m-%d %H:%M")
                         cell = QtWidgets.QTableWidgetItem(display_item_str)
@@ -900,8 +862,9 @@ class MainWindow(QtWidgets.QMainWindow):
         try:
             cursor = self.conn.cursor()
             # Angepasst für optimierte Datenbankstruktur
-            cursor.execute("SELECT id FROM directories WHERE drive_id = (SELECT id FROM drives WHERE name = ?) AND full_path = ?", 
-                           (info["drive"], new_directory))
+            condition, condition_params = directory_filter(self.conn, new_directory, "directories")
+            cursor.execute(f"SELECT id FROM directories WHERE drive_id = (SELECT id FROM drives WHERE name = ?) AND {condition}",
+                           [info["drive"]] + condition_params)
             row = cursor.fetchone()
             if row:
                 new_directory_id = row[0]
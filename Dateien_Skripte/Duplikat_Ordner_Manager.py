@@ -16,6 +16,8 @@ from PyQt5.QtCore import QThread, pyqtSignal
 # Import parent directory for drive_alias_detector
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from drive_alias_detector import is_path_alias_of, normalize_path_with_aliases, get_drive_mapping
+from db_snapshot import describe_snapshot
+from filescan_query import connect_read, directory_files_query, duplicates_query, file_info, iter_rows
 
 class DuplicateFolderAnalyzer(QThread):
     """Thread für die Analyse von Duplikat-Ordner-Paaren"""
@@ -30,66 +32,32 @@ class DuplicateFolderAnalyzer(QThread):
     
     def run(self):
         try:
-            self.progress.emit("Analysiere Datenbank...")
-            conn = sqlite3.connect(self.db_path)
+            # Snapshot (immutable) statt Live-DB: lange Analyse hält keinen WAL-Stand fest
+            conn, snapshot = connect_read(self.db_path, snapshot=True)
+            self.progress.emit(f"Analysiere Datenbank... ({describe_snapshot(snapshot)})")
             cursor = conn.cursor()
             
-            # SCHRITT 1: Finde erst alle Duplikat-Dateien (Name + Größe)
+            # SCHRITT 1: Finde alle Duplikat-Dateien (Name + Größe) samt Ordner in einer Abfrage
             self.progress.emit("1/4: Suche doppelte Dateien...")
-            cursor.execute("""
-                SELECT 
-                    files.filename || COALESCE(extensions.name, '') as full_filename,
-                    files.size,
-                    COUNT(*) as duplicate_count
-                FROM files
-                LEFT JOIN extensions ON files.extension_id = extensions.id
-                WHERE files.filename IS NOT NULL AND files.filename != ''
-                GROUP BY files.filename, COALESCE(extensions.name, ''), files.size
-                HAVING COUNT(*) > 1
-            """)
-            
-            duplicate_files = set((row[0], row[1]) for row in cursor.fetchall())
-            
-            if not duplicate_files:
+            duplicate_groups = set()
+            duplicate_folders = defaultdict(set)
+            for row in iter_rows(conn, *duplicates_query(conn, 'name_size')):
+                info = file_info(row)
+                if not info['filename']:
+                    continue
+                duplicate_groups.add(row[0])
+                duplicate_folders[info['dir_path']].add((info['name'], info['size']))
+            
+            if not duplicate_groups:
                 self.progress.emit("Keine doppelten Dateien gefunden")
                 self.finished.emit([])
                 conn.close()
                 return
             
-            self.progress.emit(f"2/4: Gefunden {len(duplicate_files)} Duplikat-Gruppen")
-            
-            # SCHRITT 2: Finde alle Ordner mit Duplikat-Dateien (super-optimiert)
-            self.progress.emit("3/4: Analysiere betroffene Ordner (ultra-optimiert)...")
-            
-            # Erstelle temporäre Tabelle für bessere Performance
-            cursor.execute("CREATE TEMP TABLE temp_duplicates (filename TEXT, size INTEGER)")
-            cursor.executemany("INSERT INTO temp_duplicates VALUES (?, ?)", list(duplicate_files))
-            
-            # Ein JOIN mit der temporären Tabelle - viel schneller als OR-Klauseln!
-            batch_query = """
-                SELECT 
-                    directories.full_path,
-                    files.filename || COALESCE(extensions.name, '') as full_filename,
-                    files.size
-                FROM files
-                JOIN directories ON files.directory_id = directories.id
-                LEFT JOIN extensions ON files.extension_id = extensions.id
-                JOIN temp_duplicates ON (
-                    temp_duplicates.filename = files.filename || COALESCE(extensions.name, '') 
-                    AND temp_duplicates.size = files.size
-                )
-            """
-            
-            cursor.execute(batch_query)
-            results = cursor.fetchall()
-            
-            # Gruppiere Ergebnisse nach Ordnern
-            duplicate_folders = defaultdict(set)
-            for folder_path, filename, size in results:
-                duplicate_folders[folder_path].add((filename, size))
+            self.progress.emit(f"2/4: Gefunden {len(duplicate_groups)} Duplikat-Gruppen")
             
-            # Temporäre Tabelle löschen
-            cursor.execute("DROP TABLE temp_duplicates")
+            # SCHRITT 2: Ordner mit Duplikat-Dateien sind schon gruppiert
+            self.progress.emit("3/4: Analysiere betroffene Ordner...")
             
             # Filter: Nur Ordner mit genug Duplikaten behalten
             candidate_folders = {
@@ -110,17 +78,8 @@ class DuplicateFolderAnalyzer(QThread):
             folder_list = list(candidate_folders.keys())
             
             for folder_path in folder_list:
-                cursor.execute("""
-                    SELECT 
-                        files.filename || COALESCE(extensions.name, '') as full_filename,
-                        files.size
-                    FROM files
-                    JOIN directories ON files.directory_id = directories.id
-                    LEFT JOIN extensions ON files.extension_id = extensions.id
-                    WHERE directories.full_path = ?
-                """, (folder_path,))
-                
-                folder_all_files[folder_path] = set((row[0], row[1]) for row in cursor.fetchall())
+                cursor.execute(*directory_files_query(conn, folder_path))
+                folder_all_files[folder_path] = set((name, size) for name, size, _ in cursor.fetchall())
             
             # SCHRITT 4: Vergleiche nur relevante Ordner-Paare (viel weniger!)
             folder_pairs = []
@@ -210,29 +169,17 @@ class FolderComparisonWorker(QThread):
     
     def run(self):
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn, _ = connect_read(self.db_path, snapshot=True)
             cursor = conn.cursor()
             
             # Lade alle Dateien beider Ordner (Dateiname + Größe als Schlüssel)
             self.progress.emit(f"Lade Dateien von {os.path.basename(self.folder1)}...")
-            cursor.execute("""
-                SELECT files.filename, COALESCE(extensions.name, '') as ext, files.size, files.hash
-                FROM files
-                JOIN directories ON files.directory_id = directories.id
-                LEFT JOIN extensions ON files.extension_id = extensions.id
-                WHERE directories.full_path = ?
-            """, (self.folder1,))
-            files1 = {(filename + ext, size): hash_val for filename, ext, size, hash_val in cursor.fetchall()}
+            cursor.execute(*directory_files_query(conn, self.folder1))
+            files1 = {(name, size): hash_val for name, size, hash_val in cursor.fetchall()}
             
             self.progress.emit(f"Lade Dateien von {os.path.basename(self.folder2)}...")
-            cursor.execute("""
-                SELECT files.filename, COALESCE(extensions.name, '') as ext, files.size, files.hash
-                FROM files
-                JOIN directories ON files.directory_id = directories.id
-                LEFT JOIN extensions ON files.extension_id = extensions.id
-                WHERE directories.full_path = ?
-            """, (self.folder2,))
-            files2 = {(filename + ext, size): hash_val for filename, ext, size, hash_val in cursor.fetchall()}
+            cursor.execute(*directory_files_query(conn, self.folder2))
+            files2 = {(name, size): hash_val for name, size, hash_val in cursor.fetchall()}
             
             # Vergleiche die Dateien basierend auf Name + Größe
             self.progress.emit("Vergleiche Dateien...")
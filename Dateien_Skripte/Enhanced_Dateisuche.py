@@ -11,6 +11,13 @@ import ctypes
 import re
 from PyQt5.QtCore import QThread, pyqtSignal
 
+# Import parent directory for models
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from filescan_query import connect_read, file_info, file_name_expr, iter_rows, search_query
+
+# Vollständiger Dateiname für LIKE-Fallback und Sortierung
+FULL_NAME_SQL = f"({file_name_expr('files', 'extensions')})"
+
 class BooleanSearchParser:
     """Parser für Boolean-Suche mit AND, OR, NOT Operatoren"""
     
@@ -41,7 +48,7 @@ class BooleanSearchParser:
             return sql_expr, params
         except Exception as e:
             # Fallback: einfache LIKE-Suche wenn Boolean-Parsing fehlschlägt
-            return "(files.filename || CASE WHEN extensions.name IS NULL OR extensions.name = '[none]' THEN '' ELSE extensions.name END) LIKE ?", [f"%{search_string}%"]
+            return f"{FULL_NAME_SQL} LIKE ?", [f"%{search_string}%"]
     
     def tokenize(self, text):
         """Tokenisiert den Suchstring"""
@@ -113,11 +120,11 @@ class BooleanSearchParser:
         elif token.startswith('"') and token.endswith('"'):
             # Exakte Phrase (ohne Anführungszeichen)
             phrase = token[1:-1]
-            return "(files.filename || CASE WHEN extensions.name IS NULL OR extensions.name = '[none]' THEN '' ELSE extensions.name END) LIKE ?", [f"%{phrase}%"], tokens
+            return f"{FULL_NAME_SQL} LIKE ?", [f"%{phrase}%"], tokens
 
         else:
             # Einzelnes Wort — suche in filename UND filename+extension
-            return "(files.filename || CASE WHEN extensions.name IS NULL OR extensions.name = '[none]' THEN '' ELSE extensions.name END) LIKE ?", [f"%{token}%"], tokens
+            return f"{FULL_NAME_SQL} LIKE ?", [f"%{token}%"], tokens
 
 # Helper functions (aus der ursprünglichen Datei übernommen)
 def open_file_with_default_app(filepath):
@@ -161,6 +168,18 @@ class NumericTableWidgetItem(QtWidgets.QTableWidgetItem):
         except (ValueError, TypeError, AttributeError):
             return super().__lt__(other)
 
+# Größenoperator der Oberfläche -> search_query
+SIZE_OPERATORS = {'zwischen': 'between'}
+
+# Sortierspalte der Oberfläche -> Sortierschlüssel von search_query
+SORT_KEYS = {
+    'full_file_path': 'path',
+    'files.size': 'size',
+    'files.filename': 'name',
+    'directories.full_path': 'directory',
+    'extensions.category': 'category',
+}
+
 class EnhancedSearchWorker(QThread):
     finished = pyqtSignal(list, int, str)  # results, total_count, query_info
 
@@ -171,126 +190,40 @@ class EnhancedSearchWorker(QThread):
 
     def run(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Basis-Query für optimierte Datenbankstruktur
-            base_query = """
-                SELECT 
-                    files.id,
-                    drives.name as drive_name,
-                    directories.full_path,
-                    files.filename,
-                    COALESCE(extensions.name, '[none]') as extension,
-                    extensions.category,
-                    files.size,
-                    files.hash,
-                    files.created_date,
-                    files.modified_date,
-                    directories.full_path || '/' || files.filename || CASE WHEN extensions.name IS NULL OR extensions.name = '[none]' THEN '' ELSE extensions.name END as full_file_path
-                FROM files
-                JOIN directories ON files.directory_id = directories.id
-                JOIN drives ON directories.drive_id = drives.id
-                LEFT JOIN extensions ON files.extension_id = extensions.id
-            """
-            
-            # WHERE-Klauseln und Parameter aufbauen
-            where_clauses = []
-            params = []
-            
-            # Drive-Filter
-            if self.search_criteria.get('drives'):
-                drive_placeholders = ','.join('?' * len(self.search_criteria['drives']))
-                where_clauses.append(f"drives.name IN ({drive_placeholders})")
-                params.extend(self.search_criteria['drives'])
-            
-            # Pfad-Filter
-            if self.search_criteria.get('path_filter'):
-                path_filter = self.search_criteria['path_filter'].replace('*', '%')
-                where_clauses.append("directories.full_path LIKE ?")
-                params.append(f"%{path_filter}%")
-            
-            # Dateiname-Filter aus strukturierter Suche
-            if self.search_criteria.get('filename_sql'):
-                filename_sql = self.search_criteria['filename_sql']
-                filename_params = self.search_criteria.get('filename_params', [])
-                where_clauses.append(filename_sql)
-                params.extend(filename_params)
-            
-            # Extension-Filter
-            if self.search_criteria.get('extensions'):
-                ext_placeholders = ','.join('?' * len(self.search_criteria['extensions']))
-                where_clauses.append(f"COALESCE(extensions.name, '[none]') IN ({ext_placeholders})")
-                params.extend(self.search_criteria['extensions'])
-            
-            # Kategorie-Filter
-            if self.search_criteria.get('categories'):
-                cat_placeholders = ','.join('?' * len(self.search_criteria['categories']))
-                where_clauses.append(f"extensions.category IN ({cat_placeholders})")
-                params.extend(self.search_criteria['categories'])
-            
-            # Größen-Filter
-            if self.search_criteria.get('size_filter'):
-                size_op = self.search_criteria['size_filter']['operator']
-                size_val1 = self.search_criteria['size_filter']['value1']
-                size_val2 = self.search_criteria['size_filter'].get('value2')
-                
-                if size_op == '>':
-                    where_clauses.append("files.size > ?")
-                    params.append(size_val1)
-                elif size_op == '<':
-                    where_clauses.append("files.size < ?")
-                    params.append(size_val1)
-                elif size_op == '=':
-                    where_clauses.append("files.size = ?")
-                    params.append(size_val1)
-                elif size_op == 'between' and size_val2:
-                    where_clauses.append("files.size BETWEEN ? AND ?")
-                    params.extend([min(size_val1, size_val2), max(size_val1, size_val2)])
-            
-            # Hash-Filter (für Duplikate)
-            if self.search_criteria.get('has_hash'):
-                if self.search_criteria['has_hash']:
-                    where_clauses.append("files.hash IS NOT NULL AND files.hash != ''")
-                else:
-                    where_clauses.append("(files.hash IS NULL OR files.hash = '')")
-            
-            # Duplikat-Filter
-            if self.search_criteria.get('show_duplicates'):
-                where_clauses.append("""
-                    files.hash IN (
-                        SELECT hash FROM files 
-                        WHERE hash IS NOT NULL AND hash != '' 
-                        GROUP BY hash 
-                        HAVING COUNT(*) > 1
-                    )
-                """)
+            conn, _ = connect_read(self.db_path)
+            criteria = self.search_criteria
             
-            # Fertige Query zusammenbauen
-            if where_clauses:
-                query = base_query + " WHERE " + " AND ".join(where_clauses)
-            else:
-                query = base_query
-                
-            # Sortierung hinzufügen
-            order_by = self.search_criteria.get('order_by', 'full_file_path')
-            order_dir = self.search_criteria.get('order_direction', 'ASC')
-            query += f" ORDER BY {order_by} {order_dir}"
+            # Gemeinsame Abfrage (filescan_query): Suchindex, Pfade über directory_paths
+            query_args = {
+                'path_text': criteria.get('path_filter'),
+                'terms': criteria.get('terms'),
+                'drives': criteria.get('drives'),
+                'extensions': criteria.get('extensions'),
+                'categories': criteria.get('categories'),
+                'hashed': True if criteria.get('has_hash') else None,
+                'duplicates': bool(criteria.get('show_duplicates')),
+            }
+            size_filter = criteria.get('size_filter')
+            if size_filter:
+                size_op = SIZE_OPERATORS.get(size_filter['operator'], size_filter['operator'])
+                if size_op != 'between' or size_filter.get('value2'):
+                    query_args['size'] = (size_op, size_filter['value1'], size_filter.get('value2'))
             
-            # Limit hinzufügen (für Performance bei großen Ergebnissen)
-            limit = self.search_criteria.get('limit', 10000)
-            query += f" LIMIT {limit}"
+            # Sortierung und Limit (für Performance bei großen Ergebnissen)
+            query, params = search_query(conn, limit=criteria.get('limit', 10000),
+                                         order_by=SORT_KEYS.get(criteria.get('order_by'), 'path'),
+                                         descending=criteria.get('order_direction') == 'DESC', **query_args)
             
-            # Query ausführen
-            cursor.execute(query, params)
-            results = cursor.fetchall()
+            # Zeilen blockweise lesen, Form wie in der Ergebnistabelle
+            results = []
+            for row in iter_rows(conn, query, params):
+                info = file_info(row)
+                results.append((info['id'], info['drive_name'], info['dir_path'], info['filename'],
+                                info['extension'] or '[none]', info['category'], info['size'], info['hash'],
+                                info['created_date'], info['modified_date'], info['file_path']))
             
             # Zähle Gesamtergebnisse (ohne LIMIT)
-            count_query = query.replace(base_query, "SELECT COUNT(*) FROM files JOIN directories ON files.directory_id = directories.id JOIN drives ON directories.drive_id = drives.id LEFT JOIN extensions ON files.extension_id = extensions.id")
-            count_query = count_query.split('ORDER BY')[0]  # Entferne ORDER BY und LIMIT
-            count_query = count_query.split('LIMIT')[0]
-            cursor.execute(count_query, params)
-            total_count = cursor.fetchone()[0]
+            total_count = conn.execute(*search_query(conn, count=True, **query_args)).fetchone()[0]
             
             conn.close()
             
@@ -704,11 +637,12 @@ class EnhancedMainWindow(QtWidgets.QMainWindow):
                 # Zeige nur die ersten 20 häufigsten Extensions als Beispiel
                 cursor = self.conn.cursor()
                 cursor.execute("""
-                    SELECT e.name, COUNT(f.id) as count 
-                    FROM extensions e 
-                    JOIN files f ON e.id = f.extension_id 
+                    SELECT e.name, SUM(s.file_count) as count 
+                    FROM file_stats s 
+                    JOIN extensions e ON e.id = s.extension_id 
                     WHERE e.name != '[none]'
                     GROUP BY e.id 
+                    HAVING count > 0 
                     ORDER BY count DESC 
                     LIMIT 20
                 """)
@@ -806,63 +740,19 @@ class EnhancedMainWindow(QtWidgets.QMainWindow):
         if self.search_terms:
             self.search_terms[0]['input'].clear()
 
-    def build_filename_query(self):
-        """Erstellt eine SQL-WHERE-Klausel aus den strukturierten Suchbegriffen"""
-        if not self.search_terms:
-            return "", []
-        
-        # Sammle alle nicht-leeren Suchbegriffe
+    def build_name_terms(self):
+        """Strukturierte Suchbegriffe als [(Operator, Begriff), ...] für search_query"""
         terms = []
         for i, term_data in enumerate(self.search_terms):
             search_text = term_data['input'].text().strip()
             if not search_text:
                 continue
-            
             # Operator (für erste Eingabe ist es implizit 'AND')
             operator = 'AND'
             if i > 0 and term_data['operator']:
                 operator = term_data['operator'].currentText()
-            
-            # Wildcard zu SQL LIKE konvertieren
-            search_pattern = search_text.replace('*', '%').replace('?', '_')
-            
-            terms.append({
-                'operator': operator,
-                'pattern': search_pattern,
-                'is_first': i == 0
-            })
-        
-        if not terms:
-            return "", []
-        
-        # SQL-Ausdruck aufbauen
-        sql_parts = []
-        params = []
-        
-        # Suche in filename UND filename+extension, damit z.B. "bericht.pdf" gefunden wird
-        full_name_expr = "(files.filename || CASE WHEN extensions.name IS NULL OR extensions.name = '[none]' THEN '' ELSE extensions.name END)"
-
-        for term in terms:
-            if term['is_first']:
-                sql_parts.append(f"({full_name_expr} LIKE ? OR files.filename LIKE ?)")
-                params.extend([f"%{term['pattern']}%", f"%{term['pattern']}%"])
-            else:
-                if term['operator'] == 'NOT':
-                    sql_parts.append(f"AND ({full_name_expr} NOT LIKE ? AND files.filename NOT LIKE ?)")
-                    params.extend([f"%{term['pattern']}%", f"%{term['pattern']}%"])
-                elif term['operator'] == 'OR':
-                    sql_parts.append(f"OR ({full_name_expr} LIKE ? OR files.filename LIKE ?)")
-                    params.extend([f"%{term['pattern']}%", f"%{term['pattern']}%"])
-                else:  # AND
-                    sql_parts.append(f"AND ({full_name_expr} LIKE ? OR files.filename LIKE ?)")
-                    params.extend([f"%{term['pattern']}%", f"%{term['pattern']}%"])
-        
-        if sql_parts:
-            # Gesamten Ausdruck in Klammern setzen
-            sql_expr = "(" + " ".join(sql_parts) + ")"
-            return sql_expr, params
-        
-        return "", []
+            terms.append((operator, search_text))
+        return terms
 
     def clear_filters(self):
         """Setzt alle Filter zurück"""
@@ -887,10 +777,9 @@ class EnhancedMainWindow(QtWidgets.QMainWindow):
             criteria['path_filter'] = self.path_input.text().strip()
         
         # Dateiname-Filter aus strukturierten Suchbegriffen
-        filename_sql, filename_params = self.build_filename_query()
-        if filename_sql:
-            criteria['filename_sql'] = filename_sql
-            criteria['filename_params'] = filename_params
+        name_terms = self.build_name_terms()
+        if name_terms:
+            criteria['terms'] = name_terms
         
         # Ausgewählte Drives
         selected_drives = []
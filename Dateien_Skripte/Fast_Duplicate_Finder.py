@@ -17,6 +17,8 @@ import time
 
 # Import parent directory for models
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_snapshot import describe_snapshot
+from filescan_query import connect_read, drives_query, duplicates_query, file_info, iter_rows
 
 class DuplicateScanThread(QThread):
     """Thread für die optimierte Duplikat-Suche"""
@@ -30,9 +32,9 @@ class DuplicateScanThread(QThread):
         
     def run(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("PRAGMA foreign_keys = ON")
-            cursor = conn.cursor()
+            # Snapshot (immutable) statt Live-DB: lange Analyse hält keinen WAL-Stand fest
+            conn, snapshot = connect_read(self.db_path, snapshot=True)
+            self.progress.emit(f"Datenquelle: {describe_snapshot(snapshot)}")
             
             # Extrahiere Optionen
             selected_drives = self.options.get('drives', [])
@@ -42,141 +44,32 @@ class DuplicateScanThread(QThread):
             search_method = self.options.get('method', 'name_size')  # 'name_size' oder 'hash'
             limit = self.options.get('limit', 1000)
             
-            # Baue WHERE-Klauseln
-            where_clauses = []
-            params = []
-            
-            # Laufwerk-Filter
-            if selected_drives:
-                drive_placeholders = ','.join('?' * len(selected_drives))
-                where_clauses.append(f"d.drive_id IN ({drive_placeholders})")
-                params.extend(selected_drives)
-            
-            # Pfad-Filter
-            if selected_paths:
-                path_conditions = []
-                for path in selected_paths:
-                    path_conditions.append("d.full_path LIKE ?")
-                    params.append(f"{path}%")
-                if path_conditions:
-                    where_clauses.append(f"({' OR '.join(path_conditions)})")
-            
-            # Größen-Filter
-            if min_size > 0:
-                where_clauses.append("f.size >= ?")
-                params.append(min_size)
-            
-            if max_size is not None:
-                where_clauses.append("f.size <= ?")
-                params.append(max_size)
-            
-            where_sql = ""
-            if where_clauses:
-                where_sql = "WHERE " + " AND ".join(where_clauses)
-            
             self.progress.emit("Suche Duplikate...")
             start_time = time.time()
             
-            if search_method == 'hash':
-                # Hash-basierte Suche (schnell wenn Hashes vorhanden)
-                query = f"""
-                WITH duplicate_hashes AS (
-                    SELECT f.hash, COUNT(*) as dup_count, SUM(f.size) as total_size
-                    FROM files f
-                    JOIN directories d ON f.directory_id = d.id
-                    {where_sql}
-                    {"AND" if where_sql else "WHERE"} f.hash IS NOT NULL AND f.hash != ''
-                    GROUP BY f.hash
-                    HAVING COUNT(*) > 1
-                    ORDER BY total_size DESC
-                    LIMIT ?
-                )
-                SELECT
-                    f.id,
-                    d.full_path,
-                    f.filename,
-                    CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END as extension,
-                    f.size,
-                    f.hash,
-                    f.modified_date,
-                    dh.dup_count
-                FROM duplicate_hashes dh
-                JOIN files f ON f.hash = dh.hash
-                JOIN directories d ON f.directory_id = d.id
-                LEFT JOIN extensions e ON f.extension_id = e.id
-                ORDER BY f.hash, d.full_path
-                """
-                params.append(limit)
-                
-            else:  # name_size method (Standard)
-                # Name+Größe basierte Suche (funktioniert immer)
-                query = f"""
-                WITH duplicate_groups AS (
-                    SELECT 
-                        f.filename,
-                        f.extension_id,
-                        f.size,
-                        COUNT(*) as dup_count,
-                        SUM(f.size) as total_size
-                    FROM files f
-                    JOIN directories d ON f.directory_id = d.id
-                    {where_sql}
-                    GROUP BY f.filename, f.extension_id, f.size
-                    HAVING COUNT(*) > 1
-                    ORDER BY total_size DESC
-                    LIMIT ?
-                )
-                SELECT
-                    f.id,
-                    d.full_path,
-                    f.filename,
-                    CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END as extension,
-                    f.size,
-                    f.hash,
-                    f.modified_date,
-                    dg.dup_count,
-                    f.filename || CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END || '_' || CAST(f.size AS TEXT) as group_key
-                FROM duplicate_groups dg
-                JOIN files f ON f.filename = dg.filename
-                    AND f.extension_id IS dg.extension_id
-                    AND f.size = dg.size
-                JOIN directories d ON f.directory_id = d.id
-                LEFT JOIN extensions e ON f.extension_id = e.id
-                {where_sql}
-                ORDER BY group_key, f.size DESC, d.full_path
-                """
-                params_final = params.copy()
-                params_final.append(limit)
-                params_final.extend(params)  # WHERE-Klausel wird zweimal verwendet
-                params = params_final
+            # Gemeinsame Abfrage (filescan_query): Filter gelten für Gruppen und Mitglieder
+            query, params = duplicates_query(conn, search_method, min_size, limit=limit, max_size=max_size,
+                                             drives=selected_drives, paths=selected_paths)
             
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            elapsed = time.time() - start_time
-            self.progress.emit(f"Gefunden: {len(results)} Duplikate in {elapsed:.2f} Sekunden")
-            
-            # Gruppiere Ergebnisse
+            # Gruppiere Ergebnisse (Zeilen werden blockweise gelesen)
             grouped = {}
-            for row in results:
-                if search_method == 'hash':
-                    key = row[5]  # hash
-                else:
-                    key = row[8]  # group_key (filename + extension)
-                
-                if key not in grouped:
-                    grouped[key] = []
-                
-                grouped[key].append({
-                    'id': row[0],
-                    'path': row[1],
-                    'filename': row[2],
-                    'extension': row[3],
-                    'size': row[4],
-                    'hash': row[5],
-                    'modified': row[6],
-                    'count': row[7]
+            found = 0
+            for row in iter_rows(conn, query, params):
+                info = file_info(row)
+                grouped.setdefault(row[0], []).append({
+                    'id': info['id'],
+                    'path': info['dir_path'],
+                    'filename': info['filename'],
+                    'extension': info['extension'],
+                    'size': info['size'],
+                    'hash': info['hash'],
+                    'modified': info['modified_date'],
+                    'count': row[1]
                 })
+                found += 1
+            
+            elapsed = time.time() - start_time
+            self.progress.emit(f"Gefunden: {found} Duplikate in {elapsed:.2f} Sekunden")
             
             self.result.emit(list(grouped.values()))
             conn.close()
@@ -286,18 +179,11 @@ class FastDuplicateFinder(QtWidgets.QMainWindow):
     def load_drives(self):
         """Lädt verfügbare Laufwerke aus der Datenbank"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn, _ = connect_read(self.db_path)
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT d.id, d.name, COUNT(f.id) as file_count
-                FROM drives d
-                LEFT JOIN directories dir ON dir.drive_id = d.id
-                LEFT JOIN files f ON f.directory_id = dir.id
-                GROUP BY d.id
-                ORDER BY d.name
-            """)
+            cursor.execute(*drives_query())
             
-            for drive_id, drive_name, file_count in cursor.fetchall():
+            for drive_id, drive_name, _, file_count in cursor.fetchall():
                 item = QtWidgets.QListWidgetItem(f"{drive_name} ({file_count:,} Dateien)")
                 item.setData(QtCore.Qt.UserRole, drive_id)
                 self.drive_list.addItem(item)
@@ -14,6 +14,8 @@ import time
 from collections import defaultdict
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_snapshot import describe_snapshot
+from filescan_query import common_files_query, connect_read, drives_query, shared_folders_query
 
 class FolderAnalysisThread(QThread):
     """Thread für optimierte Ordner-Duplikat-Suche"""
@@ -27,8 +29,9 @@ class FolderAnalysisThread(QThread):
         
     def run(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("PRAGMA foreign_keys = ON")
+            # Snapshot (immutable) statt Live-DB: lange Analyse hält keinen WAL-Stand fest
+            conn, snapshot = connect_read(self.db_path, snapshot=True)
+            self.progress.emit(f"Datenquelle: {describe_snapshot(snapshot)}")
             cursor = conn.cursor()
             
             min_common_files = self.options.get('min_common_files', 3)
@@ -40,190 +43,10 @@ class FolderAnalysisThread(QThread):
             self.progress.emit("Analysiere Ordner-Strukturen mit SQL...")
             start_time = time.time()
             
-            # Baue WHERE-Klausel für Laufwerk-Filter
-            drive_filter = ""
-            params = []
-            if selected_drives:
-                placeholders = ','.join('?' * len(selected_drives))
-                drive_filter = f"AND d.drive_id IN ({placeholders})"
-                params.extend(selected_drives)
-            
-            # Baue Exclude-Pattern Filter
-            exclude_filter = ""
-            for pattern in exclude_patterns:
-                exclude_filter += " AND d.full_path NOT LIKE ?"
-                params.append(f"%{pattern}%")
-            
-            # Schritt 1: Finde Ordner-Paare mit gemeinsamen Dateien
+            # Ordner-Paare mit gemeinsamen Dateien in einer Abfrage (filescan_query)
             # Diese Abfrage ist der Schlüssel zur Performance!
-            
-            if match_criteria == 'name_size':
-                # Match nach Name UND Größe (genaueste Methode)
-                query = f"""
-                WITH folder_files AS (
-                    -- Hole alle Dateien mit ihren Ordnern
-                    SELECT 
-                        d.id as folder_id,
-                        d.full_path,
-                        dr.name as drive,
-                        f.filename || COALESCE(e.name, '') as file_key,
-                        f.size,
-                        f.filename || '_' || f.size as match_key
-                    FROM directories d
-                    JOIN drives dr ON d.drive_id = dr.id
-                    JOIN files f ON f.directory_id = d.id
-                    LEFT JOIN extensions e ON f.extension_id = e.id
-                    WHERE 1=1
-                    {drive_filter}
-                    {exclude_filter}
-                ),
-                shared_files AS (
-                    -- Finde Dateien die in mehreren Ordnern vorkommen
-                    SELECT 
-                        f1.folder_id as folder1_id,
-                        f1.full_path as folder1_path,
-                        f1.drive as folder1_drive,
-                        f2.folder_id as folder2_id,
-                        f2.full_path as folder2_path,
-                        f2.drive as folder2_drive,
-                        COUNT(*) as common_files
-                    FROM folder_files f1
-                    JOIN folder_files f2 ON f1.match_key = f2.match_key
-                    WHERE f1.folder_id < f2.folder_id  -- Verhindere Duplikate und Selbst-Vergleich
-                    GROUP BY f1.folder_id, f2.folder_id
-                    HAVING COUNT(*) >= ?
-                ),
-                folder_stats AS (
-                    -- Hole Statistiken für jeden Ordner
-                    SELECT 
-                        d.id,
-                        d.full_path,
-                        COUNT(f.id) as total_files,
-                        SUM(f.size) as total_size
-                    FROM directories d
-                    JOIN files f ON f.directory_id = d.id
-                    WHERE d.id IN (
-                        SELECT folder1_id FROM shared_files
-                        UNION
-                        SELECT folder2_id FROM shared_files
-                    )
-                    GROUP BY d.id
-                    HAVING total_files >= ?
-                )
-                SELECT 
-                    sf.folder1_id,
-                    sf.folder1_path,
-                    sf.folder1_drive,
-                    fs1.total_files as folder1_files,
-                    fs1.total_size as folder1_size,
-                    sf.folder2_id,
-                    sf.folder2_path,
-                    sf.folder2_drive,
-                    fs2.total_files as folder2_files,
-                    fs2.total_size as folder2_size,
-                    sf.common_files,
-                    CAST(sf.common_files AS FLOAT) * 100 / 
-                        CASE 
-                            WHEN fs1.total_files < fs2.total_files THEN fs1.total_files
-                            ELSE fs2.total_files
-                        END as similarity_percent
-                FROM shared_files sf
-                JOIN folder_stats fs1 ON sf.folder1_id = fs1.id
-                JOIN folder_stats fs2 ON sf.folder2_id = fs2.id
-                ORDER BY sf.common_files DESC, similarity_percent DESC
-                LIMIT 500
-                """
-                params.append(min_common_files)
-                params.append(min_folder_size)
-                
-            elif match_criteria == 'name':
-                # Match nur nach Dateiname
-                query = f"""
-                WITH folder_files AS (
-                    SELECT 
-                        d.id as folder_id,
-                        d.full_path,
-                        dr.name as drive,
-                        f.filename || COALESCE(e.name, '') as match_key
-                    FROM directories d
-                    JOIN drives dr ON d.drive_id = dr.id
-                    JOIN files f ON f.directory_id = d.id
-                    LEFT JOIN extensions e ON f.extension_id = e.id
-                    WHERE 1=1
-                    {drive_filter}
-                    {exclude_filter}
-                ),
-                shared_files AS (
-                    SELECT 
-                        f1.folder_id as folder1_id,
-                        f1.full_path as folder1_path,
-                        f1.drive as folder1_drive,
-                        f2.folder_id as folder2_id,
-                        f2.full_path as folder2_path,
-                        f2.drive as folder2_drive,
-                        COUNT(*) as common_files
-                    FROM folder_files f1
-                    JOIN folder_files f2 ON f1.match_key = f2.match_key
-                    WHERE f1.folder_id < f2.folder_id
-                    GROUP BY f1.folder_id, f2.folder_id
-                    HAVING COUNT(*) >= ?
-                )
-                SELECT 
-                    folder1_id, folder1_path, folder1_drive,
-                    0 as folder1_files, 0 as folder1_size,
-                    folder2_id, folder2_path, folder2_drive,
-                    0 as folder2_files, 0 as folder2_size,
-                    common_files, 0 as similarity_percent
-                FROM shared_files
-                ORDER BY common_files DESC
-                LIMIT 500
-                """
-                params.append(min_common_files)
-                
-            else:  # size only
-                # Match nur nach Größe
-                query = f"""
-                WITH folder_files AS (
-                    SELECT 
-                        d.id as folder_id,
-                        d.full_path,
-                        dr.name as drive,
-                        f.size as match_key
-                    FROM directories d
-                    JOIN drives dr ON d.drive_id = dr.id
-                    JOIN files f ON f.directory_id = d.id
-                    WHERE f.size > 0
-                    {drive_filter}
-                    {exclude_filter}
-                ),
-                shared_files AS (
-                    SELECT 
-                        f1.folder_id as folder1_id,
-                        f1.full_path as folder1_path,
-                        f1.drive as folder1_drive,
-                        f2.folder_id as folder2_id,
-                        f2.full_path as folder2_path,
-                        f2.drive as folder2_drive,
-                        COUNT(*) as common_files
-                    FROM folder_files f1
-                    JOIN folder_files f2 ON f1.match_key = f2.match_key
-                    WHERE f1.folder_id < f2.folder_id
-                    GROUP BY f1.folder_id, f2.folder_id
-                    HAVING COUNT(*) >= ?
-                )
-                SELECT 
-                    folder1_id, folder1_path, folder1_drive,
-                    0 as folder1_files, 0 as folder1_size,
-                    folder2_id, folder2_path, folder2_drive,
-                    0 as folder2_files, 0 as folder2_size,
-                    common_files, 0 as similarity_percent
-                FROM shared_files
-                ORDER BY common_files DESC
-                LIMIT 500
-                """
-                params.append(min_common_files)
-            
-            cursor.execute(query, params)
+            cursor.execute(*shared_folders_query(match_criteria, min_common_files, min_folder_size,
+                                                 drives=selected_drives, exclude_patterns=exclude_patterns))
             results = cursor.fetchall()
             
             elapsed = time.time() - start_time
@@ -404,14 +227,7 @@ class FastFolderDuplicateFinder(QtWidgets.QMainWindow):
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT d.id, d.name, COUNT(DISTINCT dir.id) as folder_count, COUNT(f.id) as file_count
-                FROM drives d
-                LEFT JOIN directories dir ON dir.drive_id = d.id
-                LEFT JOIN files f ON f.directory_id = dir.id
-                GROUP BY d.id
-                ORDER BY d.name
-            """)
+            cursor.execute(*drives_query())
             
             for drive_id, drive_name, folder_count, file_count in cursor.fetchall():
                 item = QtWidgets.QListWidgetItem(
@@ -592,27 +408,11 @@ class FastFolderDuplicateFinder(QtWidgets.QMainWindow):
             return
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn, _ = connect_read(self.db_path, snapshot=True)
             cursor = conn.cursor()
             
             # Hole gemeinsame Dateien
-            cursor.execute("""
-                SELECT 
-                    f1.filename || COALESCE(e1.name, '') as filename,
-                    f1.size
-                FROM files f1
-                LEFT JOIN extensions e1 ON f1.extension_id = e1.id
-                WHERE f1.directory_id = ?
-                AND EXISTS (
-                    SELECT 1 FROM files f2
-                    LEFT JOIN extensions e2 ON f2.extension_id = e2.id
-                    WHERE f2.directory_id = ?
-                    AND f2.filename = f1.filename
-                    AND f2.size = f1.size
-                    AND COALESCE(e2.name, '') = COALESCE(e1.name, '')
-                )
-                ORDER BY f1.size DESC
-            """, (folder_ids[0], folder_ids[1]))
+            cursor.execute(*common_files_query(folder_ids[0], folder_ids[1]))
             
             files = cursor.fetchall()
             conn.close()
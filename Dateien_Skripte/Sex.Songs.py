@@ -24,6 +24,10 @@ from mutagen.id3 import ID3, APIC
 from mutagen.flac import FLAC
 import musicbrainzngs
 
+# Import parent directory for models
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from filescan_query import connect_read, media_query
+
 # MusicBrainz API konfigurieren
 musicbrainzngs.set_useragent("SexyMusicManager", "2.0", "https://github.com/example")
 musicbrainzngs.set_rate_limit(1, 1)  # Max 1 Request pro Sekunde
@@ -52,52 +56,16 @@ def fetch_songs(db_path, search_fields):
     """Schnelle DB-Abfrage ohne Dateisystem-Zugriff. Gibt Pfade zurück."""
     songs = []
     try:
-        conn = sqlite3.connect(db_path, timeout=30)
-        conn.execute("PRAGMA busy_timeout = 30000")
+        conn, _ = connect_read(db_path)
         cursor = conn.cursor()
 
-        ext_placeholders = ','.join(['?' for _ in AUDIO_EXTENSIONS])
-        query = f"""
-            SELECT
-                d.full_path || '/' || f.filename ||
-                CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END
-                as file_path,
-                f.filename,
-                d.full_path
-            FROM files f
-            JOIN directories d ON f.directory_id = d.id
-            LEFT JOIN extensions e ON f.extension_id = e.id
-            WHERE e.name IN ({ext_placeholders})
-        """
-        params = list(AUDIO_EXTENSIONS)
-
-        additional_where = []
-        if search_fields.get('main'):
-            for t in search_fields['main'].split():
-                additional_where.append("(f.filename LIKE ? OR d.full_path LIKE ?)")
-                params.extend([f"%{t}%", f"%{t}%"])
-        if search_fields.get('title'):
-            additional_where.append("f.filename LIKE ?")
-            params.append(f"%{search_fields['title']}%")
-        if search_fields.get('artist'):
-            additional_where.append("(f.filename LIKE ? OR d.full_path LIKE ?)")
-            params.extend([f"%{search_fields['artist']}%", f"%{search_fields['artist']}%"])
-        if search_fields.get('album'):
-            additional_where.append("d.full_path LIKE ?")
-            params.append(f"%{search_fields['album']}%")
-        if search_fields.get('year'):
-            additional_where.append("(f.filename LIKE ? OR d.full_path LIKE ?)")
-            params.extend([f"%{search_fields['year']}%", f"%{search_fields['year']}%"])
-        if search_fields.get('genre'):
-            additional_where.append("(f.filename LIKE ? OR d.full_path LIKE ?)")
-            params.extend([f"%{search_fields['genre']}%", f"%{search_fields['genre']}%"])
-
-        if additional_where:
-            query += " AND " + " AND ".join(additional_where)
-
-        query += " ORDER BY d.full_path, f.filename"
-
-        cursor.execute(query, params)
+        # Hauptsuche wortweise, Künstler/Jahr/Genre in Name oder Pfad, Titel im Namen, Album im Pfad
+        any_terms = (search_fields.get('main') or '').split()
+        any_terms += [search_fields[key] for key in ('artist', 'year', 'genre') if search_fields.get(key)]
+        cursor.execute(*media_query(AUDIO_EXTENSIONS,
+                                    name_terms=[search_fields['title']] if search_fields.get('title') else [],
+                                    path_terms=[search_fields['album']] if search_fields.get('album') else [],
+                                    any_terms=any_terms))
         for row in cursor.fetchall():
             file_path = os.path.normpath(row[0].replace('/', os.sep))
             songs.append({
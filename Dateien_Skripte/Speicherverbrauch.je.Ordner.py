@@ -5,6 +5,11 @@ import csv
 import sqlite3
 from PyQt5 import QtWidgets, QtCore, QtGui
 
+# Import parent directory for models
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_snapshot import describe_snapshot
+from filescan_query import connect_read, directory_sizes_query, rollup_query
+
 def convert_size(size_bytes, unit):
     """
     Konvertiert eine Größe in Bytes in die gewünschte Einheit.
@@ -43,14 +48,19 @@ class MainWindow(QtWidgets.QMainWindow):
         super().__init__()
         self.db_path = db_path
         self.conn = None
+        self.snapshot = None  # snapshot_info der geöffneten Datenquelle
         self.current_drive_id = None
         self.cached_data = None  # Zwischenspeicher für geladene Daten
+        self.data_aggregated = False  # True, wenn cached_data schon rekursive Werte enthält
         self.init_db()
         self.init_ui()
         
     def init_db(self):
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # Snapshot (immutable): Aggregation hält keinen WAL-Stand der Live-DB fest
+            if self.conn:
+                self.conn.close()
+            self.conn, self.snapshot = connect_read(self.db_path, snapshot=True)
         except sqlite3.Error as e:
             QtWidgets.QMessageBox.critical(self, "Datenbank Fehler",
                                            f"Fehler beim Verbinden mit der Datenbank: {e}")
@@ -152,23 +162,24 @@ class MainWindow(QtWidgets.QMainWindow):
     def load_data(self):
         """
         Liest die Verzeichniseinträge des aktuell gewählten Laufwerks ein.
-        Dabei werden nur die Werte des jeweiligen Verzeichnisses geholt.
+        Die Werte inklusive Unterverzeichnisse kommen fertig aus directory_stats
+        (vom Scanner/Watchdog gepflegt), ohne GROUP BY über alle Dateien.
         """
         if self.current_drive_id is None:
             return []
         try:
             cursor = self.conn.cursor()
-            # Angepasste SQL für optimierte Datenbankstruktur
-            query = """
-            SELECT directories.full_path, COUNT(files.id) AS file_count, IFNULL(SUM(files.size), 0) AS total_size
-            FROM directories
-            LEFT JOIN files ON directories.id = files.directory_id
-            WHERE directories.drive_id = ?
-            GROUP BY directories.id
-            ORDER BY directories.full_path
-            """
-            cursor.execute(query, (self.current_drive_id,))
+            cursor.execute(*rollup_query(self.current_drive_id))
+            self.data_aggregated = True
+            return cursor.fetchall()
+        except sqlite3.OperationalError:
+            # Ältere DB ohne directory_stats: direkt zählen und in Python aggregieren
+            pass
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(*directory_sizes_query(self.current_drive_id))
             results = cursor.fetchall()
+            self.data_aggregated = False
             return results
         except sqlite3.Error as e:
             QtWidgets.QMessageBox.critical(self, "DB Fehler",
@@ -221,8 +232,8 @@ class MainWindow(QtWidgets.QMainWindow):
             self.cached_data = self.load_data()
         unit = self.unit_combo.currentText()
         
-        # Aggregation inklusive Subdirectories
-        aggregated = self.aggregate_data(self.cached_data)
+        # Aggregation inklusive Subdirectories (entfällt bei directory_stats)
+        aggregated = self.cached_data if self.data_aggregated else self.aggregate_data(self.cached_data)
         
         self.table.setRowCount(len(aggregated))
         size_header = "Größe" if unit == "Bytes" else f"Größe ({unit})"
@@ -251,12 +262,13 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         Lädt die Laufwerksliste und zugehörige Daten neu und aktualisiert den Cache.
         """
+        self.init_db()  # ggf. neueren Snapshot öffnen
         self.load_drives()
         if self.drive_combo.count() > 0:
             self.drive_combo.setCurrentIndex(0)
         self.cached_data = self.load_data()
         self.update_table()
-        self.status_bar.showMessage("Daten aktualisiert", 3000)
+        self.status_bar.showMessage(f"Daten aktualisiert - {describe_snapshot(self.snapshot)}", 5000)
             
     def export_csv(self):
         path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "CSV exportieren", "",
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: parallele Lese- und Schreibzugriffe auf einen DBManager.
+
+Schreib-Threads legen Dateien an (upsert_file, Commit alle --batch Dateien),
+Lese-Threads fragen gleichzeitig die Methoden ab, die Watchdog und GUI ständig
+aufrufen (is_scan_running, get_last_scan_path, get_drive_name, get_drive_stats).
+Gemessen werden Lesedurchsatz und Leselatenz einmal mit Leseverbindungen pro
+Thread (db_read_connections) und einmal mit allen Lesezugriffen unter dem DB-Lock.
+
+    python benchmark_concurrency.py --readers 8 --writers 2 --seconds 10
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import models
+
+READ_CALLS = [
+    lambda db, drive_id: db.is_scan_running(),
+    lambda db, drive_id: db.get_last_scan_path(drive_id),
+    lambda db, drive_id: db.get_drive_name(drive_id),
+    lambda db, drive_id: db.get_drive_stats(drive_id),
+]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(db_path, read_connections, readers, writers, seconds, batch):
+    """Ein Durchlauf. Gibt (Lesezugriffe, Schreibzugriffe, Leselatenzen, Fehler) zurück."""
+    models.READ_CONNECTIONS = read_connections
+    db = models.DBManager(db_path, lock=threading.RLock())
+    drive_id = db.get_or_create_drive("C:/")
+    db.update_scan_progress(drive_id, "C:/bench")
+    stop = threading.Event()
+    latencies, errors = [], []
+    counts = {'reads': 0, 'writes': 0}
+    counts_lock = threading.Lock()
+
+    def reader(n):
+        local, done = [], 0
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                READ_CALLS[done % len(READ_CALLS)](db, drive_id)
+                local.append(time.perf_counter() - start)
+                done += 1
+        except Exception as e:
+            errors.append(f"Leser {n}: {e}")
+        with counts_lock:
+            counts['reads'] += done
+            latencies.extend(local)
+
+    def writer(n):
+        done = 0
+        try:
+            while not stop.is_set():
+                db.upsert_file(drive_id, f"C:/bench/w{n}/d{done // 500}/datei_{done}.txt", done, None)
+                done += 1
+                if done % batch == 0:
+                    with db.lock:
+                        db.conn.commit()
+        except Exception as e:
+            errors.append(f"Schreiber {n}: {e}")
+        with counts_lock:
+            counts['writes'] += done
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    db.close()
+    return counts['reads'], counts['writes'], latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lesezugriffe mit und ohne Leseverbindungen pro Thread")
+    parser.add_argument("--readers", type=int, default=8, help="Anzahl Lese-Threads")
+    parser.add_argument("--writers", type=int, default=2, help="Anzahl Schreib-Threads")
+    parser.add_argument("--seconds", type=float, default=10, help="Dauer je Durchlauf")
+    parser.add_argument("--batch", type=int, default=1000, help="Dateien je Commit")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("BENCHMARK PARALLELE DB-ZUGRIFFE")
+    print("=" * 70)
+    print(f"{args.readers} Leser, {args.writers} Schreiber, {args.seconds:.0f}s je Durchlauf\n")
+    print(f"{'Modus':22} | {'Lesen/s':>10} | {'p50':>9} | {'p95':>9} | {'max':>9} | {'Schreiben/s':>11}")
+    print("-" * 70)
+    failed = False
+    for label, read_connections in (("Lesen unter DB-Lock", False), ("Leseverbindungen", True)):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            reads, writes, latencies, errors = run(os.path.join(temp_dir, "bench.db"), read_connections,
+                                                   args.readers, args.writers, args.seconds, args.batch)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        print(f"{label:22} | {reads / args.seconds:>10,.0f} | {percentile(latencies, 50) * 1000:>7.2f}ms | "
+              f"{percentile(latencies, 95) * 1000:>7.2f}ms | {max(latencies, default=0) * 1000:>7.1f}ms | "
+              f"{writes / args.seconds:>11,.0f}")
+        for error in errors[:5]:
+            print(f"  FEHLER: {error}")
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
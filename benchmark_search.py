@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Teilstring-Suche in Dateinamen per LIKE-Full-Scan vs. Trigram-Index.
+
+Erzeugt eine synthetische Datenbank (Standard: 10 Mio. Dateien) mit dem
+aktuellen Schema und misst für typische Fragmente die alte Abfrage
+(filename || extension LIKE '%x%') gegen files_trigram. Die Trefferzahlen
+beider Wege werden verglichen.
+
+    python benchmark_search.py --rows 10000000 --db bench.db
+    python benchmark_search.py --db bench.db            # vorhandene DB wiederverwenden
+"""
+
+import argparse
+import os
+import random
+import time
+
+import models
+
+WORDS = ["bericht", "rechnung", "urlaub", "projekt", "angebot", "scan", "foto", "video",
+         "backup", "vertrag", "protokoll", "entwurf", "praesentation", "notizen", "export",
+         "kunde", "lieferung", "steuer", "handbuch", "setup"]
+TAGS = ["_v1", "_v2", "_v2fin", "_final", "_alt", "_kopie", "-draft", "_neu", ""]
+EXTENSIONS = [".pdf", ".docx", ".xlsx", ".jpg", ".png", ".mp4", ".txt", ".zip", ".py", ""]
+FRAGMENTS = ["_v2fin", "echnu", "urlaub2019", "wurf199", "2020-draft", "7.pdf", "steuer2021_v1", "zzq"]
+
+OLD_QUERY = """
+    SELECT COUNT(*) FROM files
+    LEFT JOIN extensions ON files.extension_id = extensions.id
+    WHERE (files.filename || CASE WHEN extensions.name IS NULL OR extensions.name = '[none]'
+                                  THEN '' ELSE extensions.name END) LIKE ?
+"""
+TRIGRAM_QUERY = "SELECT COUNT(*) FROM files WHERE files.id IN (SELECT rowid FROM files_trigram WHERE files_trigram.name LIKE ?)"
+
+
+def generate(db, rows, dirs=10000, batch=100000, seed=42):
+    """Füllt die Datenbank mit rows synthetischen Dateien in dirs Verzeichnissen."""
+    rng = random.Random(seed)
+    drive_id = db.get_or_create_drive("C:/")
+    dir_ids = [db.get_or_create_directory(drive_id, f"C:/bench/{i // 100:03d}/ordner_{i:05d}")
+               for i in range(dirs)]
+    ext_ids = [db.get_or_create_extension(ext) if ext else db.get_or_create_extension('[none]')
+               for ext in EXTENSIONS]
+    db.conn.commit()
+
+    start = time.time()
+    inserted = 0
+    while inserted < rows:
+        chunk = []
+        for n in range(inserted, min(inserted + batch, rows)):
+            name = f"{rng.choice(WORDS)}{rng.randint(1990, 2025)}{rng.choice(TAGS)}_{n}"
+            chunk.append((rng.choice(dir_ids), name, rng.choice(ext_ids), rng.randint(0, 1 << 30)))
+        db.conn.executemany(
+            "INSERT INTO files (directory_id, filename, extension_id, size) VALUES (?, ?, ?, ?)", chunk)
+        db.conn.commit()
+        inserted += len(chunk)
+        rate = inserted / max(time.time() - start, 1e-9)
+        print(f"  {inserted:>12,} / {rows:,} Dateien ({rate:,.0f}/s)", end="\r", flush=True)
+    print()
+
+
+def timed(conn, sql, param):
+    start = time.perf_counter()
+    count = conn.execute(sql, (param,)).fetchone()[0]
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LIKE-Full-Scan vs. Trigram-Index für Teilstring-Suche")
+    parser.add_argument("--db", default="benchmark_search.db", help="Pfad der Benchmark-Datenbank")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Anzahl Dateien (nur beim Erzeugen)")
+    parser.add_argument("--runs", type=int, default=3, help="Wiederholungen je Abfrage (bester Wert zählt)")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("BENCHMARK TEILSTRING-SUCHE")
+    print("=" * 70)
+
+    db = models.DBManager(args.db)
+    existing = db.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    if existing == 0:
+        print(f"Erzeuge {args.rows:,} Dateien in {args.db} ...")
+        generate(db, args.rows)
+        existing = args.rows
+    else:
+        print(f"Verwende vorhandene Datenbank {args.db} ({existing:,} Dateien)")
+    if db.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_trigram'").fetchone() is None:
+        print("FEHLER: files_trigram fehlt (trigram_index deaktiviert oder SQLite zu alt)")
+        return 1
+    db.conn.execute("ANALYZE")
+
+    print(f"\n{'Fragment':16} | {'Treffer':>10} | {'LIKE':>10} | {'Trigram':>10} | {'Faktor':>8}")
+    print("-" * 70)
+    for fragment in FRAGMENTS:
+        pattern = f"%{fragment}%"
+        old = [timed(db.conn, OLD_QUERY, pattern) for _ in range(args.runs)]
+        new = [timed(db.conn, TRIGRAM_QUERY, pattern) for _ in range(args.runs)]
+        old_count, old_time = old[0][0], min(t for _, t in old)
+        new_count, new_time = new[0][0], min(t for _, t in new)
+        mark = "" if old_count == new_count else f"  [ABWEICHUNG: {new_count}]"
+        print(f"{fragment:16} | {old_count:>10,} | {old_time * 1000:>8.1f}ms | "
+              f"{new_time * 1000:>8.1f}ms | {old_time / max(new_time, 1e-9):>7.0f}x{mark}")
+
+    db_size = os.path.getsize(args.db)
+    print(f"\nDatenbankgröße: {db_size / (1024 ** 2):,.0f} MB")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
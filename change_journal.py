@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Änderungsjournal (change_journal, Migration v9) für inkrementelle Verbraucher.
+
+Jede Änderung an files/directories landet per Trigger in derselben Transaktion
+als Eintrag (seq, ts, entity, op, row_id, parent_id, drive_id) - unabhängig
+davon, ob Scanner, Watchdog oder Integritätsprüfung schreibt. Statt die ganze
+DB neu zu lesen, verarbeitet ein Verbraucher (Export, Duplikate, Statistik)
+nur die Einträge seit seiner letzten seq:
+
+    consumer = ChangeConsumer(db, "export")
+    if consumer.needs_resync():
+        ...alles neu lesen...
+        consumer.reset()
+    for batch in consumer.batches():
+        for seq, ts, entity, op, row_id, parent_id, drive_id in batch:
+            ...aktuellen Stand der Zeile über row_id lesen bzw. entfernen...
+        consumer.ack(batch[-1][0])
+
+op ist ein Hinweis: IDs können nach einem Löschen wiederverwendet werden, daher
+bei 'insert'/'update' den aktuellen Zeilenstand lesen. ('drive', 'purge') heißt:
+alle Daten des Laufwerks sind gelöscht.
+
+Protokolliert wird nur, solange mindestens ein Verbraucher angemeldet ist (seit
+Migration v11). Ein neu angemeldeter Verbraucher startet daher mit needs_resync().
+
+Aufbewahrung (Wartungsschritt 'journal' in db_maintenance):
+- Einträge, die alle registrierten Verbraucher bestätigt haben, werden gelöscht,
+  spätestens nach change_journal_retention_days (ohne Verbraucher alle). Wer so
+  weit zurückliegt, bekommt needs_resync().
+- Kompaktierung: Mehrere noch von niemandem gelesene Einträge derselben Zeile
+  werden zum letzten zusammengefasst (insert+update -> insert, insert+delete -> nichts),
+  jeweils innerhalb eines seq-Fensters von BATCH_SIZE Einträgen.
+Jeder Block liest höchstens BATCH_SIZE Journalzeilen über den Primärschlüssel.
+"""
+
+import time
+
+from utils import logger, CONFIG
+
+RETENTION_DAYS = CONFIG.get('change_journal_retention_days', 30)
+BATCH_SIZE = 5000
+
+_COLUMNS = "seq, ts, entity, op, row_id, parent_id, drive_id"
+
+
+def journal_available(conn):
+    """True, wenn die Tabelle der Migration v9 vorhanden ist."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_journal'").fetchone() is not None
+
+
+def last_seq(conn):
+    """Höchste vergebene seq (auch wenn die Einträge schon gelöscht sind)."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_journal'").fetchone()
+    return row[0] if row else 0
+
+
+def changes_since(conn, seq, limit=BATCH_SIZE):
+    """Journal-Einträge mit seq > seq in Reihenfolge, höchstens limit."""
+    return conn.execute(f"SELECT {_COLUMNS} FROM change_journal WHERE seq > ? ORDER BY seq LIMIT ?",
+                        (seq, limit)).fetchall()
+
+
+def has_consumers(conn):
+    """True, wenn ein Verbraucher angemeldet ist (nur dann schreiben die Trigger)."""
+    return conn.execute("SELECT 1 FROM change_consumers LIMIT 1").fetchone() is not None
+
+
+def record_drive_purge(conn, drive_id):
+    """Ein Eintrag für das Löschen eines ganzen Laufwerks (statt eines Eintrags pro Zeile)."""
+    if journal_available(conn) and has_consumers(conn):
+        conn.execute("""
+            INSERT INTO change_journal (ts, entity, op, row_id, parent_id, drive_id)
+            VALUES (?, 'drive', 'purge', ?, NULL, ?)
+        """, (time.time(), drive_id, drive_id))
+
+
+class ChangeConsumer:
+    """Benannter Leser des Journals mit gespeicherter Position (change_consumers)."""
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        with db.lock:
+            # Vor der Anmeldung wurde nichts protokolliert: erst alles lesen, dann reset()
+            db.conn.execute("""
+                INSERT OR IGNORE INTO change_consumers (name, last_seq, needs_resync, updated_at) VALUES (?, ?, 1, ?)
+            """, (name, last_seq(db.conn), time.time()))
+            db.conn.commit()
+
+    @property
+    def position(self):
+        row = self.db.read_connection().execute(
+            "SELECT last_seq FROM change_consumers WHERE name = ?", (self.name,)).fetchone()
+        return row[0] if row else 0
+
+    def needs_resync(self):
+        """True, wenn ungelesene Einträge durch die Aufbewahrung schon gelöscht wurden."""
+        row = self.db.read_connection().execute(
+            "SELECT needs_resync FROM change_consumers WHERE name = ?", (self.name,)).fetchone()
+        return bool(row and row[0])
+
+    def read(self, limit=BATCH_SIZE):
+        """Nächste Einträge ab der eigenen Position (ohne sie zu bestätigen)."""
+        return changes_since(self.db.read_connection(), self.position, limit)
+
+    def batches(self, limit=BATCH_SIZE):
+        """Liefert Blöcke bis zum aktuellen Ende; Position erst mit ack() weitersetzen."""
+        seq = self.position
+        while True:
+            batch = changes_since(self.db.read_connection(), seq, limit)
+            if not batch:
+                return
+            yield batch
+            seq = batch[-1][0]
+
+    def ack(self, seq):
+        """Bestätigt alle Einträge bis seq."""
+        with self.db.lock:
+            self.db.conn.execute("UPDATE change_consumers SET last_seq = MAX(last_seq, ?), updated_at = ? WHERE name = ?",
+                                 (seq, time.time(), self.name))
+            self.db.conn.commit()
+
+    def reset(self, seq=None):
+        """Nach vollständigem Neulesen: Position auf seq bzw. das aktuelle Ende setzen."""
+        with self.db.lock:
+            seq = last_seq(self.db.conn) if seq is None else seq
+            self.db.conn.execute("""
+                UPDATE change_consumers SET last_seq = ?, needs_resync = 0, updated_at = ? WHERE name = ?
+            """, (seq, time.time(), self.name))
+            self.db.conn.commit()
+
+    def drop(self):
+        """Meldet den Verbraucher ab (hält dann keine Einträge mehr zurück)."""
+        with self.db.lock:
+            self.db.conn.execute("DELETE FROM change_consumers WHERE name = ?", (self.name,))
+            self.db.conn.commit()
+
+
+def apply_retention(db, retention_days=None, limit=BATCH_SIZE):
+    """Löscht einen Block bestätigter bzw. zu alter Einträge. Gibt die Anzahl gelöschter Einträge zurück.
+
+    Geprüft werden nur die ersten limit Einträge (seq und ts steigen gemeinsam),
+    gelöscht wird der passende Anfang als seq-Bereich.
+    """
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = time.time() - retention_days * 86400
+    with db.lock:
+        conn = db.conn
+        consumed = conn.execute("SELECT MIN(last_seq) FROM change_consumers").fetchone()[0]
+        if consumed is None:
+            consumed = last_seq(conn)  # ohne Verbraucher liest niemand mehr
+        upto = None
+        for seq, ts in conn.execute("SELECT seq, ts FROM change_journal ORDER BY seq LIMIT ?", (limit,)).fetchall():
+            if seq > consumed and ts >= cutoff:
+                break
+            upto = seq
+        if upto is None:
+            return 0
+        # Zu alte, aber noch ungelesene Einträge: betroffene Verbraucher müssen neu lesen
+        conn.execute("UPDATE change_consumers SET needs_resync = 1 WHERE last_seq < ?", (upto,))
+        deleted = conn.execute("DELETE FROM change_journal WHERE seq <= ?", (upto,)).rowcount
+        conn.commit()
+    return deleted
+
+
+def compaction_horizon(conn):
+    """seq, hinter der kompaktiert werden darf (Position des am weitesten gelesenen Verbrauchers)."""
+    return conn.execute("SELECT IFNULL(MAX(last_seq), 0) FROM change_consumers").fetchone()[0]
+
+
+def compact(db, limit=BATCH_SIZE, after=None):
+    """Fasst ungelesene Einträge je Zeile zusammen, im Fenster seq > after bis after + limit.
+
+    Nur Einträge hinter der Position aller Verbraucher (after=None: ab dort), sonst
+    sähe ein Verbraucher, der den ersten Eintrag schon gelesen hat, das Ergebnis nie.
+    Gibt die Anzahl entfernter Einträge zurück.
+    """
+    with db.lock:
+        conn = db.conn
+        horizon = compaction_horizon(conn)
+        start = horizon if after is None else max(after, horizon)
+        groups = conn.execute("""
+            SELECT entity, row_id, MIN(seq), MAX(seq) FROM change_journal
+            WHERE seq > ? AND seq <= ? GROUP BY entity, row_id HAVING COUNT(*) > 1
+        """, (start, start + limit)).fetchall()
+        removed = 0
+        for entity, row_id, first, last in groups:
+            first_op = conn.execute("SELECT op FROM change_journal WHERE seq = ?", (first,)).fetchone()[0]
+            last_op = conn.execute("SELECT op FROM change_journal WHERE seq = ?", (last,)).fetchone()[0]
+            keep_last = not (first_op == 'insert' and last_op == 'delete')
+            removed += conn.execute("""
+                DELETE FROM change_journal WHERE entity = ? AND row_id = ? AND seq >= ? AND seq <= ?
+            """, (entity, row_id, first, last - 1 if keep_last else last)).rowcount
+            if first_op == 'insert' and last_op == 'update':
+                conn.execute("UPDATE change_journal SET op = 'insert' WHERE seq = ?", (last,))
+        conn.commit()
+    if removed:
+        logger.debug(f"[Journal] {len(groups)} Zeilen kompaktiert, {removed} Einträge entfernt")
+    return removed
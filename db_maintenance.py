@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Automatische Datenbank-Wartung (läuft im Scheduler nach Scans und im Leerlauf).
+
+Bisher wurde die Planer-Statistik nur per optimize_db_indices.py von Hand
+aktualisiert, und die DB-Datei schrumpfte nach großen Löschvorgängen nie.
+Die Wartung besteht aus vier Schritten:
+
+- 'analyze': ANALYZE nur für Tabellen, deren Zeilenzahl sich seit der letzten
+  Statistik um mehr als maintenance_analyze_change (Anteil) geändert hat, mit
+  PRAGMA analysis_limit (Stichprobe statt Full Scan), danach PRAGMA optimize.
+- 'vacuum': PRAGMA incremental_vacuum in Blöcken (auto_vacuum=INCREMENTAL, für
+  neue Datenbanken Standard). Alte DBs ohne auto_vacuum brauchen einmal
+  `python db_maintenance.py --convert` (VACUUM, nur bei Stillstand).
+- 'journal': Aufbewahrung und Kompaktierung des Änderungsjournals (change_journal)
+  in Blöcken.
+- 'integrity': PRAGMA integrity_check alle maintenance_integrity_days Tage, auf
+  einer Leseverbindung ohne DB-Lock.
+
+Zeitbudgets: Der Writer-Lock wird pro Schritt höchstens maintenance_step_seconds
+gehalten (längere Anweisungen werden per Progress-Handler abgebrochen), die
+ganze Wartung dauert höchstens maintenance_budget_seconds. Die Dauer jedes
+Schritts steht in .maintenance_state.json und in den DB-Metriken.
+
+    python db_maintenance.py            # Wartung jetzt (wenn fällig)
+    python db_maintenance.py --force    # Wartung jetzt, alle Schritte
+    python db_maintenance.py --info     # letzte Läufe anzeigen
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import time
+
+import change_journal
+import models
+from utils import logger, CONFIG, PROJECT_DIR
+
+STATE_FILE = os.path.join(PROJECT_DIR, '.maintenance_state.json')
+BUDGET_SECONDS = CONFIG.get('maintenance_budget_seconds', 120)
+STEP_SECONDS = CONFIG.get('maintenance_step_seconds', 0.5)
+INTERVAL_HOURS = CONFIG.get('maintenance_interval_hours', 24)
+IDLE_SECONDS = CONFIG.get('maintenance_idle_seconds', 120)
+INTEGRITY_DAYS = CONFIG.get('maintenance_integrity_days', 7)
+ANALYSIS_LIMIT = CONFIG.get('maintenance_analysis_limit', 1000)
+ANALYZE_CHANGE = CONFIG.get('maintenance_analyze_change', 0.25)
+VACUUM_PAGES = CONFIG.get('maintenance_vacuum_pages', 2000)
+HISTORY_SIZE = 20
+
+
+class BudgetExceeded(Exception):
+    """Ein Schritt wurde wegen des Zeitbudgets abgebrochen."""
+
+
+class _Deadline:
+    """Bricht laufende Anweisungen einer Verbindung nach Ablauf der Frist ab (Progress-Handler)."""
+
+    def __init__(self, conn, seconds):
+        self.conn = conn
+        self.deadline = time.perf_counter() + seconds
+
+    def __enter__(self):
+        self.conn.set_progress_handler(lambda: time.perf_counter() > self.deadline, 10000)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.set_progress_handler(None, 0)
+        if exc_type is sqlite3.OperationalError and "interrupted" in str(exc):
+            raise BudgetExceeded() from exc
+        return False
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    try:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"[DB Wartung] Konnte Status nicht speichern: {e}")
+
+
+def _last_write(db_path):
+    """Zeitpunkt der letzten Schreibaktivität (Hauptdatei oder WAL)."""
+    mtimes = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(mtimes) if mtimes else 0.0
+
+
+def _finished_scan_id(db):
+    with db.lock:
+        return db.conn.execute("SELECT IFNULL(MAX(id), 0) FROM scan_lock WHERE is_active = 0").fetchone()[0]
+
+
+def maintenance_due(db, state, now=None):
+    """Grund für eine fällige Wartung ('nach Scan', 'Intervall') oder None.
+
+    Voraussetzung ist Leerlauf: kein Scan aktiv und idle_seconds keine Schreibzugriffe.
+    Ist die Wartung doppelt überfällig, läuft sie auch ohne Leerlauf (die Budgets schützen den Watchdog).
+    """
+    now = now or time.time()
+    if db.is_scan_running():
+        return None
+    last_run = state.get('last_run', 0)
+    if _finished_scan_id(db) > state.get('last_scan_id', 0):
+        reason = 'nach Scan'
+    elif now - last_run >= INTERVAL_HOURS * 3600:
+        reason = 'Intervall'
+    else:
+        return None
+    idle = now - _last_write(db.path) >= IDLE_SECONDS
+    if idle or now - last_run >= 2 * INTERVAL_HOURS * 3600:
+        return reason
+    return None
+
+
+def _user_tables(conn):
+    """Normale Tabellen ohne sqlite_*-Tabellen, virtuelle Tabellen und deren Schattentabellen."""
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall()
+    virtual = [name for name, sql in rows if sql and sql.upper().startswith("CREATE VIRTUAL")]
+    return [name for name, sql in rows
+            if not name.startswith("sqlite_") and name not in virtual
+            and not any(name.startswith(v + "_") for v in virtual)]
+
+
+# Per Trigger mitgeführte Zeilenzahlen (Migration v4): kein COUNT(*) über die großen Tabellen
+_MAINTAINED_COUNTS = {
+    'files': "SELECT IFNULL(SUM(file_count), 0) FROM file_stats",
+    'directories': "SELECT IFNULL(SUM(directory_count), 0) FROM drive_stats",
+}
+
+
+def _row_count(conn, table, deadline):
+    """Zeilenzahl einer Tabelle: mitgeführter Zähler, sonst COUNT(*) bis zur Frist, danach Schätzung über rowid."""
+    if table in _MAINTAINED_COUNTS:
+        try:
+            return conn.execute(_MAINTAINED_COUNTS[table]).fetchone()[0]
+        except sqlite3.OperationalError:
+            pass  # DB vor Migration v4
+    try:
+        with _Deadline(conn, max(deadline - time.perf_counter(), 0)):
+            return conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    except BudgetExceeded:
+        try:
+            return conn.execute(f'SELECT IFNULL(MAX(rowid) - MIN(rowid) + 1, 0) FROM "{table}"').fetchone()[0]
+        except sqlite3.OperationalError:
+            return None  # WITHOUT ROWID: Zeilenzahl unbekannt, Tabelle auslassen
+
+
+def changed_tables(conn, change=None, budget_seconds=None):
+    """[(Tabelle, Zeilen laut Statistik, Zeilen jetzt)] mit veralteter oder fehlender ANALYZE-Statistik.
+
+    Gezählt wird höchstens budget_seconds lang (Standard: maintenance_step_seconds);
+    files/directories kommen aus file_stats/drive_stats.
+    """
+    change = ANALYZE_CHANGE if change is None else change
+    deadline = time.perf_counter() + (STEP_SECONDS if budget_seconds is None else budget_seconds)
+    has_stat = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    analyzed = {}
+    if has_stat:
+        for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            analyzed[table] = max(analyzed.get(table, 0), int(stat.split()[0]))
+    result = []
+    for table in _user_tables(conn):
+        rows = _row_count(conn, table, deadline)
+        before = analyzed.get(table)
+        if rows is None:
+            continue
+        if before is None:
+            if rows:
+                result.append((table, None, rows))
+        elif abs(rows - before) > max(before * change, 100):
+            result.append((table, before, rows))
+    return result
+
+
+class MaintenanceJob:
+    """Ein Wartungslauf über eine Datenbank mit Gesamt- und Schrittbudget."""
+
+    def __init__(self, db, budget_seconds=None, step_seconds=None, state_path=STATE_FILE):
+        self.db = db
+        self.budget = BUDGET_SECONDS if budget_seconds is None else budget_seconds
+        self.step_seconds = STEP_SECONDS if step_seconds is None else step_seconds
+        self.state_path = state_path
+        self.steps = []
+        self._deadline = None
+
+    def remaining(self):
+        return self._deadline - time.perf_counter()
+
+    def _record(self, step, start, result):
+        seconds = time.perf_counter() - start
+        self.steps.append({'step': step, 'seconds': round(seconds, 3), 'result': result})
+        models.get_db_metrics().record('methods', f"Wartung: {step}", seconds)
+        logger.info(f"[DB Wartung] {step}: {result} ({seconds:.2f}s)")
+
+    def _locked_step(self, sql, script=False):
+        """Eine Anweisung unter dem Writer-Lock, höchstens step_seconds lang."""
+        def run(conn):
+            if script:
+                conn.executescript(sql)
+            else:
+                conn.execute(sql).fetchall()
+        self._locked_call(run)
+
+    def _locked_call(self, func):
+        """func(conn) unter dem Writer-Lock, höchstens step_seconds lang; Rückgabewert von func."""
+        seconds = min(self.step_seconds, max(self.remaining(), 0))
+        if seconds <= 0:
+            raise BudgetExceeded()
+        with self.db.lock:
+            conn = self.db.conn
+            try:
+                with _Deadline(conn, seconds):
+                    result = func(conn)
+                conn.commit()
+            except BudgetExceeded:
+                conn.rollback()
+                raise
+        return result
+
+    def analyze(self):
+        start = time.perf_counter()
+        done, tables = [], []
+        try:
+            # Zählen auf der Leseverbindung: ohne Writer-Lock, höchstens ein Schrittbudget
+            tables = changed_tables(self.db.read_connection(),
+                                    budget_seconds=min(self.step_seconds, max(self.remaining(), 0)))
+            with self.db.lock:
+                self.db.conn.execute(f"PRAGMA analysis_limit = {int(ANALYSIS_LIMIT)}")
+            for table, _, _ in tables:
+                self._locked_step(f'ANALYZE "{table}"')
+                done.append(table)
+            self._locked_step("PRAGMA optimize")
+            result = f"{len(done)} Tabellen ({', '.join(done)})" if done else "Statistik aktuell"
+        except BudgetExceeded:
+            result = f"abgebrochen (Zeitbudget) nach {len(done)}/{len(tables)} Tabellen"
+        self._record('analyze', start, result)
+
+    def vacuum(self):
+        start = time.perf_counter()
+        with self.db.lock:
+            mode = self.db.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            free = self.db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if mode != 2:
+            result = (f"auto_vacuum nicht INCREMENTAL, {free} freie Seiten "
+                      f"(einmalig 'python db_maintenance.py --convert')" if free else "keine freien Seiten")
+            self._record('vacuum', start, result)
+            return
+        released = 0
+        result = None
+        while free:
+            try:
+                # executescript: die PRAGMA läuft in einem Schritt über alle Seiten
+                self._locked_step(f"PRAGMA incremental_vacuum({int(VACUUM_PAGES)})", script=True)
+            except BudgetExceeded:
+                result = "abgebrochen (Zeitbudget)"
+                break
+            with self.db.lock:
+                now_free = self.db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            released += free - now_free
+            if now_free >= free:
+                break
+            free = now_free
+            time.sleep(0.01)
+        self._record('vacuum', start, f"{released} Seiten freigegeben" + (f", {result}" if result else ""))
+
+    def journal(self):
+        """Aufbewahrung und Kompaktierung des Änderungsjournals, blockweise im Schritt- und Gesamtbudget."""
+        start = time.perf_counter()
+        with self.db.lock:
+            available = change_journal.journal_available(self.db.conn)
+        if not available:
+            self._record('journal', start, "kein Änderungsjournal")
+            return
+        deleted = compacted = 0
+        result = None
+        try:
+            while True:
+                count = self._locked_call(lambda conn: change_journal.apply_retention(self.db))
+                deleted += count
+                if not count:
+                    break
+                time.sleep(0.01)
+            # Kompaktierung fensterweise über den seq-Bereich hinter allen Verbrauchern
+            with self.db.lock:
+                after = change_journal.compaction_horizon(self.db.conn)
+                end = change_journal.last_seq(self.db.conn)
+            while after < end:
+                compacted += self._locked_call(lambda conn: change_journal.compact(self.db, after=after))
+                after += change_journal.BATCH_SIZE
+                time.sleep(0.01)
+        except BudgetExceeded:
+            result = "abgebrochen (Zeitbudget)"
+        self._record('journal', start, f"{deleted} gelöscht, {compacted} kompaktiert"
+                     + (f", {result}" if result else ""))
+
+    def integrity(self):
+        """PRAGMA integrity_check auf einer eigenen Leseverbindung. True wenn vollständig geprüft."""
+        start = time.perf_counter()
+        conn = self.db.read_connection()
+        try:
+            with _Deadline(conn, max(self.remaining(), 0)):
+                problems = [row[0] for row in conn.execute("PRAGMA integrity_check(100)")]
+        except BudgetExceeded:
+            self._record('integrity', start, "abgebrochen (Zeitbudget)")
+            return False
+        if problems == ["ok"]:
+            self._record('integrity', start, "ok")
+        else:
+            logger.error(f"[DB Wartung] integrity_check meldet {len(problems)} Probleme: {problems[:5]}")
+            self._record('integrity', start, f"{len(problems)} Probleme: {problems[0]}")
+        return True
+
+    def run(self, reason='manuell', integrity=None):
+        """Führt alle Schritte im Budget aus. integrity=None: nur wenn integrity_days abgelaufen."""
+        state = load_state(self.state_path)
+        now = time.time()
+        self._deadline = time.perf_counter() + self.budget
+        self.steps = []
+        scan_id = _finished_scan_id(self.db)
+        logger.info(f"[DB Wartung] Start ({reason}, Budget {self.budget}s)")
+        self.analyze()
+        self.journal()
+        self.vacuum()
+        if integrity is None:
+            integrity = now - state.get('last_integrity', 0) >= INTEGRITY_DAYS * 86400
+        if integrity and self.remaining() > 0 and self.integrity():
+            state['last_integrity'] = now
+        state['last_run'] = now
+        state['last_scan_id'] = scan_id
+        history = state.get('history', [])
+        history.append({'time': datetime.datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+                        'reason': reason, 'steps': self.steps})
+        state['history'] = history[-HISTORY_SIZE:]
+        save_state(state, self.state_path)
+        return self.steps
+
+
+def run_if_due(db=None, state_path=STATE_FILE):
+    """Vom Scheduler aufgerufen: Wartung ausführen, wenn fällig. Gibt die Schritte oder None zurück."""
+    db = db or models.get_db_instance()
+    reason = maintenance_due(db, load_state(state_path))
+    if reason is None:
+        return None
+    return MaintenanceJob(db, state_path=state_path).run(reason)
+
+
+def convert_to_incremental(db):
+    """Stellt eine bestehende DB auf auto_vacuum=INCREMENTAL um (VACUUM, hält den Lock für die ganze Dauer)."""
+    start = time.time()
+    with db.lock:
+        db.conn.commit()
+        db.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        db.conn.execute("VACUUM")
+    logger.info(f"[DB Wartung] auto_vacuum=INCREMENTAL gesetzt, VACUUM in {time.time() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Datenbank-Wartung (ANALYZE, incremental_vacuum, integrity_check)")
+    parser.add_argument("--force", action="store_true", help="Wartung sofort inkl. integrity_check")
+    parser.add_argument("--info", action="store_true", help="Letzte Wartungsläufe anzeigen")
+    parser.add_argument("--convert", action="store_true",
+                        help="Bestehende DB auf auto_vacuum=INCREMENTAL umstellen (VACUUM, Dienste vorher beenden)")
+    parser.add_argument("--budget", type=float, help="Gesamtbudget in Sekunden")
+    args = parser.parse_args()
+
+    if args.info:
+        for run in load_state().get('history', []):
+            steps = ", ".join(f"{s['step']} {s['seconds']:.1f}s ({s['result']})" for s in run['steps'])
+            print(f"{run['time']}  {run['reason']:10}  {steps}")
+        return 0
+    db = models.get_db_instance()
+    if args.convert:
+        convert_to_incremental(db)
+    if args.force:
+        MaintenanceJob(db, budget_seconds=args.budget).run('manuell', integrity=True)
+    elif not args.convert and run_if_due(db) is None:
+        print("Wartung nicht fällig (oder kein Leerlauf). --force erzwingt sie.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
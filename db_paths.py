@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Pfad-Normalisierung und indexfreundliche Teilbaum-Abfragen.
+
+Statt `full_path LIKE 'prefix%'` (kann keinen Index nutzen, bricht bei '%'/'_'
+im Pfad und wurde mit os.sep statt '/' gebaut) wird ein Ordner in eine
+Bereichssuche übersetzt:
+
+    full_path >= 'C:/Daten' AND full_path < 'C:/Daten0'            -- '0' = '/' + 1
+    AND (full_path = 'C:/Daten' OR full_path >= 'C:/Daten/')
+
+Ein einziger Indexbereich (kein OR über zwei Bereiche), damit der Planer die
+Sortierung des Index behält; die Nachbedingung schließt 'C:/Daten-alt' aus.
+Die Vergleiche laufen mit COLLATE NOCASE über idx_directories_full_path_nocase.
+Bei case-sensitiven Pfaden (Linux) wird zusätzlich binär gefiltert.
+Im kompakten Verzeichnisformat (full_path NULL) wird der Teilbaum per
+rekursivem CTE über idx_directories_parent bestimmt.
+"""
+
+import os
+import sqlite3
+
+# Windows-Pfade unterscheiden nicht zwischen Groß-/Kleinschreibung
+CASE_INSENSITIVE = os.name == 'nt'
+
+
+def normalize_path(path):
+    """Bringt einen Pfad in die Form, in der er in directories.full_path steht.
+
+    'c:\\Daten\\' -> 'c:/Daten', 'C:' -> 'C:/', '/tmp/x/' -> '/tmp/x'
+    """
+    path = os.path.normpath(path).replace('\\', '/')
+    if len(path) == 2 and path[1] == ':':
+        return path + '/'
+    if len(path) > 1 and path.endswith('/') and not path.endswith(':/'):
+        path = path.rstrip('/') or '/'
+    return path
+
+
+def subtree_bounds(path):
+    """(path, untere, obere Grenze) für alle Verzeichnisse unterhalb von path."""
+    path = normalize_path(path)
+    lower = path if path.endswith('/') else path + '/'
+    upper = lower[:-1] + '0'  # '0' folgt direkt auf '/'
+    return path, lower, upper
+
+
+def subtree_condition(path, column="d.full_path", case_insensitive=None):
+    """SQL-Bedingung + Parameter: column liegt in path oder darunter."""
+    if case_insensitive is None:
+        case_insensitive = CASE_INSENSITIVE
+    path, lower, upper = subtree_bounds(path)
+    if path == lower:
+        # Laufwerkswurzel ('C:/'): der Bereich allein ist exakt
+        params = [path, upper]
+        nocase = f"({column} >= ? COLLATE NOCASE AND {column} < ? COLLATE NOCASE)"
+        binary = f"({column} >= ? AND {column} < ?)"
+    else:
+        params = [path, upper, path, lower]
+        nocase = (f"({column} >= ? COLLATE NOCASE AND {column} < ? COLLATE NOCASE AND "
+                  f"({column} = ? COLLATE NOCASE OR {column} >= ? COLLATE NOCASE))")
+        binary = f"({column} >= ? AND {column} < ? AND ({column} = ? OR {column} >= ?))"
+    if case_insensitive:
+        return nocase, params
+    # Bereich über den NOCASE-Index, exakte Schreibweise als Filter
+    return f"({nocase} AND {binary})", params + params
+
+
+def subtree_condition_by_id(root_id, id_column="d.id"):
+    """SQL-Bedingung + Parameter: Verzeichnis-ID liegt im Teilbaum von root_id (parent_id-Kette)."""
+    return (f"{id_column} IN (WITH RECURSIVE subtree(id) AS ("
+            f"SELECT ? UNION ALL SELECT c.id FROM directories c JOIN subtree ON c.parent_id = subtree.id"
+            f") SELECT id FROM subtree)"), [root_id]
+
+
+def is_compact(conn):
+    """True, wenn directories im kompakten Format (full_path NULL erlaubt) vorliegt."""
+    columns = conn.execute("PRAGMA table_info(directories)").fetchall()
+    return any(col[1] == 'full_path' and not col[3] for col in columns)
+
+
+def resolve_drive(conn, path):
+    """Laufwerk (id, name), zu dem path gehört, oder None."""
+    path = normalize_path(path)
+    fold = (lambda value: value.lower()) if CASE_INSENSITIVE else (lambda value: value)
+    matches = []
+    for drive_id, name in conn.execute("SELECT id, name FROM drives"):
+        prefix = name if name.endswith('/') else name + '/'
+        if fold(path) == fold(name.rstrip('/')) or fold(path).startswith(fold(prefix)):
+            matches.append((drive_id, name))
+    # Längster Laufwerksname gewinnt ('/' vs. '/mnt/usb/')
+    return max(matches, key=lambda m: len(m[1])) if matches else None
+
+
+def resolve_directory_id(conn, path):
+    """Sucht die ID eines Verzeichnisses im kompakten Format über den Schlüsselindex
+    (drive_id, IFNULL(parent_id, 0), directory_name) - eine Abfrage pro Pfadkomponente."""
+    path = normalize_path(path)
+    drive = resolve_drive(conn, path)
+    if drive is None:
+        return None
+    drive_id, drive_name = drive
+    rest = path[len(drive_name):].strip('/') if len(path) > len(drive_name) else ''
+    query = ("SELECT id FROM directories WHERE drive_id = ? AND IFNULL(parent_id, 0) = ? AND directory_name = ?"
+             + (" COLLATE NOCASE" if CASE_INSENSITIVE else ""))
+    root = conn.execute(query, (drive_id, 0, '')).fetchone()
+    if not rest:
+        return root[0] if root else None
+    parent_id = 0
+    for index, name in enumerate(rest.split('/')):
+        row = conn.execute(query, (drive_id, parent_id, name)).fetchone()
+        if row is None and index == 0 and root:
+            # Oberste Ebene hängt am Laufwerks-Wurzeleintrag ('')
+            row = conn.execute(query, (drive_id, root[0], name)).fetchone()
+        if row is None:
+            return None
+        parent_id = row[0]
+    return parent_id
+
+
+def subtree_filter(conn, path, alias="d"):
+    """Teilbaum-Bedingung passend zum Schema der Verbindung.
+
+    alias bezeichnet directories oder directory_paths in der Abfrage.
+    """
+    if not is_compact(conn):
+        return subtree_condition(path, f"{alias}.full_path")
+    root_id = resolve_directory_id(conn, path)
+    if root_id is None:
+        return "0", []
+    return subtree_condition_by_id(root_id, f"{alias}.id")
+
+
+def directory_filter(conn, path, alias="d"):
+    """Bedingung für genau ein Verzeichnis (ohne Unterordner), passend zum Schema der Verbindung."""
+    if not is_compact(conn):
+        # Mit drive_id trifft die Abfrage den Schlüssel (drive_id, full_path) statt alle Verzeichnisse
+        drive = resolve_drive(conn, path)
+        if drive is None:
+            return "0", []
+        return f"{alias}.drive_id = ? AND {alias}.full_path = ?", [drive[0], normalize_path(path)]
+    directory_id = resolve_directory_id(conn, path)
+    if directory_id is None:
+        return "0", []
+    return f"{alias}.id = ?", [directory_id]
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Namenssuche über den FTS5-Index (files_fts / directories_fts, Migration v6).
+
+Statt `files.filename LIKE '%term%'` (Full Scan pro Tastendruck) wird ein
+Suchbegriff in Tokens zerlegt und als Präfix-Abfrage gegen den Index gestellt:
+
+    'Urlaub*2020.jpg'  ->  "urlaub"* "2020"* "jpg"*
+
+Ein Treffer braucht alle Tokens (in Dateiname oder Extension). Verzeichnis-
+treffer gelten für den ganzen Teilbaum (rekursiver CTE über parent_id).
+
+Mit dem Trigram-Index (Migration v7) bleibt die alte Teilstring-Semantik
+erhalten ('*' -> '%', '?' -> '_'), die Kandidaten kommen aber aus files_trigram:
+
+    '_v2fin'  ->  files_trigram.name LIKE '%_v2fin%'
+
+Ohne FTS5-Tabellen (alte DB, SQLite ohne FTS5) fallen die Werkzeuge auf LIKE zurück.
+"""
+
+import re
+
+# Trennzeichen wie beim unicode61-Tokenizer: alles außer Buchstaben/Ziffern
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def fts_available(conn):
+    """True, wenn der Suchindex der Migration v6 vorhanden ist."""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name IN ('files_fts', 'directories_fts')"
+    ).fetchone()
+    return row[0] == 2
+
+
+def trigram_available(conn):
+    """True, wenn der Trigram-Index der Migration v7 vorhanden ist."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_trigram'").fetchone() is not None
+
+
+def search_mode(conn):
+    """'trigram', 'fts' oder None (kein Index, LIKE-Fallback) für eine Verbindung."""
+    if trigram_available(conn):
+        return 'trigram'
+    if fts_available(conn):
+        return 'fts'
+    return None
+
+
+def fts_query(term):
+    """FTS5-Abfrage (Präfix je Token) für einen Suchbegriff, None ohne verwertbare Tokens."""
+    tokens = _TOKEN_RE.findall(term)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def filename_condition(term, id_column="files.id", negate=False):
+    """SQL-Bedingung + Parameter: Datei passt (nicht) auf term in Name/Extension."""
+    query = fts_query(term)
+    if query is None:
+        return ("1" if negate else "0"), []
+    op = "NOT IN" if negate else "IN"
+    return f"{id_column} {op} (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)", [query]
+
+
+def substring_condition(term, id_column="files.id", negate=False):
+    """SQL-Bedingung + Parameter: vollständiger Dateiname enthält term (Wildcards * und ?)."""
+    pattern = '%' + term.replace('*', '%').replace('?', '_') + '%'
+    op = "NOT IN" if negate else "IN"
+    return f"{id_column} {op} (SELECT rowid FROM files_trigram WHERE files_trigram.name LIKE ?)", [pattern]
+
+
+def name_condition(mode, term, id_column="files.id", negate=False):
+    """Namensbedingung passend zu search_mode(): Teilstring über Trigram, sonst Token-Präfix."""
+    if mode == 'trigram':
+        return substring_condition(term, id_column, negate)
+    return filename_condition(term, id_column, negate)
+
+
+def directory_condition(term, id_column="directories.id", mode='fts'):
+    """SQL-Bedingung + Parameter: Verzeichnis liegt in (oder unter) einem Ordner, der auf term passt.
+
+    directories_fts findet nur einzelne Verzeichnisnamen per Token-Präfix. Das wird
+    nur im Modus 'fts' für einen einzelnen Token ('projekte', 'proj*') verwendet;
+    mehrteilige Pfade ('sub/deep', 'a\\b') und im Modus 'trigram' auch Teilstrings
+    ('ub') laufen wie bisher über full_path LIKE (aus directory_paths).
+    """
+    tokens = _TOKEN_RE.findall(term)
+    if mode == 'fts' and len(tokens) == 1 and term.rstrip('*') == tokens[0]:
+        return (f"{id_column} IN (WITH RECURSIVE matched(id) AS ("
+                f"SELECT rowid FROM directories_fts WHERE directories_fts MATCH ? "
+                f"UNION SELECT c.id FROM directories c JOIN matched ON c.parent_id = matched.id"
+                f") SELECT id FROM matched)"), [fts_query(term)]
+    pattern = '%' + term.replace('\\', '/').replace('*', '%').replace('?', '_') + '%'
+    # directory_paths liefert den Pfad auch im kompakten Format (full_path dort NULL)
+    return f"{id_column} IN (SELECT id FROM directory_paths WHERE full_path LIKE ?)", [pattern]
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Lese-Snapshot der Datenbank für Analyse-Werkzeuge.
+
+Duplikatsuche, Speicherverbrauch und Export laufen minutenlang. Auf der
+Live-DB hält jede dieser Lesetransaktionen den WAL-Stand fest, sodass kein
+Checkpoint durchkommt und die WAL-Datei während der Analyse unbegrenzt wächst.
+
+Stattdessen wird per Backup-API eine Kopie erzeugt (<db>_snapshot.db):
+- schrittweise (snapshot_pages_per_step Seiten) mit Pause dazwischen,
+  damit Scanner und Watchdog weiter schreiben können,
+- aus einer festgehaltenen Lesetransaktion, damit der Backup bei
+  gleichzeitigen Schreibzugriffen nicht immer wieder neu startet
+  (der WAL-Stand ist damit nur für die Kopierdauer festgehalten),
+- in eine temporäre Datei, die danach atomar ersetzt wird.
+Die Tabelle snapshot_meta hält Zeitpunkt und Quelle fest (Aktualität).
+
+Werkzeuge öffnen den Snapshot mit immutable=1 (keine Locks, kein WAL) und
+fallen auf die Live-DB (nur lesend) zurück, solange es keinen Snapshot gibt.
+
+    python db_snapshot.py            # Snapshot jetzt aktualisieren
+    python db_snapshot.py --info     # Alter des Snapshots anzeigen
+"""
+
+import argparse
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+from utils import logger, DB_PATH, CONFIG
+
+
+def snapshot_path_for(db_path=DB_PATH):
+    """Pfad des Snapshots zu einer Datenbank (Dateien.db -> Dateien_snapshot.db)."""
+    if os.path.abspath(db_path) == os.path.abspath(DB_PATH) and CONFIG.get('snapshot_path'):
+        return CONFIG['snapshot_path']
+    return os.path.splitext(db_path)[0] + "_snapshot.db"
+
+
+def _source_mtime(db_path):
+    """Letzte Schreibaktivität der Live-DB (Hauptdatei oder WAL)."""
+    mtimes = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(mtimes) if mtimes else 0.0
+
+
+def refresh_snapshot(db_path=DB_PATH, snapshot_path=None, pages_per_step=None, step_sleep=None):
+    """Erzeugt/ersetzt den Snapshot. Gibt snapshot_info() des neuen Snapshots zurück."""
+    snapshot_path = snapshot_path or snapshot_path_for(db_path)
+    pages_per_step = pages_per_step or CONFIG.get('snapshot_pages_per_step', 1024)
+    step_sleep = step_sleep if step_sleep is not None else CONFIG.get('snapshot_step_sleep', 0.01)
+    tmp_path = snapshot_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    start = time.time()
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    source = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Lesetransaktion festhalten: konsistenter Stand, kein Neustart des Backups
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages_per_step, progress=progress, sleep=step_sleep)
+        source.execute("COMMIT")
+        # Snapshot ist eigenständig: kein WAL, Metadaten für die Aktualität
+        target.execute("PRAGMA journal_mode = DELETE")
+        target.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (key TEXT PRIMARY KEY, value)")
+        target.executemany("INSERT OR REPLACE INTO snapshot_meta (key, value) VALUES (?, ?)", [
+            ('created_at', start),
+            ('source_path', os.path.abspath(db_path)),
+            ('duration_seconds', round(time.time() - start, 3)),
+            ('backup_steps', steps),
+        ])
+        target.commit()
+    finally:
+        target.close()
+        source.close()
+
+    _replace(tmp_path, snapshot_path)
+    info = snapshot_info(snapshot_path)
+    logger.info(f"[DB Snapshot] {snapshot_path} aktualisiert ({info['duration_seconds']:.2f}s, "
+                f"{steps} Schritte à {pages_per_step} Seiten)")
+    return info
+
+
+def _replace(tmp_path, snapshot_path, attempts=10):
+    """Ersetzt den Snapshot atomar. Unter Windows kann ein geöffneter Snapshot das verhindern."""
+    for attempt in range(attempts):
+        try:
+            os.replace(tmp_path, snapshot_path)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.5)
+
+
+def snapshot_info(snapshot_path):
+    """Metadaten eines Snapshots inkl. age_seconds, None wenn keiner existiert."""
+    if not os.path.exists(snapshot_path):
+        return None
+    conn = sqlite3.connect(_immutable_uri(snapshot_path), uri=True)
+    try:
+        info = dict(conn.execute("SELECT key, value FROM snapshot_meta").fetchall())
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+    info['age_seconds'] = time.time() - info['created_at']
+    # Live-DB seit dem Snapshot verändert?
+    source = info.get('source_path')
+    info['stale'] = bool(source) and _source_mtime(source) > info['created_at']
+    return info
+
+
+def describe_snapshot(info):
+    """Kurze Anzeige der Aktualität für Statuszeilen der Werkzeuge."""
+    if info is None:
+        return "Live-Datenbank (kein Snapshot)"
+    created = time.strftime('%d.%m.%Y %H:%M', time.localtime(info['created_at']))
+    minutes = int(info['age_seconds'] // 60)
+    suffix = ", seitdem geändert" if info['stale'] else ""
+    return f"Snapshot vom {created} (vor {minutes} Min.{suffix})"
+
+
+def _immutable_uri(path):
+    return pathlib.Path(os.path.abspath(path)).as_uri() + "?immutable=1"
+
+
+def connect_snapshot(db_path=DB_PATH, max_age_seconds=None):
+    """Öffnet den Snapshot mit immutable=1, sonst die Live-DB nur lesend.
+
+    Gibt (Verbindung, snapshot_info oder None) zurück.
+    """
+    snapshot_path = snapshot_path_for(db_path)
+    info = snapshot_info(snapshot_path)
+    if info is not None and (max_age_seconds is None or info['age_seconds'] <= max_age_seconds):
+        return sqlite3.connect(_immutable_uri(snapshot_path), uri=True, check_same_thread=False), info
+    logger.warning(f"[DB Snapshot] Kein (aktueller) Snapshot für {db_path}, lese Live-Datenbank.")
+    live_uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+    return sqlite3.connect(live_uri, uri=True, check_same_thread=False, timeout=30), None
+
+
+class SnapshotRefresher:
+    """Hintergrund-Thread: aktualisiert den Snapshot alle snapshot_interval_minutes,
+    aber nur wenn die Live-DB seit dem letzten Snapshot geschrieben wurde."""
+
+    def __init__(self, db_path=DB_PATH, interval_minutes=None):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path_for(db_path)
+        interval = interval_minutes if interval_minutes is not None else CONFIG.get('snapshot_interval_minutes', 30)
+        self.interval = interval * 60
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="DBSnapshot", daemon=True)
+            self._thread.start()
+            logger.info(f"[DB Snapshot] Gestartet (Intervall {self.interval / 60:.0f} Min.)")
+        return self
+
+    def stop(self, timeout=30):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def poll(self):
+        """Aktualisiert den Snapshot, falls er fehlt oder die Live-DB neuer ist."""
+        info = snapshot_info(self.snapshot_path)
+        if info is None or info['stale']:
+            refresh_snapshot(self.db_path, self.snapshot_path)
+            return True
+        return False
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"[DB Snapshot] Fehler beim Aktualisieren: {e}")
+            if self._stop_event.wait(self.interval):
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lese-Snapshot der Datenbank für Analyse-Werkzeuge")
+    parser.add_argument("--db", default=DB_PATH, help="Live-Datenbank")
+    parser.add_argument("--info", action="store_true", help="Nur Alter/Status des Snapshots anzeigen")
+    args = parser.parse_args()
+    if args.info:
+        print(describe_snapshot(snapshot_info(snapshot_path_for(args.db))))
+    else:
+        print(describe_snapshot(refresh_snapshot(args.db)))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,27 @@
 r"""
 Drive Alias Detection System
 Erkennt gemappte Laufwerke (wie T: -> C:\Laufwerk T\USB16GB) um Duplikate zu vermeiden.
+
+get_drive_mapping() startet subst und net use - für Pfade im laufenden Betrieb
+(Watchdog-Ereignisse, Duplikatvergleich) daher get_alias_resolver().resolve(path)
+verwenden: eine Dict-Suche in einer vorberechneten Tabelle, die nach
+drive_alias_ttl_seconds bzw. bei geänderten Laufwerksbuchstaben im Hintergrund
+neu geladen wird.
 """
 
 import os
+import ctypes
 import subprocess
+import threading
+import time
 import logging
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+ALIAS_TTL_SECONDS = 300     # Mappings spätestens nach dieser Zeit neu ermitteln
+VOLUME_CHECK_SECONDS = 5    # Laufwerksbuchstaben (GetLogicalDrives) höchstens so oft prüfen
+
 def get_drive_mapping():
     """
     Ermittelt alle Laufwerk-Mappings auf dem System.
@@ -87,6 +99,139 @@ def normalize_path_with_aliases(path, drive_mappings):
         # Kein Alias
         return (normalized_path, False, drive_letter, drive_letter)
 
+def _logical_drive_mask():
+    """Bitmaske der vorhandenen Laufwerksbuchstaben (nur Windows, sonst None)."""
+    try:
+        return ctypes.windll.kernel32.GetLogicalDrives()
+    except (AttributeError, OSError):
+        return None
+
+
+class AliasResolver:
+    """Zwischengespeicherte Laufwerk-Mappings mit vorberechneter Tabelle.
+
+    resolve() liefert dasselbe wie normalize_path_with_aliases(path, get_drive_mapping()),
+    braucht aber nur eine Dict-Suche. Neu geladen wird nach ttl_seconds oder wenn sich
+    die Laufwerksbuchstaben ändern (subst, net use, USB-Laufwerk); das geschieht im
+    Hintergrund, bis dahin gilt die bisherige Tabelle. Nur das erste Laden blockiert.
+    """
+
+    def __init__(self, ttl_seconds=ALIAS_TTL_SECONDS, loader=None, volume_mask=None,
+                 volume_check_seconds=VOLUME_CHECK_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.volume_check_seconds = volume_check_seconds
+        self.loader = loader or get_drive_mapping
+        self.volume_mask = volume_mask or _logical_drive_mask
+        self.lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.refreshes = 0
+        self._mappings = {}
+        self._table = None      # 'T:' -> (echter Pfad, echtes Laufwerk)
+        self._loaded_at = 0.0
+        self._mask = None
+        self._checked_at = 0.0
+        self._refreshing = False
+
+    def mappings(self):
+        """Aktuelle Mappings wie get_drive_mapping() ({'T:': 'C:\\...'})."""
+        self._current()
+        return dict(self._mappings)
+
+    def resolve(self, path, now=None):
+        """Wie normalize_path_with_aliases: (normalized_path, is_alias, original_drive, real_drive)."""
+        table = self._current(now)
+        normalized_path = os.path.normpath(path)
+        drive_letter, rest_of_path = os.path.splitdrive(normalized_path)
+        entry = table.get(drive_letter.upper())
+        if entry is None:
+            return (normalized_path, False, drive_letter, drive_letter)
+        real_path, real_drive = entry
+        rest_of_path = rest_of_path.lstrip(os.sep)
+        full_real_path = real_path.rstrip(os.sep) + os.sep + rest_of_path if rest_of_path else real_path
+        return (full_real_path, True, drive_letter, real_drive)
+
+    def normalize(self, path):
+        """Nur der echte Pfad."""
+        return self.resolve(path)[0]
+
+    def refresh(self):
+        """Lädt die Mappings sofort neu (blockierend)."""
+        mappings = self.loader()
+        table = {}
+        for drive_letter, real_path in mappings.items():
+            real_path = os.path.normpath(real_path)
+            table[drive_letter.upper()] = (real_path, os.path.splitdrive(real_path)[0])
+        with self.lock:
+            if self._table is not None and mappings != self._mappings:
+                logger.info(f"Laufwerk-Mappings geändert: {self._mappings} -> {mappings}")
+            self._mappings, self._table = mappings, table
+            self._loaded_at = time.monotonic()
+            self._mask = self.volume_mask()
+            self.refreshes += 1
+        return mappings
+
+    def invalidate(self):
+        """Markiert die Tabelle als veraltet (z.B. nach Laufwerksänderung); nächster resolve() lädt neu."""
+        with self.lock:
+            self._loaded_at = float('-inf')
+
+    def _current(self, now=None):
+        if self._table is None:
+            # Erstes Laden: andere Threads warten darauf statt selbst subst zu starten
+            with self._load_lock:
+                if self._table is None:
+                    self.refresh()
+            return self._table
+        now = time.monotonic() if now is None else now
+        if now - self._loaded_at >= self.ttl_seconds or self._volumes_changed(now):
+            self._refresh_in_background()
+        return self._table
+
+    def _volumes_changed(self, now):
+        if now - self._checked_at < self.volume_check_seconds:
+            return False
+        self._checked_at = now
+        mask = self.volume_mask()
+        return mask is not None and mask != self._mask
+
+    def _refresh_in_background(self):
+        with self.lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            # Bis der Thread fertig ist, keine weiteren Auslöser
+            self._loaded_at = float('inf')
+        threading.Thread(target=self._background_refresh, name="AliasRefresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"Fehler beim Aktualisieren der Laufwerk-Mappings: {e}")
+            with self.lock:
+                self._loaded_at = time.monotonic()  # alte Tabelle behalten, erst nach TTL erneut
+        finally:
+            self._refreshing = False
+
+
+_alias_resolver = None
+_alias_resolver_lock = threading.Lock()
+
+
+def get_alias_resolver():
+    """Gemeinsamer AliasResolver des Prozesses (TTL aus config: drive_alias_ttl_seconds)."""
+    global _alias_resolver
+    with _alias_resolver_lock:
+        if _alias_resolver is None:
+            try:
+                from utils import CONFIG  # Import hier um Zirkularität zu vermeiden
+                ttl_seconds = CONFIG.get('drive_alias_ttl_seconds', ALIAS_TTL_SECONDS)
+            except ImportError:
+                ttl_seconds = ALIAS_TTL_SECONDS
+            _alias_resolver = AliasResolver(ttl_seconds)
+        return _alias_resolver
+
+
 def get_canonical_drive_list():
     """
     Ermittelt eine Liste der kanonischen (nicht-gemappten) Laufwerke.
@@ -98,7 +243,7 @@ def get_canonical_drive_list():
     from utils import get_available_drives  # Import hier um Zirkularität zu vermeiden
     
     all_drives = get_available_drives()
-    drive_mappings = get_drive_mapping()
+    drive_mappings = get_alias_resolver().mappings()
     
     canonical_drives = []
     real_paths_seen = set()
@@ -136,12 +281,8 @@ def is_path_alias_of(path1, path2):
     Returns:
         bool: True wenn sie auf dieselben Daten zeigen
     """
-    drive_mappings = get_drive_mapping()
-    
-    norm1, is_alias1, orig1, real1 = normalize_path_with_aliases(path1, drive_mappings)
-    norm2, is_alias2, orig2, real2 = normalize_path_with_aliases(path2, drive_mappings)
-    
-    return norm1 == norm2
+    resolver = get_alias_resolver()
+    return resolver.normalize(path1) == resolver.normalize(path2)
 
 if __name__ == "__main__":
     # Test-Code
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Blockweises Löschen aller Daten eines Laufwerks (clear_drive_data, --restart).
+
+Bisher löschte ein einziges `DELETE FROM directories WHERE drive_id = ?` per
+CASCADE alle Dateien des Laufwerks in einer Transaktion: bei Millionen Dateien
+eine WAL-Datei im GB-Bereich und minutenlang gehaltener DB-Lock (Watchdog steht).
+
+Stattdessen zwei Phasen mit begrenzten Blöcken, Commit nach jedem Block und
+kurzer Pause, in der andere Schreiber den Lock bekommen:
+1. 'files': Dateien in Verzeichnis-ID-Reihenfolge, höchstens purge_chunk_files je Block,
+2. 'directories': die (leeren) Verzeichnisse absteigend nach ID, damit CASCADE
+   keine großen Teilbäume auf einmal mitnimmt.
+Der Cursor steht in purge_progress (gleiche Transaktion wie der Block), ein
+abgebrochenes Löschen läuft beim nächsten Aufruf an dieser Stelle weiter.
+
+Macht das Laufwerk den Großteil der DB aus (purge_rebuild_ratio), ist es
+billiger, den Rest zu behalten statt das Laufwerk zu löschen ('rebuild'):
+übrige Verzeichnisse/Dateien in TEMP-Tabellen sichern, files/directories ohne
+Trigger leeren (Truncate statt Zeile für Zeile), Rest zurückschreiben, Trigger
+und Suchindex neu anlegen. Das dauert proportional zum Rest, nicht zum Laufwerk.
+
+Im Änderungsjournal erscheint in beiden Fällen nur ein Eintrag ('drive', 'purge')
+statt einer Löschung pro Zeile.
+
+    python drive_purge.py --drive "D:/"
+    python drive_purge.py --resume          # unterbrochene Löschvorgänge fortsetzen
+"""
+
+import argparse
+import time
+
+import change_journal
+from utils import logger, CONFIG
+
+CHUNK_FILES = CONFIG.get('purge_chunk_files', 20000)
+CHUNK_DIRECTORIES = CONFIG.get('purge_chunk_directories', 5000)
+PAUSE_SECONDS = CONFIG.get('purge_pause_seconds', 0.05)
+REBUILD_RATIO = CONFIG.get('purge_rebuild_ratio', 0.6)
+
+
+def pending_purges(db):
+    """[(drive_id, phase, files_deleted, directories_deleted), ...] unterbrochener Löschvorgänge."""
+    with db.lock:
+        return db.conn.execute(
+            "SELECT drive_id, phase, files_deleted, directories_deleted FROM purge_progress ORDER BY drive_id"
+        ).fetchall()
+
+
+def pending_purge(db, drive_id):
+    """True, wenn für das Laufwerk ein Löschvorgang unterbrochen wurde."""
+    return any(row[0] == drive_id for row in pending_purges(db))
+
+
+def _drive_share(db, drive_id):
+    """(Dateien des Laufwerks, Dateien gesamt) aus file_stats."""
+    with db.lock:
+        drive_files, total_files = db.conn.execute("""
+            SELECT IFNULL(SUM(CASE WHEN drive_id = ? THEN file_count END), 0), IFNULL(SUM(file_count), 0)
+            FROM file_stats
+        """, (drive_id,)).fetchone()
+    return drive_files, total_files
+
+
+def choose_strategy(db, drive_id, chunk_files=None, rebuild_ratio=None):
+    """'rebuild' wenn das Laufwerk den Großteil der Dateien hält, sonst 'chunked'."""
+    chunk_files = chunk_files or CHUNK_FILES
+    rebuild_ratio = REBUILD_RATIO if rebuild_ratio is None else rebuild_ratio
+    drive_files, total_files = _drive_share(db, drive_id)
+    if rebuild_ratio and drive_files > chunk_files and drive_files >= total_files * rebuild_ratio:
+        return 'rebuild'
+    return 'chunked'
+
+
+def purge_drive(db, drive_id, strategy=None, chunk_files=None, chunk_directories=None, pause=None,
+                progress=None):
+    """Löscht Dateien, Verzeichnisse und Scan-Fortschritt eines Laufwerks (der Laufwerkseintrag bleibt).
+
+    strategy: 'chunked', 'rebuild' oder None (automatisch, ein unterbrochener Vorgang läuft blockweise weiter).
+    progress(phase, files_deleted, directories_deleted) wird nach jedem Block aufgerufen.
+    Gibt {'strategy', 'files_deleted', 'directories_deleted', 'chunks', 'seconds'} zurück.
+    """
+    start = time.time()
+    if strategy is None:
+        strategy = 'chunked' if pending_purge(db, drive_id) else choose_strategy(db, drive_id, chunk_files)
+    if strategy == 'rebuild':
+        result = _purge_rebuild(db, drive_id)
+    else:
+        result = _purge_chunked(db, drive_id, chunk_files or CHUNK_FILES, chunk_directories or CHUNK_DIRECTORIES,
+                                PAUSE_SECONDS if pause is None else pause, progress)
+    result['strategy'] = strategy
+    result['seconds'] = time.time() - start
+    return result
+
+
+def _purge_chunked(db, drive_id, chunk_files, chunk_directories, pause, progress):
+    conn = db.conn
+    with db.lock:
+        conn.commit()
+        row = conn.execute("""
+            SELECT phase, last_directory_id, files_deleted, directories_deleted
+            FROM purge_progress WHERE drive_id = ?
+        """, (drive_id,)).fetchone()
+        if row:
+            logger.info(f"[Purge] Setze Löschen von Laufwerk ID {drive_id} fort ({row[0]}, "
+                        f"{row[2]} Dateien / {row[3]} Verzeichnisse bereits gelöscht)")
+        else:
+            now = time.time()
+            conn.execute("""
+                INSERT INTO purge_progress (drive_id, phase, last_directory_id, started_at, updated_at)
+                VALUES (?, 'files', 0, ?, ?)
+            """, (drive_id, now, now))
+            conn.commit()
+            row = ('files', 0, 0, 0)
+    phase, last_id, files_deleted, dirs_deleted = row
+    chunks = 0
+
+    while phase == 'files':
+        with db.lock:
+            # CROSS JOIN: Verzeichnisse in ID-Reihenfolge ab dem Cursor, Dateien je Verzeichnis über den Index
+            rows = conn.execute("""
+                SELECT f.id, d.id FROM directories d CROSS JOIN files f ON f.directory_id = d.id
+                WHERE d.id >= ? AND d.drive_id = ?
+                ORDER BY d.id LIMIT ?
+            """, (last_id, drive_id, chunk_files)).fetchall()
+            if rows:
+                conn.executemany("DELETE FROM files WHERE id = ?", [(file_id,) for file_id, _ in rows])
+                files_deleted += len(rows)
+                last_id = rows[-1][1]
+            else:
+                # Verzeichnisphase läuft absteigend unterhalb dieses Cursors
+                phase = 'directories'
+                last_id = conn.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM directories").fetchone()[0]
+            _save_progress(conn, drive_id, phase, last_id, files_deleted, dirs_deleted)
+            conn.commit()
+        chunks += 1
+        _report(progress, phase, files_deleted, dirs_deleted, pause)
+
+    while phase == 'directories':
+        with db.lock:
+            ids = [row[0] for row in conn.execute("""
+                SELECT id FROM directories WHERE id < ? AND +drive_id = ?
+                ORDER BY id DESC LIMIT ?
+            """, (last_id, drive_id, chunk_directories))]
+            if ids:
+                conn.executemany("DELETE FROM directories WHERE id = ?", [(dir_id,) for dir_id in ids])
+                dirs_deleted += len(ids)
+                last_id = ids[-1]
+                _save_progress(conn, drive_id, phase, last_id, files_deleted, dirs_deleted)
+            else:
+                phase = 'done'
+                conn.execute("DELETE FROM scan_progress WHERE drive_id = ?", (drive_id,))
+                conn.execute("DELETE FROM purge_progress WHERE drive_id = ?", (drive_id,))
+                change_journal.record_drive_purge(conn, drive_id)
+            conn.commit()
+            # Eigene Löschungen ändern data_version nicht - Baum explizit bereinigen
+            if phase == 'done':
+                db.dir_tree.remove_drive(drive_id)
+            else:
+                db.dir_tree.invalidate()
+        chunks += 1
+        _report(progress, phase, files_deleted, dirs_deleted, pause if phase != 'done' else 0)
+
+    db.file_cache.clear()
+    return {'files_deleted': files_deleted, 'directories_deleted': dirs_deleted, 'chunks': chunks}
+
+
+def _save_progress(conn, drive_id, phase, last_id, files_deleted, dirs_deleted):
+    conn.execute("""
+        UPDATE purge_progress
+        SET phase = ?, last_directory_id = ?, files_deleted = ?, directories_deleted = ?, updated_at = ?
+        WHERE drive_id = ?
+    """, (phase, last_id, files_deleted, dirs_deleted, time.time(), drive_id))
+
+
+def _report(progress, phase, files_deleted, dirs_deleted, pause):
+    logger.debug(f"[Purge] {phase}: {files_deleted} Dateien, {dirs_deleted} Verzeichnisse gelöscht")
+    if progress:
+        progress(phase, files_deleted, dirs_deleted)
+    if pause:
+        # Lock ist frei: Watchdog und Write-Queue kommen zwischen den Blöcken dran
+        time.sleep(pause)
+
+
+def _purge_rebuild(db, drive_id):
+    """Behält die übrigen Laufwerke statt das große Laufwerk zeilenweise zu löschen."""
+    conn = db.conn
+    with db.lock:
+        conn.commit()
+        # foreign_keys lässt sich nur außerhalb einer Transaktion umschalten
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            files_deleted = conn.execute("""
+                SELECT COUNT(*) FROM directories d CROSS JOIN files f ON f.directory_id = d.id WHERE d.drive_id = ?
+            """, (drive_id,)).fetchone()[0]
+            dirs_deleted = conn.execute("SELECT COUNT(*) FROM directories WHERE drive_id = ?", (drive_id,)).fetchone()[0]
+            conn.execute("CREATE TEMP TABLE purge_keep_dirs AS SELECT * FROM directories WHERE drive_id != ?", (drive_id,))
+            conn.execute("""
+                CREATE TEMP TABLE purge_keep_files AS
+                SELECT f.* FROM directories d CROSS JOIN files f ON f.directory_id = d.id WHERE d.drive_id != ?
+            """, (drive_id,))
+            conn.execute("CREATE TEMP TABLE purge_keep_stats AS SELECT * FROM directory_stats WHERE drive_id != ?",
+                         (drive_id,))
+            # Ohne Trigger und ohne FK-Prüfung greift die Truncate-Optimierung von DELETE ohne WHERE
+            triggers = conn.execute("""
+                SELECT name, sql FROM sqlite_master
+                WHERE type = 'trigger' AND tbl_name IN ('files', 'directories', 'directory_stats')
+            """).fetchall()
+            for name, _ in triggers:
+                conn.execute(f'DROP TRIGGER "{name}"')
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM directory_stats")
+            conn.execute("DELETE FROM directories")
+            conn.execute("INSERT INTO directories SELECT * FROM purge_keep_dirs ORDER BY id")
+            conn.execute("INSERT INTO files SELECT * FROM purge_keep_files ORDER BY id")
+            conn.execute("INSERT INTO directory_stats SELECT * FROM purge_keep_stats")
+            for name, sql in triggers:
+                conn.execute(sql)
+            for table in ("purge_keep_dirs", "purge_keep_files", "purge_keep_stats"):
+                conn.execute(f"DROP TABLE temp.{table}")
+            # Statistik der übrigen Laufwerke bleibt gültig, die des Laufwerks fällt weg
+            conn.execute("DELETE FROM file_stats WHERE drive_id = ?", (drive_id,))
+            conn.execute("UPDATE drive_stats SET directory_count = 0 WHERE drive_id = ?", (drive_id,))
+            conn.execute("DELETE FROM scan_progress WHERE drive_id = ?", (drive_id,))
+            conn.execute("DELETE FROM purge_progress WHERE drive_id = ?", (drive_id,))
+            change_journal.record_drive_purge(conn, drive_id)
+            db.rebuild_search_index()
+            violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+            if violations:
+                raise RuntimeError(f"Fremdschlüssel verletzt nach Neuaufbau: {violations[:5]}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+        db.dir_tree.remove_drive(drive_id)
+        db.file_cache.clear()
+    return {'files_deleted': files_deleted, 'directories_deleted': dirs_deleted, 'chunks': 1}
+
+
+def main():
+    import models
+    parser = argparse.ArgumentParser(description="Laufwerksdaten blockweise löschen")
+    parser.add_argument("--drive", help="Laufwerk, dessen Daten gelöscht werden (z.B. 'D:/')")
+    parser.add_argument("--resume", action="store_true", help="Unterbrochene Löschvorgänge fortsetzen")
+    parser.add_argument("--strategy", choices=["chunked", "rebuild"], help="Strategie erzwingen")
+    args = parser.parse_args()
+
+    def show(phase, files_deleted, dirs_deleted):
+        print(f"  {phase:12} {files_deleted:>12,} Dateien {dirs_deleted:>10,} Verzeichnisse", end="\r", flush=True)
+
+    if args.drive and models.DATABASE_LAYOUT == 'sharded':
+        # Shard-Layout: Laufwerk entfernen = Shard-Datei löschen
+        from shard_manager import get_shard_manager
+        removed = get_shard_manager().drop_drive(args.drive)
+        print(f"{args.drive}: Shard gelöscht" if removed else f"Laufwerk {args.drive} hat keinen Shard")
+    elif args.drive:
+        db = models.get_db_for_drive(args.drive)
+        row = db.conn.execute("SELECT id FROM drives WHERE name = ?", (args.drive,)).fetchone()
+        if row is None:
+            print(f"Laufwerk {args.drive} nicht in der Datenbank")
+            return 1
+        result = purge_drive(db, row[0], strategy=args.strategy, progress=show)
+        print(f"\n{args.drive}: {result['files_deleted']:,} Dateien, {result['directories_deleted']:,} Verzeichnisse "
+              f"gelöscht ({result['strategy']}, {result['seconds']:.1f}s)")
+    if args.resume:
+        db = models.get_db_instance()
+        for drive_id, phase, _, _ in pending_purges(db):
+            result = purge_drive(db, drive_id, strategy='chunked', progress=show)
+            print(f"\nLaufwerk ID {drive_id}: fortgesetzt ab '{phase}', insgesamt {result['files_deleted']:,} Dateien")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
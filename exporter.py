@@ -10,6 +10,8 @@ import logging
 # Importiere zentrale Funktionen und Konstanten
 from utils import DB_PATH, CONFIG, PROJECT_DIR, logger
 from models import get_db_instance
+from db_snapshot import describe_snapshot
+from filescan_query import connect_read, export_query
 
 # Exportverzeichnis definieren (relativ zum Projekt)
 EXPORT_DIR = os.path.join(PROJECT_DIR, "exports")
@@ -31,29 +33,8 @@ if not isinstance(EXPORT_FORMATS, list):
 
 def fetch_file_data(db_cursor, path_filter=None):
     """Holt Dateiinformationen aus der Datenbank, optional gefiltert nach Pfad."""
-    # Erweiterte Query für optimierte Datenbankstruktur - rekonstruiert vollständigen Pfad
-    query = '''
-        SELECT 
-            d.full_path || '/' || f.filename || COALESCE(e.name, '') as file_path,
-            f.size, 
-            f.hash, 
-            d.full_path AS dir_path, 
-            dr.name AS drive_name,
-            e.name AS extension,
-            e.category AS file_category
-        FROM files f
-        JOIN directories d ON f.directory_id = d.id
-        JOIN drives dr ON d.drive_id = dr.id
-        LEFT JOIN extensions e ON f.extension_id = e.id
-    '''
-    params = []
-    if path_filter:
-        # Filtert auf Dateien, deren Verzeichnis mit dem path_filter beginnt oder gleich ist
-        normalized_filter = os.path.normpath(path_filter)
-        query += " WHERE (d.full_path LIKE ? OR d.full_path = ?)"
-        params.extend([normalized_filter + os.sep + '%', normalized_filter])
-
-    query += " ORDER BY dr.name, d.full_path, f.filename" # Bessere Sortierung
+    # Gemeinsame Abfrage (filescan_query): vollständiger Pfad ohne '[none]', Teilbaum indexiert
+    query, params = export_query(db_cursor.connection, path_filter)
 
     logger.info(f"[Exporter] Führe Abfrage aus: {query} mit Parametern: {params}")
     db_cursor.execute(query, params)
@@ -180,6 +161,14 @@ def export_all(db, path_filter=None):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     overall_success = True
 
+    # Lesen aus dem Snapshot (immutable), damit der Export keinen WAL-Stand festhält;
+    # das Export-Log geht weiter in die Live-DB
+    if CONFIG.get('export_from_snapshot', True):
+        read_conn, snapshot = connect_read(db.path, snapshot=True)
+        logger.info(f"[Exporter] Datenquelle: {describe_snapshot(snapshot)}")
+    else:
+        read_conn = db.conn
+
     for fmt in EXPORT_FORMATS:
         export_func = None
         if fmt.lower() == "csv":
@@ -198,7 +187,7 @@ def export_all(db, path_filter=None):
 
         try:
             # Hole Daten für jedes Format neu, da der Cursor verbraucht wird
-            data_cursor = fetch_file_data(db.cursor, path_filter)
+            data_cursor = fetch_file_data(read_conn.cursor(), path_filter)
             success = export_func(data_cursor, filepath)
 
             if success:
@@ -213,6 +202,9 @@ def export_all(db, path_filter=None):
             logger.error(traceback.format_exc())
             overall_success = False
 
+    if read_conn is not db.conn:
+        read_conn.close()
+
     if overall_success:
         write_log("[Exporter] Alle Exporte erfolgreich abgeschlossen.")
     else:
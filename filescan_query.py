@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Gemeinsame Lese-Abfragen für die Werkzeuge in Dateien_Skripte und den Exporter.
+
+Bisher baute jedes Werkzeug eigene Verbindungen und eigene JOINs über
+files/directories/drives/extensions, und den Dateipfad jedes Mal anders
+(teils mit COALESCE(e.name, ''), das '[none]' als Endung anhängt). Hier liegt
+das einmal:
+
+- connect_read(): Leseverbindung (Snapshot oder Live-DB nur lesend) mit
+  abgestimmten PRAGMAs (Cache, mmap, temp_store) und großem
+  Statement-Cache für wiederholte Abfragen,
+- Ausdrücke für Extension, Dateiname, Dateipfad und Hash,
+- Abfragen als (sql, params) für Suche, Duplikate, Ordner-Summen und Export
+  sowie für Ordnervergleiche, Laufwerkslisten und Musiksuche - alle SQL der
+  Werkzeuge in Dateien_Skripte liegt hier, Qt-frei und im Planungstest prüfbar,
+- iter_rows(): streamt Ergebnisse in Blöcken statt fetchall().
+
+Pfade kommen immer über directory_paths und funktionieren damit auch im
+kompakten Verzeichnisformat.
+"""
+
+import os
+import pathlib
+import sqlite3
+
+from utils import DB_PATH, CONFIG
+from models import HASH_HEX_SQL
+from db_paths import directory_filter, subtree_filter
+from db_search import search_mode, name_condition, directory_condition
+from db_snapshot import connect_snapshot
+
+READ_CACHE_MB = CONFIG.get('read_cache_mb', 64)
+READ_MMAP_MB = CONFIG.get('read_mmap_mb', 256)
+STATEMENT_CACHE = 256
+FETCH_SIZE = 2000
+
+
+def extension_expr(e="e"):
+    """Extension ohne Platzhalter: '[none]' und NULL werden zu ''."""
+    return f"CASE WHEN {e}.name IS NULL OR {e}.name = '[none]' THEN '' ELSE {e}.name END"
+
+
+def file_name_expr(f="f", e="e"):
+    """Vollständiger Dateiname (filename + Extension)."""
+    return f"{f}.filename || {extension_expr(e)}"
+
+
+def file_path_expr(d="d", f="f", e="e"):
+    """Vollständiger Dateipfad mit '/' - auch direkt im Laufwerkswurzelverzeichnis ('C:/x', nicht 'C://x')."""
+    return f"rtrim({d}.full_path, '/') || '/' || {file_name_expr(f, e)}"
+
+
+def hash_expr(f="f"):
+    """Hash als Hex-Text, unabhängig von der Speicherform (BLOB oder Text)."""
+    return HASH_HEX_SQL.format(f"{f}.hash")
+
+
+# Standard-JOIN für Dateiabfragen (Aliase f, d, dr, e)
+FILES_FROM = """
+    FROM files f
+    JOIN directory_paths d ON f.directory_id = d.id
+    JOIN drives dr ON d.drive_id = dr.id
+    LEFT JOIN extensions e ON f.extension_id = e.id
+"""
+
+FILE_COLUMNS = (f"f.id, {file_path_expr()} AS file_path, d.full_path AS dir_path, "
+                f"{file_name_expr()} AS name, f.size, {hash_expr()} AS hash, f.mtime_ns, "
+                f"dr.name AS drive_name, f.filename, {extension_expr()} AS extension, e.category, "
+                f"f.created_date, f.modified_date")
+FILE_FIELDS = ('id', 'file_path', 'dir_path', 'name', 'size', 'hash', 'mtime_ns',
+               'drive_name', 'filename', 'extension', 'category', 'created_date', 'modified_date')
+
+
+def file_info(row):
+    """Zeile mit FILE_COLUMNS (am Ende der Zeile) als Dict nach FILE_FIELDS."""
+    return dict(zip(FILE_FIELDS, row[-len(FILE_FIELDS):]))
+
+# Sortierschlüssel für search_query (order_by)
+SEARCH_ORDER = {
+    'path': "file_path",
+    'directory': "d.full_path, f.filename",
+    'name': "f.filename",
+    'size': "f.size",
+    'category': "e.category",
+}
+
+
+def tune_read_connection(conn):
+    """PRAGMAs für reine Leseverbindungen (Analysewerkzeuge, Export).
+
+    Schreibschutz kommt aus mode=ro/immutable; query_only würde auch TEMP-Tabellen verbieten.
+    """
+    conn.execute(f"PRAGMA cache_size = -{int(READ_CACHE_MB) * 1024}")
+    conn.execute(f"PRAGMA mmap_size = {int(READ_MMAP_MB) * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def connect_read(db_path=DB_PATH, snapshot=False, max_age_seconds=None):
+    """Abgestimmte Leseverbindung. Gibt (Verbindung, snapshot_info oder None) zurück.
+
+    snapshot=True liest aus dem Lese-Snapshot (db_snapshot), sonst die Live-DB nur lesend.
+    """
+    if snapshot:
+        conn, info = connect_snapshot(db_path, max_age_seconds)
+    else:
+        uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+        conn, info = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30,
+                                     cached_statements=STATEMENT_CACHE), None
+        conn.execute("PRAGMA busy_timeout = 30000")
+    return tune_read_connection(conn), info
+
+
+def iter_rows(conn, sql, params=(), size=FETCH_SIZE):
+    """Führt sql aus und liefert die Zeilen blockweise (fetchmany) als Generator."""
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def _where(clauses):
+    return (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+def _in(column, values, negate=False):
+    """column [NOT] IN (?, ...) + Parameter."""
+    return f"{column} {'NOT ' if negate else ''}IN ({','.join('?' * len(values))})", list(values)
+
+
+def _subtrees(conn, paths, negate=False):
+    """Teilbaum-Bedingungen: in einem der Ordner (OR) bzw. in keinem (negate)."""
+    clauses, params = [], []
+    for path in paths:
+        condition, condition_params = subtree_filter(conn, path, "d")
+        clauses.append(f"NOT {condition}" if negate else condition)
+        params.extend(condition_params)
+    return "(" + (" AND " if negate else " OR ").join(clauses) + ")", params
+
+
+def _scope(conn, clauses, params, drives=None, exclude_drives=None, paths=None, exclude_paths=None):
+    """Laufwerks-IDs und Teilbäume (ein-/ausschließen) als Bedingungen auf d anhängen."""
+    for column, values, negate in (("d.drive_id", drives, False), ("d.drive_id", exclude_drives, True)):
+        if values:
+            condition, condition_params = _in(column, values, negate)
+            clauses.append(condition)
+            params.extend(condition_params)
+    for values, negate in ((paths, False), (exclude_paths, True)):
+        if values:
+            condition, condition_params = _subtrees(conn, values, negate)
+            clauses.append(condition)
+            params.extend(condition_params)
+
+
+def _like(text):
+    return '%' + text.replace('*', '%').replace('?', '_') + '%'
+
+
+def name_terms_condition(mode, terms):
+    """Verknüpfte Namensbegriffe [(op, Begriff), ...] mit op 'AND', 'OR' oder 'NOT'.
+
+    Der erste Begriff steht ohne Operator; 'NOT' heißt 'und nicht'. Mit Suchindex
+    (mode aus search_mode) über name_condition, sonst LIKE über den vollen Dateinamen.
+    """
+    parts, params = [], []
+    for index, (op, term) in enumerate(terms):
+        negate = index > 0 and op == 'NOT'
+        if mode:
+            condition, condition_params = name_condition(mode, term, "f.id", negate=negate)
+        else:
+            condition = f"({file_name_expr()}) {'NOT ' if negate else ''}LIKE ?"
+            condition_params = [_like(term)]
+        if index:
+            parts.append('OR' if op == 'OR' else 'AND')
+        parts.append(condition)
+        params.extend(condition_params)
+    return "(" + " ".join(parts) + ")", params
+
+
+def search_query(conn, term=None, path=None, extensions=None, limit=None, terms=None, path_text=None,
+                 drives=None, categories=None, size=None, mtime=None, hashed=None, duplicates=False,
+                 order_by=None, descending=False, count=False):
+    """Dateisuche. Spalten: FILE_COLUMNS (count=True: nur COUNT(*), ohne Sortierung und limit).
+
+    term/terms: Name (Suchindex wenn vorhanden), terms als [(op, Begriff), ...].
+    path: Teilbaum; path_text: Teilstring in Laufwerks- oder Verzeichnisname/-pfad.
+    drives: Laufwerksnamen, categories: Extension-Kategorien.
+    size: (op, Wert[, Wert2]) mit op '>', '<', '=' oder 'between'.
+    mtime: (ab_ns, bis_ns) halboffen, je None = offen; Zeilen ohne mtime_ns bleiben drin.
+    hashed: True nur mit Hash, False nur ohne; duplicates: Hash mehrfach vorhanden.
+    order_by: Schlüssel aus SEARCH_ORDER (Standard 'directory').
+    """
+    clauses, params = [], []
+    mode = search_mode(conn) if term or terms or path_text else None
+    if term:
+        terms = [('AND', term)] + list(terms or [])
+    if terms:
+        condition, condition_params = name_terms_condition(mode, terms)
+        clauses.append(condition)
+        params.extend(condition_params)
+    if path:
+        condition, condition_params = subtree_filter(conn, path, "d")
+        clauses.append(condition)
+        params.extend(condition_params)
+    if path_text:
+        if mode:
+            condition, condition_params = directory_condition(path_text, "d.id", mode)
+        else:
+            condition, condition_params = "d.full_path LIKE ?", [_like(path_text)]
+        clauses.append(f"(dr.name LIKE ? OR {condition})")
+        params.extend([_like(path_text)] + condition_params)
+    for column, values in ((extension_expr(), extensions), ("dr.name", drives), ("e.category", categories)):
+        if values:
+            condition, condition_params = _in(column, values)
+            clauses.append(condition)
+            params.extend(condition_params)
+    if size:
+        op, values = size[0], list(size[1:])
+        if op == 'between':
+            clauses.append("f.size BETWEEN ? AND ?")
+            params.extend(sorted(values[:2]))
+        elif op in ('>', '<', '='):
+            clauses.append(f"f.size {op} ?")
+            params.append(values[0])
+    if mtime:
+        bounds = [(f"f.mtime_ns {op} ?", value) for op, value in zip((">=", "<"), mtime) if value is not None]
+        if bounds:
+            clauses.append(f"(({' AND '.join(sql for sql, _ in bounds)}) OR f.mtime_ns IS NULL)")
+            params.extend(value for _, value in bounds)
+    if hashed is not None:
+        clauses.append("(f.hash IS NOT NULL AND f.hash != '')" if hashed else "(f.hash IS NULL OR f.hash = '')")
+    if duplicates:
+        clauses.append(duplicate_hash_condition("f"))
+    if count:
+        return f"SELECT COUNT(*) {FILES_FROM}{_where(clauses)}", params
+    order = SEARCH_ORDER.get(order_by or 'directory', SEARCH_ORDER['directory'])
+    if descending:
+        order = ", ".join(f"{column} DESC" for column in order.split(", "))
+    sql = f"SELECT {FILE_COLUMNS} {FILES_FROM}{_where(clauses)} ORDER BY {order}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def duplicates_query(conn, method='name_size', min_size=0, path=None, limit=None, max_size=None,
+                     drives=None, exclude_drives=None, paths=None, exclude_paths=None):
+    """Duplikatgruppen, größte zuerst. Spalten: group_key, dup_count, total_size, FILE_COLUMNS.
+
+    method 'hash' gruppiert nach Hash, 'name_size' nach Dateiname + Größe.
+    limit begrenzt die Anzahl Gruppen, nicht Dateien. drives/exclude_drives sind
+    Laufwerks-IDs, paths (ODER) und exclude_paths Teilbäume; path = ein Teilbaum.
+    """
+    clauses, params = [], []
+    if min_size:
+        clauses.append("f.size >= ?")
+        params.append(min_size)
+    if max_size is not None:
+        clauses.append("f.size <= ?")
+        params.append(max_size)
+    paths = ([path] if path else []) + list(paths or [])
+    _scope(conn, clauses, params, drives, exclude_drives, paths, exclude_paths)
+    if method == 'hash':
+        key = hash_expr()
+        clauses.append("f.hash IS NOT NULL AND f.hash != ''")
+        match = "f.hash = g.hash"
+        group_columns = "f.hash"
+    else:
+        key = "f.filename || '|' || IFNULL(f.extension_id, 0) || '|' || f.size"
+        match = "f.filename = g.filename AND f.extension_id IS g.extension_id AND f.size = g.size"
+        group_columns = "f.filename, f.extension_id, f.size"
+    where = _where(clauses)
+    sql = f"""
+        WITH g AS (
+            SELECT {group_columns}, COUNT(*) AS dup_count, SUM(f.size) AS total_size
+            FROM files f JOIN directory_paths d ON f.directory_id = d.id
+            {where}
+            GROUP BY {group_columns}
+            HAVING COUNT(*) > 1
+            ORDER BY total_size DESC
+            {"LIMIT ?" if limit else ""}
+        )
+        SELECT {key} AS group_key, g.dup_count, g.total_size, {FILE_COLUMNS}
+        FROM g JOIN files f ON {match}
+        JOIN directory_paths d ON f.directory_id = d.id
+        JOIN drives dr ON d.drive_id = dr.id
+        LEFT JOIN extensions e ON f.extension_id = e.id
+        {where}
+        ORDER BY g.total_size DESC, group_key, d.full_path
+    """
+    # Filter gelten für Gruppenbildung und Mitglieder
+    params = params + ([limit] if limit else []) + params
+    return sql, params
+
+
+def duplicate_hash_condition(f="files"):
+    """SQL-Bedingung: Hash der Datei kommt mindestens zweimal vor.
+
+    EXISTS über idx_files_hash je Kandidat statt GROUP BY hash über alle Dateien.
+    """
+    return (f"({f}.hash IS NOT NULL AND {f}.hash != '' AND EXISTS ("
+            f"SELECT 1 FROM files dup WHERE dup.hash = {f}.hash AND dup.id != {f}.id))")
+
+
+def drives_query():
+    """Laufwerke mit Zählern aus den Statistiktabellen. Spalten: id, name, folder_count, file_count."""
+    return """
+        SELECT d.id, d.name,
+               IFNULL((SELECT directory_count FROM drive_stats WHERE drive_id = d.id), 0) AS folder_count,
+               IFNULL((SELECT SUM(file_count) FROM file_stats WHERE drive_id = d.id), 0) AS file_count
+        FROM drives d
+        ORDER BY d.name
+    """, []
+
+
+def directory_files_query(conn, path):
+    """Dateien genau eines Verzeichnisses (ohne Unterordner). Spalten: name, size, hash."""
+    condition, params = directory_filter(conn, path, "d")
+    sql = f"""
+        SELECT {file_name_expr()} AS name, f.size, {hash_expr()} AS hash
+        FROM directories d
+        JOIN files f ON f.directory_id = d.id
+        LEFT JOIN extensions e ON f.extension_id = e.id
+        WHERE {condition}
+    """
+    return sql, params
+
+
+def common_files_query(directory_id, other_id):
+    """Dateien aus directory_id, die mit Name + Größe auch in other_id liegen. Spalten: name, size."""
+    sql = f"""
+        SELECT {file_name_expr()} AS name, f.size
+        FROM files f
+        LEFT JOIN extensions e ON f.extension_id = e.id
+        WHERE f.directory_id = ?
+        AND EXISTS (
+            SELECT 1 FROM files f2
+            WHERE f2.directory_id = ?
+            AND f2.filename = f.filename
+            AND f2.size = f.size
+            AND f2.extension_id IS f.extension_id
+        )
+        ORDER BY f.size DESC
+    """
+    return sql, [directory_id, other_id]
+
+
+def folder_signatures_query(conn, min_files=5, drives=None, exclude_drives=None, paths=None,
+                            exclude_paths=None):
+    """Ordner mit mehr als min_files Dateien und ihren Datei-Signaturen ('Name_Größe', kommagetrennt).
+
+    Spalten: id, full_path, drive, file_count, total_size, file_signatures.
+    Filter wie bei duplicates_query.
+    """
+    clauses, params = [], []
+    _scope(conn, clauses, params, drives, exclude_drives, paths, exclude_paths)
+    sql = f"""
+        SELECT d.id, d.full_path, dr.name AS drive, COUNT(f.id) AS file_count, SUM(f.size) AS total_size,
+               GROUP_CONCAT({file_name_expr()} || '_' || COALESCE(f.size, 0)) AS file_signatures
+        FROM directory_paths d
+        JOIN drives dr ON d.drive_id = dr.id
+        LEFT JOIN files f ON f.directory_id = d.id
+        LEFT JOIN extensions e ON f.extension_id = e.id
+        {_where(clauses)}
+        GROUP BY d.id
+        HAVING file_count > ?
+    """
+    return sql, params + [min_files]
+
+
+# Vergleichsschlüssel je Datei für shared_folders_query
+FOLDER_MATCH_KEYS = {
+    'name_size': "f.filename || '_' || f.size",
+    'name': file_name_expr(),
+    'size': "f.size",
+}
+
+
+def shared_folders_query(match='name_size', min_common=3, min_files=5, drives=None, exclude_patterns=(),
+                         limit=500):
+    """Ordner-Paare mit mindestens min_common gemeinsamen Dateien (Schlüssel aus FOLDER_MATCH_KEYS).
+
+    Spalten je Ordner: id, path, drive, total_files, total_size (1 und 2), dann common_files
+    und similarity_percent. Dateizahl, Größe und Ähnlichkeit nur bei 'name_size' (sonst 0),
+    dort auch nur Ordner mit mindestens min_files Dateien.
+    """
+    clauses, params = [], []
+    if match == 'size':
+        clauses.append("f.size > 0")
+    if drives:
+        condition, condition_params = _in("d.drive_id", drives)
+        clauses.append(condition)
+        params.extend(condition_params)
+    for pattern in exclude_patterns:
+        clauses.append("d.full_path NOT LIKE ?")
+        params.append(f"%{pattern}%")
+    sql = f"""
+        WITH folder_files AS (
+            SELECT d.id AS folder_id, d.full_path, dr.name AS drive,
+                   {FOLDER_MATCH_KEYS.get(match, FOLDER_MATCH_KEYS['name_size'])} AS match_key
+            FROM directory_paths d
+            JOIN drives dr ON d.drive_id = dr.id
+            JOIN files f ON f.directory_id = d.id
+            LEFT JOIN extensions e ON f.extension_id = e.id
+            {_where(clauses)}
+        ),
+        shared_files AS (
+            -- Dateien, die in mehreren Ordnern vorkommen; folder1_id < folder2_id ohne Selbstvergleich
+            SELECT f1.folder_id AS folder1_id, f1.full_path AS folder1_path, f1.drive AS folder1_drive,
+                   f2.folder_id AS folder2_id, f2.full_path AS folder2_path, f2.drive AS folder2_drive,
+                   COUNT(*) AS common_files
+            FROM folder_files f1
+            JOIN folder_files f2 ON f1.match_key = f2.match_key
+            WHERE f1.folder_id < f2.folder_id
+            GROUP BY f1.folder_id, f2.folder_id
+            HAVING COUNT(*) >= ?
+        )"""
+    params.append(min_common)
+    if match == 'name_size':
+        sql += """,
+        folder_stats AS (
+            SELECT d.id, COUNT(f.id) AS total_files, SUM(f.size) AS total_size
+            FROM directory_paths d
+            JOIN files f ON f.directory_id = d.id
+            WHERE d.id IN (SELECT folder1_id FROM shared_files UNION SELECT folder2_id FROM shared_files)
+            GROUP BY d.id
+            HAVING total_files >= ?
+        )
+        SELECT sf.folder1_id, sf.folder1_path, sf.folder1_drive, fs1.total_files, fs1.total_size,
+               sf.folder2_id, sf.folder2_path, sf.folder2_drive, fs2.total_files, fs2.total_size,
+               sf.common_files,
+               CAST(sf.common_files AS FLOAT) * 100 / MIN(fs1.total_files, fs2.total_files) AS similarity_percent
+        FROM shared_files sf
+        JOIN folder_stats fs1 ON sf.folder1_id = fs1.id
+        JOIN folder_stats fs2 ON sf.folder2_id = fs2.id
+        ORDER BY sf.common_files DESC, similarity_percent DESC
+        LIMIT ?
+        """
+        params.append(min_files)
+    else:
+        sql += """
+        SELECT folder1_id, folder1_path, folder1_drive, 0, 0,
+               folder2_id, folder2_path, folder2_drive, 0, 0,
+               common_files, 0 AS similarity_percent
+        FROM shared_files
+        ORDER BY common_files DESC
+        LIMIT ?
+        """
+    params.append(limit)
+    return sql, params
+
+
+def media_query(extensions, name_terms=(), path_terms=(), any_terms=()):
+    """Dateien mit bestimmten Endungen (z.B. Audio), sortiert nach Ordner und Name.
+
+    name_terms/path_terms: Teilstrings in Dateiname bzw. Verzeichnispfad,
+    any_terms: in einem von beiden. Spalten: file_path, filename, dir_path.
+    """
+    condition, params = _in("e.name", extensions)
+    clauses = [condition]
+    for terms, columns in ((name_terms, ("f.filename",)), (path_terms, ("d.full_path",)),
+                           (any_terms, ("f.filename", "d.full_path"))):
+        for term in terms:
+            clauses.append("(" + " OR ".join(f"{column} LIKE ?" for column in columns) + ")")
+            params.extend([f"%{term}%"] * len(columns))
+    sql = f"""
+        SELECT {file_path_expr()} AS file_path, f.filename, d.full_path
+        FROM files f
+        JOIN directory_paths d ON f.directory_id = d.id
+        LEFT JOIN extensions e ON f.extension_id = e.id
+        {_where(clauses)}
+        ORDER BY d.full_path, f.filename
+    """
+    return sql, params
+
+
+def directory_sizes_query(drive_id):
+    """Direkte Dateizahl und Größe je Verzeichnis (ohne Unterordner) für Datenbanken ohne directory_stats.
+
+    Spalten: full_path, file_count, total_size.
+    """
+    sql = """
+        SELECT d.full_path, COUNT(f.id) AS file_count, IFNULL(SUM(f.size), 0) AS total_size
+        FROM directory_paths d
+        LEFT JOIN files f ON d.id = f.directory_id
+        WHERE d.drive_id = ?
+        GROUP BY d.id
+        ORDER BY d.full_path
+    """
+    return sql, [drive_id]
+
+
+def rollup_query(drive_id, min_size=0):
+    """Ordner-Summen inkl. Unterverzeichnisse aus directory_stats. Spalten: full_path, file_count, size."""
+    sql = """
+        SELECT p.full_path, s.recursive_file_count, s.recursive_size
+        FROM directory_stats s
+        JOIN directory_paths p ON p.id = s.directory_id
+        WHERE s.drive_id = ? AND s.recursive_size >= ?
+        ORDER BY p.full_path
+    """
+    return sql, [drive_id, min_size]
+
+
+def export_query(conn, path=None):
+    """Export aller Dateien, optional unterhalb von path.
+
+    Spalten: file_path, size, hash, dir_path, drive_name, extension, category.
+    """
+    # CROSS JOIN legt die Reihenfolge Laufwerk -> Verzeichnis -> Datei fest: die
+    # Ausgabe kommt sortiert aus den Indizes statt aus einem TEMP B-TREE über alle
+    # Dateien (ohne ANALYZE-Statistik wählte der Planer sonst SCAN files)
+    sql = f"""
+        SELECT {file_path_expr()} AS file_path, f.size, {hash_expr()} AS hash,
+               d.full_path AS dir_path, dr.name AS drive_name,
+               e.name AS extension, e.category AS file_category
+        FROM drives dr
+        CROSS JOIN directory_paths d ON d.drive_id = dr.id
+        CROSS JOIN files f ON f.directory_id = d.id
+        LEFT JOIN extensions e ON f.extension_id = e.id
+    """
+    params = []
+    if path:
+        condition, params = subtree_filter(conn, path, "d")
+        sql += f" WHERE {condition}"
+    sql += " ORDER BY dr.name, d.full_path, f.filename"
+    return sql, params
@@ -6,7 +6,7 @@ import logging # Logging hinzugefügt
 import html  # Für HTML-Export im Exporter-Teil (jetzt hier importiert? Besser nicht.)
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QCheckBox, QLabel, QListWidget, QPushButton, QFileDialog, QHBoxLayout, QListWidgetItem, QMessageBox, QApplication, QMainWindow, QWidget, QProgressBar, QTreeView, QFileSystemModel, QTextEdit, QDialogButtonBox, QMenu, QAction, QHeaderView, QComboBox, QTableWidget, QTableWidgetItem, QTimeEdit, QAbstractItemView, QInputDialog
-from models import get_db_instance
+from models import get_db_instance, get_db_metrics, read_metrics_files
 import hashlib
 import json
 from datetime import datetime
@@ -543,6 +543,67 @@ class ScheduledScansDialog(QDialog):
             logger.error(f"[GUI] {error_msg}")
             QMessageBox.critical(self, "Speicherfehler", error_msg)
 
+class DBMetricsDialog(QDialog):
+    """Zeigt die DB-Messwerte (Methoden, SQL-Anweisungen, Lock-Wartezeit) aller Prozesse."""
+    KIND_LABELS = {'methods': "Methode", 'statements': "SQL", 'lock_wait': "Lock-Wartezeit"}
+    COLUMNS = ["Prozess", "Art", "Name", "Aufrufe", "Summe ms", "Mittel ms", "p50 ms", "p95 ms", "p99 ms", "Max ms"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("DB-Metriken")
+        self.resize(1100, 600)
+        layout = QVBoxLayout(self)
+
+        self.info_label = QLabel()
+        layout.addWidget(self.info_label)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSortingEnabled(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        refresh_button = QPushButton("🔄 Aktualisieren")
+        refresh_button.clicked.connect(self.populate_table)
+        close_button = QPushButton("Schließen")
+        close_button.clicked.connect(self.accept)
+        button_layout.addWidget(refresh_button)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.populate_table()
+
+    def populate_table(self):
+        """Liest die Dateien unter metrics/ und die Werte dieses Prozesses."""
+        reports = [get_db_metrics().get_metrics()] + [
+            m for m in read_metrics_files() if m.get('pid') != os.getpid()]
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(0)
+        for report in reports:
+            written = datetime.fromtimestamp(report.get('written_at', 0)).strftime('%d.%m. %H:%M')
+            process = f"{report.get('process')} ({written})"
+            for kind, label in self.KIND_LABELS.items():
+                for name, summary in report.get(kind, {}).items():
+                    row = self.table.rowCount()
+                    self.table.insertRow(row)
+                    values = [process, label, name, summary['count'], summary['total_ms'], summary['avg_ms'],
+                              summary['p50_ms'], summary['p95_ms'], summary['p99_ms'], summary['max_ms']]
+                    for column, value in enumerate(values):
+                        item = QTableWidgetItem()
+                        item.setData(Qt.DisplayRole, value)
+                        if column == 2:
+                            item.setToolTip(name)
+                        self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(4, Qt.DescendingOrder)
+        self.info_label.setText(f"{len(reports)} Prozess(e), {self.table.rowCount()} Einträge - "
+                                f"Dateien unter metrics/ werden beim Beenden bzw. vom Dienst regelmäßig geschrieben.")
+
 class MainWindow(QMainWindow):
     """Hauptfenster der Dateiscanner GUI."""
     def __init__(self):
@@ -965,6 +1026,13 @@ class MainWindow(QMainWindow):
         scheduled_scans_action.triggered.connect(self.open_scheduled_scans_settings) # NEU
         settings_menu.addAction(scheduled_scans_action) # NEU
 
+        # Diagnose-Menü
+        diagnose_menu = menubar.addMenu('&Diagnose')
+        metrics_action = QtWidgets.QAction('&DB-Metriken...', self)
+        metrics_action.setStatusTip('Laufzeiten je DB-Methode und SQL-Anweisung sowie Lock-Wartezeiten anzeigen')
+        metrics_action.triggered.connect(self.open_db_metrics)
+        diagnose_menu.addAction(metrics_action)
+
         widget.setLayout(main_layout) # Setze das Hauptlayout für das zentrale Widget
         self.setCentralWidget(widget)
 
@@ -1069,11 +1137,8 @@ class MainWindow(QMainWindow):
             # Prüfe ob Fortsetzungspunkt existiert
             resume_point = db.get_last_scan_path(drive_id)
             
-            # Zähle vorhandene Daten
-            db.cursor.execute("SELECT COUNT(*) FROM files f JOIN directories d ON f.directory_id = d.id WHERE d.drive_id = ?", (drive_id,))
-            file_count = db.cursor.fetchone()[0]
-            db.cursor.execute("SELECT COUNT(*) FROM directories WHERE drive_id = ?", (drive_id,))
-            dir_count = db.cursor.fetchone()[0]
+            # Zähle vorhandene Daten (Statistik-Tabelle statt COUNT(*) über files)
+            _, _, file_count, _, dir_count = db.get_drive_stats(drive_id)[0]
             
             if file_count > 0 or dir_count > 0:
                 # Erstelle benutzerdefinierten Dialog
@@ -1635,6 +1700,10 @@ class MainWindow(QMainWindow):
         dialog.exec_()
         # Konfiguration wird im Dialog gespeichert
 
+    def open_db_metrics(self):
+        """Öffnet die Anzeige der DB-Messwerte."""
+        DBMetricsDialog(self).exec_()
+
     # Methode zum Starten des LogUpdaters
     def start_log_updater(self):
         if not self.log_updater:
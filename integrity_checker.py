@@ -7,7 +7,8 @@ import logging
 
 # Importiere zentrale Funktionen und Konstanten
 from utils import logger, DB_PATH, CONFIG, PROJECT_DIR, calculate_hash, HASHING
-from models import get_db_instance
+from models import get_db_instance, get_write_queue, HASH_HEX_SQL
+from db_paths import subtree_filter
 
 
 def _emit(line):
@@ -34,6 +35,8 @@ def check_integrity(db, check_base_path=None):
     cursor = db.conn.cursor()
     cursor.execute("PRAGMA busy_timeout = 60000")
     cursor.execute("PRAGMA journal_mode = WAL")
+    # Korrekturen laufen über die gemeinsame Write-Queue
+    writer = get_write_queue(db)
 
     missing_dirs = 0
     missing_files = 0
@@ -43,21 +46,22 @@ def check_integrity(db, check_base_path=None):
 
     try:
         # --- Gesamtzahlen ermitteln (fuer Fortschritt) ---
-        count_dir_query = "SELECT COUNT(*) FROM directories"
+        count_dir_query = "SELECT COUNT(*) FROM directory_paths"
         count_file_query = """
             SELECT COUNT(*) FROM files f
-            JOIN directories d ON f.directory_id = d.id
+            JOIN directory_paths d ON f.directory_id = d.id
         """
         count_params = []
+        count_dir_params = []
 
         if check_base_path:
-            path_filter = " WHERE d.full_path LIKE ? OR d.full_path = ?"
-            dir_path_filter = " WHERE full_path LIKE ? OR full_path = ?"
-            count_params = [check_base_path + os.sep + '%', check_base_path]
-            count_dir_query += dir_path_filter
-            count_file_query += path_filter
+            # Bereichsabfrage über den full_path-Index statt LIKE 'prefix%'
+            path_filter, count_params = subtree_filter(db.conn, check_base_path, "d")
+            dir_path_filter, count_dir_params = subtree_filter(db.conn, check_base_path, "directory_paths")
+            count_dir_query += " WHERE " + dir_path_filter
+            count_file_query += " WHERE " + path_filter
 
-        cursor.execute(count_dir_query, count_params)
+        cursor.execute(count_dir_query, count_dir_params)
         total_dirs = cursor.fetchone()[0]
 
         cursor.execute(count_file_query, count_params)
@@ -68,11 +72,11 @@ def check_integrity(db, check_base_path=None):
         # --- Verzeichnisse pruefen ---
         _emit("@@PHASE:dirs")
         logger.info("[Integritaet] Pruefe Verzeichnisse...")
-        dir_query = "SELECT id, full_path FROM directories"
+        dir_query = "SELECT id, full_path FROM directory_paths"
         dir_params = []
         if check_base_path:
-            dir_query += " WHERE full_path LIKE ? OR full_path = ?"
-            dir_params.extend([check_base_path + os.sep + '%', check_base_path])
+            dir_query += " WHERE " + dir_path_filter
+            dir_params.extend(count_dir_params)
 
         cursor.execute(dir_query, dir_params)
         dirs_to_check = cursor.fetchall()
@@ -84,14 +88,15 @@ def check_integrity(db, check_base_path=None):
                 _emit(f"@@PROGRESS:{checked_dirs}:{total_dirs}")
             # Pruefe Existenz
             if not os.path.isdir(full_path):
-                dirs_to_delete.append((dir_id,))
+                dirs_to_delete.append(dir_id)
                 logger.error(f"[FEHLT] Verzeichnis fehlt: {full_path}")
                 missing_dirs += 1
 
         if dirs_to_delete:
             logger.info(f"[Integritaet] Entferne {len(dirs_to_delete)} fehlende Verzeichnisse...")
-            cursor.executemany("DELETE FROM directories WHERE id = ?", dirs_to_delete)
-            db.conn.commit()
+            writer.submit('integrity', 'delete_directories', dirs_to_delete)
+            # Dateiprüfung erst nach dem Löschen (CASCADE) starten
+            writer.flush()
 
         # Abschluss-Fortschritt fuer Verzeichnisse
         _emit(f"@@PROGRESS:{checked_dirs}:{total_dirs}")
@@ -100,19 +105,19 @@ def check_integrity(db, check_base_path=None):
         _emit("@@PHASE:files")
         logger.info("[Integritaet] Pruefe Dateien...")
         # FIX: CASE WHEN statt COALESCE — '[none]' Extension wird korrekt als '' behandelt
-        file_query = """
+        file_query = f"""
             SELECT f.id,
                    d.full_path || '/' || f.filename || CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END as file_path,
-                   f.size, f.hash
+                   f.size, {HASH_HEX_SQL.format('f.hash')}
             FROM files f
-            JOIN directories d ON f.directory_id = d.id
+            JOIN directory_paths d ON f.directory_id = d.id
             LEFT JOIN extensions e ON f.extension_id = e.id
         """
         file_params = []
 
         if check_base_path:
-            file_query += " WHERE d.full_path LIKE ? OR d.full_path = ?"
-            file_params.extend([check_base_path + os.sep + '%', check_base_path])
+            file_query += " WHERE " + path_filter
+            file_params.extend(count_params)
 
         cursor.execute(file_query, file_params)
         chunk_size = 500
@@ -134,12 +139,13 @@ def check_integrity(db, check_base_path=None):
 
                 # Pruefe Existenz
                 if not os.path.isfile(file_path):
-                    files_to_delete.append((file_id,))
+                    files_to_delete.append(file_id)
                     logger.error(f"[FEHLT] Datei fehlt: {file_path}")
                     missing_files += 1
                 else:
                     try:
-                        size_new = os.path.getsize(file_path)
+                        st = os.stat(file_path)
+                        size_new = st.st_size
                         hash_new = calculate_hash(file_path) if HASHING else None
 
                         needs_update = False
@@ -149,14 +155,14 @@ def check_integrity(db, check_base_path=None):
                             needs_update = True
 
                         if needs_update:
-                            files_to_update.append((size_new, hash_new, file_id))
+                            files_to_update.append((size_new, hash_new, st.st_mtime_ns, st.st_ctime_ns, file_id))
                             logger.info(f"[GEAENDERT] Datei geaendert: {file_path} (Size: {size_old}->{size_new}, Hash: {(hash_old or 'N/A')[:8]}->{(hash_new or 'N/A')[:8]})")
                             updated_files += 1
 
                     except PermissionError:
                         logger.error(f"[Integritaet Fehler] Keine Berechtigung fuer Datei: {file_path}")
                     except FileNotFoundError:
-                        files_to_delete.append((file_id,))
+                        files_to_delete.append(file_id)
                         logger.error(f"[FEHLT] Datei fehlt (trotz isfile): {file_path}")
                         missing_files += 1
                     except Exception as e:
@@ -165,19 +171,20 @@ def check_integrity(db, check_base_path=None):
             # Loesche fehlende Dateien im Chunk
             if files_to_delete:
                 logger.info(f"[Integritaet] Entferne {len(files_to_delete)} fehlende Dateien...")
-                cursor.executemany("DELETE FROM files WHERE id = ?", files_to_delete)
-                files_to_delete.clear()
+                writer.submit('integrity', 'delete_files', files_to_delete)
+                files_to_delete = []
 
             # Aktualisiere geaenderte Dateien im Chunk
             if files_to_update:
                 logger.info(f"[Integritaet] Aktualisiere {len(files_to_update)} geaenderte Dateien...")
-                cursor.executemany("UPDATE files SET size = ?, hash = ? WHERE id = ?", files_to_update)
-                files_to_update.clear()
+                writer.submit('integrity', 'update_files', files_to_update)
+                files_to_update = []
 
-            # Commit nach jedem Chunk
-            db.conn.commit()
             logger.info(f"[Integritaet] {checked_files} Dateien geprueft...")
 
+        # Alle eingereihten Korrekturen committen
+        writer.flush()
+
         # Abschluss-Fortschritt fuer Dateien
         _emit(f"@@PROGRESS:{checked_files}:{total_files}")
 
@@ -200,19 +207,10 @@ def check_integrity(db, check_base_path=None):
 
         # Erweiterte Statistiken
         try:
-            cursor.execute("""
-                SELECT e.name, e.category, COUNT(f.id) as count
-                FROM extensions e
-                JOIN files f ON e.id = f.extension_id
-                GROUP BY e.id
-                HAVING count > 0
-                ORDER BY count DESC
-                LIMIT 5
-            """)
-            ext_stats = cursor.fetchall()
+            ext_stats = db.get_extension_stats(limit=5)
             if ext_stats:
                 logger.info("[Integritaet] Top Extensions in Datenbank:")
-                for ext, category, count in ext_stats:
+                for ext, category, count, _ in ext_stats:
                     logger.info(f"   {ext:12} ({category:10}): {count:>8,} Dateien")
         except Exception as e:
             logger.warning(f"[Integritaet] Konnte erweiterte Statistiken nicht erstellen: {e}")
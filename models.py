@@ -1,16 +1,73 @@
+import atexit
+import json
 import os
+import pathlib
+import queue
+import re
 import sqlite3
+import sys
 import threading
+import time
 from datetime import datetime
 import logging
+from array import array
 from collections import defaultdict
 
 # Importiere den globalen Logger aus utils
-from utils import logger, DB_PATH, CONFIG
+from utils import logger, DB_PATH, CONFIG, PROJECT_DIR
 
 _db_lock = threading.RLock()
 _db_instance = None
 _db_path = None
+_write_queues = {}  # DB-Pfad -> WriteQueue (eine pro Datenbankdatei)
+_write_queue_lock = threading.Lock()
+
+# Datenbank-Layout: "single" (alle Laufwerke in Dateien.db) oder "sharded"
+# (eine DB-Datei pro Laufwerk + Katalog, siehe shard_manager). Das Shard-Layout ist
+# experimentell: GUI, Werkzeuge, Export, Integritätsprüfung und Wartung lesen noch
+# Dateien.db. Es wirkt daher nur zusammen mit 'experimental_sharded_layout': true.
+DATABASE_LAYOUT = CONFIG.get('database_layout', 'single')
+if DATABASE_LAYOUT == 'sharded' and not CONFIG.get('experimental_sharded_layout', False):
+    logger.warning("[DB] database_layout 'sharded' ist experimentell (Leser nutzen noch Dateien.db) - "
+                   "ohne 'experimental_sharded_layout' wird 'single' verwendet.")
+    DATABASE_LAYOUT = 'single'
+
+# Verzeichnis-Speicherung: "full" (full_path pro Zeile) oder "compact" (nur Name + parent_id).
+# Wird nur beim Anlegen einer neuen DB ausgewertet, danach gilt das vorhandene Schema.
+DIRECTORY_STORAGE = CONFIG.get('directory_storage', 'full')
+
+# Hash-Speicherung: "text" (64 Hex-Zeichen) oder "blob" (32 Bytes, halbiert idx_files_hash).
+# Vorhandene Hashes werden beim Start in das konfigurierte Format migriert.
+HASH_STORAGE = CONFIG.get('hash_storage', 'text')
+
+# Lesemethoden (@with_read) auf eigenen Leseverbindungen pro Thread statt unter dem DB-Lock
+READ_CONNECTIONS = CONFIG.get('db_read_connections', True)
+
+# auto_vacuum neuer Datenbanken: "incremental" (freie Seiten gibt db_maintenance zurück) oder "none"
+AUTO_VACUUM = CONFIG.get('auto_vacuum', 'incremental')
+
+# Obergrenze für die WAL-Datei nach einem Checkpoint (Bytes), siehe CheckpointManager
+JOURNAL_SIZE_LIMIT = int(CONFIG.get('journal_size_limit_mb', 64) * 1024 * 1024)
+
+# Migrations-Registry: (Version, Beschreibung, Methode). Die DB-Version steht in
+# PRAGMA user_version. Neue Schemaänderungen nur hinten anhängen, nie umnummerieren.
+MIGRATIONS = [
+    (1, "Basisschema (Laufwerke, Verzeichnisse, Dateien, Extensions, Views)", "_migration_base_schema"),
+    (2, "Datei-Zeitstempel mtime_ns/ctime_ns", "_migration_file_timestamps"),
+    (3, "Verzeichnis-Rollups directory_stats", "_migration_directory_stats"),
+    (4, "Globale Statistik (Laufwerk/Extension/Kategorie) per Trigger", "_migration_global_stats"),
+    (5, "NOCASE-Index auf directories.full_path für Teilbaum-Bereichsabfragen", "_migration_path_index"),
+    (6, "FTS5-Suchindex über Dateinamen, Extensions und Verzeichnisnamen", "_migration_search_index"),
+    (7, "Trigram-Index für Teilstring-Suche in Dateinamen", "_migration_trigram_index"),
+    (8, "Fortschritt für blockweises Löschen von Laufwerken (purge_progress)", "_migration_purge_progress"),
+    (9, "Änderungsjournal change_journal per Trigger (inkrementelle Verbraucher)", "_migration_change_journal"),
+    (10, "Zähler directory_tree_version für verschobene Verzeichnisse (Baum-Cache)", "_migration_tree_version"),
+    (11, "Änderungsjournal nur bei angemeldeten Verbrauchern schreiben", "_migration_journal_consumers"),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# SQL-Ausdruck, der einen Hash unabhängig vom Speicherformat als Hex-Text liefert
+HASH_HEX_SQL = "CASE WHEN typeof({0}) = 'blob' THEN lower(hex({0})) ELSE {0} END"
 
 class FileCache:
     """Leichtgewichtiger In-Memory Cache für existierende Dateien"""
@@ -54,15 +111,434 @@ class FileCache:
         with self.lock:
             self.cache.clear()
 
+class DirectoryTree:
+    """Array-basierter In-Memory-Verzeichnisbaum (id -> parent_id/Name).
+
+    Wird beim ersten Zugriff komplett aus der DB geladen. Pfade werden aus den
+    Namen entlang der parent_id-Kette rekonstruiert, Pfad -> ID ist eine Kette
+    von Dict-Lookups (eine pro Pfadkomponente) statt einer Index-Suche über
+    den vollständigen Pfadtext.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.parent = array('q')   # id -> parent_id (0 = kein Parent)
+        self.drive = array('q')    # id -> drive_id (0 = Lücke/gelöscht)
+        self.name = []             # id -> directory_name
+        self.children = {}         # (parent_id bzw. -drive_id, name) -> id
+        self.drive_names = {}      # drive_id -> "C:/"
+        self.count = 0
+        self.max_id = 0
+        self.data_version = None
+        self.tree_version = None   # directory_tree_version beim Laden (Verschiebungen)
+
+    def invalidate(self):
+        """Verwirft den Baum, er wird beim nächsten Zugriff neu geladen."""
+        with self.lock:
+            self.loaded = False
+
+    def load(self, conn):
+        """Lädt alle Laufwerke und Verzeichnisse aus der DB."""
+        with self.lock:
+            self.parent = array('q')
+            self.drive = array('q')
+            self.name = []
+            self.children = {}
+            self.count = 0
+            self.max_id = 0
+            cur = conn.cursor()
+            cur.execute("SELECT id, name FROM drives")
+            self.drive_names = {drive_id: name for drive_id, name in cur.fetchall()}
+            self._load_rows(cur, 0)
+            self.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            self.tree_version = self.read_tree_version(conn)
+            self.loaded = True
+            logger.info(f"[DB] Verzeichnisbaum geladen: {self.count} Verzeichnisse")
+
+    def _load_rows(self, cur, min_id):
+        cur.execute(
+            "SELECT id, drive_id, parent_id, directory_name FROM directories WHERE id > ? ORDER BY id",
+            (min_id,)
+        )
+        while True:
+            rows = cur.fetchmany(10000)
+            if not rows:
+                break
+            for dir_id, drive_id, parent_id, name in rows:
+                self.add(dir_id, drive_id, parent_id, name)
+
+    @staticmethod
+    def read_tree_version(conn):
+        try:
+            row = conn.execute("SELECT version FROM directory_tree_version WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return None  # vor Migration v10
+        return row[0] if row else None
+
+    def refresh(self, conn):
+        """Lädt den Baum bei Bedarf (neu).
+
+        Änderungen anderer Verbindungen (Scanner-Prozess, Integritätsprüfung) werden
+        über PRAGMA data_version erkannt: neue Verzeichnisse werden inkrementell
+        nachgeladen, bei abweichender Anzahl (Löschungen) oder verschobenen
+        Verzeichnissen (directory_tree_version) wird komplett neu geladen.
+        """
+        with self.lock:
+            if not self.loaded:
+                self.load(conn)
+                return
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return
+            self.data_version = version
+            if self.read_tree_version(conn) != self.tree_version:
+                self.load(conn)
+                return
+            cur = conn.cursor()
+            cur.execute("SELECT id, name FROM drives")
+            self.drive_names.update(cur.fetchall())
+            self._load_rows(cur, self.max_id)
+            cur.execute("SELECT COUNT(*) FROM directories")
+            if cur.fetchone()[0] != self.count:
+                self.load(conn)
+
+    def _key(self, drive_id, parent_id, name):
+        return (parent_id if parent_id else -drive_id, name)
+
+    def add(self, dir_id, drive_id, parent_id, name):
+        with self.lock:
+            if dir_id >= len(self.drive):
+                grow = dir_id + 1 - len(self.drive)
+                self.parent.extend([0] * grow)
+                self.drive.extend([0] * grow)
+                self.name.extend([None] * grow)
+            if not self.drive[dir_id]:
+                self.count += 1
+            self.parent[dir_id] = parent_id or 0
+            self.drive[dir_id] = drive_id
+            self.name[dir_id] = name
+            self.children[self._key(drive_id, parent_id, name)] = dir_id
+            if dir_id > self.max_id:
+                self.max_id = dir_id
+
+    def split_path(self, drive_id, full_path):
+        """Zerlegt einen normalisierten Pfad in Komponenten relativ zum Laufwerk.
+
+        Returns:
+            list or None: [""] für das Laufwerks-Root, None wenn der Pfad nicht
+            zum Laufwerk gehört.
+        """
+        drive_name = self.drive_names.get(drive_id)
+        if drive_name is None:
+            return None
+        prefix = drive_name.rstrip('/')
+        if full_path == drive_name or full_path == prefix:
+            return [""]
+        if not full_path.startswith(prefix + '/'):
+            return None
+        return [p for p in full_path[len(prefix) + 1:].split('/') if p]
+
+    def lookup(self, drive_id, full_path):
+        """Pfad -> Verzeichnis-ID (None wenn unbekannt)."""
+        parts = self.split_path(drive_id, full_path)
+        if not parts:
+            return None
+        with self.lock:
+            parent_id = 0
+            for part in parts:
+                dir_id = self.children.get(self._key(drive_id, parent_id, part))
+                if dir_id is None and not parent_id and part:
+                    # Je nach Plattform hängen Top-Level-Verzeichnisse am Root-Eintrag ("/")
+                    root_id = self.children.get(self._key(drive_id, 0, ""))
+                    if root_id is not None:
+                        dir_id = self.children.get(self._key(drive_id, root_id, part))
+                if dir_id is None:
+                    return None
+                parent_id = dir_id
+            return parent_id
+
+    def path_of(self, dir_id):
+        """Rekonstruiert den vollständigen Pfad eines Verzeichnisses."""
+        with self.lock:
+            if dir_id >= len(self.drive) or not self.drive[dir_id]:
+                return None
+            drive_name = self.drive_names.get(self.drive[dir_id], "")
+            names = []
+            current = dir_id
+            while current:
+                names.append(self.name[current])
+                current = self.parent[current]
+            names.reverse()
+            if names == [""]:
+                return drive_name
+            return drive_name.rstrip('/') + '/' + '/'.join(n for n in names if n)
+
+    def _remove(self, dir_id):
+        self.children.pop(self._key(self.drive[dir_id], self.parent[dir_id], self.name[dir_id]), None)
+        self.drive[dir_id] = 0
+        self.parent[dir_id] = 0
+        self.name[dir_id] = None
+        self.count -= 1
+
+    def remove_subtree(self, dir_id):
+        """Entfernt ein Verzeichnis samt Unterverzeichnissen (wie ON DELETE CASCADE).
+
+        Kinder werden nach ihren Eltern angelegt und haben meist höhere IDs, ein
+        Durchlauf in ID-Reihenfolge erfasst sie. Nach move() kann ein Teilbaum unter
+        einem jüngeren Verzeichnis hängen, dann sind weitere Durchläufe nötig.
+        """
+        with self.lock:
+            if dir_id >= len(self.drive) or not self.drive[dir_id]:
+                return
+            removed = {dir_id}
+            self._remove(dir_id)
+            start = dir_id + 1
+            while True:
+                found = False
+                for child_id in range(start, len(self.drive)):
+                    if self.drive[child_id] and self.parent[child_id] in removed:
+                        removed.add(child_id)
+                        self._remove(child_id)
+                        found = True
+                if not found or start == 1:
+                    break
+                start = 1
+
+    def move(self, dir_id, parent_id, name):
+        """Hängt ein Verzeichnis um; die Unterverzeichnisse bleiben relativ gleich."""
+        with self.lock:
+            drive_id = self.drive[dir_id]
+            self.children.pop(self._key(drive_id, self.parent[dir_id], self.name[dir_id]), None)
+            self.parent[dir_id] = parent_id or 0
+            self.name[dir_id] = name
+            self.children[self._key(drive_id, parent_id, name)] = dir_id
+
+    def remove_drive(self, drive_id):
+        """Entfernt alle Verzeichnisse eines Laufwerks."""
+        with self.lock:
+            for dir_id in range(len(self.drive)):
+                if self.drive[dir_id] == drive_id:
+                    self._remove(dir_id)
+
+# --- Instrumentierung -----------------------------------------------------------
+# Laufzeit je DBManager-Methode (@with_lock), je SQL-Anweisung und die Wartezeit auf
+# den DB-Lock. Kosten: zwei perf_counter() und ein Dict-Update pro Aufruf.
+DB_METRICS_ENABLED = CONFIG.get('db_metrics', True)
+DB_METRICS_DIR = CONFIG.get('db_metrics_dir') or os.path.join(PROJECT_DIR, "metrics")
+_STATEMENT_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+class _Timing:
+    """Aufrufe, Summe, Maximum und die letzten Messwerte (für Perzentile)."""
+    __slots__ = ('count', 'total', 'max', 'samples', 'pos')
+
+    def __init__(self, size):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = array('d', bytes(8 * size))
+        self.pos = 0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples[self.pos] = seconds
+        self.pos = (self.pos + 1) % len(self.samples)
+
+    def summary(self):
+        recent = sorted(self.samples[:min(self.count, len(self.samples))])
+
+        def pct(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] * 1000 if recent else 0.0
+
+        return {'count': self.count, 'total_ms': round(self.total * 1000, 3),
+                'avg_ms': round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+                'p50_ms': round(pct(0.50), 3), 'p95_ms': round(pct(0.95), 3),
+                'p99_ms': round(pct(0.99), 3), 'max_ms': round(self.max * 1000, 3)}
+
+
+class DBMetrics:
+    """Prozessweite Messwerte: methods, statements, lock_wait (je Name ein _Timing)."""
+    KINDS = ('methods', 'statements', 'lock_wait')
+
+    def __init__(self, enabled=True, samples=None, max_statements=None):
+        self.enabled = enabled
+        self.samples = samples or CONFIG.get('db_metrics_samples', 1024)
+        self.max_statements = max_statements or CONFIG.get('db_metrics_max_statements', 500)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._data = {kind: {} for kind in self.KINDS}
+        self._statement_keys = {}  # SQL-Text -> normalisierter Schlüssel
+
+    def record(self, kind, name, seconds):
+        with self._lock:
+            timing = self._data[kind].get(name)
+            if timing is None:
+                timing = self._data[kind][name] = _Timing(self.samples)
+            timing.add(seconds)
+
+    def record_statement(self, sql, seconds):
+        key = self._statement_keys.get(sql)
+        if key is None:
+            # Whitespace zusammenfassen, IN-Listen (?, ?, ...) vereinheitlichen
+            key = _STATEMENT_LIST_RE.sub("?, ...", " ".join(sql.split()))[:300]
+            if len(self._statement_keys) >= self.max_statements and key not in self._data['statements']:
+                key = "(weitere Anweisungen)"
+            if len(self._statement_keys) < 4 * self.max_statements:
+                self._statement_keys[sql] = key
+        self.record('statements', key, seconds)
+
+    def get_metrics(self):
+        """Zusammenfassung je Art, sortiert nach Gesamtzeit."""
+        with self._lock:
+            data = {kind: {name: timing.summary() for name, timing in entries.items()}
+                    for kind, entries in self._data.items()}
+        for kind in data:
+            data[kind] = dict(sorted(data[kind].items(), key=lambda item: -item[1]['total_ms']))
+        return {'process': _process_name(), 'pid': os.getpid(), 'started': self.started,
+                'written_at': time.time(), **data}
+
+    def reset(self):
+        with self._lock:
+            self._data = {kind: {} for kind in self.KINDS}
+            self._statement_keys = {}
+            self.started = time.time()
+
+    def has_data(self):
+        with self._lock:
+            return any(self._data.values())
+
+    def dump(self, path=None, extra=None):
+        """Schreibt get_metrics() (plus extra, z.B. Watchdog-Zähler) als JSON (atomar ersetzt). Gibt den Pfad zurück."""
+        path = path or metrics_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**self.get_metrics(), **(extra or {})}, f, indent=1)
+        os.replace(tmp_path, path)
+        return path
+
+    def log_metrics(self, limit=5):
+        metrics = self.get_metrics()
+        for kind in self.KINDS:
+            for name, summary in list(metrics[kind].items())[:limit]:
+                logger.info(f"[DB Metriken] {kind}: {name[:80]} - {summary['count']}x, "
+                            f"Summe {summary['total_ms']:.0f}ms, p95 {summary['p95_ms']:.1f}ms")
+
+
+def _process_name():
+    return os.path.splitext(os.path.basename(sys.argv[0] if sys.argv and sys.argv[0] else "python"))[0] or "python"
+
+
+def metrics_path(process=None):
+    """JSON-Datei der Messwerte eines Prozesses: metrics/db_metrics_<skript>.json"""
+    return os.path.join(DB_METRICS_DIR, f"db_metrics_{process or _process_name()}.json")
+
+
+def read_metrics_files():
+    """Alle geschriebenen Messwert-Dateien (ein Dict je Prozess), neueste zuerst."""
+    results = []
+    if not os.path.isdir(DB_METRICS_DIR):
+        return results
+    for name in os.listdir(DB_METRICS_DIR):
+        if name.startswith("db_metrics_") and name.endswith(".json"):
+            try:
+                with open(os.path.join(DB_METRICS_DIR, name), encoding="utf-8") as f:
+                    results.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"[DB Metriken] {name} nicht lesbar: {e}")
+    return sorted(results, key=lambda m: -m.get('written_at', 0))
+
+
+_metrics = DBMetrics(enabled=DB_METRICS_ENABLED)
+
+
+def get_db_metrics():
+    """Prozessweite DBMetrics-Instanz."""
+    return _metrics
+
+
+def _dump_metrics_at_exit():
+    if _metrics.enabled and _metrics.has_data() and CONFIG.get('db_metrics_dump_at_exit', True):
+        try:
+            _metrics.dump()
+        except OSError as e:
+            logger.warning(f"[DB Metriken] Konnte Messwerte nicht schreiben: {e}")
+
+
+atexit.register(_dump_metrics_at_exit)
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """Cursor, der die Ausführungszeit jeder Anweisung erfasst (ohne späteres fetch)."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _metrics.record_statement(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _metrics.record_statement(sql, time.perf_counter() - start)
+
+
+class _TimedConnection(sqlite3.Connection):
+    """Verbindung, deren Cursor (auch bei conn.execute) _TimedCursor sind."""
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# Lock-Disziplin im DBManager:
+# - self.conn ist die einzige Schreibverbindung. Jeder Zugriff darauf läuft unter
+#   self.lock (@with_lock, WriteQueue._apply, CheckpointManager). Der Lock gilt pro
+#   Datenbankdatei: Standard _db_lock, Shards bringen einen eigenen mit.
+# - Reine Lesemethoden (@with_read) laufen ohne self.lock auf einer eigenen
+#   Leseverbindung pro Thread (mode=ro). Dank WAL blockieren sie weder den Writer
+#   noch einander und sehen den zuletzt committeten Stand.
+# - Ausnahme: Hat der aufrufende Thread selbst ungesicherte Änderungen auf
+#   self.conn (oder hält er den Lock schon), liest er über self.conn unter dem
+#   Lock, damit er seine eigenen Schreibzugriffe sieht.
+# - Verzeichnisbaum und FileCache haben eigene Locks und werden nur unter
+#   self.lock verändert. Andere Locks nie vor self.lock nehmen (Reihenfolge
+#   self.lock -> dir_tree.lock / file_cache.lock / stats_lock).
 class DBManager:
-    def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=120.0)
+    def __init__(self, db_path, lock=None):
+        # Standard: gemeinsamer _db_lock; Shards bringen einen eigenen Lock mit,
+        # damit Laufwerke parallel schreiben können
+        self.lock = lock or _db_lock
+        self._local = threading.local()
+        self._readers = {}  # Thread-ID -> Leseverbindung
+        self._readers_lock = threading.Lock()
+        self._read_uri = None
+        if READ_CONNECTIONS and db_path and db_path != ":memory:" and not db_path.startswith("file:"):
+            self._read_uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=120.0,
+                                    factory=_TimedConnection if _metrics.enabled else sqlite3.Connection)
+        if AUTO_VACUUM == 'incremental' and self.conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            # Nur vor der ersten Tabelle (und vor dem WAL-Header) wirksam; Freigabe übernimmt db_maintenance
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
         try:
             self.conn.execute("PRAGMA journal_mode=WAL;")
             logger.info("[DB] WAL Journal-Modus erfolgreich aktiviert.")
         except sqlite3.Error as e:
             logger.warning(f"[DB Warnung] Konnte WAL Journal-Modus nicht aktivieren: {e}. Verwende Standard-Journal.")
         self.conn.execute("PRAGMA busy_timeout = 60000;")
+        self.conn.execute(f"PRAGMA journal_size_limit = {JOURNAL_SIZE_LIMIT}")
         self.conn.execute("PRAGMA foreign_keys = ON")
         self.cursor = self.conn.cursor()
         
@@ -83,11 +559,15 @@ class DBManager:
                 logger.error("[DB] KRITISCH: Foreign Keys bleiben deaktiviert!")
         
         self.path = db_path
-        self.lock = threading.Lock()
         
         # NEU: File Cache für Performance
         self.file_cache = FileCache()
         
+        # In-Memory Verzeichnisbaum (lazy geladen, siehe _dir_tree_ready)
+        self.dir_tree = DirectoryTree()
+        self._compact_dirs = None
+        self.hash_blob = HASH_STORAGE == 'blob'
+        
         self.connect()
         self.ensure_schema()
 
@@ -96,14 +576,154 @@ class DBManager:
         pass # Hinzugefügt, um Einrückungsfehler zu beheben
 
     def with_lock(func):
-        def wrapper(self, *args, **kwargs):
-            with _db_lock:
+        name = func.__name__
+
+        def locked(self, *args, **kwargs):
+            local = self._local
+            local.depth = getattr(local, 'depth', 0) + 1
+            try:
                 return func(self, *args, **kwargs)
+            finally:
+                local.depth -= 1
+                if not local.depth:
+                    # Offene Transaktion nach eigenem Schreibzugriff: Lesen dann über self.conn
+                    try:
+                        local.dirty = self.conn.in_transaction
+                    except sqlite3.ProgrammingError:
+                        local.dirty = False
+
+        def wrapper(self, *args, **kwargs):
+            if not _metrics.enabled:
+                with self.lock:
+                    return locked(self, *args, **kwargs)
+            start = time.perf_counter()
+            with self.lock:
+                acquired = time.perf_counter()
+                try:
+                    return locked(self, *args, **kwargs)
+                finally:
+                    _metrics.record('methods', name, time.perf_counter() - acquired)
+                    _metrics.record('lock_wait', name, acquired - start)
+        wrapper.__name__ = name
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def with_read(func):
+        """Lesemethode ohne self.lock: func(self, conn, ...) mit der Leseverbindung des Threads."""
+        name = func.__name__
+
+        def wrapper(self, *args, **kwargs):
+            local = self._local
+            if self._read_uri is not None and not getattr(local, 'depth', 0) and \
+                    not (getattr(local, 'dirty', False) and self.conn.in_transaction):
+                if not _metrics.enabled:
+                    return func(self, self.read_connection(), *args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(self, self.read_connection(), *args, **kwargs)
+                finally:
+                    _metrics.record('methods', name, time.perf_counter() - start)
+            # Eigene ungesicherte Änderungen sichtbar halten: über self.conn unter dem Lock
+            start = time.perf_counter()
+            with self.lock:
+                acquired = time.perf_counter()
+                try:
+                    return func(self, self.conn, *args, **kwargs)
+                finally:
+                    if _metrics.enabled:
+                        _metrics.record('methods', name, time.perf_counter() - acquired)
+                        _metrics.record('lock_wait', name, acquired - start)
+        wrapper.__name__ = name
+        wrapper.__doc__ = func.__doc__
         return wrapper
 
+    def read_connection(self):
+        """Leseverbindung (nur lesend) des aktuellen Threads, wird beim ersten Zugriff geöffnet."""
+        conn = getattr(self._local, 'reader', None)
+        if conn is not None:
+            return conn
+        if self._read_uri is None:
+            return self.conn
+        conn = sqlite3.connect(self._read_uri, uri=True, check_same_thread=False, timeout=120.0,
+                               factory=_TimedConnection if _metrics.enabled else sqlite3.Connection)
+        conn.execute("PRAGMA busy_timeout = 60000;")
+        with self._readers_lock:
+            # Verbindungen beendeter Threads schließen
+            alive = {thread.ident for thread in threading.enumerate()}
+            for ident in [ident for ident in self._readers if ident not in alive]:
+                self._readers.pop(ident).close()
+            self._readers[threading.get_ident()] = conn
+        self._local.reader = conn
+        return conn
+
+    def _close_readers(self):
+        with self._readers_lock:
+            for conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+
     @with_lock
     def ensure_schema(self):
-        """Erstellt das optimierte Datenbankschema mit normalisierten Tabellen."""
+        """Bringt das Schema über die Migrations-Registry auf SCHEMA_VERSION.
+
+        Ist die DB aktuell, kostet der Start nur das Lesen von PRAGMA user_version.
+        Jede ausstehende Migration läuft genau einmal in einer eigenen Transaktion,
+        zusammen mit dem Hochsetzen von user_version.
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            self._run_migrations(version)
+        elif version > SCHEMA_VERSION:
+            logger.warning(f"[DB Migration] Schema-Version {version} ist neuer als diese Programmversion ({SCHEMA_VERSION}).")
+        self._migrate_hash_storage()
+        if version >= 7:
+            # Nach v7 nicht mehr Teil einer Migration: Einstellung bei jedem Start abgleichen
+            self._apply_trigram_config()
+            self.conn.commit()
+
+    def _run_migrations(self, version):
+        if version == 0:
+            self._check_legacy_schema()
+        total_start = time.time()
+        for target, description, method_name in MIGRATIONS:
+            if target <= version:
+                continue
+            start = time.time()
+            try:
+                # IMMEDIATE: paralleler Start (Scanner, Watchdog) wartet hier statt doppelt zu migrieren
+                self.conn.execute("BEGIN IMMEDIATE")
+                current = self.conn.execute("PRAGMA user_version").fetchone()[0]
+                if current >= target:
+                    self.conn.rollback()
+                    continue
+                getattr(self, method_name)()
+                self.conn.execute(f"PRAGMA user_version = {int(target)}")
+                self.conn.commit()
+            except Exception as e:
+                self.rollback()
+                logger.error(f"[DB Migration] v{target} ({description}) fehlgeschlagen, Rollback: {e}")
+                raise
+            logger.info(f"[DB Migration] v{target}: {description} ({time.time() - start:.2f}s)")
+        logger.info(f"[DB Migration] Schema auf Version {SCHEMA_VERSION} gebracht ({time.time() - total_start:.2f}s)")
+
+    def _check_legacy_schema(self):
+        """Erkennt das alte Schema mit files.file_path, das db_migration_script.py umstellt."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        if 'file_path' in columns and 'directory_id' in columns and 'filename' not in columns:
+            raise RuntimeError(
+                "Altes DB-Schema (files.file_path) erkannt. Bitte zuerst db_migration_script.py ausführen."
+            )
+
+    @property
+    def compact_dirs(self):
+        """True, wenn directories im kompakten Format (full_path NULL) angelegt ist."""
+        if self._compact_dirs is None:
+            columns = self.conn.execute("PRAGMA table_info(directories)").fetchall()
+            self._compact_dirs = any(col[1] == 'full_path' and not col[3] for col in columns)
+        return self._compact_dirs
+
+    def _migration_base_schema(self):
+        """v1: Optimiertes Datenbankschema mit normalisierten Tabellen."""
         
         # MIGRATION: Deaktiviert - Tabellen werden NICHT mehr gelöscht
         # Dies war der kritische Bug, der alle Daten löschte!
@@ -135,19 +755,43 @@ class DBManager:
         """)
         
         # 3. Tabelle für Verzeichnisse (erweitert)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS directories (
-                id INTEGER PRIMARY KEY,
-                drive_id INTEGER NOT NULL,
-                parent_id INTEGER,          -- Hierarchie-Support
-                directory_name TEXT NOT NULL, -- Nur der Name, nicht vollständiger Pfad
-                full_path TEXT NOT NULL,    -- Cache für Performance
-                depth_level INTEGER DEFAULT 0, -- Verzeichnistiefe
-                FOREIGN KEY (drive_id) REFERENCES drives (id) ON DELETE CASCADE,
-                FOREIGN KEY (parent_id) REFERENCES directories (id) ON DELETE CASCADE,
-                UNIQUE (drive_id, full_path)
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='directories'")
+        if self.cursor.fetchone() is None and DIRECTORY_STORAGE == 'compact':
+            # Kompaktes Schema: nur Name + parent_id, Pfade kommen aus dem DirectoryTree
+            # bzw. der View directory_paths. full_path bleibt NULL.
+            self.cursor.execute("""
+                CREATE TABLE directories (
+                    id INTEGER PRIMARY KEY,
+                    drive_id INTEGER NOT NULL,
+                    parent_id INTEGER,
+                    directory_name TEXT NOT NULL,
+                    full_path TEXT,             -- Im kompakten Modus immer NULL
+                    depth_level INTEGER DEFAULT 0,
+                    FOREIGN KEY (drive_id) REFERENCES drives (id) ON DELETE CASCADE,
+                    FOREIGN KEY (parent_id) REFERENCES directories (id) ON DELETE CASCADE
+                )
+            """)
+            self.cursor.execute(
+                "CREATE UNIQUE INDEX idx_directories_compact_key ON directories (drive_id, IFNULL(parent_id, 0), directory_name)"
             )
-        """)
+            logger.info("[DB] Kompakte Verzeichnis-Speicherung (Name + parent_id) angelegt.")
+        else:
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS directories (
+                    id INTEGER PRIMARY KEY,
+                    drive_id INTEGER NOT NULL,
+                    parent_id INTEGER,          -- Hierarchie-Support
+                    directory_name TEXT NOT NULL, -- Nur der Name, nicht vollständiger Pfad
+                    full_path TEXT NOT NULL,    -- Cache für Performance
+                    depth_level INTEGER DEFAULT 0, -- Verzeichnistiefe
+                    FOREIGN KEY (drive_id) REFERENCES drives (id) ON DELETE CASCADE,
+                    FOREIGN KEY (parent_id) REFERENCES directories (id) ON DELETE CASCADE,
+                    UNIQUE (drive_id, full_path)
+                )
+            """)
+        
+        # Kompakter Modus wird aus dem tatsächlichen Schema gelesen
+        self._compact_dirs = None
         
         # 4. Tabelle für Dateien (komplett überarbeitet)
         self.cursor.execute("""
@@ -161,18 +805,16 @@ class DBManager:
                 created_date TEXT,            -- Erstellungsdatum
                 modified_date TEXT,           -- Änderungsdatum
                 attributes INTEGER DEFAULT 0, -- Dateiattribute
+                mtime_ns INTEGER,             -- Echte Änderungszeit (Epoch-Nanosekunden)
+                ctime_ns INTEGER,             -- Echte ctime (Windows: Erstellung, Epoch-Nanosekunden)
                 FOREIGN KEY (directory_id) REFERENCES directories (id) ON DELETE CASCADE,
                 FOREIGN KEY (extension_id) REFERENCES extensions (id)
             )
         """)
         
-        # 5. Standard Extensions einfügen
-        self._populate_standard_extensions()
-        
-        # 6. Performance-Indizes (nach Tabellenerstellung)
+        # 5. Performance-Indizes (nach Tabellenerstellung)
         try:
             indices = [
-                "CREATE INDEX IF NOT EXISTS idx_directories_drive_path ON directories (drive_id, full_path)",
                 "CREATE INDEX IF NOT EXISTS idx_directories_parent ON directories (parent_id)",
                 "CREATE INDEX IF NOT EXISTS idx_files_filename ON files (filename)",
                 "CREATE INDEX IF NOT EXISTS idx_files_extension ON files (extension_id)",
@@ -187,6 +829,9 @@ class DBManager:
             
             for idx_sql in indices:
                 self.cursor.execute(idx_sql)
+            
+            # Doppelt zum UNIQUE (drive_id, full_path) Autoindex - nur Platzverschwendung
+            self.cursor.execute("DROP INDEX IF EXISTS idx_directories_drive_path")
         except sqlite3.Error as e:
             logger.warning(f"[DB] Warnung beim Erstellen von Indizes: {e}")
         
@@ -243,25 +888,489 @@ class DBManager:
             )
         """)
         
-        # 10. Kompatibilitäts-View für legacy code
-        self.cursor.execute("""
-            CREATE VIEW IF NOT EXISTS files_legacy AS
+        # 10. Verzeichnispfade für beide Speicherformen (kompakt: rekursiv rekonstruiert)
+        if self.compact_dirs:
+            self.cursor.execute("""
+                CREATE VIEW IF NOT EXISTS directory_paths AS
+                WITH RECURSIVE tree(id, drive_id, full_path) AS (
+                    SELECT d.id, d.drive_id,
+                           CASE WHEN d.directory_name = '' THEN dr.name
+                                ELSE rtrim(dr.name, '/') || '/' || d.directory_name END
+                    FROM directories d
+                    JOIN drives dr ON dr.id = d.drive_id
+                    WHERE d.parent_id IS NULL
+                    UNION ALL
+                    SELECT c.id, c.drive_id, rtrim(tree.full_path, '/') || '/' || c.directory_name
+                    FROM directories c
+                    JOIN tree ON c.parent_id = tree.id
+                )
+                SELECT id, drive_id, full_path FROM tree
+            """)
+        else:
+            self.cursor.execute("""
+                CREATE VIEW IF NOT EXISTS directory_paths AS
+                SELECT id, drive_id, full_path FROM directories
+            """)
+        
+        # 11. Kompatibilitäts-View für legacy code (Hash immer als Hex-Text)
+        self.cursor.execute("DROP VIEW IF EXISTS files_legacy")
+        self.cursor.execute(f"""
+            CREATE VIEW files_legacy AS
             SELECT 
                 f.id,
                 f.directory_id,
                 d.full_path || '/' || f.filename || COALESCE(e.name, '') as file_path,
                 f.size,
-                f.hash
+                {HASH_HEX_SQL.format('f.hash')} as hash
             FROM files f
-            JOIN directories d ON f.directory_id = d.id
+            JOIN directory_paths d ON f.directory_id = d.id
             LEFT JOIN extensions e ON f.extension_id = e.id
         """)
         
-        # Standard Extensions einfügen
+        # 12. Standard Extensions einfügen
         self._populate_standard_extensions()
-        
-        self.conn.commit()
-        logger.info("[DB] Optimiertes Datenbankschema erstellt/aktualisiert.")
+
+    def _migration_file_timestamps(self):
+        """v2: Echte Datei-Zeitstempel (mtime_ns/ctime_ns) mit Index für Bereichsabfragen."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        for column in ('mtime_ns', 'ctime_ns'):
+            if column not in columns:
+                self.cursor.execute(f"ALTER TABLE files ADD COLUMN {column} INTEGER")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_mtime ON files (mtime_ns)")
+
+    def _migration_directory_stats(self):
+        """v3: Materialisierte Anzahl/Größe je Verzeichnis, direkt und inkl. Unterverzeichnisse."""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS directory_stats (
+                directory_id INTEGER PRIMARY KEY,
+                drive_id INTEGER NOT NULL,
+                file_count INTEGER NOT NULL DEFAULT 0,          -- Dateien direkt im Verzeichnis
+                total_size INTEGER NOT NULL DEFAULT 0,
+                recursive_file_count INTEGER NOT NULL DEFAULT 0, -- inkl. aller Unterverzeichnisse
+                recursive_size INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (directory_id) REFERENCES directories (id) ON DELETE CASCADE
+            )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_directory_stats_drive ON directory_stats (drive_id)")
+        self.rebuild_directory_stats()
+
+    def _migration_global_stats(self):
+        """v4: Anzahl/Bytes je Laufwerk und Extension, exakt gehalten durch Trigger.
+
+        Kategorien ergeben sich per JOIN auf extensions, Laufwerkssummen per SUM über
+        die wenigen Extension-Zeilen - Dashboards brauchen keinen COUNT(*) über files.
+        """
+        self._execute_statements("""
+            CREATE TABLE IF NOT EXISTS file_stats (
+                drive_id INTEGER NOT NULL,
+                extension_id INTEGER NOT NULL,       -- 0 = ohne extension_id
+                file_count INTEGER NOT NULL DEFAULT 0,
+                total_size INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (drive_id, extension_id)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS drive_stats (
+                drive_id INTEGER PRIMARY KEY,
+                directory_count INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE TRIGGER IF NOT EXISTS trg_file_stats_insert AFTER INSERT ON files
+            BEGIN
+                INSERT INTO file_stats (drive_id, extension_id, file_count, total_size)
+                VALUES ((SELECT drive_id FROM directories WHERE id = NEW.directory_id),
+                        IFNULL(NEW.extension_id, 0), 1, IFNULL(NEW.size, 0))
+                ON CONFLICT (drive_id, extension_id) DO UPDATE
+                SET file_count = file_count + 1, total_size = total_size + excluded.total_size;
+            END;
+
+            -- Beim CASCADE-Löschen ist das Verzeichnis schon weg: dann zählt trg_file_stats_directory_delete
+            CREATE TRIGGER IF NOT EXISTS trg_file_stats_delete AFTER DELETE ON files
+            WHEN EXISTS (SELECT 1 FROM directories WHERE id = OLD.directory_id)
+            BEGIN
+                UPDATE file_stats SET file_count = file_count - 1, total_size = total_size - IFNULL(OLD.size, 0)
+                WHERE drive_id = (SELECT drive_id FROM directories WHERE id = OLD.directory_id)
+                AND extension_id = IFNULL(OLD.extension_id, 0);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_file_stats_update AFTER UPDATE OF directory_id, extension_id, size ON files
+            BEGIN
+                UPDATE file_stats SET file_count = file_count - 1, total_size = total_size - IFNULL(OLD.size, 0)
+                WHERE drive_id = (SELECT drive_id FROM directories WHERE id = OLD.directory_id)
+                AND extension_id = IFNULL(OLD.extension_id, 0);
+                INSERT INTO file_stats (drive_id, extension_id, file_count, total_size)
+                VALUES ((SELECT drive_id FROM directories WHERE id = NEW.directory_id),
+                        IFNULL(NEW.extension_id, 0), 1, IFNULL(NEW.size, 0))
+                ON CONFLICT (drive_id, extension_id) DO UPDATE
+                SET file_count = file_count + 1, total_size = total_size + excluded.total_size;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_drive_stats_directory_insert AFTER INSERT ON directories
+            BEGIN
+                INSERT INTO drive_stats (drive_id, directory_count) VALUES (NEW.drive_id, 1)
+                ON CONFLICT (drive_id) DO UPDATE SET directory_count = directory_count + 1;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_file_stats_directory_delete BEFORE DELETE ON directories
+            BEGIN
+                UPDATE drive_stats SET directory_count = directory_count - 1 WHERE drive_id = OLD.drive_id;
+                UPDATE file_stats
+                SET file_count = file_count - (SELECT COUNT(*) FROM files
+                                               WHERE directory_id = OLD.id AND IFNULL(extension_id, 0) = file_stats.extension_id),
+                    total_size = total_size - (SELECT IFNULL(SUM(size), 0) FROM files
+                                               WHERE directory_id = OLD.id AND IFNULL(extension_id, 0) = file_stats.extension_id)
+                WHERE drive_id = OLD.drive_id
+                AND extension_id IN (SELECT IFNULL(extension_id, 0) FROM files WHERE directory_id = OLD.id);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_stats_drive_delete AFTER DELETE ON drives
+            BEGIN
+                DELETE FROM file_stats WHERE drive_id = OLD.id;
+                DELETE FROM drive_stats WHERE drive_id = OLD.id;
+            END;
+        """)
+        self.rebuild_global_stats()
+
+    def _migration_path_index(self):
+        """v5: Index für Teilbaum-Abfragen (db_paths.subtree_condition) statt LIKE 'prefix%'.
+
+        Im kompakten Format ist full_path NULL; dort läuft der Teilbaum über idx_directories_parent.
+        """
+        if not self.compact_dirs:
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_directories_full_path_nocase "
+                "ON directories (full_path COLLATE NOCASE)"
+            )
+
+    def _migration_search_index(self):
+        """v6: FTS5-Index für die Suchwerkzeuge (db_search) statt LIKE '%term%'.
+
+        files_fts indexiert Dateiname + Extension, directories_fts die Verzeichnisnamen
+        (Pfadkomponenten). Beide sind External-Content-Tabellen ohne eigene Textkopie
+        und werden per Trigger bei jedem Schreibweg (Scanner, Watchdog, Integrität) gepflegt.
+        """
+        try:
+            self.cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+            self.cursor.execute("DROP TABLE temp.fts5_probe")
+        except sqlite3.OperationalError:
+            logger.warning("[DB Migration] SQLite ohne FTS5 - Suche bleibt bei LIKE.")
+            return
+        self._execute_statements("""
+            CREATE VIEW IF NOT EXISTS files_fts_source AS
+            SELECT f.id, f.filename,
+                   CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END AS extension
+            FROM files f LEFT JOIN extensions e ON e.id = f.extension_id;
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                filename, extension,
+                content='files_fts_source', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS directories_fts USING fts5(
+                directory_name,
+                content='directories', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS trg_files_fts_insert AFTER INSERT ON files
+            BEGIN
+                INSERT INTO files_fts (rowid, filename, extension)
+                VALUES (NEW.id, NEW.filename,
+                        IFNULL((SELECT name FROM extensions WHERE id = NEW.extension_id AND name != '[none]'), ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_files_fts_delete AFTER DELETE ON files
+            BEGIN
+                INSERT INTO files_fts (files_fts, rowid, filename, extension)
+                VALUES ('delete', OLD.id, OLD.filename,
+                        IFNULL((SELECT name FROM extensions WHERE id = OLD.extension_id AND name != '[none]'), ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_files_fts_update AFTER UPDATE OF filename, extension_id ON files
+            BEGIN
+                INSERT INTO files_fts (files_fts, rowid, filename, extension)
+                VALUES ('delete', OLD.id, OLD.filename,
+                        IFNULL((SELECT name FROM extensions WHERE id = OLD.extension_id AND name != '[none]'), ''));
+                INSERT INTO files_fts (rowid, filename, extension)
+                VALUES (NEW.id, NEW.filename,
+                        IFNULL((SELECT name FROM extensions WHERE id = NEW.extension_id AND name != '[none]'), ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_directories_fts_insert AFTER INSERT ON directories
+            BEGIN
+                INSERT INTO directories_fts (rowid, directory_name) VALUES (NEW.id, NEW.directory_name);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_directories_fts_delete AFTER DELETE ON directories
+            BEGIN
+                INSERT INTO directories_fts (directories_fts, rowid, directory_name)
+                VALUES ('delete', OLD.id, OLD.directory_name);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_directories_fts_update AFTER UPDATE OF directory_name ON directories
+            BEGIN
+                INSERT INTO directories_fts (directories_fts, rowid, directory_name)
+                VALUES ('delete', OLD.id, OLD.directory_name);
+                INSERT INTO directories_fts (rowid, directory_name) VALUES (NEW.id, NEW.directory_name);
+            END;
+        """)
+        self.rebuild_search_index()
+
+    def _migration_trigram_index(self):
+        """v7: Trigram-Index über den vollständigen Dateinamen (Name + Extension).
+
+        Beantwortet LIKE '%fragment%' ab 3 Zeichen über den Index statt per Full Scan
+        (auch mitten im Wort, z.B. '_v2fin'). Kostet etwa das Dreifache der Namenslänge
+        an Speicher, daher abschaltbar über CONFIG 'trigram_index'. Die Einstellung
+        gleicht _apply_trigram_config bei jedem Start ab (Index nachträglich anlegen
+        oder entfernen), die Migration ruft nur diesen Abgleich auf.
+        """
+        self._apply_trigram_config()
+
+    def _apply_trigram_config(self):
+        """Legt files_trigram laut CONFIG 'trigram_index' an bzw. entfernt ihn (Start, Migration v7)."""
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_trigram'").fetchone() is not None
+        if not CONFIG.get('trigram_index', True):
+            if exists:
+                self._execute_statements("""
+                    DROP TRIGGER IF EXISTS trg_files_trigram_insert;
+                    DROP TRIGGER IF EXISTS trg_files_trigram_delete;
+                    DROP TRIGGER IF EXISTS trg_files_trigram_update;
+                    DROP TABLE IF EXISTS files_trigram;
+                    DROP VIEW IF EXISTS files_trigram_source;
+                """)
+                logger.info("[DB] Trigram-Index per Konfiguration entfernt.")
+            return
+        if exists:
+            return
+        try:
+            self.cursor.execute("CREATE VIRTUAL TABLE temp.trigram_probe USING fts5(x, tokenize='trigram')")
+            self.cursor.execute("DROP TABLE temp.trigram_probe")
+        except sqlite3.OperationalError:
+            logger.warning("[DB Migration] SQLite ohne FTS5-Trigram (ab 3.34) - Teilstring-Suche bleibt bei LIKE.")
+            return
+        self._execute_statements("""
+            CREATE VIEW IF NOT EXISTS files_trigram_source AS
+            SELECT f.id,
+                   f.filename || CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END AS name
+            FROM files f LEFT JOIN extensions e ON e.id = f.extension_id;
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS files_trigram USING fts5(
+                name,
+                content='files_trigram_source', content_rowid='id',
+                tokenize='trigram'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS trg_files_trigram_insert AFTER INSERT ON files
+            BEGIN
+                INSERT INTO files_trigram (rowid, name)
+                VALUES (NEW.id, NEW.filename ||
+                        IFNULL((SELECT name FROM extensions WHERE id = NEW.extension_id AND name != '[none]'), ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_files_trigram_delete AFTER DELETE ON files
+            BEGIN
+                INSERT INTO files_trigram (files_trigram, rowid, name)
+                VALUES ('delete', OLD.id, OLD.filename ||
+                        IFNULL((SELECT name FROM extensions WHERE id = OLD.extension_id AND name != '[none]'), ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_files_trigram_update AFTER UPDATE OF filename, extension_id ON files
+            BEGIN
+                INSERT INTO files_trigram (files_trigram, rowid, name)
+                VALUES ('delete', OLD.id, OLD.filename ||
+                        IFNULL((SELECT name FROM extensions WHERE id = OLD.extension_id AND name != '[none]'), ''));
+                INSERT INTO files_trigram (rowid, name)
+                VALUES (NEW.id, NEW.filename ||
+                        IFNULL((SELECT name FROM extensions WHERE id = NEW.extension_id AND name != '[none]'), ''));
+            END;
+        """)
+        self.cursor.execute("INSERT INTO files_trigram (files_trigram) VALUES ('rebuild')")
+        logger.info("[DB] Trigram-Index angelegt.")
+
+    def _migration_purge_progress(self):
+        """v8: Fortschritt von drive_purge (blockweises Löschen, nach Abbruch fortsetzbar)."""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS purge_progress (
+                drive_id INTEGER PRIMARY KEY,
+                phase TEXT NOT NULL,                -- 'files' oder 'directories'
+                last_directory_id INTEGER NOT NULL, -- Cursor über directories.id
+                files_deleted INTEGER NOT NULL DEFAULT 0,
+                directories_deleted INTEGER NOT NULL DEFAULT 0,
+                started_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def _migration_change_journal(self):
+        """v9: Append-only Änderungsjournal über files/directories (siehe change_journal).
+
+        Trigger schreiben jede Änderung in derselben Transaktion wie die Änderung selbst,
+        egal ob Scanner, Watchdog oder Integritätsprüfung schreibt (seit v11 nur,
+        solange ein Verbraucher angemeldet ist). seq ist monoton
+        (AUTOINCREMENT, nie wiederverwendet). Löschungen eines Laufwerks im Gange
+        (purge_progress) werden nicht zeilenweise protokolliert, drive_purge schreibt
+        am Ende einen einzelnen Eintrag ('drive', 'purge').
+        """
+        self._execute_statements("""
+            CREATE TABLE IF NOT EXISTS change_journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                entity TEXT NOT NULL,       -- 'file', 'directory' oder 'drive'
+                op TEXT NOT NULL,           -- 'insert', 'update', 'delete' oder 'purge'
+                row_id INTEGER NOT NULL,    -- files.id / directories.id / drives.id
+                parent_id INTEGER,          -- Datei: directory_id, Verzeichnis: parent_id
+                drive_id INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_change_journal_row ON change_journal (entity, row_id, seq);
+            CREATE INDEX IF NOT EXISTS idx_change_journal_ts ON change_journal (ts);
+
+            CREATE TABLE IF NOT EXISTS change_consumers (
+                name TEXT PRIMARY KEY,
+                last_seq INTEGER NOT NULL DEFAULT 0,
+                needs_resync INTEGER NOT NULL DEFAULT 0, -- ungelesene Einträge durch Aufbewahrung gelöscht
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._create_journal_triggers()
+
+    def _create_journal_triggers(self):
+        """Trigger des Änderungsjournals (v9, seit v11 nur bei angemeldeten Verbrauchern).
+
+        Ohne Eintrag in change_consumers liest niemand das Journal; die Trigger
+        schreiben dann nichts, statt jede Zeile des Scans zu protokollieren.
+        """
+        ts = "(julianday('now') - 2440587.5) * 86400.0"
+        drive_of = "(SELECT drive_id FROM directories WHERE id = {}.directory_id)"
+        consumers = "EXISTS (SELECT 1 FROM change_consumers)"
+        self._execute_statements(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_journal_file_insert AFTER INSERT ON files
+            WHEN {consumers}
+            BEGIN
+                INSERT INTO change_journal (ts, entity, op, row_id, parent_id, drive_id)
+                VALUES ({ts}, 'file', 'insert', NEW.id, NEW.directory_id, {drive_of.format('NEW')});
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_journal_file_update AFTER UPDATE ON files
+            WHEN {consumers} AND (OLD.directory_id IS NOT NEW.directory_id OR OLD.filename IS NOT NEW.filename
+              OR OLD.extension_id IS NOT NEW.extension_id OR OLD.size IS NOT NEW.size
+              OR OLD.hash IS NOT NEW.hash OR OLD.mtime_ns IS NOT NEW.mtime_ns)
+            BEGIN
+                INSERT INTO change_journal (ts, entity, op, row_id, parent_id, drive_id)
+                VALUES ({ts}, 'file', 'update', NEW.id, NEW.directory_id, {drive_of.format('NEW')});
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_journal_file_delete AFTER DELETE ON files
+            WHEN {consumers} AND NOT EXISTS (SELECT 1 FROM purge_progress WHERE drive_id = {drive_of.format('OLD')})
+            BEGIN
+                INSERT INTO change_journal (ts, entity, op, row_id, parent_id, drive_id)
+                VALUES ({ts}, 'file', 'delete', OLD.id, OLD.directory_id, {drive_of.format('OLD')});
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_journal_directory_insert AFTER INSERT ON directories
+            WHEN {consumers}
+            BEGIN
+                INSERT INTO change_journal (ts, entity, op, row_id, parent_id, drive_id)
+                VALUES ({ts}, 'directory', 'insert', NEW.id, NEW.parent_id, NEW.drive_id);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_journal_directory_update AFTER UPDATE ON directories
+            WHEN {consumers} AND (OLD.parent_id IS NOT NEW.parent_id OR OLD.directory_name IS NOT NEW.directory_name
+              OR OLD.full_path IS NOT NEW.full_path)
+            BEGIN
+                INSERT INTO change_journal (ts, entity, op, row_id, parent_id, drive_id)
+                VALUES ({ts}, 'directory', 'update', NEW.id, NEW.parent_id, NEW.drive_id);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_journal_directory_delete AFTER DELETE ON directories
+            WHEN {consumers} AND NOT EXISTS (SELECT 1 FROM purge_progress WHERE drive_id = OLD.drive_id)
+            BEGIN
+                INSERT INTO change_journal (ts, entity, op, row_id, parent_id, drive_id)
+                VALUES ({ts}, 'directory', 'delete', OLD.id, OLD.parent_id, OLD.drive_id);
+            END;
+        """)
+
+    def _migration_tree_version(self):
+        """v10: Zähler, den jedes Umhängen/Umbenennen eines Verzeichnisses erhöht.
+
+        Der In-Memory-Baum anderer Verbindungen lädt bei geänderter data_version nur
+        neue IDs nach; verschobene Verzeichnisse erkennt er an diesem Zähler.
+        """
+        self._execute_statements("""
+            CREATE TABLE IF NOT EXISTS directory_tree_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO directory_tree_version (id, version) VALUES (1, 0);
+
+            CREATE TRIGGER IF NOT EXISTS trg_directories_tree_version AFTER UPDATE OF parent_id, directory_name ON directories
+            WHEN OLD.parent_id IS NOT NEW.parent_id OR OLD.directory_name IS NOT NEW.directory_name
+            BEGIN
+                UPDATE directory_tree_version SET version = version + 1 WHERE id = 1;
+            END;
+        """)
+
+    def _migration_journal_consumers(self):
+        """v11: Journal-Trigger mit Bedingung auf angemeldete Verbraucher neu anlegen."""
+        for name in ('trg_journal_file_insert', 'trg_journal_file_update', 'trg_journal_file_delete',
+                     'trg_journal_directory_insert', 'trg_journal_directory_update', 'trg_journal_directory_delete'):
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        self._create_journal_triggers()
+
+    def _execute_statements(self, script):
+        """Führt ein SQL-Skript Anweisung für Anweisung aus.
+
+        Anders als executescript() ohne implizites COMMIT, bleibt also in der
+        Transaktion der laufenden Migration.
+        """
+        statement = ""
+        for line in script.splitlines(keepends=True):
+            statement += line
+            if sqlite3.complete_statement(statement):
+                self.cursor.execute(statement)
+                statement = ""
+        if statement.strip():
+            self.cursor.execute(statement)
+
+    def _migrate_hash_storage(self, batch_size=50000):
+        """Bringt vorhandene Hashes in das konfigurierte Speicherformat.
+
+        Die Prüfung nutzt idx_files_hash: SQLite sortiert TEXT vor BLOB, daher
+        findet eine Bereichssuche Zeilen im "falschen" Format ohne Full-Scan.
+        """
+        if self.hash_blob:
+            # SQLite 3.40 hat kein unhex() - Umwandlung in Python, in Batches
+            converted = 0
+            while True:
+                self.cursor.execute(
+                    "SELECT id, hash FROM files WHERE hash > '' AND hash < x'' LIMIT ?", (batch_size,)
+                )
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for file_id, hash_val in rows:
+                    try:
+                        updates.append((bytes.fromhex(hash_val), file_id))
+                    except ValueError:
+                        # Kein gültiger Hex-Hash - verwerfen statt endlos erneut zu finden
+                        updates.append((None, file_id))
+                self.cursor.executemany("UPDATE files SET hash = ? WHERE id = ?", updates)
+                self.conn.commit()
+                converted += len(updates)
+                logger.info(f"[DB] Hash-Migration (BLOB): {converted} Hashes umgewandelt...")
+            if converted:
+                logger.info(f"[DB] Hash-Migration abgeschlossen: {converted} Hashes als BLOB gespeichert.")
+        elif self.conn.execute("SELECT 1 FROM files WHERE hash >= x'' LIMIT 1").fetchone():
+            self.cursor.execute("UPDATE files SET hash = lower(hex(hash)) WHERE hash >= x''")
+            logger.info(f"[DB] Hash-Migration abgeschlossen: {self.cursor.rowcount} Hashes als Text gespeichert.")
+            self.conn.commit()
+
+    def encode_hash(self, hash_val):
+        """Wandelt einen Hex-Hash in das Speicherformat der DB um."""
+        if hash_val and self.hash_blob:
+            return bytes.fromhex(hash_val)
+        return hash_val
 
     @with_lock
     def get_or_create_drive(self, name):
@@ -272,7 +1381,9 @@ class DBManager:
         self.cursor.execute("INSERT INTO drives (name) VALUES (?)", (name,))
         logger.info(f"[DB Commit] Committing new drive: {name}")
         self.conn.commit()
-        return self.cursor.lastrowid
+        drive_id = self.cursor.lastrowid
+        self.dir_tree.drive_names[drive_id] = name
+        return drive_id
     
     def _populate_standard_extensions(self):
         """Fügt Standard-Extensions mit Kategorien ein."""
@@ -368,11 +1479,12 @@ class DBManager:
         category = self._determine_extension_category(ext_name)
         is_binary = 1 if category in ['executable', 'image', 'video', 'audio', 'archive'] else 0
         
+        # Kein eigenes Commit: wird mit der umgebenden Transaktion festgeschrieben
+        # (sonst würde ein Commit mitten in einer Write-Queue-Gruppe deren Savepoints beenden)
         self.cursor.execute(
             "INSERT INTO extensions (name, category, is_binary) VALUES (?, ?, ?)",
             (ext_name, category, is_binary)
         )
-        self.conn.commit()
         return self.cursor.lastrowid
     
     def _determine_extension_category(self, ext):
@@ -396,17 +1508,523 @@ class DBManager:
         else:
             return 'other'
 
+    def _dir_tree_ready(self):
+        """Stellt sicher, dass der Verzeichnisbaum geladen und aktuell ist."""
+        self.dir_tree.refresh(self.conn)
+        return self.dir_tree
+
+    def _lookup_directory(self, drive_id, full_path):
+        tree = self._dir_tree_ready()
+        dir_id = tree.lookup(drive_id, full_path)
+        if dir_id is None and not self.compact_dirs and tree.split_path(drive_id, full_path) is None:
+            # Pfad liegt nicht unter dem Laufwerksnamen (z.B. "UNKNOWN/") - nur über den Pfadtext auffindbar
+            row = self.conn.execute(
+                "SELECT id FROM directories WHERE drive_id = ? AND full_path = ?", (drive_id, full_path)
+            ).fetchone()
+            dir_id = row[0] if row else None
+        return dir_id
+
+    @with_lock
+    def find_directory_id(self, drive_id, full_path):
+        """Sucht die ID eines Verzeichnisses über den In-Memory-Baum (None wenn unbekannt)."""
+        full_path = os.path.normpath(full_path).replace('\\', '/')
+        return self._lookup_directory(drive_id, full_path)
+
+    @with_lock
+    def get_directory_path(self, directory_id):
+        """Liefert den vollständigen Pfad eines Verzeichnisses (auch im kompakten Modus)."""
+        return self._dir_tree_ready().path_of(directory_id)
+
+    @with_lock
+    def rebuild_directory_stats(self, drive_id=None):
+        """Berechnet directory_stats komplett neu (nach Scans, Migration).
+
+        Direkte Werte per GROUP BY, die rekursiven Summen in einem Durchlauf
+        von den Blättern zur Wurzel entlang parent_id.
+        """
+        start = time.time()
+        where = "WHERE d.drive_id = ?" if drive_id is not None else ""
+        params = (drive_id,) if drive_id is not None else ()
+        self.cursor.execute(f"""
+            SELECT d.id, d.drive_id, d.parent_id, COUNT(f.id), IFNULL(SUM(f.size), 0)
+            FROM directories d
+            LEFT JOIN files f ON f.directory_id = d.id
+            {where}
+            GROUP BY d.id
+        """, params)
+        stats = {}
+        children = {}
+        for dir_id, drv_id, parent_id, count, size in self.cursor.fetchall():
+            stats[dir_id] = [drv_id, parent_id, count, size, count, size]
+            children.setdefault(parent_id, []).append(dir_id)
+
+        # Breitensuche ab den Wurzeln, dann rückwärts: Kinder vor Eltern
+        order = [dir_id for dir_id, entry in stats.items() if entry[1] not in stats]
+        for dir_id in order:
+            order.extend(children.get(dir_id, ()))
+        for dir_id in reversed(order):
+            entry = stats[dir_id]
+            parent = stats.get(entry[1])
+            if parent is not None:
+                parent[4] += entry[4]
+                parent[5] += entry[5]
+
+        if drive_id is not None:
+            self.cursor.execute("DELETE FROM directory_stats WHERE drive_id = ?", (drive_id,))
+        else:
+            self.cursor.execute("DELETE FROM directory_stats")
+        self.cursor.executemany(
+            "INSERT INTO directory_stats (directory_id, drive_id, file_count, total_size, recursive_file_count, recursive_size) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(dir_id, e[0], e[2], e[3], e[4], e[5]) for dir_id, e in stats.items()]
+        )
+        logger.info(f"[DB] Verzeichnis-Statistik neu berechnet: {len(stats)} Verzeichnisse ({time.time() - start:.2f}s)")
+        return len(stats)
+
+    def _adjust_directory_stats(self, deltas, direct=True):
+        """Verbucht Änderungen inkrementell: deltas = {directory_id: (Δanzahl, Δbytes)}.
+
+        Direkte Werte nur beim Verzeichnis selbst (außer direct=False), rekursive
+        Werte beim Verzeichnis und allen Vorfahren (parent_id-Kette aus dem
+        Verzeichnisbaum).
+        """
+        tree = self._dir_tree_ready()
+        own = {}
+        recursive = {}
+        for dir_id, (d_count, d_size) in deltas.items():
+            if not d_count and not d_size:
+                continue
+            if direct:
+                own[dir_id] = (d_count, d_size)
+            current = dir_id
+            while current:
+                count, size = recursive.get(current, (0, 0))
+                recursive[current] = (count + d_count, size + d_size)
+                current = tree.parent[current] if current < len(tree.parent) else 0
+        if not recursive:
+            return
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO directory_stats (directory_id, drive_id) VALUES (?, ?)",
+            [(dir_id, tree.drive[dir_id]) for dir_id in recursive if dir_id < len(tree.drive) and tree.drive[dir_id]]
+        )
+        self.cursor.executemany(
+            "UPDATE directory_stats SET recursive_file_count = recursive_file_count + ?, recursive_size = recursive_size + ? "
+            "WHERE directory_id = ?",
+            [(count, size, dir_id) for dir_id, (count, size) in recursive.items()]
+        )
+        self.cursor.executemany(
+            "UPDATE directory_stats SET file_count = file_count + ?, total_size = total_size + ? WHERE directory_id = ?",
+            [(count, size, dir_id) for dir_id, (count, size) in own.items()]
+        )
+
+    def _remove_directory_from_stats(self, dir_id):
+        """Zieht die rekursiven Werte eines Verzeichnisses vor dem Löschen bei den Vorfahren ab."""
+        self.cursor.execute(
+            "SELECT recursive_file_count, recursive_size FROM directory_stats WHERE directory_id = ?", (dir_id,)
+        )
+        row = self.cursor.fetchone()
+        tree = self._dir_tree_ready()
+        parent_id = tree.parent[dir_id] if dir_id < len(tree.parent) else 0
+        if row and parent_id:
+            self._adjust_directory_stats({parent_id: (-row[0], -row[1])}, direct=False)
+
+    @with_lock
+    def rebuild_global_stats(self):
+        """Berechnet file_stats/drive_stats komplett neu (Reparatur, Migration)."""
+        start = time.time()
+        self.cursor.execute("DELETE FROM file_stats")
+        self.cursor.execute("""
+            INSERT INTO file_stats (drive_id, extension_id, file_count, total_size)
+            SELECT d.drive_id, IFNULL(f.extension_id, 0), COUNT(*), IFNULL(SUM(f.size), 0)
+            FROM files f
+            JOIN directories d ON d.id = f.directory_id
+            GROUP BY d.drive_id, IFNULL(f.extension_id, 0)
+        """)
+        self.cursor.execute("DELETE FROM drive_stats")
+        self.cursor.execute("""
+            INSERT INTO drive_stats (drive_id, directory_count)
+            SELECT drive_id, COUNT(*) FROM directories GROUP BY drive_id
+        """)
+        logger.info(f"[DB] Globale Statistik neu berechnet ({time.time() - start:.2f}s)")
+
+    def rebuild_search_index(self):
+        """Baut files_fts/directories_fts (und files_trigram) aus den Inhaltstabellen neu auf."""
+        start = time.time()
+        self.cursor.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+        self.cursor.execute("INSERT INTO directories_fts (directories_fts) VALUES ('rebuild')")
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_trigram'")
+        if self.cursor.fetchone():
+            self.cursor.execute("INSERT INTO files_trigram (files_trigram) VALUES ('rebuild')")
+        logger.info(f"[DB] Suchindex neu aufgebaut ({time.time() - start:.2f}s)")
+
+    @with_read
+    def get_drive_stats(self, conn, drive_id=None):
+        """[(drive_id, name, file_count, total_size, directory_count), ...] aus file_stats/drive_stats."""
+        where = "WHERE d.id = ?" if drive_id is not None else ""
+        cursor = conn.execute(f"""
+            SELECT d.id, d.name,
+                   IFNULL((SELECT SUM(file_count) FROM file_stats WHERE drive_id = d.id), 0),
+                   IFNULL((SELECT SUM(total_size) FROM file_stats WHERE drive_id = d.id), 0),
+                   IFNULL((SELECT directory_count FROM drive_stats WHERE drive_id = d.id), 0)
+            FROM drives d
+            {where}
+            ORDER BY d.name
+        """, (drive_id,) if drive_id is not None else ())
+        return cursor.fetchall()
+
+    @with_read
+    def get_extension_stats(self, conn, drive_id=None, limit=None):
+        """[(extension, category, file_count, total_size), ...] absteigend nach Anzahl."""
+        where = "WHERE s.drive_id = ?" if drive_id is not None else ""
+        params = [drive_id] if drive_id is not None else []
+        query = f"""
+            SELECT IFNULL(e.name, '[none]'), IFNULL(e.category, 'other'), SUM(s.file_count), SUM(s.total_size)
+            FROM file_stats s
+            LEFT JOIN extensions e ON e.id = s.extension_id
+            {where}
+            GROUP BY s.extension_id
+            HAVING SUM(s.file_count) > 0
+            ORDER BY SUM(s.file_count) DESC
+        """
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        cursor = conn.execute(query, params)
+        return cursor.fetchall()
+
+    @with_read
+    def get_category_stats(self, conn, drive_id=None):
+        """[(category, file_count, total_size), ...] absteigend nach Größe."""
+        where = "WHERE s.drive_id = ?" if drive_id is not None else ""
+        cursor = conn.execute(f"""
+            SELECT IFNULL(e.category, 'other'), SUM(s.file_count), SUM(s.total_size)
+            FROM file_stats s
+            LEFT JOIN extensions e ON e.id = s.extension_id
+            {where}
+            GROUP BY IFNULL(e.category, 'other')
+            HAVING SUM(s.file_count) > 0
+            ORDER BY SUM(s.total_size) DESC
+        """, (drive_id,) if drive_id is not None else ())
+        return cursor.fetchall()
+
+    @with_read
+    def get_directory_stats(self, conn, directory_id):
+        """(file_count, total_size, recursive_file_count, recursive_size) eines Verzeichnisses."""
+        cursor = conn.execute("""
+            SELECT file_count, total_size, recursive_file_count, recursive_size
+            FROM directory_stats WHERE directory_id = ?
+        """, (directory_id,))
+        return cursor.fetchone() or (0, 0, 0, 0)
+
+    @with_lock
+    def get_directory_usage(self, drive_id, full_path):
+        """Speicherverbrauch eines Ordners über Pfad: Baum-Lookup + ein PK-Zugriff."""
+        dir_id = self.find_directory_id(drive_id, full_path)
+        if dir_id is None:
+            return None
+        return self.get_directory_stats(dir_id)
+
+    @with_lock
+    def delete_directory(self, drive_id, full_path):
+        """Löscht ein Verzeichnis samt Inhalt (CASCADE). Gibt die Anzahl gelöschter Zeilen zurück."""
+        dir_id = self.find_directory_id(drive_id, full_path)
+        if dir_id is None:
+            return 0
+        self._remove_directory_from_stats(dir_id)
+        self.cursor.execute("DELETE FROM directories WHERE id = ?", (dir_id,))
+        deleted = self.cursor.rowcount
+        self.dir_tree.remove_subtree(dir_id)
+        return deleted
+
+    @with_lock
+    def delete_directories(self, dir_ids):
+        """Löscht Verzeichnisse nach ID (CASCADE). Gibt die Anzahl gelöschter Zeilen zurück."""
+        deleted = 0
+        for dir_id in dir_ids:
+            # Einzeln: ein bereits per CASCADE gelöschtes Unterverzeichnis wird übersprungen
+            self.cursor.execute("SELECT 1 FROM directories WHERE id = ?", (dir_id,))
+            if self.cursor.fetchone() is None:
+                continue
+            self._remove_directory_from_stats(dir_id)
+            self.cursor.execute("DELETE FROM directories WHERE id = ?", (dir_id,))
+            deleted += self.cursor.rowcount
+        # Eigene Löschungen ändern data_version nicht - Baum explizit verwerfen
+        self.dir_tree.invalidate()
+        return deleted
+
+    @with_lock
+    def upsert_file(self, drive_id, file_path, size, hash_val, mtime_ns=None, ctime_ns=None):
+        """Legt eine Datei samt Verzeichnis an oder aktualisiert sie (vollständiger Dateipfad)."""
+        file_path = os.path.normpath(file_path)
+        dir_id = self.get_or_create_directory_optimized(drive_id, os.path.dirname(file_path))
+        filename = os.path.basename(file_path)
+        self.cursor.execute(
+            "SELECT size FROM files WHERE directory_id = ? AND filename = ?",
+            (dir_id, os.path.splitext(filename)[0])
+        )
+        row = self.cursor.fetchone()
+        file_id = self.insert_file_optimized(dir_id, filename, size, hash_val, mtime_ns=mtime_ns, ctime_ns=ctime_ns)
+        if row is None:
+            self._adjust_directory_stats({dir_id: (1, size or 0)})
+        else:
+            self._adjust_directory_stats({dir_id: (0, (size or 0) - (row[0] or 0))})
+        return file_id
+
+    @with_lock
+    def delete_file(self, drive_id, file_path):
+        """Löscht eine Datei über ihren vollständigen Pfad. Gibt die Anzahl gelöschter Zeilen zurück."""
+        file_path = os.path.normpath(file_path)
+        dir_id = self.find_directory_id(drive_id, os.path.dirname(file_path))
+        if dir_id is None:
+            return 0
+        filename, ext = os.path.splitext(os.path.basename(file_path))
+        self.cursor.execute("""
+            SELECT id, size FROM files
+            WHERE directory_id = ? AND filename = ?
+            AND extension_id = (SELECT id FROM extensions WHERE name = ?)
+        """, (dir_id, filename, ext if ext else '[none]'))
+        removed = self.cursor.fetchall()
+        self.cursor.executemany("DELETE FROM files WHERE id = ?", [(row[0],) for row in removed])
+        self.file_cache.remove(dir_id, filename)
+        if removed:
+            self._adjust_directory_stats({dir_id: (-len(removed), -sum(row[1] or 0 for row in removed))})
+        return len(removed)
+
+    @with_lock
+    def delete_files(self, file_ids):
+        """Löscht Dateien nach ID."""
+        deltas = {}
+        for file_id in file_ids:
+            row = self.cursor.execute("SELECT directory_id, size FROM files WHERE id = ?", (file_id,)).fetchone()
+            if row:
+                self.cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                count, size = deltas.get(row[0], (0, 0))
+                deltas[row[0]] = (count - 1, size - (row[1] or 0))
+        self._adjust_directory_stats(deltas)
+        return sum(-count for count, _ in deltas.values())
+
+    @with_lock
+    def update_files(self, rows):
+        """Aktualisiert Dateien: rows = [(size, hash, mtime_ns, ctime_ns, file_id), ...] (Hash als Hex)."""
+        updated = 0
+        deltas = {}
+        for size, hash_val, mtime_ns, ctime_ns, file_id in rows:
+            old = self.cursor.execute("SELECT directory_id, size FROM files WHERE id = ?", (file_id,)).fetchone()
+            if old is None:
+                continue
+            self.cursor.execute(
+                "UPDATE files SET size = ?, hash = ?, mtime_ns = ?, ctime_ns = ? WHERE id = ?",
+                (size, self.encode_hash(hash_val), mtime_ns, ctime_ns, file_id)
+            )
+            updated += 1
+            count, total = deltas.get(old[0], (0, 0))
+            deltas[old[0]] = (count, total + (size or 0) - (old[1] or 0))
+        self._adjust_directory_stats(deltas)
+        return updated
+
+    @with_lock
+    def move_file(self, drive_id, src_path, dest_path):
+        """Verschiebt/benennt einen Dateieintrag um.
+
+        Returns:
+            bool: False, wenn die Quelldatei nicht in der DB steht.
+        """
+        src_path = os.path.normpath(src_path)
+        dest_path = os.path.normpath(dest_path)
+        src_dir_id = self.find_directory_id(drive_id, os.path.dirname(src_path))
+        if src_dir_id is None:
+            return False
+        src_filename, src_ext = os.path.splitext(os.path.basename(src_path))
+        ext_id = self.get_or_create_extension(src_ext if src_ext else '[none]')
+        self.cursor.execute(
+            "SELECT id, size FROM files WHERE directory_id = ? AND filename = ? AND extension_id = ?",
+            (src_dir_id, src_filename, ext_id)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return False
+        file_id, size = row[0], row[1] or 0
+        
+        dest_dir_id = self.get_or_create_directory_optimized(drive_id, os.path.dirname(dest_path))
+        dest_filename, dest_ext = os.path.splitext(os.path.basename(dest_path))
+        dest_ext_id = self.get_or_create_extension(dest_ext if dest_ext else '[none]')
+        
+        # Evtl. existierende Zieldatei entfernen (Rename-Pattern: temp -> final)
+        replaced = self.cursor.execute(
+            "SELECT size FROM files WHERE directory_id = ? AND filename = ? AND id != ?",
+            (dest_dir_id, dest_filename, file_id)
+        ).fetchall()
+        self.cursor.execute(
+            "DELETE FROM files WHERE directory_id = ? AND filename = ? AND id != ?",
+            (dest_dir_id, dest_filename, file_id)
+        )
+        self.cursor.execute(
+            "UPDATE files SET directory_id = ?, filename = ?, extension_id = ? WHERE id = ?",
+            (dest_dir_id, dest_filename, dest_ext_id, file_id)
+        )
+        deltas = {src_dir_id: (-1, -size)}
+        count, total = deltas.get(dest_dir_id, (0, 0))
+        deltas[dest_dir_id] = (count + 1 - len(replaced), total + size - sum(r[0] or 0 for r in replaced))
+        self._adjust_directory_stats(deltas)
+        self.file_cache.remove(src_dir_id, src_filename)
+        self.file_cache.add(dest_dir_id, dest_filename)
+        return True
+
+    @with_lock
+    def move_or_upsert_file(self, drive_id, src_path, dest_path, size, hash_val,
+                            mtime_ns=None, ctime_ns=None, modified=False):
+        """Verschiebt einen Dateieintrag; ist die Quelle unbekannt oder die Datei geändert,
+        wird das Ziel mit den übergebenen Werten geschrieben (size None = Ziel fehlt).
+
+        Eine Operation statt move_file + Warten auf das Ergebnis: der Watchdog reiht
+        Umbenennungen ein, ohne auf den Commit zu warten. Gibt True zurück, wenn der
+        Eintrag verschoben wurde.
+        """
+        moved = self.move_file(drive_id, src_path, dest_path)
+        if (not moved or modified) and size is not None:
+            self.upsert_file(drive_id, dest_path, size, hash_val, mtime_ns, ctime_ns)
+        return moved
+
+    @with_lock
+    def move_directory(self, drive_id, src_path, dest_path):
+        """Verschiebt/benennt ein Verzeichnis samt Teilbaum um (ein Satz UPDATEs).
+
+        Das Verzeichnis selbst bekommt parent_id/Name/Pfad/Tiefe des Ziels, alle
+        Unterverzeichnisse werden in einer Anweisung (rekursiv über parent_id)
+        auf das neue Pfad-Präfix und die neue Tiefe umgeschrieben. Dateien hängen
+        an directory_id und bleiben unverändert. Ein vorhandenes Ziel wird ersetzt.
+
+        Returns:
+            int or None: Anzahl umgeschriebener Verzeichnisse, None wenn die Quelle
+            nicht in der DB steht (Aufrufer scannt dann das Ziel neu).
+        """
+        src_path = os.path.normpath(src_path).replace('\\', '/')
+        dest_path = os.path.normpath(dest_path).replace('\\', '/')
+        src_id = self._lookup_directory(drive_id, src_path)
+        if src_id is None:
+            return None
+        if dest_path == src_path:
+            return 0
+        if (dest_path + '/').startswith(src_path.rstrip('/') + '/') or src_path.startswith(dest_path + '/'):
+            raise ValueError(f"Ziel liegt im bzw. über dem verschobenen Verzeichnis: {src_path} -> {dest_path}")
+        drive_name = self.get_drive_name(drive_id)
+        drive_root = drive_name.rstrip('/')
+        if not dest_path.startswith(drive_root + '/') or dest_path == drive_root:
+            raise ValueError(f"Ziel liegt nicht auf Laufwerk {drive_name}: {dest_path}")
+
+        dest_id = self._lookup_directory(drive_id, dest_path)
+        if dest_id is not None:
+            self.delete_directory(drive_id, dest_path)
+        parent_path = os.path.dirname(dest_path).replace('\\', '/')
+        if parent_path == drive_root or parent_path + '/' == drive_name:
+            parent_id = None
+        else:
+            parent_id = self.get_or_create_directory_optimized(drive_id, parent_path)
+        directory_name = os.path.basename(dest_path)
+        depth_level = len([p for p in dest_path[len(drive_root):].split('/') if p])
+
+        old_depth = self.cursor.execute("SELECT depth_level FROM directories WHERE id = ?", (src_id,)).fetchone()[0] or 0
+        # Rollups: beim alten Elternpfad abziehen, beim neuen hinzurechnen
+        self._remove_directory_from_stats(src_id)
+        self.cursor.execute(
+            "UPDATE directories SET parent_id = ?, directory_name = ?, full_path = ?, depth_level = ? WHERE id = ?",
+            (parent_id, directory_name, None if self.compact_dirs else dest_path, depth_level, src_id)
+        )
+        # Teilbaum in einer Anweisung: Präfix des Pfadtexts ersetzen, Tiefe verschieben
+        self.cursor.execute("""
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id FROM directories WHERE parent_id = ?
+                UNION ALL
+                SELECT d.id FROM directories d JOIN subtree s ON d.parent_id = s.id
+            )
+            UPDATE directories
+            SET full_path = CASE WHEN full_path IS NULL THEN NULL ELSE ? || substr(full_path, ?) END,
+                depth_level = depth_level + ?
+            WHERE id IN (SELECT id FROM subtree)
+        """, (src_id, dest_path, len(src_path) + 1, depth_level - old_depth))
+        # rowcount kennt WITH ... UPDATE nicht als DML, changes() zählt ohne Trigger
+        moved = self.cursor.execute("SELECT changes()").fetchone()[0] + 1
+        tree = self._dir_tree_ready()
+        tree.move(src_id, parent_id, directory_name)
+        # Eigene Verschiebung ist im Baum schon nachgeführt
+        tree.tree_version = tree.read_tree_version(self.conn)
+        row = self.cursor.execute(
+            "SELECT recursive_file_count, recursive_size FROM directory_stats WHERE directory_id = ?", (src_id,)
+        ).fetchone()
+        if row and parent_id:
+            self._adjust_directory_stats({parent_id: (row[0], row[1])}, direct=False)
+        return moved
+
+    @with_lock
+    def insert_directory_files(self, drive_id, dir_path, file_tuples):
+        """Legt ein Verzeichnis an und schreibt dessen Dateien (Scanner).
+        file_tuples: [(full_filename, size, hash_val, mtime_ns, ctime_ns), ...]
+        directory_stats wird inkrementell nachgeführt (Verzeichnis und Vorfahren).
+        """
+        dir_id = self.get_or_create_directory_optimized(drive_id, dir_path)
+        self._insert_counted(drive_id, dir_id, file_tuples)
+        return dir_id
+
+    def _insert_counted(self, drive_id, dir_id, file_tuples):
+        """Schreibt die Dateien eines Verzeichnisses und verbucht die Differenz
+        (Anzahl/Bytes vorher und nachher) in directory_stats."""
+        self.cursor.execute("INSERT OR IGNORE INTO directory_stats (directory_id, drive_id) VALUES (?, ?)",
+                            (dir_id, drive_id))
+        totals = "SELECT COUNT(*), IFNULL(SUM(size), 0) FROM files WHERE directory_id = ?"
+        before = self.cursor.execute(totals, (dir_id,)).fetchone()
+        if file_tuples:
+            self.batch_insert_files([(dir_id,) + tuple(entry) for entry in file_tuples], raise_errors=True)
+        after = self.cursor.execute(totals, (dir_id,)).fetchone()
+        self._adjust_directory_stats({dir_id: (after[0] - before[0], after[1] - before[1])})
+
+    @with_lock
+    def sync_directory(self, drive_id, dir_path, file_tuples, subdir_names=None):
+        """Gleicht ein Verzeichnis mit dem Dateisystem ab (gezielter Rescan).
+
+        Wie insert_directory_files, entfernt aber zusätzlich Dateien, die nicht mehr
+        in file_tuples stehen, und Unterverzeichnisse, die nicht in subdir_names
+        stehen (None = Unterverzeichnisse nicht prüfen). directory_stats wird
+        inkrementell nachgeführt (nur dieses Verzeichnis und seine Vorfahren).
+        Gibt (Verzeichnis-ID, entfernte Dateien, entfernte Verzeichnisse) zurück.
+        """
+        dir_id = self.get_or_create_directory_optimized(drive_id, dir_path)
+        self._insert_counted(drive_id, dir_id, file_tuples)
+        present = {os.path.basename(entry[0]) for entry in file_tuples}
+        stale_files = [file_id for file_id, filename, ext in self.cursor.execute("""
+            SELECT f.id, f.filename, e.name FROM files f LEFT JOIN extensions e ON e.id = f.extension_id
+            WHERE f.directory_id = ?
+        """, (dir_id,)).fetchall() if filename + ('' if ext in (None, '[none]') else ext) not in present]
+        if stale_files:
+            self.delete_files(stale_files)
+            self.file_cache.clear()
+        stale_dirs = []
+        if subdir_names is not None:
+            subdir_names = set(subdir_names)
+            stale_dirs = [child_id for child_id, name in self.cursor.execute(
+                "SELECT id, directory_name FROM directories WHERE parent_id = ?", (dir_id,)).fetchall()
+                if name not in subdir_names]
+            if stale_dirs:
+                self.delete_directories(stale_dirs)
+        return dir_id, len(stale_files), len(stale_dirs)
+
+    @with_lock
+    def rollback(self):
+        """Rollback der offenen Transaktion. Der Verzeichnisbaum kann nicht
+        zurückgerollte IDs enthalten und wird daher neu geladen."""
+        self.conn.rollback()
+        self.dir_tree.invalidate()
+
     @with_lock
     def get_or_create_directory_optimized(self, drive_id, full_path):
         """Optimierte Directory-Erstellung mit Hierarchie-Support."""
         # Normalisiere Pfad ZUERST (Windows-kompatibel)
         full_path = os.path.normpath(full_path).replace('\\', '/')
         
-        # Prüfe ob bereits existiert (mit normalisiertem Pfad!)
-        self.cursor.execute("SELECT id FROM directories WHERE drive_id = ? AND full_path = ?", (drive_id, full_path))
-        row = self.cursor.fetchone()
-        if row:
-            return row[0]
+        # Prüfe ob bereits existiert - Dict-Lookups im Verzeichnisbaum statt Index-Suche
+        tree = self._dir_tree_ready()
+        dir_id = self._lookup_directory(drive_id, full_path)
+        if dir_id is not None:
+            return dir_id
         
         drive_name = self.get_drive_name(drive_id)
         
@@ -433,36 +2051,47 @@ class DBManager:
                 else:
                     parent_id = None
         
+        # Im kompakten Modus wird kein Pfadtext gespeichert
+        stored_path = None if self.compact_dirs else full_path
+        
         # Neues Verzeichnis einfügen (mit Fehlerbehandlung für Race Conditions)
         try:
             self.cursor.execute(
                 "INSERT INTO directories (drive_id, parent_id, directory_name, full_path, depth_level) VALUES (?, ?, ?, ?, ?)",
-                (drive_id, parent_id, directory_name, full_path, depth_level)
+                (drive_id, parent_id, directory_name, stored_path, depth_level)
             )
-            return self.cursor.lastrowid
+            dir_id = self.cursor.lastrowid
+            tree.add(dir_id, drive_id, parent_id, directory_name)
+            return dir_id
         except sqlite3.IntegrityError:
-            # Race Condition: Ein anderer Thread hat das Verzeichnis bereits erstellt
-            # Versuche es nochmal zu finden
-            self.cursor.execute("SELECT id FROM directories WHERE drive_id = ? AND full_path = ?", (drive_id, full_path))
-            row = self.cursor.fetchone()
-            if row:
-                return row[0]
+            # Race Condition: Ein anderer Prozess hat das Verzeichnis bereits erstellt
+            # Baum neu laden und nochmal suchen
+            tree.load(self.conn)
+            dir_id = self._lookup_directory(drive_id, full_path)
+            if dir_id is not None:
+                return dir_id
             else:
                 # Sollte nicht passieren, aber zur Sicherheit
                 raise
     
-    def get_drive_name(self, drive_id):
+    @with_read
+    def get_drive_name(self, conn, drive_id):
         """Hilfsfunktion um Drive-Namen zu holen."""
-        self.cursor.execute("SELECT name FROM drives WHERE id = ?", (drive_id,))
-        row = self.cursor.fetchone()
+        row = conn.execute("SELECT name FROM drives WHERE id = ?", (drive_id,)).fetchone()
         return row[0] if row else None
 
     @with_lock
-    def insert_file_optimized(self, directory_id, full_filename, size, hash_val, created_date=None, modified_date=None):
-        """Optimierte Datei-Einfügung mit Cache und UNIQUE INDEX Kompatibilität."""
+    def insert_file_optimized(self, directory_id, full_filename, size, hash_val, created_date=None, modified_date=None,
+                              mtime_ns=None, ctime_ns=None):
+        """Optimierte Datei-Einfügung mit Cache und UNIQUE INDEX Kompatibilität.
+
+        mtime_ns/ctime_ns: echte Datei-Zeitstempel (os.stat, Epoch-Nanosekunden).
+        """
         # Filename und Extension trennen
         filename, ext = os.path.splitext(full_filename)
         
+        hash_val = self.encode_hash(hash_val)
+        
         # PERFORMANCE: Prüfe Cache zuerst
         in_cache = self.file_cache.check(directory_id, filename)
         
@@ -473,9 +2102,10 @@ class DBManager:
             # Definitiv im Cache = UPDATE
             self.cursor.execute("""
                 UPDATE files 
-                SET size = ?, hash = ?, modified_date = COALESCE(?, datetime('now'))
+                SET size = ?, hash = ?, modified_date = COALESCE(?, datetime('now')),
+                    mtime_ns = COALESCE(?, mtime_ns), ctime_ns = COALESCE(?, ctime_ns)
                 WHERE directory_id = ? AND filename = ?
-            """, (size, hash_val, modified_date, directory_id, filename))
+            """, (size, hash_val, modified_date, mtime_ns, ctime_ns, directory_id, filename))
             return self.cursor.lastrowid
             
         elif in_cache is False:
@@ -483,18 +2113,19 @@ class DBManager:
             try:
                 self.cursor.execute("""
                     INSERT INTO files 
-                    (directory_id, filename, extension_id, size, hash, created_date, modified_date) 
-                    VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, datetime('now')))
-                """, (directory_id, filename, extension_id, size, hash_val, created_date, modified_date))
+                    (directory_id, filename, extension_id, size, hash, created_date, modified_date, mtime_ns, ctime_ns) 
+                    VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, datetime('now')), ?, ?)
+                """, (directory_id, filename, extension_id, size, hash_val, created_date, modified_date, mtime_ns, ctime_ns))
                 self.file_cache.add(directory_id, filename)
                 return self.cursor.lastrowid
             except sqlite3.IntegrityError:
                 # Race condition oder Cache miss - UPDATE
                 self.cursor.execute("""
                     UPDATE files 
-                    SET size = ?, hash = ?, modified_date = COALESCE(?, datetime('now'))
+                    SET size = ?, hash = ?, modified_date = COALESCE(?, datetime('now')),
+                        mtime_ns = COALESCE(?, mtime_ns), ctime_ns = COALESCE(?, ctime_ns)
                     WHERE directory_id = ? AND filename = ?
-                """, (size, hash_val, modified_date, directory_id, filename))
+                """, (size, hash_val, modified_date, mtime_ns, ctime_ns, directory_id, filename))
                 self.file_cache.add(directory_id, filename)
                 return self.cursor.lastrowid
         
@@ -503,9 +2134,10 @@ class DBManager:
             # Versuche erst zu aktualisieren (wenn Datei existiert)
             self.cursor.execute("""
                 UPDATE files 
-                SET size = ?, hash = ?, modified_date = COALESCE(?, datetime('now'))
+                SET size = ?, hash = ?, modified_date = COALESCE(?, datetime('now')),
+                    mtime_ns = COALESCE(?, mtime_ns), ctime_ns = COALESCE(?, ctime_ns)
                 WHERE directory_id = ? AND filename = ?
-            """, (size, hash_val, modified_date, directory_id, filename))
+            """, (size, hash_val, modified_date, mtime_ns, ctime_ns, directory_id, filename))
             
             if self.cursor.rowcount > 0:
                 # UPDATE erfolgreich = Datei existierte
@@ -514,9 +2146,9 @@ class DBManager:
                 # Keine Zeile aktualisiert = INSERT nötig
                 self.cursor.execute("""
                     INSERT OR IGNORE INTO files 
-                    (directory_id, filename, extension_id, size, hash, created_date, modified_date) 
-                    VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, datetime('now')))
-                """, (directory_id, filename, extension_id, size, hash_val, created_date, modified_date))
+                    (directory_id, filename, extension_id, size, hash, created_date, modified_date, mtime_ns, ctime_ns) 
+                    VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, datetime('now')), ?, ?)
+                """, (directory_id, filename, extension_id, size, hash_val, created_date, modified_date, mtime_ns, ctime_ns))
                 if self.cursor.rowcount > 0:
                     self.file_cache.add(directory_id, filename)
             
@@ -528,14 +2160,18 @@ class DBManager:
         return self.get_or_create_directory_optimized(drive_id, path)
 
     @with_lock
-    def batch_insert_files(self, file_tuples):
+    def batch_insert_files(self, file_tuples, raise_errors=False):
         """Optimierte Batch-Insertion für neue Datenbankstruktur.
-        file_tuples: [(dir_id, full_filename, size, hash_val), ...]
+        file_tuples: [(dir_id, full_filename, size, hash_val[, mtime_ns, ctime_ns]), ...]
+        raise_errors=True (Write-Queue): Fehler weitergeben, damit der Savepoint der
+        Operation zurückgerollt und der Fehler gezählt wird.
         """
         try:
             # Konvertiere zu optimierter Struktur
             optimized_tuples = []
-            for dir_id, full_filename, size, hash_val in file_tuples:
+            for entry in file_tuples:
+                dir_id, full_filename, size, hash_val = entry[:4]
+                mtime_ns, ctime_ns = entry[4:6] if len(entry) >= 6 else (None, None)
                 # Parse filename und extension
                 basename = os.path.basename(full_filename) if '/' in full_filename or '\\' in full_filename else full_filename
                 filename, ext = os.path.splitext(basename)
@@ -543,22 +2179,22 @@ class DBManager:
                 # Extension-ID ermitteln (Bulk-Optimierung möglich)
                 extension_id = self.get_or_create_extension(ext) if ext else self.get_or_create_extension('[none]')
                 
-                optimized_tuples.append((dir_id, filename, extension_id, size, hash_val))
+                optimized_tuples.append((dir_id, filename, extension_id, size, self.encode_hash(hash_val), mtime_ns, ctime_ns))
             
             # Batch-Insert in optimierte Tabelle mit Cache-Unterstützung
             updates = []
             inserts = []
             
-            for dir_id, filename, extension_id, size, hash_val in optimized_tuples:
+            for dir_id, filename, extension_id, size, hash_val, mtime_ns, ctime_ns in optimized_tuples:
                 # Prüfe Cache für bessere Performance
                 in_cache = self.file_cache.check(dir_id, filename)
                 
                 if in_cache is True:
                     # Definitiv existiert = UPDATE
-                    updates.append((size, hash_val, dir_id, filename))
+                    updates.append((size, hash_val, mtime_ns, ctime_ns, dir_id, filename))
                 elif in_cache is False:
                     # Definitiv neu = INSERT
-                    inserts.append((dir_id, filename, extension_id, size, hash_val))
+                    inserts.append((dir_id, filename, extension_id, size, hash_val, mtime_ns, ctime_ns))
                     self.file_cache.add(dir_id, filename)
                 else:
                     # Cache unbekannt = muss einzeln geprüft werden
@@ -569,17 +2205,18 @@ class DBManager:
                     """, (dir_id, filename))
                     
                     if self.cursor.fetchone():
-                        updates.append((size, hash_val, dir_id, filename))
+                        updates.append((size, hash_val, mtime_ns, ctime_ns, dir_id, filename))
                         self.file_cache.add(dir_id, filename)
                     else:
-                        inserts.append((dir_id, filename, extension_id, size, hash_val))
+                        inserts.append((dir_id, filename, extension_id, size, hash_val, mtime_ns, ctime_ns))
                         self.file_cache.add(dir_id, filename)
             
             # Batch-UPDATE
             if updates:
                 self.cursor.executemany("""
                     UPDATE files 
-                    SET size = ?, hash = ?, modified_date = datetime('now')
+                    SET size = ?, hash = ?, modified_date = datetime('now'),
+                        mtime_ns = COALESCE(?, mtime_ns), ctime_ns = COALESCE(?, ctime_ns)
                     WHERE directory_id = ? AND filename = ?
                 """, updates)
             
@@ -587,25 +2224,29 @@ class DBManager:
             if inserts:
                 self.cursor.executemany("""
                     INSERT OR IGNORE INTO files 
-                    (directory_id, filename, extension_id, size, hash, modified_date) 
-                    VALUES (?, ?, ?, ?, ?, datetime('now'))
+                    (directory_id, filename, extension_id, size, hash, mtime_ns, ctime_ns, modified_date) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
                 """, inserts)
             
         except sqlite3.Error as e:
             num_tuples = len(file_tuples) if file_tuples else 0
             first_tuple_example = file_tuples[0] if file_tuples else "N/A"
             logger.error(f"[DB Fehler] Fehler bei batch_insert_files (optimized) mit {num_tuples} Tupeln. Erstes Tupel: {first_tuple_example}. Fehler: {e}")
+            if raise_errors:
+                raise
         except Exception as e:
              logger.error(f"[DB Fehler] Unerwarteter Fehler bei batch_insert_files (optimized): {e}")
+             if raise_errors:
+                 raise
 
-    @with_lock
-    def get_last_scan_path(self, drive_id):
-        self.cursor.execute("SELECT last_path FROM scan_progress WHERE drive_id = ?", (drive_id,))
-        row = self.cursor.fetchone()
+    @with_read
+    def get_last_scan_path(self, conn, drive_id):
+        cursor = conn.execute("SELECT last_path FROM scan_progress WHERE drive_id = ?", (drive_id,))
+        row = cursor.fetchone()
         return row[0] if row else None
 
     @with_lock
-    def update_scan_progress(self, drive_id, path):
+    def update_scan_progress(self, drive_id, path, commit=True):
         timestamp = datetime.now().isoformat()
         self.cursor.execute("SELECT id FROM scan_progress WHERE drive_id = ?", (drive_id,))
         row = self.cursor.fetchone()
@@ -619,8 +2260,9 @@ class DBManager:
                 "INSERT INTO scan_progress (drive_id, last_path, timestamp) VALUES (?, ?, ?)",
                 (drive_id, path, timestamp)
             )
-        logger.info(f"[DB Commit] Committing scan progress update: drive_id={drive_id}, last_path={path}")
-        self.conn.commit()
+        if commit:
+            logger.info(f"[DB Commit] Committing scan progress update: drive_id={drive_id}, last_path={path}")
+            self.conn.commit()
 
     @with_lock
     def cleanup_removed_dirs(self, drive_id, scanned_paths_set):
@@ -636,46 +2278,32 @@ class DBManager:
             if path not in scanned_file_paths_set and not os.path.exists(path):
                 self.cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
 
-    @with_lock
-    def clear_drive_data(self, drive_id):
+    def clear_drive_data(self, drive_id, progress=None):
         """Löscht alle Daten eines spezifischen Laufwerks (für --restart).
         
         WICHTIG: Löscht NUR die Daten des angegebenen Laufwerks!
-        Andere Laufwerke bleiben unberührt.
+        Andere Laufwerke bleiben unberührt. Läuft blockweise über drive_purge,
+        der DB-Lock wird zwischen den Blöcken freigegeben.
         
         Args:
             drive_id: Die ID des Laufwerks, dessen Daten gelöscht werden sollen
+            progress: Optionaler Callback progress(phase, files_deleted, directories_deleted)
         """
+        import drive_purge
         try:
-            # Zähle vorher die Daten für Logging
-            self.cursor.execute("SELECT COUNT(*) FROM directories WHERE drive_id = ?", (drive_id,))
-            dir_count = self.cursor.fetchone()[0]
-            
-            self.cursor.execute("""
-                SELECT COUNT(*) FROM files f 
-                JOIN directories d ON f.directory_id = d.id 
-                WHERE d.drive_id = ?
-            """, (drive_id,))
-            file_count = self.cursor.fetchone()[0]
-            
-            # Lösche alle Verzeichnisse des Laufwerks (CASCADE löscht automatisch alle Dateien)
-            self.cursor.execute("DELETE FROM directories WHERE drive_id = ?", (drive_id,))
-            
-            # Lösche auch den Scan-Fortschritt für dieses Laufwerk
-            self.cursor.execute("DELETE FROM scan_progress WHERE drive_id = ?", (drive_id,))
-            
-            self.conn.commit()
-            logger.info(f"[DB] Daten für Laufwerk ID {drive_id} gelöscht: {dir_count} Verzeichnisse, {file_count} Dateien")
-            
+            result = drive_purge.purge_drive(self, drive_id, progress=progress)
+            logger.info(f"[DB] Daten für Laufwerk ID {drive_id} gelöscht: {result['directories_deleted']} Verzeichnisse, "
+                        f"{result['files_deleted']} Dateien ({result['strategy']}, {result['seconds']:.1f}s)")
             return True
         except Exception as e:
             logger.error(f"[DB] Fehler beim Löschen der Laufwerksdaten: {e}")
-            self.conn.rollback()
+            self.rollback()
             return False
 
     @with_lock
     def close(self):
         logger.info("[DB Commit] Committing final changes on DB close.")
+        self._close_readers()
         self.conn.commit()
         self.conn.close()
 
@@ -760,17 +2388,447 @@ class DBManager:
             logger.error(f"[DB] Fehler beim Freigeben des Scan-Locks {lock_id}: {e}")
             return False
     
-    @with_lock
-    def is_scan_running(self):
+    @with_read
+    def is_scan_running(self, conn):
         """Prüft, ob aktuell ein Scan läuft.
         
         Returns:
             bool: True wenn ein Scan aktiv ist, False sonst
         """
-        self.cursor.execute("SELECT COUNT(*) FROM scan_lock WHERE is_active=1")
-        count = self.cursor.fetchone()[0]
+        cursor = conn.execute("SELECT COUNT(*) FROM scan_lock WHERE is_active=1")
+        count = cursor.fetchone()[0]
         return count > 0
 
+class WriteRequest:
+    """Eine eingereihte Schreiboperation. wait() blockiert bis zum Commit.
+
+    on_done(request) wird nach dem Commit (bzw. Rollback) im Writer-Thread
+    aufgerufen - für Producer, die das Ergebnis nur protokollieren wollen.
+    """
+
+    __slots__ = ('producer', 'op', 'args', 'submitted', 'done', 'result', 'error', 'on_done')
+
+    def __init__(self, producer, op, args, on_done=None):
+        self.producer = producer
+        self.op = op
+        self.args = args
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.on_done = on_done
+
+    def wait(self, timeout=None):
+        """Ergebnis nach dem Commit; wirft den Fehler der Operation bzw. TimeoutError."""
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"Schreiboperation {self.op} nach {timeout}s nicht committet")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class WriteQueue:
+    """Single-Writer-Service für alle Schreibzugriffe eines Prozesses.
+
+    Producer (Scanner, Watchdog, Integritätsprüfung) reihen typisierte Operationen
+    ein, ein Writer-Thread wendet sie gesammelt an (Group Commit): eine Transaktion
+    je max_batch Operationen oder linger_ms, je nachdem, was zuerst eintritt. Kommen
+    Ereignisse einzeln (Watchdog bei npm install, Foto-Import), wartet der Writer
+    nach der ersten Operation bis zu linger_ms auf weitere, statt jede einzeln zu
+    committen (fsync je Commit). max_delay_ms begrenzt die Zeit vom Einreihen bis
+    zur Sichtbarkeit in der DB. Jede Operation läuft in einem eigenen Savepoint,
+    ein Fehler verwirft nur diese. Ist die Queue voll, blockiert submit() den
+    Producer (Backpressure).
+    """
+
+    # Operation -> DBManager-Methode
+    OPERATIONS = {
+        'upsert_file': 'upsert_file',
+        'delete_file': 'delete_file',
+        'move_file': 'move_file',
+        'move_or_upsert_file': 'move_or_upsert_file',
+        'move_directory': 'move_directory',
+        'delete_files': 'delete_files',
+        'update_files': 'update_files',
+        'create_directory': 'get_or_create_directory_optimized',
+        'delete_directory': 'delete_directory',
+        'delete_directories': 'delete_directories',
+        'insert_directory_files': 'insert_directory_files',
+        'sync_directory': 'sync_directory',
+        'scan_progress': 'update_scan_progress',
+        'rebuild_directory_stats': 'rebuild_directory_stats',
+    }
+    # Feste Argumente: innerhalb des Savepoints darf keine Operation selbst committen
+    FIXED_KWARGS = {
+        'scan_progress': {'commit': False},
+    }
+
+    def __init__(self, db, max_depth=None, max_batch=None, linger_ms=None, max_delay_ms=None):
+        self.db = db
+        self.queue = queue.Queue(maxsize=max_depth or CONFIG.get('write_queue_max_depth', 10000))
+        self.max_batch = max_batch or CONFIG.get('write_queue_max_batch', 1000)
+        self.linger = (linger_ms if linger_ms is not None else CONFIG.get('write_queue_linger_ms', 20)) / 1000
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else CONFIG.get('write_queue_max_delay_ms', 200)) / 1000
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+        self.commits = 0
+        self.commit_stats = {'operations': 0, 'max_batch': 0, 'delay_total': 0.0, 'delay_max': 0.0}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="DBWriter", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, producer, op, *args, on_done=None):
+        """Reiht eine Operation ein. Blockiert, solange die Queue voll ist."""
+        if op not in self.OPERATIONS and op != '_barrier':
+            raise ValueError(f"Unbekannte Schreiboperation: {op}")
+        request = WriteRequest(producer, op, args, on_done)
+        if op == '_barrier':
+            self.queue.put(request)
+            return request
+        stats = self._producer_stats(producer)
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            wait_start = time.perf_counter()
+            self.queue.put(request)
+            with self.stats_lock:
+                stats['backpressure_waits'] += 1
+                stats['backpressure_time'] += time.perf_counter() - wait_start
+        with self.stats_lock:
+            stats['submitted'] += 1
+        return request
+
+    def flush(self, timeout=None):
+        """Wartet, bis alle bisher eingereihten Operationen committet sind."""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        return self.submit(None, '_barrier').done.wait(timeout)
+
+    def stop(self, timeout=30):
+        """Arbeitet die Queue ab und beendet den Writer-Thread."""
+        if self._thread is None:
+            return
+        self.flush(timeout=timeout)
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self.log_stats()
+
+    def _producer_stats(self, producer):
+        with self.stats_lock:
+            stats = self.stats.get(producer)
+            if stats is None:
+                stats = self.stats[producer] = {
+                    'submitted': 0, 'completed': 0, 'errors': 0,
+                    'latency_total': 0.0, 'latency_max': 0.0,
+                    'backpressure_waits': 0, 'backpressure_time': 0.0,
+                    'first_submit': time.perf_counter(), 'last_done': None,
+                }
+            return stats
+
+    def get_stats(self):
+        """Latenz (Einreihen bis Commit) und Durchsatz je Producer."""
+        result = {}
+        with self.stats_lock:
+            for producer, stats in self.stats.items():
+                completed = stats['completed']
+                elapsed = (stats['last_done'] or stats['first_submit']) - stats['first_submit']
+                result[producer] = {
+                    'submitted': stats['submitted'],
+                    'completed': completed,
+                    'errors': stats['errors'],
+                    'avg_latency_ms': stats['latency_total'] / completed * 1000 if completed else 0.0,
+                    'max_latency_ms': stats['latency_max'] * 1000,
+                    'throughput_per_s': completed / elapsed if elapsed > 0 else float(completed),
+                    'backpressure_waits': stats['backpressure_waits'],
+                    'backpressure_time_s': stats['backpressure_time'],
+                }
+        return result
+
+    def get_commit_stats(self):
+        """Operationen je Commit und Verzögerung bis zur Sichtbarkeit (älteste Operation im Batch)."""
+        with self.stats_lock:
+            stats = dict(self.commit_stats)
+        commits = self.commits
+        return {
+            'commits': commits,
+            'operations': stats['operations'],
+            'avg_batch': stats['operations'] / commits if commits else 0.0,
+            'max_batch': stats['max_batch'],
+            'avg_delay_ms': stats['delay_total'] / commits * 1000 if commits else 0.0,
+            'max_delay_ms': stats['delay_max'] * 1000,
+        }
+
+    def log_stats(self):
+        commit_stats = self.get_commit_stats()
+        if commit_stats['commits']:
+            logger.info(
+                f"[DB Writer] {commit_stats['commits']} Commits, {commit_stats['avg_batch']:.1f} Operationen je Commit "
+                f"(max {commit_stats['max_batch']}), sichtbar nach avg {commit_stats['avg_delay_ms']:.1f} ms / "
+                f"max {commit_stats['max_delay_ms']:.1f} ms"
+            )
+        for producer, stats in self.get_stats().items():
+            logger.info(
+                f"[DB Writer] {producer}: {stats['completed']}/{stats['submitted']} Operationen, "
+                f"{stats['errors']} Fehler, Latenz avg {stats['avg_latency_ms']:.1f} ms / max {stats['max_latency_ms']:.1f} ms, "
+                f"{stats['throughput_per_s']:.0f} Ops/s, Backpressure {stats['backpressure_waits']}x"
+            )
+
+    def _run(self):
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            # Group Commit: alles mitnehmen, was bereits wartet, und bis zu linger
+            # auf weitere Operationen warten (höchstens max_delay ab dem Einreihen)
+            deadline = min(time.perf_counter() + self.linger, batch[0].submitted + self.max_delay)
+            while len(batch) < self.max_batch and batch[-1].op != '_barrier':
+                timeout = deadline - time.perf_counter()
+                try:
+                    if timeout <= 0 or self._stop_event.is_set():
+                        batch.append(self.queue.get_nowait())
+                    else:
+                        batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._apply(batch)
+
+    def _apply(self, batch):
+        db = self.db
+        if all(request.op == '_barrier' for request in batch):
+            for request in batch:
+                request.done.set()
+                self.queue.task_done()
+            return
+        start = time.perf_counter()
+        with db.lock:
+            _metrics.record('lock_wait', 'WriteQueue._apply', time.perf_counter() - start)
+            try:
+                for request in batch:
+                    if request.op == '_barrier':
+                        continue
+                    db.conn.execute("SAVEPOINT write_op")
+                    try:
+                        request.result = getattr(db, self.OPERATIONS[request.op])(
+                            *request.args, **self.FIXED_KWARGS.get(request.op, {}))
+                        db.conn.execute("RELEASE write_op")
+                    except Exception as e:
+                        db.conn.execute("ROLLBACK TO write_op")
+                        db.conn.execute("RELEASE write_op")
+                        # Der Verzeichnisbaum kann IDs der verworfenen Operation enthalten
+                        db.dir_tree.invalidate()
+                        request.error = e
+                        logger.error(f"[DB Writer] {request.producer}/{request.op} fehlgeschlagen: {e}")
+                db.conn.commit()
+                self.commits += 1
+            except sqlite3.Error as e:
+                logger.error(f"[DB Writer] Commit fehlgeschlagen ({len(batch)} Operationen), Rollback: {e}")
+                db.rollback()
+                for request in batch:
+                    if request.error is None and request.op != '_barrier':
+                        request.error = e
+
+        done = time.perf_counter()
+        with self.stats_lock:
+            operations = [request for request in batch if request.op != '_barrier']
+            if operations:
+                delay = done - min(request.submitted for request in operations)
+                self.commit_stats['operations'] += len(operations)
+                self.commit_stats['max_batch'] = max(self.commit_stats['max_batch'], len(operations))
+                self.commit_stats['delay_total'] += delay
+                self.commit_stats['delay_max'] = max(self.commit_stats['delay_max'], delay)
+            for request in batch:
+                if request.op == '_barrier':
+                    continue
+                stats = self.stats[request.producer]
+                latency = done - request.submitted
+                stats['completed'] += 1
+                stats['latency_total'] += latency
+                stats['latency_max'] = max(stats['latency_max'], latency)
+                stats['last_done'] = done
+                if request.error is not None:
+                    stats['errors'] += 1
+        for request in batch:
+            request.done.set()
+            self.queue.task_done()
+            if request.on_done is not None:
+                try:
+                    request.on_done(request)
+                except Exception as e:
+                    logger.error(f"[DB Writer] Rückmeldung für {request.producer}/{request.op} fehlgeschlagen: {e}")
+
+
+class CheckpointManager:
+    """Hintergrund-Thread für WAL-Checkpoints (statt Checkpoint nach jedem Commit).
+
+    - WAL größer als checkpoint_wal_size_mb (höchstens journal_size_limit): PASSIVE,
+      blockiert weder Leser noch Schreiber.
+    - Keine Schreibaktivität seit checkpoint_idle_seconds: TRUNCATE, setzt die
+      WAL-Datei auf 0 Bytes zurück.
+    Aktivität wird an Größe/mtime der -wal-Datei erkannt und umfasst damit auch
+    andere Prozesse (GUI, Scanner). Solange der Manager läuft, ist der
+    Auto-Checkpoint der Hauptverbindung abgeschaltet.
+    """
+
+    def __init__(self, db, wal_size_mb=None, idle_seconds=None, poll_interval=None):
+        self.db = db
+        self.wal_path = db.path + "-wal"
+        wal_size = int((wal_size_mb or CONFIG.get('checkpoint_wal_size_mb', 16)) * 1024 * 1024)
+        # Vor Erreichen von journal_size_limit checkpointen
+        self.wal_size_threshold = min(wal_size, JOURNAL_SIZE_LIMIT) if JOURNAL_SIZE_LIMIT > 0 else wal_size
+        self.idle_seconds = idle_seconds if idle_seconds is not None else CONFIG.get('checkpoint_idle_seconds', 5)
+        self.poll_interval = poll_interval or CONFIG.get('checkpoint_poll_interval', 1.0)
+        self.metrics = {
+            'wal_size_bytes': 0, 'wal_size_max_bytes': 0,
+            'checkpoints_passive': 0, 'checkpoints_truncate': 0, 'checkpoints_busy': 0,
+            'last_duration_ms': 0.0, 'max_duration_ms': 0.0, 'total_duration_ms': 0.0,
+            'last_wal_pages': 0, 'last_checkpointed_pages': 0,
+        }
+        self._conn = None
+        self._last_wal_state = None
+        self._last_activity = time.monotonic()
+        self._truncated = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            # Eigene Verbindung: Checkpoints halten den DB-Lock nicht fest
+            self._conn = sqlite3.connect(self.db.path, check_same_thread=False, timeout=1.0)
+            self._conn.execute(f"PRAGMA journal_size_limit = {JOURNAL_SIZE_LIMIT}")
+            with self.db.lock:
+                self.db.conn.execute("PRAGMA wal_autocheckpoint = 0")
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="WALCheckpoint", daemon=True)
+            self._thread.start()
+            logger.info(f"[DB Checkpoint] Gestartet (Schwelle {self.wal_size_threshold / (1024 * 1024):.0f} MB, Leerlauf {self.idle_seconds}s)")
+        return self
+
+    def stop(self, timeout=10):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        # Abschließend WAL leeren und Auto-Checkpoint wieder aktivieren
+        self.checkpoint('TRUNCATE')
+        with self.db.lock:
+            self.db.conn.execute("PRAGMA wal_autocheckpoint = 1000")
+        self._conn.close()
+        self._conn = None
+        self.log_metrics()
+
+    def wal_size(self):
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def checkpoint(self, mode='PASSIVE'):
+        """Führt einen Checkpoint aus. Gibt True zurück, wenn alle Frames übertragen wurden."""
+        start = time.perf_counter()
+        try:
+            busy, wal_pages, checkpointed = self._conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"[DB Checkpoint] {mode} fehlgeschlagen: {e}")
+            self.metrics['checkpoints_busy'] += 1
+            return False
+        duration_ms = (time.perf_counter() - start) * 1000
+        metrics = self.metrics
+        metrics['checkpoints_' + mode.lower()] += 1
+        metrics['last_duration_ms'] = duration_ms
+        metrics['max_duration_ms'] = max(metrics['max_duration_ms'], duration_ms)
+        metrics['total_duration_ms'] += duration_ms
+        metrics['last_wal_pages'] = wal_pages
+        metrics['last_checkpointed_pages'] = checkpointed
+        if busy:
+            metrics['checkpoints_busy'] += 1
+        logger.debug(f"[DB Checkpoint] {mode}: {checkpointed}/{wal_pages} Seiten in {duration_ms:.1f} ms")
+        return not busy and checkpointed == wal_pages
+
+    def get_metrics(self):
+        metrics = dict(self.metrics)
+        metrics['wal_size_bytes'] = self.wal_size()
+        return metrics
+
+    def log_metrics(self):
+        m = self.get_metrics()
+        logger.info(
+            f"[DB Checkpoint] WAL {m['wal_size_bytes'] / (1024 * 1024):.1f} MB (max {m['wal_size_max_bytes'] / (1024 * 1024):.1f} MB), "
+            f"{m['checkpoints_passive']} PASSIVE / {m['checkpoints_truncate']} TRUNCATE / {m['checkpoints_busy']} busy, "
+            f"Dauer letzte {m['last_duration_ms']:.1f} ms, max {m['max_duration_ms']:.1f} ms"
+        )
+
+    def poll(self):
+        """Ein Durchlauf der Checkpoint-Strategie (vom Thread aufgerufen)."""
+        now = time.monotonic()
+        try:
+            st = os.stat(self.wal_path)
+            wal_state = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            wal_state = (0, 0)
+        wal_size = wal_state[0]
+        self.metrics['wal_size_bytes'] = wal_size
+        self.metrics['wal_size_max_bytes'] = max(self.metrics['wal_size_max_bytes'], wal_size)
+
+        # Jede Änderung an der WAL-Datei zählt als Schreibaktivität
+        changed = wal_state != self._last_wal_state
+        if changed:
+            self._last_wal_state = wal_state
+            self._last_activity = now
+            self._truncated = False
+
+        # Nach PASSIVE behält die Datei ihre Größe (wird wiederverwendet),
+        # daher nur bei neuer Aktivität erneut checkpointen
+        if changed and wal_size >= self.wal_size_threshold:
+            self.checkpoint('PASSIVE')
+        elif wal_size > 0 and not self._truncated and now - self._last_activity >= self.idle_seconds:
+            # Ruhephase: WAL vollständig übertragen und Datei kürzen
+            self._truncated = self.checkpoint('TRUNCATE')
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"[DB Checkpoint] Fehler: {e}")
+
+
+def get_write_queue(db=None):
+    """Gibt die (gestartete) Write-Queue der DB-Instanz zurück, eine pro Datenbankdatei."""
+    db = db or get_db_instance()
+    # Eigener Lock: stop() wartet auf den Writer-Thread, der den DB-Lock braucht
+    with _write_queue_lock:
+        writer = _write_queues.get(db.path)
+        if writer is not None and writer.db is not db:
+            writer.stop()
+            writer = None
+        if writer is None:
+            writer = _write_queues[db.path] = WriteQueue(db)
+        return writer.start()
+
+def stop_write_queues():
+    """Stoppt alle Write-Queues (committet ausstehende Operationen)."""
+    with _write_queue_lock:
+        writers = list(_write_queues.values())
+        _write_queues.clear()
+    for writer in writers:
+        writer.stop()
+
+def get_db_for_drive(drive_name):
+    """DB-Instanz, in die ein Laufwerk schreibt: Dateien.db oder dessen Shard."""
+    if DATABASE_LAYOUT == 'sharded':
+        from shard_manager import get_shard_manager
+        return get_shard_manager().get_shard(drive_name)
+    return get_db_instance()
+
 def get_db_instance(path=None):
     """Gibt eine globale, thread-sichere Singleton-Instanz des DBManagers zurück."""
     global _db_instance, _db_path
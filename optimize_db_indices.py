@@ -4,6 +4,7 @@ Optimiert die Datenbank-Indizes für schnellere Duplikat-Suche.
 WICHTIG: Einmalig ausführen nach dem Scan, um die Performance zu verbessern.
 """
 
+import argparse
 import sqlite3
 import time
 from models import get_db_instance
@@ -81,24 +82,32 @@ def create_optimized_indices():
     except sqlite3.Error as e:
         print(f"FEHLER bei ANALYZE: {e}")
     
+    # FTS5-Segmente nach großen Scans zusammenführen (schnellere MATCH-Abfragen)
+    try:
+        start_time = time.time()
+        db.cursor.execute("INSERT INTO files_fts (files_fts) VALUES ('optimize')")
+        db.cursor.execute("INSERT INTO directories_fts (directories_fts) VALUES ('optimize')")
+        db.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_trigram'")
+        if db.cursor.fetchone():
+            db.cursor.execute("INSERT INTO files_trigram (files_trigram) VALUES ('optimize')")
+        db.conn.commit()
+        print(f"Suchindex optimiert in {time.time() - start_time:.2f} Sekunden [OK]")
+    except sqlite3.Error as e:
+        print(f"Suchindex nicht optimiert: {e}")
+    
     # Zeige Statistiken
     print("\n" + "=" * 70)
     print("DATENBANKSTATISTIKEN")
     print("=" * 70)
     
-    # Dateien nach Laufwerk
-    db.cursor.execute("""
-        SELECT d.name, COUNT(f.id) as file_count
-        FROM drives d
-        LEFT JOIN directories dir ON dir.drive_id = d.id
-        LEFT JOIN files f ON f.directory_id = dir.id
-        GROUP BY d.id
-        ORDER BY file_count DESC
-    """)
-    
+    # Dateien nach Laufwerk (aus file_stats/drive_stats)
     print("\nDateien je Laufwerk:")
-    for row in db.cursor.fetchall():
-        print(f"  {row[0]}: {row[1]:,} Dateien")
+    for _, name, file_count, total_size, dir_count in sorted(db.get_drive_stats(), key=lambda r: -r[2]):
+        print(f"  {name}: {file_count:,} Dateien, {dir_count:,} Verzeichnisse, {total_size / (1024**3):.1f} GB")
+    
+    print("\nDateien je Kategorie:")
+    for category, file_count, total_size in db.get_category_stats():
+        print(f"  {category:12}: {file_count:>12,} Dateien, {total_size / (1024**3):>8.1f} GB")
     
     # Größte Duplikat-Kandidaten
     db.cursor.execute("""
@@ -125,5 +134,35 @@ def create_optimized_indices():
     print("OPTIMIERUNG ABGESCHLOSSEN!")
     print("=" * 70)
 
+def rebuild_stats():
+    """Berechnet alle Statistik-Tabellen neu (file_stats, drive_stats, directory_stats)."""
+    db = get_db_instance()
+    start_time = time.time()
+    print("Statistik-Tabellen werden neu berechnet...")
+    db.rebuild_global_stats()
+    db.rebuild_directory_stats()
+    db.conn.commit()
+    print(f"Fertig in {time.time() - start_time:.2f} Sekunden [OK]")
+
+def rebuild_search_index():
+    """Baut den FTS5-Suchindex (files_fts, directories_fts) neu auf."""
+    db = get_db_instance()
+    start_time = time.time()
+    print("Suchindex wird neu aufgebaut...")
+    db.rebuild_search_index()
+    db.conn.commit()
+    print(f"Fertig in {time.time() - start_time:.2f} Sekunden [OK]")
+
 if __name__ == "__main__":
-    create_optimized_indices()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Datenbank-Indizes und Statistiken optimieren")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="Nur die Statistik-Tabellen neu berechnen (z.B. nach manuellen Änderungen)")
+    parser.add_argument("--rebuild-search", action="store_true",
+                        help="Nur den FTS5-Suchindex (inkl. Trigram) neu aufbauen")
+    args = parser.parse_args()
+    if args.rebuild_stats:
+        rebuild_stats()
+    elif args.rebuild_search:
+        rebuild_search_index()
+    else:
+        create_optimized_indices()
\ No newline at end of file
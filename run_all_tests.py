@@ -549,6 +549,1986 @@ def test_watchdog_events():
         models.DB_PATH = original_path
         shutil.rmtree(temp_dir, ignore_errors=True)
 
+def test_compact_directory_storage():
+    """Test 9: Compact directory storage with in-memory tree"""
+    print("\n[TEST 9] Testing compact directory storage...")
+    
+    temp_dir = tempfile.mkdtemp()
+    test_dir = os.path.join(temp_dir, "compact_test")
+    db_path = os.path.join(temp_dir, "test.db")
+    os.makedirs(os.path.join(test_dir, "a", "b"))
+    
+    original_path = models.DB_PATH
+    original_storage = models.DIRECTORY_STORAGE
+    try:
+        with open(os.path.join(test_dir, "a", "b", "deep.txt"), 'w') as f:
+            f.write("deep")
+        
+        models.DB_PATH = db_path
+        models.DIRECTORY_STORAGE = 'compact'
+        models._db_instance = None
+        
+        scanner_core.run_scan(test_dir, force_restart=True)
+        db = models.get_db_instance()
+        cursor = db.conn.cursor()
+        
+        if not db.compact_dirs:
+            print("  [FAIL] Compact schema not created")
+            return False
+        
+        cursor.execute("SELECT COUNT(*) FROM directories WHERE full_path IS NOT NULL")
+        if cursor.fetchone()[0] != 0:
+            print("  [FAIL] full_path stored in compact mode")
+            return False
+        
+        # Pfade aus View und Baum müssen übereinstimmen
+        cursor.execute("SELECT id, drive_id, full_path FROM directory_paths")
+        rows = cursor.fetchall()
+        deep_path = os.path.normpath(os.path.join(test_dir, "a", "b")).replace('\\', '/')
+        if deep_path not in {row[2] for row in rows}:
+            print(f"  [FAIL] directory_paths does not contain {deep_path}")
+            return False
+        for dir_id, drive_id, full_path in rows:
+            if db.get_directory_path(dir_id) != full_path or db.find_directory_id(drive_id, full_path) != dir_id:
+                print(f"  [FAIL] Tree mismatch for {full_path}")
+                return False
+        
+        cursor.execute("SELECT COUNT(*) FROM files_legacy WHERE file_path LIKE ?", ('%/a/b/deep%',))
+        if cursor.fetchone()[0] != 1:
+            print("  [FAIL] files_legacy does not resolve compact paths")
+            return False
+        
+        # Leser-Filter ohne full_path: Pfad-LIKE der Suche und exakter Ordner
+        from db_paths import directory_filter
+        from db_search import directory_condition
+        count_sql = "SELECT COUNT(*) FROM files f JOIN directories d ON f.directory_id = d.id WHERE "
+        like_sql, like_params = directory_condition("a/b", "d.id")
+        exact_sql, exact_params = directory_filter(db.conn, deep_path, "d")
+        if cursor.execute(count_sql + like_sql, like_params).fetchone()[0] != 1 or \
+                cursor.execute(count_sql + exact_sql, exact_params).fetchone()[0] != 1:
+            print("  [FAIL] Path filters do not resolve compact paths")
+            return False
+        
+        # Löschen entfernt Unterbaum in DB und Baum
+        drive_id = rows[0][1]
+        a_path = os.path.dirname(deep_path)
+        db.delete_directory(drive_id, a_path)
+        db.conn.commit()
+        if db.find_directory_id(drive_id, deep_path) is not None:
+            print("  [FAIL] Subtree still in tree after delete")
+            return False
+        cursor.execute("SELECT COUNT(*) FROM files")
+        if cursor.fetchone()[0] != 0:
+            print("  [FAIL] Files not removed by cascade")
+            return False
+        
+        print("  [OK] Compact storage resolves paths via tree and view")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        cleanup_test_db()
+        models.DB_PATH = original_path
+        models.DIRECTORY_STORAGE = original_storage
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_binary_hash_storage():
+    """Test 10: Binary hash storage and migration"""
+    print("\n[TEST 10] Testing binary hash storage...")
+    
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    hash_hex = "ab" * 32
+    
+    original_path = models.DB_PATH
+    original_storage = models.HASH_STORAGE
+    try:
+        models.DB_PATH = db_path
+        models.HASH_STORAGE = 'text'
+        models._db_instance = None
+        
+        # Bestehende DB mit Text-Hashes
+        db = models.get_db_instance()
+        drive_id = db.get_or_create_drive("T:/")
+        dir_id = db.get_or_create_directory_optimized(drive_id, "T:/data")
+        db.insert_file_optimized(dir_id, "old.bin", 10, hash_hex)
+        db.conn.commit()
+        db.conn.close()
+        
+        # Neustart im BLOB-Modus migriert vorhandene Hashes
+        models.HASH_STORAGE = 'blob'
+        models._db_instance = None
+        db = models.get_db_instance()
+        db.insert_file_optimized(dir_id, "new.bin", 10, hash_hex)
+        db.conn.commit()
+        
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM files WHERE typeof(hash) = 'blob' AND length(hash) = 32")
+        if cursor.fetchone()[0] != 2:
+            print("  [FAIL] Hashes not stored as 32-byte BLOB")
+            return False
+        
+        cursor.execute("SELECT DISTINCT hash FROM files_legacy")
+        if [row[0] for row in cursor.fetchall()] != [hash_hex]:
+            print("  [FAIL] files_legacy does not show hex hashes")
+            return False
+        
+        print("  [OK] Hashes migrated to BLOB and shown as hex")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        cleanup_test_db()
+        models.DB_PATH = original_path
+        models.HASH_STORAGE = original_storage
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_file_timestamps():
+    """Test 11: Real file timestamps stored as epoch nanoseconds"""
+    print("\n[TEST 11] Testing file timestamps...")
+    
+    temp_dir = tempfile.mkdtemp()
+    test_dir = os.path.join(temp_dir, "mtime_test")
+    db_path = os.path.join(temp_dir, "test.db")
+    os.makedirs(test_dir)
+    
+    original_path = models.DB_PATH
+    try:
+        old_file = os.path.join(test_dir, "old.txt")
+        with open(old_file, 'w') as f:
+            f.write("old")
+        old_mtime = time.time() - 10 * 86400
+        os.utime(old_file, (old_mtime, old_mtime))
+        with open(os.path.join(test_dir, "new.txt"), 'w') as f:
+            f.write("new")
+        
+        models.DB_PATH = db_path
+        models._db_instance = None
+        scanner_core.run_scan(test_dir, force_restart=True)
+        
+        db = models.get_db_instance()
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT mtime_ns FROM files WHERE filename = 'old'")
+        row = cursor.fetchone()
+        if not row or row[0] != os.stat(old_file).st_mtime_ns:
+            print(f"  [FAIL] Wrong mtime_ns stored: {row}")
+            return False
+        
+        # Bereichsabfrage rein in SQL
+        cutoff_ns = int((time.time() - 86400) * 1_000_000_000)
+        cursor.execute("SELECT filename FROM files WHERE mtime_ns >= ?", (cutoff_ns,))
+        if [r[0] for r in cursor.fetchall()] != ['new']:
+            print("  [FAIL] Date range query returned wrong files")
+            return False
+        
+        print("  [OK] mtime_ns/ctime_ns stored and queryable")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        cleanup_test_db()
+        models.DB_PATH = original_path
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_schema_migrations():
+    """Test 12: Versioned schema migrations via PRAGMA user_version"""
+    print("\n[TEST 12] Testing schema migrations...")
+    
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    try:
+        # DB ohne user_version und ohne Zeitstempel-Spalten (Stand vor der Registry)
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE files (
+                id INTEGER PRIMARY KEY, directory_id INTEGER NOT NULL, filename TEXT NOT NULL,
+                extension_id INTEGER, size INTEGER, hash TEXT, created_date TEXT,
+                modified_date TEXT, attributes INTEGER DEFAULT 0
+            )
+        """)
+        conn.commit()
+        conn.close()
+        
+        db = models.DBManager(db_path)
+        version = db.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != models.SCHEMA_VERSION:
+            print(f"  [FAIL] Expected version {models.SCHEMA_VERSION}, got {version}")
+            return False
+        columns = {row[1] for row in db.conn.execute("PRAGMA table_info(files)")}
+        if not {'mtime_ns', 'ctime_ns'} <= columns:
+            print("  [FAIL] Timestamp columns not added by migration")
+            return False
+        db.close()
+        
+        # Aktuelles Schema: Start führt keine Migration mehr aus
+        def fail_migration(self):
+            raise AssertionError("migration ran on current schema")
+        original_migration = models.DBManager._migration_base_schema
+        models.DBManager._migration_base_schema = fail_migration
+        try:
+            db = models.DBManager(db_path)
+            db.close()
+        finally:
+            models.DBManager._migration_base_schema = original_migration
+        
+        print("  [OK] Migrations applied once and skipped when current")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_write_queue():
+    """Test 13: Single-writer queue with group commit"""
+    print("\n[TEST 13] Testing write queue...")
+    
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    try:
+        db = models.DBManager(db_path)
+        drive_id = db.get_or_create_drive("C:/")
+        writer = models.WriteQueue(db, max_depth=10, max_batch=50)
+        
+        # Vor dem Start einreihen: alles landet in einer Transaktion
+        for i in range(5):
+            writer.submit('scanner', 'upsert_file', drive_id, f"C:/data/file{i}.txt", i, None)
+        writer.submit('watchdog', 'delete_file', drive_id, "C:/data/file0.txt")
+        writer.submit('watchdog', 'move_file', drive_id, "C:/data/missing.txt", "C:/data/x.txt")
+        writer.start()
+        if not writer.flush(timeout=10):
+            print("  [FAIL] Flush timed out")
+            return False
+        
+        count = db.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        if count != 4:
+            print(f"  [FAIL] Expected 4 files, got {count}")
+            return False
+        if writer.commits != 1:
+            print(f"  [FAIL] Expected 1 group commit, got {writer.commits}")
+            return False
+        
+        # Fehlerhafte Operation wird isoliert, der Rest committet
+        bad = writer.submit('integrity', 'update_files', [(1, 'not-hex', None, None)])
+        good = writer.submit('integrity', 'delete_files', [1])
+        writer.flush(timeout=10)
+        if bad.error is None or good.error is not None:
+            print("  [FAIL] Failed operation not isolated in savepoint")
+            return False
+        try:
+            bad.wait(1)
+            print("  [FAIL] wait() did not raise the operation's error")
+            return False
+        except ValueError:
+            pass
+        
+        # Einfügefehler im Scanner-Batch: Savepoint verwirft auch das angelegte Verzeichnis
+        done = []
+        broken = writer.submit('scanner', 'insert_directory_files', drive_id, "C:/broken",
+                               [("a.txt", object(), None, None, None)], on_done=done.append)
+        writer.flush(timeout=10)
+        if broken.error is None or done != [broken] or db.find_directory_id(drive_id, "C:/broken") is not None:
+            print(f"  [FAIL] Insert failure not propagated: {broken.error}, {done}")
+            return False
+        
+        stats = writer.get_stats()
+        if stats['scanner']['completed'] != 6 or stats['scanner']['errors'] != 1 or stats['integrity']['errors'] != 1:
+            print(f"  [FAIL] Unexpected stats: {stats}")
+            return False
+        writer.stop()
+        db.close()
+        
+        print("  [OK] Operations group-committed with per-producer stats")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_checkpoint_manager():
+    """Test 14: Background WAL checkpoints by size and idle time"""
+    print("\n[TEST 14] Testing WAL checkpoint manager...")
+    
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    try:
+        db = models.DBManager(db_path)
+        checkpointer = models.CheckpointManager(db, wal_size_mb=0.05, idle_seconds=0.2, poll_interval=0.05)
+        checkpointer.start()
+        
+        # Schreiblast: Auto-Checkpoint ist aus, WAL wächst bis zur Schwelle
+        drive_id = db.get_or_create_drive("C:/")
+        dir_id = db.get_or_create_directory(drive_id, "C:/data")
+        for i in range(20):
+            db.batch_insert_files([(dir_id, f"file{i}_{j}.txt", j, None) for j in range(100)])
+            db.conn.commit()
+        
+        def wait_for(condition):
+            # Nur der Hintergrund-Thread pollt; auf dessen Zähler warten statt auf die Dateigröße
+            deadline = time.time() + 5
+            while not condition() and time.time() < deadline:
+                time.sleep(0.05)
+            return condition()
+        
+        if not wait_for(lambda: checkpointer.metrics['checkpoints_passive'] > 0):
+            print("  [FAIL] No PASSIVE checkpoint above size threshold")
+            return False
+        
+        # Ruhephase: TRUNCATE setzt die WAL-Datei auf 0 zurück
+        wait_for(lambda: checkpointer.metrics['checkpoints_truncate'] > 0 and checkpointer.wal_size() == 0)
+        metrics = checkpointer.get_metrics()
+        if metrics['checkpoints_truncate'] == 0 or metrics['wal_size_bytes'] != 0:
+            print(f"  [FAIL] WAL not truncated when idle: {metrics}")
+            return False
+        checkpointer.stop()
+        db.close()
+        
+        print("  [OK] WAL checkpointed by size and truncated when idle")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_directory_stats():
+    """Test 15: Materialized per-directory rollups"""
+    print("\n[TEST 15] Testing directory stats...")
+    
+    temp_dir = tempfile.mkdtemp()
+    test_dir = os.path.join(temp_dir, "stats_test")
+    db_path = os.path.join(temp_dir, "test.db")
+    os.makedirs(os.path.join(test_dir, "sub", "deep"))
+    original_path = models.DB_PATH
+    
+    try:
+        for rel, size in [("a.txt", 10), ("sub/b.txt", 20), ("sub/deep/c.txt", 30)]:
+            with open(os.path.join(test_dir, rel), 'wb') as f:
+                f.write(b"x" * size)
+        
+        models.DB_PATH = db_path
+        models._db_instance = None
+        # Der Scan bucht die Rollups pro Verzeichnis, ohne Neuberechnung am Ende
+        models.get_db_instance()
+        rebuilds = []
+        original_rebuild = models.DBManager.rebuild_directory_stats
+        models.DBManager.rebuild_directory_stats = lambda self, *args: rebuilds.append(args)
+        try:
+            scanner_core.run_scan(test_dir, force_restart=True)
+            scanner_core.run_scan(test_dir, force_restart=True)
+        finally:
+            models.DBManager.rebuild_directory_stats = original_rebuild
+        if rebuilds:
+            print(f"  [FAIL] Scan rebuilt directory stats: {rebuilds}")
+            return False
+        db = models.get_db_instance()
+        drive_id = db.get_or_create_drive("/")
+        
+        usage = db.get_directory_usage(drive_id, test_dir)
+        if usage != (1, 10, 3, 60):
+            print(f"  [FAIL] Wrong rollup after scan: {usage}")
+            return False
+        scanned = db.conn.execute("SELECT * FROM directory_stats ORDER BY directory_id").fetchall()
+        db.rebuild_directory_stats()
+        if scanned != db.conn.execute("SELECT * FROM directory_stats ORDER BY directory_id").fetchall():
+            print("  [FAIL] Scan rollups differ from rebuild")
+            return False
+        
+        # Inkrementelle Änderungen wie vom Watchdog
+        sub = os.path.join(test_dir, "sub")
+        deep = os.path.join(sub, "deep")
+        db.upsert_file(drive_id, os.path.join(deep, "new.txt"), 100, None)
+        db.upsert_file(drive_id, os.path.join(test_dir, "a.txt"), 15, None)
+        db.move_file(drive_id, os.path.join(sub, "b.txt"), os.path.join(test_dir, "b.txt"))
+        db.delete_file(drive_id, os.path.join(deep, "c.txt"))
+        incremental = db.conn.execute(
+            "SELECT * FROM directory_stats ORDER BY directory_id").fetchall()
+        
+        db.rebuild_directory_stats()
+        rebuilt = db.conn.execute(
+            "SELECT * FROM directory_stats ORDER BY directory_id").fetchall()
+        if incremental != rebuilt:
+            print(f"  [FAIL] Incremental {incremental} != rebuilt {rebuilt}")
+            return False
+        
+        db.delete_directory(drive_id, deep)
+        usage = db.get_directory_usage(drive_id, test_dir)
+        if usage != (2, 35, 2, 35):
+            print(f"  [FAIL] Wrong rollup after directory delete: {usage}")
+            return False
+        db.conn.commit()
+        
+        print("  [OK] Rollups built by scan and maintained incrementally")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        models.DB_PATH = original_path
+        models._db_instance = None
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_global_stats():
+    """Test 16: Trigger-maintained drive/extension/category stats"""
+    print("\n[TEST 16] Testing global stats...")
+    
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    try:
+        db = models.DBManager(db_path)
+        c_id = db.get_or_create_drive("C:/")
+        d_id = db.get_or_create_drive("D:/")
+        docs = db.get_or_create_directory(c_id, "C:/docs")
+        sub = db.get_or_create_directory(c_id, "C:/docs/sub")
+        other = db.get_or_create_directory(d_id, "D:/other")
+        db.batch_insert_files([
+            (docs, "a.txt", 10, None), (docs, "b.pdf", 20, None),
+            (sub, "c.txt", 30, None), (other, "d.jpg", 40, None),
+        ])
+        db.conn.execute("UPDATE files SET size = 15 WHERE filename = 'a'")
+        db.conn.execute("UPDATE files SET directory_id = ? WHERE filename = 'b'", (other,))
+        db.conn.execute("DELETE FROM files WHERE filename = 'd'")
+        db.conn.execute("DELETE FROM directories WHERE id = ?", (sub,))  # CASCADE
+        db.conn.commit()
+        
+        def snapshot():
+            return (db.get_drive_stats(), db.get_extension_stats(), db.get_category_stats(),
+                    db.conn.execute("SELECT * FROM file_stats WHERE file_count != 0 ORDER BY 1, 2").fetchall())
+        
+        maintained = snapshot()
+        if maintained[0] != [(c_id, "C:/", 1, 15, 1), (d_id, "D:/", 1, 20, 1)]:
+            print(f"  [FAIL] Wrong drive stats: {maintained[0]}")
+            return False
+        db.rebuild_global_stats()
+        if snapshot() != maintained:
+            print(f"  [FAIL] Triggers diverged from rebuild: {maintained} vs {snapshot()}")
+            return False
+        
+        db.conn.execute("DELETE FROM drives WHERE id = ?", (d_id,))
+        db.conn.commit()
+        if db.conn.execute("SELECT COUNT(*) FROM file_stats WHERE drive_id = ?", (d_id,)).fetchone()[0]:
+            print("  [FAIL] Stats of deleted drive not removed")
+            return False
+        db.close()
+        
+        print("  [OK] Stats kept exact by triggers and match rebuild")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_subtree_queries():
+    """Test 17: Index-friendly subtree filters instead of LIKE 'prefix%'"""
+    print("\n[TEST 17] Testing subtree queries...")
+    
+    import db_paths
+    temp_dir = tempfile.mkdtemp()
+    original_storage = models.DIRECTORY_STORAGE
+    
+    try:
+        paths = ["/data", "/data/100%_x", "/data/100%_x/sub", "/data/a_b",
+                 "/data.bak", "/data0", "/database", "/other"]
+        expected = {"/data", "/data/100%_x", "/data/100%_x/sub", "/data/a_b"}
+        
+        for storage in ("full", "compact"):
+            models.DIRECTORY_STORAGE = storage
+            db = models.DBManager(os.path.join(temp_dir, f"{storage}.db"))
+            drive_id = db.get_or_create_drive("/")
+            for path in paths:
+                db.get_or_create_directory(drive_id, path)
+            db.conn.commit()
+            
+            for query_path in ("/data", "/data/", "/data//"):
+                condition, params = db_paths.subtree_filter(db.conn, query_path, "d")
+                found = {row[0] for row in db.conn.execute(
+                    f"SELECT d.full_path FROM directory_paths d WHERE {condition}", params)}
+                if found != expected:
+                    print(f"  [FAIL] {storage}: subtree of {query_path!r} = {sorted(found)}")
+                    return False
+            
+            condition, params = db_paths.subtree_filter(db.conn, "/data/100%_x", "d")
+            found = {row[0] for row in db.conn.execute(
+                f"SELECT d.full_path FROM directory_paths d WHERE {condition}", params)}
+            if found != {"/data/100%_x", "/data/100%_x/sub"}:
+                print(f"  [FAIL] {storage}: wildcard characters not literal: {sorted(found)}")
+                return False
+            
+            condition, params = db_paths.subtree_filter(db.conn, "/", "d")
+            count = db.conn.execute(
+                f"SELECT COUNT(*) FROM directory_paths d WHERE {condition}", params).fetchone()[0]
+            total = db.conn.execute("SELECT COUNT(*) FROM directory_paths").fetchone()[0]
+            if count != total:
+                print(f"  [FAIL] {storage}: root subtree has {count} of {total} directories")
+                return False
+            
+            if storage == "full":
+                condition, params = db_paths.subtree_condition("/data", "d.full_path")
+                plan = " ".join(row[3] for row in db.conn.execute(
+                    f"EXPLAIN QUERY PLAN SELECT d.id FROM directories d WHERE {condition}", params))
+                if "idx_directories_full_path_nocase" not in plan or "SCAN" in plan:
+                    print(f"  [FAIL] Subtree filter does not use the path index: {plan}")
+                    return False
+            db.close()
+        
+        print("  [OK] Range/CTE subtree filters exact and index-backed")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        models.DIRECTORY_STORAGE = original_storage
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_search_index():
+    """Test 18: FTS5 filename/directory index kept in sync by triggers"""
+    print("\n[TEST 18] Testing search index...")
+    
+    import db_search
+    temp_dir = tempfile.mkdtemp()
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"))
+        drive_id = db.get_or_create_drive("C:/")
+        projekte = db.get_or_create_directory(drive_id, "C:/Projekte")
+        alt = db.get_or_create_directory(drive_id, "C:/Projekte/Alt")
+        other = db.get_or_create_directory(drive_id, "C:/Sonstiges")
+        db.batch_insert_files([
+            (projekte, "Bericht_2020", 10, None), (projekte, "bericht-final.pdf", 20, None),
+            (alt, "Übersicht.txt", 30, None), (other, "urlaub.jpg", 40, None),
+        ])
+        db.upsert_file(drive_id, "C:/Sonstiges/Bericht Kopie.docx", 50, None)
+        db.move_file(drive_id, "C:/Sonstiges/urlaub.jpg", "C:/Projekte/Alt/urlaub2020.jpg")
+        db.delete_file(drive_id, "C:/Projekte/Alt/Übersicht.txt")
+        db.conn.commit()
+        
+        def names(sql, params):
+            return sorted(row[0] for row in db.conn.execute(
+                f"SELECT files.filename FROM files JOIN directories ON directories.id = files.directory_id "
+                f"WHERE {sql}", params))
+        
+        def search():
+            return (names(*db_search.filename_condition("bericht")),
+                    names(*db_search.filename_condition("bericht.pdf")),
+                    names(*db_search.filename_condition("urlaub*")),
+                    names(*db_search.filename_condition("ubersicht")),
+                    names(*db_search.directory_condition("projekte")),
+                    names(*db_search.filename_condition("bericht", negate=True)))
+        
+        maintained = search()
+        expected = (["Bericht Kopie", "Bericht_2020", "bericht-final"], ["bericht-final"],
+                    ["urlaub2020"], [],
+                    ["Bericht_2020", "bericht-final", "urlaub2020"], ["urlaub2020"])
+        if maintained != expected:
+            print(f"  [FAIL] Wrong search results: {maintained}")
+            return False
+        
+        # Mehrteilige Pfade und Teilstrings bleiben wie beim alten full_path LIKE
+        for term, mode, expected_names in (
+                ("projekte/alt", 'fts', ["urlaub2020"]), ("Projekte\\Alt", 'fts', ["urlaub2020"]),
+                ("C:/Projekte", 'fts', ["Bericht_2020", "bericht-final", "urlaub2020"]),
+                ("jekt", 'trigram', ["Bericht_2020", "bericht-final", "urlaub2020"]),
+                ("onstig", 'trigram', ["Bericht Kopie"]), ("jekte/a*", 'trigram', ["urlaub2020"])):
+            found = names(*db_search.directory_condition(term, "directories.id", mode))
+            if found != expected_names:
+                print(f"  [FAIL] Path filter {term!r} ({mode}): {found}")
+                return False
+        
+        db.delete_directory(drive_id, "C:/Projekte/Alt")
+        db.conn.commit()
+        if names(*db_search.filename_condition("urlaub")) or names(*db_search.directory_condition("alt")):
+            print("  [FAIL] Index not cleaned up after directory delete")
+            return False
+        maintained = search()
+        db.rebuild_search_index()
+        if search() != maintained:
+            print(f"  [FAIL] Triggers diverged from rebuild: {maintained} vs {search()}")
+            return False
+        
+        sql, params = db_search.filename_condition("bericht")
+        plan = [row[3] for row in db.conn.execute(f"EXPLAIN QUERY PLAN SELECT files.id FROM files WHERE {sql}", params)]
+        if "SCAN files" in plan:
+            print(f"  [FAIL] Name search scans files: {plan}")
+            return False
+        db.close()
+        
+        print("  [OK] FTS5 index in sync and used for name/path search")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_trigram_index():
+    """Test 19: Trigram substring search matches the old LIKE path"""
+    print("\n[TEST 19] Testing trigram substring search...")
+    
+    import db_search
+    temp_dir = tempfile.mkdtemp()
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"))
+        if db_search.search_mode(db.conn) != 'trigram':
+            print("  [FAIL] Trigram index not created")
+            return False
+        drive_id = db.get_or_create_drive("C:/")
+        docs = db.get_or_create_directory(drive_id, "C:/docs")
+        db.batch_insert_files([
+            (docs, "plan_v2fin.pdf", 1, None), (docs, "PLAN_V2FINAL.docx", 2, None),
+            (docs, "v2fin", 3, None), (docs, "notes.txt", 4, None), (docs, "Makefile", 5, None),
+        ])
+        db.upsert_file(drive_id, "C:/docs/entwurf_v2fin_alt.odt", 6, None)
+        db.conn.execute("UPDATE files SET filename = 'notes_v2fin' WHERE filename = 'notes'")
+        db.delete_file(drive_id, "C:/docs/v2fin")
+        db.conn.commit()
+        
+        full_name = ("files.filename || CASE WHEN e.name IS NULL OR e.name = '[none]' "
+                     "THEN '' ELSE e.name END")
+        for term in ("_v2fin", "v2fin", "n.pd", "2fin*.odt", "akef", "xyz"):
+            sql, params = db_search.name_condition('trigram', term)
+            found = sorted(row[0] for row in db.conn.execute(
+                f"SELECT files.id FROM files WHERE {sql}", params))
+            pattern = '%' + term.replace('*', '%') + '%'
+            expected = sorted(row[0] for row in db.conn.execute(
+                f"SELECT files.id FROM files LEFT JOIN extensions e ON e.id = files.extension_id "
+                f"WHERE ({full_name}) LIKE ?", (pattern,)))
+            if found != expected or (term == "_v2fin" and len(found) != 4):
+                print(f"  [FAIL] {term!r}: trigram {found} != LIKE {expected}")
+                return False
+        
+        sql, params = db_search.name_condition('trigram', "_v2fin")
+        plan = [row[3] for row in db.conn.execute(f"EXPLAIN QUERY PLAN SELECT files.id FROM files WHERE {sql}", params)]
+        if "SCAN files" in plan:
+            print(f"  [FAIL] Substring search scans files: {plan}")
+            return False
+        db.close()
+        
+        # Einstellung wird bei jedem Start abgeglichen, nicht nur in der Migration v7
+        db_path = os.path.join(temp_dir, "test.db")
+        original = models.CONFIG.get('trigram_index', True)
+        models.CONFIG['trigram_index'] = False
+        try:
+            db = models.DBManager(db_path)
+            disabled = db_search.search_mode(db.conn)
+            db.close()
+        finally:
+            models.CONFIG['trigram_index'] = original
+        db = models.DBManager(db_path)
+        sql, params = db_search.name_condition(db_search.search_mode(db.conn), "_v2fin")
+        found = db.conn.execute(f"SELECT COUNT(*) FROM files WHERE {sql}", params).fetchone()[0]
+        db.close()
+        if disabled != 'fts' or found != 4:
+            print(f"  [FAIL] trigram_index option not applied on start: {disabled}, {found} matches")
+            return False
+        
+        print("  [OK] Infix search via trigram index equals LIKE results")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_read_snapshot():
+    """Test 20: Throttled backup snapshot opened immutable by analytics tools"""
+    print("\n[TEST 20] Testing read snapshot...")
+    
+    import threading
+    import db_snapshot
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    try:
+        db = models.DBManager(db_path)
+        drive_id = db.get_or_create_drive("C:/")
+        docs = db.get_or_create_directory(drive_id, "C:/docs")
+        db.batch_insert_files([(docs, f"file{i}.txt", i, None) for i in range(2000)])
+        db.conn.commit()
+        
+        # Gleichzeitige Schreibzugriffe dürfen den schrittweisen Backup nicht neu starten
+        stop = threading.Event()
+        def writer():
+            conn = sqlite3.connect(db_path, timeout=30)
+            i = 0
+            while not stop.is_set():
+                conn.execute("INSERT INTO drives (name) VALUES (?)", (f"X{i}:/",))
+                conn.commit()
+                i += 1
+            conn.close()
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            info = db_snapshot.refresh_snapshot(db_path, pages_per_step=4, step_sleep=0.001)
+        finally:
+            stop.set()
+            thread.join()
+        pages = db.conn.execute("PRAGMA page_count").fetchone()[0]
+        if info['backup_steps'] > pages // 4 + 2:
+            print(f"  [FAIL] Backup restarted: {info['backup_steps']} steps for {pages} pages")
+            return False
+        if not info['stale']:
+            print("  [FAIL] Snapshot not marked stale after concurrent writes")
+            return False
+        
+        conn, info = db_snapshot.connect_snapshot(db_path)
+        if info is None or conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] != 2000:
+            print("  [FAIL] Snapshot not opened or incomplete")
+            return False
+        # Offene Lesetransaktion auf dem Snapshot blockiert keinen Checkpoint der Live-DB
+        cursor = conn.execute("SELECT id FROM files")
+        cursor.fetchone()
+        db.batch_insert_files([(docs, "late.txt", 1, None)])
+        db.conn.commit()
+        busy = db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]
+        conn.close()
+        if busy:
+            print("  [FAIL] Checkpoint blocked while snapshot is read")
+            return False
+        db.close()
+        
+        print("  [OK] Snapshot consistent, throttled and independent of the WAL")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_shard_layout():
+    """Test 21: Per-drive shards with own locks and ATTACH-based federated views"""
+    print("\n[TEST 21] Testing shard layout...")
+    
+    import shard_manager
+    temp_dir = tempfile.mkdtemp()
+    manager = None
+    
+    try:
+        manager = shard_manager.ShardManager(os.path.join(temp_dir, "shards"))
+        for drive, count in (("C:/", 30), ("D:/", 20)):
+            db = manager.get_shard(drive)
+            drive_id = db.get_or_create_drive(drive)
+            dir_id = db.get_or_create_directory(drive_id, f"{drive}data")
+            db.batch_insert_files([(dir_id, f"file{i}.txt", 100, None) for i in range(count)])
+            db.conn.commit()
+        c_db, d_db = manager.get_shard("C:/"), manager.get_shard("D:/")
+        if c_db.path == d_db.path or c_db.lock is d_db.lock:
+            print("  [FAIL] Shards share a database file or writer lock")
+            return False
+        
+        conn = manager.federated_connection()
+        total = conn.execute("SELECT COUNT(*) FROM all_files").fetchone()[0]
+        per_drive = dict(conn.execute(
+            "SELECT d.name, SUM(s.file_count) FROM all_file_stats s "
+            "JOIN all_drives d ON d.shard_id = s.shard_id AND d.id = s.drive_id GROUP BY d.name").fetchall())
+        conn.close()
+        if total != 50 or per_drive != {"C:/": 30, "D:/": 20}:
+            print(f"  [FAIL] Federated views wrong: {total}, {per_drive}")
+            return False
+        
+        # Einzel-DB aufteilen: IDs und Anzahlen bleiben erhalten
+        source_path = os.path.join(temp_dir, "single.db")
+        source = models.DBManager(source_path)
+        for drive in ("E:/", "F:/"):
+            drive_id = source.get_or_create_drive(drive)
+            dir_id = source.get_or_create_directory(drive_id, f"{drive}x/y")
+            source.batch_insert_files([(dir_id, f"{drive[0]}{i}.bin", 1, f"{i:032x}") for i in range(10)])
+        source.conn.commit()
+        source.close()
+        # Quelle mit Text-Hashes, Shards im BLOB-Format: Hashes werden beim Kopieren umgewandelt
+        original_storage = models.HASH_STORAGE
+        models.HASH_STORAGE = 'blob'
+        try:
+            shard_manager.split_database(source_path, manager)
+        finally:
+            models.HASH_STORAGE = original_storage
+        check = sqlite3.connect(manager.shard_path("E:/"))
+        hash_types = check.execute("SELECT DISTINCT typeof(hash) FROM files").fetchall()
+        check.close()
+        if hash_types != [('blob',)]:
+            print(f"  [FAIL] Split shard has mixed hash storage: {hash_types}")
+            return False
+        e_db = manager.get_shard("E:/")
+        if e_db.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] != 10 or \
+                e_db.conn.execute("SELECT COUNT(*) FROM drives").fetchone()[0] != 1:
+            print("  [FAIL] Split shard incomplete or contains other drives")
+            return False
+        # Verschoben, nicht kopiert: Quelle leer, zweiter Lauf ändert nichts
+        check = sqlite3.connect(source_path)
+        left = check.execute("SELECT (SELECT COUNT(*) FROM drives), (SELECT COUNT(*) FROM directories), "
+                             "(SELECT COUNT(*) FROM files)").fetchone()
+        check.close()
+        if left != (0, 0, 0):
+            print(f"  [FAIL] Split left migrated rows in the source: {left}")
+            return False
+        shard_manager.split_database(source_path, manager)
+        if e_db.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] != 10:
+            print("  [FAIL] Second split changed the shards")
+            return False
+        
+        # Laufwerk entfernen = Datei löschen
+        d_path = d_db.path
+        if not manager.drop_drive("D:/") or os.path.exists(d_path):
+            print("  [FAIL] Shard file not removed")
+            return False
+        if "D:/" in dict(manager.drives()):
+            print("  [FAIL] Dropped drive still in catalog")
+            return False
+        
+        print("  [OK] Shards isolated, federated queries, split moves drives, drop works")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        if manager:
+            manager.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_query_library():
+    """Test 22: Shared read queries (filescan_query) with central path reconstruction"""
+    print("\n[TEST 22] Testing shared query library...")
+    
+    import filescan_query as fq
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    try:
+        db = models.DBManager(db_path)
+        drive_id = db.get_or_create_drive("C:/")
+        root = db.get_or_create_directory(drive_id, "C:/")
+        docs = db.get_or_create_directory(drive_id, "C:/docs")
+        backup = db.get_or_create_directory(drive_id, "C:/backup")
+        db.batch_insert_files([
+            (root, "README", 10, None),
+            (docs, "bericht_2020.pdf", 500, "aa" * 32),
+            (backup, "bericht_2020.pdf", 500, "aa" * 32),
+            (docs, "notizen.txt", 20, None),
+        ])
+        db.rebuild_directory_stats(drive_id)
+        db.conn.commit()
+        db.close()
+        
+        conn, info = fq.connect_read(db_path)
+        if info is not None or conn.execute("PRAGMA cache_size").fetchone()[0] != -fq.READ_CACHE_MB * 1024:
+            print("  [FAIL] Read connection not tuned")
+            return False
+        conn.execute("CREATE TEMP TABLE scratch (x)")  # Werkzeuge brauchen TEMP-Tabellen
+        
+        paths = sorted(row[0] for row in fq.iter_rows(conn, *fq.export_query(conn), size=1))
+        expected = ["C:/README", "C:/backup/bericht_2020.pdf", "C:/docs/bericht_2020.pdf", "C:/docs/notizen.txt"]
+        if paths != expected:
+            print(f"  [FAIL] Path reconstruction wrong: {paths}")
+            return False
+        
+        hits = [row[3] for row in conn.execute(*fq.search_query(conn, "bericht", path="C:/docs"))]
+        if hits != ["bericht_2020.pdf"]:
+            print(f"  [FAIL] Search wrong: {hits}")
+            return False
+        
+        # Kriterien der Suchwerkzeuge (Dateisuche, Enhanced_Dateisuche)
+        rows = [fq.file_info(row) for row in fq.iter_rows(conn, *fq.search_query(
+            conn, terms=[('AND', "bericht"), ('OR', "notizen"), ('NOT', "*.txt")], path_text="docs",
+            drives=["C:/"], size=('between', 1000, 100), order_by='size', descending=True))]
+        if [(row['dir_path'], row['filename'], row['extension']) for row in rows] != [("C:/docs", "bericht_2020", ".pdf")]:
+            print(f"  [FAIL] Search criteria wrong: {rows}")
+            return False
+        counts = [conn.execute(*fq.search_query(conn, count=True, **criteria)).fetchone()[0] for criteria in
+                  ({}, {'size': ('<', 100)}, {'hashed': True}, {'duplicates': True}, {'drives': ["D:/"]})]
+        if counts != [4, 2, 2, 2, 0]:
+            print(f"  [FAIL] Search counts wrong: {counts}")
+            return False
+        
+        for method in ("hash", "name_size"):
+            rows = conn.execute(*fq.duplicates_query(conn, method, min_size=100)).fetchall()
+            if len(rows) != 2 or {row[1] for row in rows} != {2} or len({row[0] for row in rows}) != 1:
+                print(f"  [FAIL] Duplicates ({method}) wrong: {rows}")
+                return False
+        if conn.execute(*fq.duplicates_query(conn, "hash", path="C:/docs")).fetchall():
+            print("  [FAIL] Duplicate path filter ignored")
+            return False
+        if conn.execute(*fq.duplicates_query(conn, "hash", exclude_paths=["C:/backup"])).fetchall() or \
+                conn.execute(*fq.duplicates_query(conn, "hash", max_size=100)).fetchall():
+            print("  [FAIL] Duplicate exclusion/size filter ignored")
+            return False
+        
+        # Ordner-Abfragen der Werkzeuge (Duplikat-Ordner, Musik, Speicherverbrauch)
+        names = sorted(row[0] for row in conn.execute(*fq.directory_files_query(conn, "C:/docs")))
+        common = conn.execute(*fq.common_files_query(docs, backup)).fetchall()
+        pairs = [(row[1], row[6], row[10]) for row in conn.execute(*fq.shared_folders_query('name', 1))]
+        media = [row[0] for row in conn.execute(*fq.media_query((".pdf",), path_terms=["backup"]))]
+        sizes = {path: (count, size) for path, count, size in conn.execute(*fq.directory_sizes_query(drive_id))}
+        if names != ["bericht_2020.pdf", "notizen.txt"] or common != [("bericht_2020.pdf", 500)] or \
+                sorted(pairs) != [("C:/docs", "C:/backup", 1)] or media != ["C:/backup/bericht_2020.pdf"] or \
+                sizes.get("C:/docs") != (2, 520):
+            print(f"  [FAIL] Folder queries wrong: {names} {common} {pairs} {media} {sizes}")
+            return False
+        
+        rollup = dict((path, size) for path, _, size in conn.execute(*fq.rollup_query(drive_id)))
+        if rollup.get("C:/docs") != 520 or rollup.get("C:/backup") != 500:
+            print(f"  [FAIL] Rollup wrong: {rollup}")
+            return False
+        conn.close()
+        
+        print("  [OK] Tuned read connection, paths, search, duplicates, folder queries and rollups")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_query_plans():
+    """Test 23: EXPLAIN QUERY PLAN regression check for the hot queries"""
+    print("\n[TEST 23] Testing query plans...")
+    
+    import random
+    import re
+    import filescan_query as fq
+    import exporter
+    import integrity_checker
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    # Große Tabellen: ein SCAN darüber ist eine Regression
+    big_tables = {"files", "directories", "directory_stats", "deleted_files", "deleted_directories"}
+    
+    def plan_of(conn, sql, params=()):
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    
+    def full_scans(sql, plan):
+        # Alias -> Tabelle aus FROM/JOIN, damit 'SCAN f' als files erkannt wird
+        aliases = {}
+        for table, alias in re.findall(r"(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.I):
+            aliases[table] = table
+            if alias and alias.upper() not in ("ON", "WHERE", "JOIN", "LEFT", "CROSS", "INNER", "USING",
+                                                "GROUP", "ORDER", "LIMIT", "SET"):
+                aliases[alias] = table
+        tables = {"directory_paths": "directories"}
+        return [line for line in plan if line.startswith("SCAN ")
+                and tables.get(aliases.get(line.split()[1], line.split()[1]),
+                               aliases.get(line.split()[1], line.split()[1])) in big_tables]
+    
+    try:
+        db = models.DBManager(db_path)
+        rng = random.Random(7)
+        drive_ids = {}
+        for drive in ("C:/", "D:/", "E:/", "F:/"):
+            drive_id = drive_ids[drive] = db.get_or_create_drive(drive)
+            dirs = [db.get_or_create_directory(drive_id, f"{drive}d{i // 10}/s{i}") for i in range(100)]
+            db.batch_insert_files([
+                (rng.choice(dirs), f"datei{n}_{rng.randint(0, 40)}.{rng.choice(['pdf', 'txt', 'jpg'])}",
+                 rng.randint(0, 5000), None if n % 3 else f"{rng.randint(0, 200):064x}")
+                for n in range(1500)])
+        db.rebuild_directory_stats()
+        db.conn.commit()
+        c_id = drive_ids["C:/"]
+        
+        # (Name, (sql, params), Pflicht-Teilstrings im Plan, verbotene Teilstrings, SCAN erlaubt)
+        cases = [
+            ("export", fq.export_query(db.conn), ["idx_files_directory_filename"], ["TEMP B-TREE"], False),
+            ("export subtree", fq.export_query(db.conn, "C:/d1"), [], ["TEMP B-TREE FOR ORDER BY"], False),
+            ("search", fq.search_query(db.conn, "datei12", path="C:/d1"), ["files_trigram"], [], False),
+            ("duplicates hash", fq.duplicates_query(db.conn, "hash", 100), ["idx_files_hash"],
+             ["TEMP B-TREE FOR GROUP BY"], False),
+            # Gruppierung über alle Dateien: ein Durchlauf in Indexreihenfolge, aber ohne Sortierung
+            ("duplicates name_size", fq.duplicates_query(db.conn, "name_size", 100),
+             ["idx_files_name_ext_size"], ["TEMP B-TREE FOR GROUP BY"], True),
+            ("duplicate filter", (f"SELECT files.id FROM files WHERE files.directory_id = ? AND "
+                                  f"{fq.duplicate_hash_condition('files')}", [1]),
+             ["idx_files_hash"], ["GROUP BY"], False),
+            ("rollup", fq.rollup_query(c_id), ["idx_directory_stats_drive"], [], False),
+            # Abfragen der Werkzeuge in Dateien_Skripte
+            ("search criteria", fq.search_query(db.conn, terms=[('AND', "datei1"), ('NOT', "*.txt")],
+                                                drives=["C:/"], size=('between', 100, 2000),
+                                                order_by='size', descending=True, limit=100),
+             ["files_trigram"], [], False),
+            # Teilstring im Pfad: Durchlauf über directories (kein Trigramm-Index für Pfade)
+            ("search count", fq.search_query(db.conn, "datei2", path_text="s2", count=True),
+             ["files_trigram"], [], True),
+            ("duplicates scoped", fq.duplicates_query(db.conn, "hash", drives=[c_id], exclude_paths=["C:/d1"],
+                                                      limit=1000), ["idx_files_hash"], [], False),
+            ("drives", fq.drives_query(), [], [], False),
+            ("directory files", fq.directory_files_query(db.conn, "C:/d1/s10"),
+             ["sqlite_autoindex_directories_1", "idx_files_directory"], [], False),
+            ("common files", fq.common_files_query(1, 2), ["idx_files_directory_filename"], [], False),
+            # Signaturen aller Ordner im Bereich: mit Statistik darf das ein Durchlauf über directories sein
+            ("folder signatures", fq.folder_signatures_query(db.conn, drives=[c_id], exclude_paths=["C:/d1"]),
+             ["idx_files_directory"], [], True),
+            ("shared folders name_size", fq.shared_folders_query('name_size', drives=[c_id]),
+             ["idx_files_directory"], [], False),
+            # Paarvergleich über alle Dateien: ein Durchlauf ist hier gewollt
+            ("shared folders name", fq.shared_folders_query('name'), [], [], True),
+            ("shared folders size", fq.shared_folders_query('size'), [], [], True),
+            ("media", fq.media_query(('.pdf',), any_terms=["d1"]), ["idx_files_extension"], [], False),
+            # Fallback ohne directory_stats: alle Verzeichnisse des Laufwerks, Durchlauf erlaubt
+            ("directory sizes", fq.directory_sizes_query(c_id), ["idx_files_directory"], [], True),
+        ]
+        
+        # Produktionsabfragen mitschneiden: DBManager-Hot-Path, Export, Integritätsprüfung
+        traced = []
+        db.conn.set_trace_callback(traced.append)
+        db.read_connection().set_trace_callback(traced.append)
+        db.upsert_file(c_id, "C:/d1/s10/neu.txt", 5, None)
+        db.upsert_file(c_id, "C:/d1/s10/neu.txt", 6, None)
+        db.move_file(c_id, "C:/d1/s10/neu.txt", "C:/d2/s20/neu.txt")
+        db.delete_file(c_id, "C:/d2/s20/neu.txt")
+        db.get_directory_usage(c_id, "C:/d1")
+        db.get_drive_stats()
+        db.get_extension_stats(limit=5)
+        db.get_category_stats(c_id)
+        db.get_last_scan_path(c_id)
+        db.update_scan_progress(c_id, "C:/d3")
+        db.delete_directory(c_id, "C:/d5/s50")
+        db.conn.commit()
+        exporter.fetch_file_data(db.conn.cursor(), "C:/d1").fetchall()
+        integrity_checker.check_integrity(db, "C:/d7")
+        db.conn.set_trace_callback(None)
+        db.read_connection().set_trace_callback(None)
+        statements = []
+        for sql in dict.fromkeys(stmt.strip() for stmt in traced):
+            if re.match(r"(?i)(SELECT|WITH|UPDATE|DELETE)\b", sql):
+                statements.append(sql)
+        if len(statements) < 10:
+            print(f"  [FAIL] Only {len(statements)} production statements captured")
+            return False
+        
+        # Pläne müssen mit und ohne ANALYZE-Statistik stimmen
+        for stage in ("ohne ANALYZE", "mit ANALYZE"):
+            if stage == "mit ANALYZE":
+                db.conn.execute("ANALYZE")
+                db.conn.commit()
+            for name, (sql, params), required, forbidden, scan_ok in cases:
+                plan = plan_of(db.conn, sql, params)
+                text = " | ".join(plan)
+                missing = [index for index in required if index not in text]
+                bad = [item for item in forbidden if item in text] + ([] if scan_ok else full_scans(sql, plan))
+                if missing or bad:
+                    print(f"  [FAIL] {name} ({stage}): missing {missing}, found {bad}: {text}")
+                    return False
+            for sql in statements:
+                bad = full_scans(sql, plan_of(db.conn, sql))
+                if bad:
+                    print(f"  [FAIL] Full scan ({stage}) {bad} in: {' '.join(sql.split())[:160]}")
+                    return False
+        db.close()
+        
+        print(f"  [OK] {len(cases)} builder queries and {len(statements)} production statements use their indexes")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_db_metrics():
+    """Test 24: Per-method, per-statement and lock-wait instrumentation"""
+    print("\n[TEST 24] Testing DB metrics...")
+    
+    import json
+    import threading
+    temp_dir = tempfile.mkdtemp()
+    metrics = models.get_db_metrics()
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"))
+        drive_id = db.get_or_create_drive("C:/")
+        metrics.reset()
+        for i in range(20):
+            db.upsert_file(drive_id, f"C:/docs/file{i}.txt", i, None)
+        db.delete_files([1, 2, 3])
+        
+        # Lock-Wartezeit: ein anderer Thread hält den DB-Lock
+        held = threading.Event()
+        def holder():
+            with db.lock:
+                held.set()
+                time.sleep(0.2)
+        thread = threading.Thread(target=holder)
+        thread.start()
+        held.wait()
+        db.find_directory_id(drive_id, "C:/docs")
+        thread.join()
+        
+        report = metrics.get_metrics()
+        upsert = report['methods'].get('upsert_file')
+        if not upsert or upsert['count'] != 20 or not upsert['p50_ms'] <= upsert['p95_ms'] <= upsert['max_ms']:
+            print(f"  [FAIL] Method timings wrong: {upsert}")
+            return False
+        if report['lock_wait'].get('find_directory_id', {}).get('max_ms', 0) < 150:
+            print(f"  [FAIL] Lock wait not measured: {report['lock_wait'].get('find_directory_id')}")
+            return False
+        if not any("?, ..." in sql for sql in report['statements']):
+            print("  [FAIL] IN lists not normalized in statement keys")
+            return False
+        if sum(s['count'] for s in report['statements'].values()) < 20:
+            print("  [FAIL] Statements not recorded")
+            return False
+        
+        path = metrics.dump(os.path.join(temp_dir, "metrics", "db_metrics_test.json"))
+        with open(path, encoding="utf-8") as f:
+            dumped = json.load(f)
+        if dumped['methods']['upsert_file']['count'] != 20 or dumped['pid'] != os.getpid():
+            print("  [FAIL] JSON dump incomplete")
+            return False
+        db.close()
+        
+        print("  [OK] Method, statement and lock-wait timings recorded and dumped")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_concurrent_reads():
+    """Test 25: Reads on per-thread connections while writers hold the DB lock"""
+    print("\n[TEST 25] Testing concurrent reads and writes...")
+    
+    import threading
+    temp_dir = tempfile.mkdtemp()
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"), lock=threading.RLock())
+        drive_id = db.get_or_create_drive("C:/")
+        db.update_scan_progress(drive_id, "C:/start")
+        
+        # Eigene ungesicherte Änderungen sind für den schreibenden Thread sichtbar
+        db.update_scan_progress(drive_id, "C:/neu", commit=False)
+        seen = []
+        other = threading.Thread(target=lambda: seen.append(db.get_last_scan_path(drive_id)))
+        other.start()
+        other.join()
+        if db.get_last_scan_path(drive_id) != "C:/neu" or seen != ["C:/start"]:
+            print(f"  [FAIL] Read isolation wrong: own={db.get_last_scan_path(drive_id)}, other={seen}")
+            return False
+        db.conn.commit()
+        
+        # Lesen blockiert nicht, während ein anderer Thread den Writer-Lock hält
+        held, release = threading.Event(), threading.Event()
+        def holder():
+            with db.lock:
+                held.set()
+                release.wait(5)
+        thread = threading.Thread(target=holder)
+        thread.start()
+        held.wait()
+        start = time.time()
+        running = db.is_scan_running()
+        name = db.get_drive_name(drive_id)
+        stats = db.get_drive_stats(drive_id)
+        elapsed = time.time() - start
+        release.set()
+        thread.join()
+        if elapsed > 1.0 or running or name != "C:/" or not stats:
+            print(f"  [FAIL] Reads blocked by writer lock ({elapsed:.2f}s)")
+            return False
+        
+        # Stresstest: 3 Schreiber, 6 Leser parallel
+        errors = []
+        stop = threading.Event()
+        reads = []
+        def writer(n):
+            try:
+                for i in range(150):
+                    db.upsert_file(drive_id, f"C:/w{n}/d{i % 5}/f{i}.txt", i, None)
+                    if i % 50 == 49:
+                        with db.lock:
+                            db.conn.commit()
+            except Exception as e:
+                errors.append(e)
+        def reader():
+            count = 0
+            try:
+                while not stop.is_set():
+                    db.is_scan_running()
+                    db.get_last_scan_path(drive_id)
+                    db.get_drive_stats(drive_id)
+                    db.get_extension_stats(drive_id)
+                    count += 1
+            except Exception as e:
+                errors.append(e)
+            reads.append(count)
+        writers = [threading.Thread(target=writer, args=(n,)) for n in range(3)]
+        readers = [threading.Thread(target=reader) for _ in range(6)]
+        for t in readers + writers:
+            t.start()
+        for t in writers:
+            t.join()
+        stop.set()
+        for t in readers:
+            t.join()
+        with db.lock:
+            db.conn.commit()
+        
+        if errors:
+            print(f"  [FAIL] Errors under concurrency: {errors[:3]}")
+            return False
+        if min(reads) == 0:
+            print(f"  [FAIL] Reader starved: {reads}")
+            return False
+        files = db.get_drive_stats(drive_id)[0][2]
+        if files != 450:
+            print(f"  [FAIL] Expected 450 files after stress run, got {files}")
+            return False
+        if len(db._readers) < 6:
+            print(f"  [FAIL] Expected per-thread read connections, got {len(db._readers)}")
+            return False
+        db.close()
+        
+        print(f"  [OK] 450 writes, {sum(reads)} read rounds, reads not blocked by writer lock")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_drive_purge():
+    """Test 26: Chunked, resumable drive purge and drop-and-rebuild strategy"""
+    print("\n[TEST 26] Testing drive purge...")
+    
+    import drive_purge
+    temp_dir = tempfile.mkdtemp()
+    
+    def stats_consistent(db):
+        # Trigger-gepflegte Statistik muss einer Neuberechnung entsprechen
+        query = "SELECT drive_id, extension_id, file_count, total_size FROM file_stats WHERE file_count > 0 ORDER BY 1, 2"
+        before = db.conn.execute(query).fetchall()
+        db.rebuild_global_stats()
+        return before == db.conn.execute(query).fetchall()
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"))
+        c_id = db.get_or_create_drive("C:/")
+        d_id = db.get_or_create_drive("D:/")
+        for i in range(40):
+            db.upsert_file(c_id, f"C:/a{i % 4}/b{i % 3}/file{i}.txt", i, None)
+        for i in range(100):
+            db.upsert_file(d_id, f"D:/x{i % 5}/y{i % 7}/data{i}.bin", i, None)
+        db.update_scan_progress(c_id, "C:/a1")
+        db.conn.commit()
+        triggers = db.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0]
+        
+        # Blockweise, nach zwei Blöcken abgebrochen
+        seen = []
+        def interrupt(phase, files_deleted, dirs_deleted):
+            seen.append((phase, files_deleted))
+            if len(seen) == 2:
+                raise KeyboardInterrupt
+        try:
+            drive_purge.purge_drive(db, c_id, strategy='chunked', chunk_files=7, chunk_directories=2,
+                                    pause=0, progress=interrupt)
+        except KeyboardInterrupt:
+            pass
+        if not drive_purge.pending_purge(db, c_id) or seen[-1] != ('files', 14):
+            print(f"  [FAIL] Interrupted purge not recorded: {seen}")
+            return False
+        
+        result = drive_purge.purge_drive(db, c_id, chunk_files=7, chunk_directories=2, pause=0)
+        c_dirs = db.conn.execute("SELECT COUNT(*) FROM directories WHERE drive_id = ?", (c_id,)).fetchone()[0]
+        remaining = db.conn.execute(
+            "SELECT COUNT(*) FROM files f JOIN directories d ON d.id = f.directory_id WHERE d.drive_id = ?", (d_id,)
+        ).fetchone()[0]
+        if result['strategy'] != 'chunked' or result['files_deleted'] != 40 or c_dirs != 0 or remaining != 100:
+            print(f"  [FAIL] Resumed purge wrong: {result}, C directories left {c_dirs}, D files {remaining}")
+            return False
+        if drive_purge.pending_purges(db) or db.get_last_scan_path(c_id) is not None:
+            print("  [FAIL] Purge progress or scan progress not cleaned up")
+            return False
+        if not stats_consistent(db) or db.get_drive_stats(c_id)[0][2:] != (0, 0, 0):
+            print(f"  [FAIL] Stats inconsistent after chunked purge: {db.get_drive_stats(c_id)}")
+            return False
+        
+        # D: hält den Großteil der Dateien -> Neuaufbau statt Löschen
+        for i in range(10):
+            db.upsert_file(c_id, f"C:/neu/file{i}.txt", 100 + i, None)
+        db.conn.commit()
+        strategy = drive_purge.choose_strategy(db, d_id, chunk_files=20)
+        result = drive_purge.purge_drive(db, d_id, strategy=strategy)
+        left = db.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        if strategy != 'rebuild' or result['files_deleted'] != 100 or left != 10:
+            print(f"  [FAIL] Rebuild purge wrong: strategy={strategy}, {result}, {left} files left")
+            return False
+        if db.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0] != triggers:
+            print("  [FAIL] Triggers not restored after rebuild")
+            return False
+        if db.conn.execute("PRAGMA foreign_keys").fetchone()[0] != 1 or db.conn.execute("PRAGMA foreign_key_check").fetchall():
+            print("  [FAIL] Foreign keys disabled or violated after rebuild")
+            return False
+        db.upsert_file(c_id, "C:/neu/danach.txt", 5, None)
+        db.conn.commit()
+        if not stats_consistent(db) or db.get_drive_stats(c_id)[0][2] != 11 or db.get_drive_stats(d_id)[0][2] != 0:
+            print(f"  [FAIL] Stats wrong after rebuild: {db.get_drive_stats()}")
+            return False
+        db.conn.execute("INSERT INTO files_fts (files_fts) VALUES ('integrity-check')")
+        hits = db.conn.execute("SELECT COUNT(*) FROM files_fts WHERE files_fts MATCH 'danach'").fetchone()[0]
+        if hits != 1 or db.conn.execute("SELECT COUNT(*) FROM files_fts WHERE files_fts MATCH 'data'").fetchone()[0]:
+            print("  [FAIL] Search index not rebuilt")
+            return False
+        db.close()
+        
+        print("  [OK] Chunked purge resumed after interruption, rebuild keeps other drives intact")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_db_maintenance():
+    """Test 27: Maintenance job (ANALYZE on changed tables, incremental vacuum, integrity check, budgets)"""
+    print("\n[TEST 27] Testing DB maintenance...")
+    
+    import json
+    import db_maintenance
+    import drive_purge
+    temp_dir = tempfile.mkdtemp()
+    state_path = os.path.join(temp_dir, "maintenance.json")
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"))
+        if db.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("  [FAIL] New database not created with auto_vacuum=INCREMENTAL")
+            return False
+        drive_id = db.get_or_create_drive("C:/")
+        for i in range(300):
+            db.upsert_file(drive_id, f"C:/d{i % 10}/datei_{i}_{'x' * 100}.txt", i, None)
+        db.conn.commit()
+        
+        if 'files' not in [t for t, _, _ in db_maintenance.changed_tables(db.read_connection())]:
+            print("  [FAIL] Table without statistics not detected")
+            return False
+        # Ohne Zählbudget: files/directories aus den Trigger-Zählern, Rest geschätzt statt COUNT(*)
+        counted = {t: rows for t, _, rows in db_maintenance.changed_tables(db.read_connection(), budget_seconds=0)}
+        if counted.get('files') != 300 or counted.get('directories') != 10:
+            print(f"  [FAIL] Row counts without budget wrong: {counted}")
+            return False
+        
+        # Fälligkeit: nach Scan, aber erst im Leerlauf
+        db_maintenance.save_state({'last_run': time.time(), 'last_scan_id': 0}, state_path)
+        state = db_maintenance.load_state(state_path)
+        if db_maintenance.maintenance_due(db, state) is not None:
+            print("  [FAIL] Maintenance due without finished scan")
+            return False
+        db.release_scan_lock(db.acquire_scan_lock("test"))
+        idle_later = time.time() + db_maintenance.IDLE_SECONDS + 1
+        if db_maintenance.maintenance_due(db, state) is not None or \
+                db_maintenance.maintenance_due(db, state, now=idle_later) != 'nach Scan':
+            print("  [FAIL] Maintenance after scan should wait for idle time")
+            return False
+        
+        steps = db_maintenance.MaintenanceJob(db, budget_seconds=30, step_seconds=5, state_path=state_path).run(
+            'test', integrity=True)
+        results = {step['step']: step['result'] for step in steps}
+        stat = db.conn.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = 'files'").fetchone()[0]
+        if set(results) != {'analyze', 'journal', 'vacuum', 'integrity'} or results['integrity'] != 'ok' or not stat:
+            print(f"  [FAIL] Maintenance steps wrong: {results}")
+            return False
+        if db_maintenance.maintenance_due(db, db_maintenance.load_state(state_path), now=idle_later) is not None:
+            print("  [FAIL] Maintenance still due right after a run")
+            return False
+        
+        # Nach dem Löschen: freie Seiten werden zurückgegeben, Statistik von files ist veraltet
+        drive_purge.purge_drive(db, drive_id, strategy='chunked', pause=0)
+        free_before = db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        steps = db_maintenance.MaintenanceJob(db, budget_seconds=30, step_seconds=5, state_path=state_path).run(
+            'test', integrity=False)
+        results = {step['step']: step['result'] for step in steps}
+        free_after = db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_before == 0 or free_after != 0 or 'files' not in results['analyze']:
+            print(f"  [FAIL] Vacuum/analyze after purge wrong: free {free_before}->{free_after}, {results}")
+            return False
+        
+        # Budget erschöpft: Schritte brechen ab statt den Lock zu halten
+        steps = db_maintenance.MaintenanceJob(db, budget_seconds=0, state_path=state_path).run('test')
+        if 'abgebrochen' not in steps[0]['result'] or any(step['step'] == 'integrity' for step in steps):
+            print(f"  [FAIL] Budget not enforced: {steps}")
+            return False
+        
+        with open(state_path, encoding='utf-8') as f:
+            history = json.load(f)['history']
+        if len(history) != 3 or not all('seconds' in step for run in history for step in run['steps']):
+            print("  [FAIL] Step durations not recorded")
+            return False
+        db.close()
+        
+        print(f"  [OK] Maintenance analyzed, freed {free_before} pages, checked integrity within budget")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_change_journal():
+    """Test 28: Change journal (triggers, consumers, compaction, retention, drive purge)"""
+    print("\n[TEST 28] Testing change journal...")
+    
+    import change_journal
+    import db_maintenance
+    import drive_purge
+    temp_dir = tempfile.mkdtemp()
+    
+    def journal(db, since=0):
+        return [(entity, op) for _, _, entity, op, _, _, _ in change_journal.changes_since(db.conn, since)]
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"))
+        c_id = db.get_or_create_drive("C:/")
+        d_id = db.get_or_create_drive("D:/")
+        # Ohne angemeldeten Verbraucher schreiben die Trigger nichts
+        db.upsert_file(c_id, "C:/early/z.txt", 1, None)
+        db.conn.commit()
+        if journal(db):
+            print(f"  [FAIL] Journal written without consumer: {journal(db)}")
+            return False
+        consumer = change_journal.ChangeConsumer(db, "test")
+        if not consumer.needs_resync():
+            print("  [FAIL] New consumer not flagged for initial full read")
+            return False
+        consumer.reset()
+        db.upsert_file(c_id, "C:/docs/a.txt", 10, None)
+        db.upsert_file(c_id, "C:/docs/a.txt", 10, None)   # unverändert: kein Eintrag
+        db.upsert_file(c_id, "C:/docs/a.txt", 20, None)
+        db.upsert_file(c_id, "C:/docs/b.txt", 5, None)
+        db.delete_file(c_id, "C:/docs/b.txt")
+        db.conn.commit()
+        expected = [('directory', 'insert'), ('file', 'insert'), ('file', 'update'), ('file', 'insert'), ('file', 'delete')]
+        if journal(db) != expected:
+            print(f"  [FAIL] Journal entries wrong: {journal(db)}")
+            return False
+        
+        # Verbraucher liest nur die Änderungen seit seiner Position
+        batch = consumer.read()
+        consumer.ack(batch[-1][0])
+        db.upsert_file(c_id, "C:/docs/c.txt", 1, None)
+        db.conn.commit()
+        if [(e, op) for _, _, e, op, _, _, _ in consumer.read()] != [('file', 'insert')]:
+            print(f"  [FAIL] Consumer does not read deltas: {consumer.read()}")
+            return False
+        
+        # Kompaktierung hinter der Verbraucher-Position: insert+update -> insert, insert+delete -> nichts
+        position = consumer.position
+        db.upsert_file(c_id, "C:/docs/c.txt", 2, None)
+        db.upsert_file(c_id, "C:/docs/d.txt", 1, None)
+        db.delete_file(c_id, "C:/docs/d.txt")
+        db.conn.commit()
+        removed = change_journal.compact(db)
+        if journal(db, position) != [('file', 'insert')] or removed != 3:
+            print(f"  [FAIL] Compaction wrong: {journal(db, position)}, {removed} removed")
+            return False
+        
+        # Aufbewahrung: bestätigte Einträge weg, zu alte ungelesene -> needs_resync
+        deleted = change_journal.apply_retention(db)
+        if deleted != len(batch) or consumer.needs_resync():
+            print(f"  [FAIL] Retention of acknowledged entries wrong: {deleted}")
+            return False
+        change_journal.apply_retention(db, retention_days=-1)
+        if journal(db) or not consumer.needs_resync():
+            print("  [FAIL] Consumer behind retention not flagged for resync")
+            return False
+        consumer.reset()
+        if consumer.needs_resync() or consumer.read():
+            print("  [FAIL] Reset did not move consumer to the end")
+            return False
+        
+        # Laufwerk löschen: ein Eintrag statt einer Löschung pro Zeile (beide Strategien)
+        for i in range(30):
+            db.upsert_file(d_id, f"D:/x{i % 3}/data{i}.bin", i, None)
+        db.conn.commit()
+        consumer.reset()
+        drive_purge.purge_drive(db, d_id, strategy='chunked', chunk_files=7, pause=0)
+        c_entries = change_journal.changes_since(db.conn, consumer.position)
+        db.upsert_file(c_id, "C:/other/e.txt", 1, None)
+        db.conn.commit()
+        consumer.reset()
+        drive_purge.purge_drive(db, c_id, strategy='rebuild')
+        r_entries = change_journal.changes_since(db.conn, consumer.position)
+        if [(e[2], e[3], e[4]) for e in c_entries] != [('drive', 'purge', d_id)] or \
+                [(e[2], e[3], e[4]) for e in r_entries] != [('drive', 'purge', c_id)]:
+            print(f"  [FAIL] Drive purge journaled wrong: {c_entries}, {r_entries}")
+            return False
+        db.upsert_file(c_id, "C:/new/f.txt", 1, None)
+        db.conn.commit()
+        if [(e, op) for _, _, e, op, _, _, _ in consumer.read()] != [('drive', 'purge'), ('directory', 'insert'), ('file', 'insert')]:
+            print(f"  [FAIL] Journal triggers missing after rebuild: {consumer.read()}")
+            return False
+        
+        # Kompaktierung nur im seq-Fenster: ein Block liest höchstens limit Einträge
+        consumer.reset()
+        for i in range(4):
+            db.upsert_file(c_id, "C:/new/g.txt", i, None)
+        db.conn.commit()
+        window = change_journal.compaction_horizon(db.conn)
+        if change_journal.compact(db, limit=2) != 1 or change_journal.compact(db, limit=2, after=window + 2) != 1 \
+                or journal(db, window) != [('file', 'insert'), ('file', 'update')]:
+            print(f"  [FAIL] Compaction not bounded by seq window: {journal(db, window)}")
+            return False
+        
+        # Wartungsschritt: Blöcke unter Schrittbudget, bei erschöpftem Budget abgebrochen
+        for i in range(4, 8):
+            db.upsert_file(c_id, "C:/new/g.txt", i, None)
+        db.conn.commit()
+        state_path = os.path.join(temp_dir, "maintenance.json")
+        steps = {step['step']: step['result'] for step in db_maintenance.MaintenanceJob(
+            db, budget_seconds=0, state_path=state_path).run('test', integrity=False)}
+        if 'abgebrochen' not in steps['journal'] or len(journal(db, window)) != 6:
+            print(f"  [FAIL] Journal maintenance ignored budget: {steps['journal']}")
+            return False
+        steps = {step['step']: step['result'] for step in db_maintenance.MaintenanceJob(
+            db, budget_seconds=30, state_path=state_path).run('test', integrity=False)}
+        if '5 kompaktiert' not in steps['journal'] or journal(db, window) != [('file', 'insert')]:
+            print(f"  [FAIL] Journal maintenance wrong: {steps['journal']}, {journal(db, window)}")
+            return False
+        
+        # Ohne Verbraucher: nichts mehr protokolliert, Aufbewahrung leert das Journal blockweise
+        consumer.drop()
+        db.upsert_file(c_id, "C:/new/h.txt", 1, None)
+        db.conn.commit()
+        pending = len(journal(db))
+        if change_journal.apply_retention(db, limit=1) != 1 or change_journal.apply_retention(db) != pending - 1 \
+                or journal(db):
+            print(f"  [FAIL] Journal kept without consumers: {journal(db)}")
+            return False
+        db.close()
+        
+        print("  [OK] Journal recorded changes, consumers read deltas, compaction/retention/purge correct")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_event_coalescer():
+    """Test 29: Watchdog event coalescing (merge per path, settle window, counters)"""
+    print("\n[TEST 29] Testing watchdog event coalescer...")
+    
+    try:
+        from watchdog_monitor import EventCoalescer
+        out = []
+        coalescer = EventCoalescer(lambda kind, path, is_dir, src, modified: out.append((kind, path, src, modified)),
+                                   settle_seconds=1.0, max_delay_seconds=10.0)
+        a, b, tmp = os.path.join("C:", "d", "a.txt"), os.path.join("C:", "d", "b.txt"), os.path.join("C:", "d", "~a.tmp")
+        
+        # Speichern erzeugt viele Änderungen: nur eine Weitergabe nach Ruhe
+        for i in range(8):
+            coalescer.add('modified', a, now=i * 0.1)
+        if coalescer.poll(now=1.0) != 0:
+            print("  [FAIL] Event dispatched before settle window elapsed")
+            return False
+        coalescer.poll(now=1.8)
+        if out != [('modified', a, None, False)]:
+            print(f"  [FAIL] Modify burst not coalesced: {out}")
+            return False
+        
+        # created+modified -> created, created+deleted -> nichts, modified+deleted -> deleted
+        out.clear()
+        coalescer.add('created', b, now=10.0)
+        coalescer.add('modified', b, now=10.1)
+        coalescer.add('created', tmp, now=10.0)
+        coalescer.add('deleted', tmp, now=10.2)
+        coalescer.add('modified', a, now=10.0)
+        coalescer.add('deleted', a, now=10.3)
+        coalescer.poll(now=12.0)
+        if sorted(out) != sorted([('created', b, None, False), ('deleted', a, None, False)]):
+            print(f"  [FAIL] Sequences not collapsed: {out}")
+            return False
+        
+        # Temporäre Datei schreiben und umbenennen -> nur das Ziel anlegen; Kette a -> b -> c
+        out.clear()
+        coalescer.add('created', tmp, now=20.0)
+        coalescer.add('modified', tmp, now=20.1)
+        coalescer.add('moved', tmp, dest_path=a, now=20.2)
+        coalescer.add('moved', b, dest_path=tmp, now=20.3)
+        coalescer.add('moved', tmp, dest_path=os.path.join("C:", "d", "c.txt"), now=20.4)
+        coalescer.flush()
+        if out != [('created', a, None, False), ('moved', os.path.join("C:", "d", "c.txt"), b, False)]:
+            print(f"  [FAIL] Moves not coalesced: {out}")
+            return False
+        
+        # Verzeichnis gelöscht: gesammelte Ereignisse darin entfallen
+        out.clear()
+        coalescer.add('modified', a, now=30.0)
+        coalescer.add('deleted', os.path.join("C:", "d"), is_directory=True, now=30.1)
+        coalescer.flush()
+        if out != [('deleted', os.path.join("C:", "d"), None, False)]:
+            print(f"  [FAIL] Events inside deleted directory not dropped: {out}")
+            return False
+        
+        # Ständig geändert: spätestens nach max_delay weitergeben
+        out.clear()
+        for i in range(150):
+            coalescer.add('modified', b, now=40.0 + i * 0.1)
+        coalescer.poll(now=50.0)
+        if out != [('modified', b, None, False)]:
+            print(f"  [FAIL] Max delay not enforced: {out}")
+            return False
+        
+        metrics = coalescer.get_metrics()
+        if metrics['events_in'] != 171 or metrics['events_out'] != 7 or metrics['pending'] != 0:
+            print(f"  [FAIL] Counters wrong: {metrics}")
+            return False
+        
+        # Mit Thread: Weitergabe nach der Ruhezeit ohne poll()
+        out.clear()
+        coalescer = EventCoalescer(lambda *args: out.append(args), settle_seconds=0.05).start()
+        for _ in range(5):
+            coalescer.add('modified', a)
+        time.sleep(0.3)
+        coalescer.stop()
+        if len(out) != 1:
+            print(f"  [FAIL] Background thread did not dispatch once: {out}")
+            return False
+        
+        print(f"  [OK] {metrics['events_in']} events coalesced to {metrics['events_out']} ({metrics['reduction']:.0%} saved)")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+
+def test_write_queue_linger():
+    """Test 30: Write queue micro-batches (linger time, max visibility delay)"""
+    print("\n[TEST 30] Testing write queue linger...")
+    
+    temp_dir = tempfile.mkdtemp()
+    
+    def trickle(writer, drive_id, name, count, interval):
+        # Einzelne Ereignisse wie vom Watchdog, jeweils kurz nacheinander
+        requests = []
+        for i in range(count):
+            requests.append(writer.submit('watchdog', 'upsert_file', drive_id, f"C:/data/{name}_{i}.txt", i, None))
+            time.sleep(interval)
+        for request in requests:
+            request.wait(10)
+    
+    try:
+        db = models.DBManager(os.path.join(temp_dir, "test.db"))
+        drive_id = db.get_or_create_drive("C:/")
+        
+        immediate = models.WriteQueue(db, linger_ms=0).start()
+        trickle(immediate, drive_id, 'immediate', 30, 0.003)
+        immediate.stop()
+        
+        lingering = models.WriteQueue(db, linger_ms=100, max_delay_ms=500).start()
+        trickle(lingering, drive_id, 'lingering', 30, 0.003)
+        stats = lingering.get_commit_stats()
+        if stats['commits'] >= immediate.commits or stats['avg_batch'] < 5:
+            print(f"  [FAIL] Linger did not batch: {stats['commits']} vs {immediate.commits} commits")
+            return False
+        
+        # flush() wartet nicht auf das Ende der linger-Zeit
+        start = time.perf_counter()
+        lingering.submit('watchdog', 'upsert_file', drive_id, "C:/data/flush.txt", 1, None)
+        lingering.flush(timeout=10)
+        if time.perf_counter() - start > 0.09:
+            print("  [FAIL] Flush waited for linger time")
+            return False
+        lingering.stop()
+        
+        # Sichtbarkeit nach höchstens max_delay, auch bei langer linger-Zeit
+        bounded = models.WriteQueue(db, linger_ms=5000, max_delay_ms=100).start()
+        start = time.perf_counter()
+        bounded.submit('watchdog', 'upsert_file', drive_id, "C:/data/late.txt", 1, None).wait(10)
+        elapsed = time.perf_counter() - start
+        bounded.stop()
+        if elapsed > 1.0 or bounded.get_commit_stats()['max_delay_ms'] > 1000:
+            print(f"  [FAIL] Max visibility delay exceeded: {elapsed:.2f}s")
+            return False
+        if db.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] != 62:
+            print("  [FAIL] Operations lost")
+            return False
+        
+        # Massen-Umbenennung ohne Warten: bekannte Quelle verschoben, unbekannte als neues Ziel angelegt
+        renamer = models.WriteQueue(db, linger_ms=50, max_delay_ms=500).start()
+        results = []
+        for i in range(20):
+            renamer.submit('watchdog', 'move_or_upsert_file', drive_id, f"C:/data/immediate_{i}.txt", f"C:/renamed/w{i}.txt",
+                           7, None, None, None, False, on_done=lambda request: results.append(request.result))
+        for i in range(5):
+            renamer.submit('watchdog', 'move_or_upsert_file', drive_id, f"C:/nowhere/n{i}.txt", f"C:/renamed/n{i}.txt",
+                           3, None, None, None, False, on_done=lambda request: results.append(request.result))
+        renamer.flush(timeout=10)
+        renamer.stop()
+        renamed = db.conn.execute("SELECT COUNT(*) FROM files f JOIN directories d ON d.id = f.directory_id "
+                                  "WHERE d.full_path = 'C:/renamed'").fetchone()[0]
+        if renamer.commits > 2 or results.count(True) != 20 or results.count(False) != 5 or renamed != 25:
+            print(f"  [FAIL] Renames not group-committed: {renamer.commits} commits, {renamed} renamed")
+            return False
+        db.close()
+        
+        print(f"  [OK] {stats['operations']} operations in {stats['commits']} commits "
+              f"(without linger {immediate.commits}), max delay {stats['max_delay_ms']:.0f} ms")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_move_directory():
+    """Test 31: Directory move/rename as a single subtree rewrite"""
+    print("\n[TEST 31] Testing directory move...")
+    
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    def stats_snapshot(db):
+        return db.conn.execute("SELECT * FROM directory_stats ORDER BY directory_id").fetchall()
+    
+    try:
+        db = models.DBManager(db_path)
+        other = models.DBManager(db_path)   # zweite Verbindung mit eigenem Baum (anderer Prozess)
+        drive_id = db.get_or_create_drive("C:/")
+        for i in range(200):
+            db.upsert_file(drive_id, f"C:/proj/src/m{i % 20}/sub{i % 3}/file{i}.py", i, None)
+        db.upsert_file(drive_id, "C:/proj/readme.txt", 5, None)
+        db.conn.commit()
+        other_id = other.find_directory_id(drive_id, "C:/proj/src/m3/sub1")
+        
+        start = time.perf_counter()
+        moved = db.move_directory(drive_id, "C:/proj/src", "C:/archive/2024/code")
+        db.conn.commit()
+        elapsed = time.perf_counter() - start
+        if moved != 81:
+            print(f"  [FAIL] Expected 81 rewritten directories, got {moved}")
+            return False
+        
+        new_id = db.find_directory_id(drive_id, "C:/archive/2024/code/m3/sub1")
+        if new_id != other_id or db.find_directory_id(drive_id, "C:/proj/src/m3") is not None:
+            print("  [FAIL] Subtree not reachable under new path")
+            return False
+        row = db.conn.execute("SELECT full_path, depth_level FROM directories WHERE id = ?", (new_id,)).fetchone()
+        stale = db.conn.execute("SELECT COUNT(*) FROM directories WHERE full_path LIKE 'C:/proj/src%'").fetchone()[0]
+        if row != ("C:/archive/2024/code/m3/sub1", 5) or stale:
+            print(f"  [FAIL] Paths/depth not rewritten: {row}, {stale} stale")
+            return False
+        
+        # Rollups: alter Elternpfad ohne, neuer mit dem Teilbaum - wie eine Neuberechnung
+        incremental = stats_snapshot(db)
+        db.rebuild_directory_stats()
+        if incremental != stats_snapshot(db):
+            print("  [FAIL] Directory stats after move differ from rebuild")
+            return False
+        if db.get_directory_usage(drive_id, "C:/proj")[2:] != (1, 5) or \
+                db.get_directory_usage(drive_id, "C:/archive")[2] != 200:
+            print("  [FAIL] Recursive stats not moved")
+            return False
+        
+        # Andere Verbindung erkennt die Verschiebung (directory_tree_version)
+        if other.find_directory_id(drive_id, "C:/archive/2024/code/m3/sub1") != new_id or \
+                other.find_directory_id(drive_id, "C:/proj/src/m3/sub1") is not None:
+            print("  [FAIL] Other connection's directory tree not refreshed after move")
+            return False
+        
+        # Umbenennen an Ort und Stelle; unbekannte Quelle -> None (Aufrufer scannt neu)
+        db.move_directory(drive_id, "C:/archive/2024/code/m3", "C:/archive/2024/code/module3")
+        if db.get_directory_path(new_id) != "C:/archive/2024/code/module3/sub1":
+            print("  [FAIL] Rename not applied")
+            return False
+        if db.move_directory(drive_id, "C:/nowhere", "C:/elsewhere") is not None:
+            print("  [FAIL] Unknown source should return None")
+            return False
+        
+        # Löschen des neuen (jüngeren) Elternverzeichnisses entfernt auch den verschobenen Teilbaum
+        db.delete_directory(drive_id, "C:/archive")
+        db.conn.commit()
+        if db.find_directory_id(drive_id, "C:/archive/2024/code/module3/sub1") is not None or \
+                db.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] != 1:
+            print("  [FAIL] Moved subtree not removed with its new parent")
+            return False
+        other.close()
+        db.close()
+        
+        print(f"  [OK] {moved} directories moved in {elapsed * 1000:.1f} ms, stats and trees consistent")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_event_overflow():
+    """Test 32: Bounded watchdog queue, overflow detection and targeted subtree rescan"""
+    print("\n[TEST 32] Testing event queue overflow and rescan...")
+    
+    temp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(temp_dir, "test.db")
+    
+    try:
+        from watchdog_monitor import EventCoalescer
+        from scanner_core import scan_subtree
+        out, rescans = [], []
+        coalescer = EventCoalescer(lambda kind, path, is_dir, src, modified: out.append(path),
+                                   settle_seconds=1.0, max_delay_seconds=10.0, max_pending=10,
+                                   rescan=lambda path, recursive: rescans.append((path, recursive)))
+        base = os.path.join(temp_dir, "tree")
+        
+        # Kopiersturm: nur 10 Pfade werden gesammelt, der Rest verworfen und als Rescan vorgemerkt
+        for i in range(100):
+            coalescer.add('created', os.path.join(base, f"d{i % 4}", f"f{i}.txt"), now=i * 0.01)
+        coalescer.add('created', os.path.join(base, "d4"), is_directory=True, now=1.0)
+        coalescer.add('modified', os.path.join(base, "d0", "f0.txt"), now=1.0)   # bereits gesammelt
+        metrics = coalescer.get_metrics()
+        if metrics['pending'] != 10 or metrics['dropped'] != 91 or metrics['max_pending'] != 10:
+            print(f"  [FAIL] Queue not bounded: {metrics}")
+            return False
+        
+        # Rekursiver Rescan von base deckt die Verzeichnisse darunter ab; Überlauf des OS ebenso
+        coalescer.overflow(os.path.join(base, "d1"))
+        if coalescer.rescans != {base: True}:
+            print(f"  [FAIL] Rescans not collapsed to subtree: {coalescer.rescans}")
+            return False
+        coalescer.poll(now=20.0)
+        if len(out) != 10 or rescans != [(base, True)]:
+            print(f"  [FAIL] Rescan not run after drain: {len(out)} events, {rescans}")
+            return False
+        metrics = coalescer.get_metrics()
+        if metrics['os_overflows'] != 1 or metrics['rescans_done'] != 1 or metrics['rescans_pending']:
+            print(f"  [FAIL] Overflow metrics wrong: {metrics}")
+            return False
+        
+        # Gezielter Rescan: neue Dateien anlegen, verschwundene Dateien/Verzeichnisse entfernen
+        db = models.DBManager(db_path)
+        writer = models.WriteQueue(db).start()
+        drive_id = db.get_or_create_drive("C:/")
+        rebuilds, rebuild = [], db.rebuild_directory_stats
+        db.rebuild_directory_stats = lambda *args: rebuilds.append(args) or rebuild(*args)
+        for d in ("keep", "gone"):
+            os.makedirs(os.path.join(base, d))
+            for name in ("a.txt", "b.log"):
+                with open(os.path.join(base, d, name), "w") as f:
+                    f.write(name)
+        if scan_subtree(writer, drive_id, base) != (3, 4):
+            print("  [FAIL] Initial subtree scan counts wrong")
+            return False
+        os.remove(os.path.join(base, "keep", "b.log"))
+        shutil.rmtree(os.path.join(base, "gone"))
+        with open(os.path.join(base, "keep", "c.md"), "w") as f:
+            f.write("neu")
+        scan_subtree(writer, drive_id, os.path.join(base, "keep"), recursive=False)
+        scan_subtree(writer, drive_id, base)
+        writer.stop()
+        # Rollups inkrementell nachgeführt: gleich einer Neuberechnung, ohne sie anzustoßen
+        stats = db.conn.execute("SELECT * FROM directory_stats ORDER BY directory_id").fetchall()
+        rebuild()
+        if stats != db.conn.execute("SELECT * FROM directory_stats ORDER BY directory_id").fetchall() or rebuilds:
+            print("  [FAIL] Directory stats after rescan differ from rebuild")
+            return False
+        names = sorted(row[0] for row in db.conn.execute("SELECT filename FROM files"))
+        gone = db.find_directory_id(drive_id, os.path.join(base, "gone").replace("\\", "/"))
+        if names != ["a", "c"] or gone is not None:
+            print(f"  [FAIL] Rescan did not reconcile subtree: {names}, gone={gone}")
+            return False
+        db.close()
+        
+        print(f"  [OK] {metrics['dropped']} events dropped, 1 subtree rescan queued and reconciled")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def test_alias_resolver():
+    """Test 33: Drive alias resolver (cached table, TTL and volume-change refresh)"""
+    print("\n[TEST 33] Testing drive alias resolver...")
+    
+    try:
+        from drive_alias_detector import AliasResolver, normalize_path_with_aliases
+        mappings = {'T:': 'C:\\Laufwerk T\\USB16GB'}
+        calls, mask = [], [0b1100]
+        
+        def loader():
+            calls.append(time.monotonic())
+            return dict(mappings)
+        
+        def wait_for(count):
+            deadline = time.monotonic() + 2.0
+            while len(calls) < count and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            return len(calls) == count
+        
+        resolver = AliasResolver(ttl_seconds=0.3, loader=loader, volume_mask=lambda: mask[0],
+                                 volume_check_seconds=0)
+        paths = ["T:\\Programme\\test", "T:", "C:\\Laufwerk T\\USB16GB\\x", os.path.join("data", "a.txt")]
+        
+        # Gleiches Ergebnis wie normalize_path_with_aliases, aber nur ein Ladevorgang
+        start = time.perf_counter()
+        for i in range(20000):
+            for path in paths:
+                result = resolver.resolve(path)
+        elapsed = time.perf_counter() - start
+        for path in paths:
+            if resolver.resolve(path) != normalize_path_with_aliases(path, mappings):
+                print(f"  [FAIL] {path}: {resolver.resolve(path)} != {normalize_path_with_aliases(path, mappings)}")
+                return False
+        if len(calls) != 1:
+            print(f"  [FAIL] Mappings loaded {len(calls)} times in hot path")
+            return False
+        
+        # Neues Laufwerk (subst/net use): Bitmaske ändert sich -> Neuladen im Hintergrund
+        mappings['U:'] = '\\\\wsl$\\Ubuntu'
+        mask[0] = 0b11100
+        resolver.resolve(paths[0])
+        if not wait_for(2) or resolver.mappings() != mappings:
+            print(f"  [FAIL] Volume change not picked up: {len(calls)} loads, {resolver.mappings()}")
+            return False
+        
+        # TTL abgelaufen -> ein Neuladen, auch bei vielen gleichzeitigen Aufrufen
+        time.sleep(0.35)
+        for i in range(1000):
+            resolver.resolve(paths[0])
+        if not wait_for(3):
+            print(f"  [FAIL] TTL refresh count wrong: {len(calls)} loads")
+            return False
+        resolver.invalidate()
+        resolver.resolve(paths[0])
+        if not wait_for(4):
+            print(f"  [FAIL] invalidate() did not trigger refresh: {len(calls)} loads")
+            return False
+        
+        print(f"  [OK] {20000 * len(paths)} lookups in {elapsed * 1000:.0f} ms, {len(calls)} mapping loads")
+        return True
+        
+    except Exception as e:
+        print(f"  [FAIL] Error: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("="*60)
@@ -563,7 +2543,32 @@ def main():
         test_duplicate_handling,
         test_export_functionality,
         test_resume_capability,
-        test_watchdog_events
+        test_watchdog_events,
+        test_compact_directory_storage,
+        test_binary_hash_storage,
+        test_file_timestamps,
+        test_schema_migrations,
+        test_write_queue,
+        test_checkpoint_manager,
+        test_directory_stats,
+        test_global_stats,
+        test_subtree_queries,
+        test_search_index,
+        test_trigram_index,
+        test_read_snapshot,
+        test_shard_layout,
+        test_query_library,
+        test_query_plans,
+        test_db_metrics,
+        test_concurrent_reads,
+        test_drive_purge,
+        test_db_maintenance,
+        test_change_journal,
+        test_event_coalescer,
+        test_write_queue_linger,
+        test_move_directory,
+        test_event_overflow,
+        test_alias_resolver
     ]
     
     passed = 0
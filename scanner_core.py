@@ -8,7 +8,8 @@ import logging # Hinzufügen
 
 # Importiere zentrale Funktionen und Konstanten
 from utils import calculate_hash, HASHING, CONFIG, DB_PATH, load_config, logger # logger importieren
-from models import get_db_instance
+from models import DATABASE_LAYOUT, get_db_instance, get_db_for_drive, get_write_queue
+import drive_purge
 
 # --- Entferne alte, lokale Funktionen --- 
 # def load_config():
@@ -25,6 +26,41 @@ from models import get_db_instance
 
 hash_dirs = [] # Wird in main geladen
 
+def scan_subtree(writer, drive_id, base_path, producer='scanner', recursive=True):
+    """Gleicht einen Teilbaum über die Write-Queue mit dem Dateisystem ab (gezielter Rescan).
+
+    Nach einem Verschieben mit unbekannter Quelle oder verlorenen Watchdog-Ereignissen:
+    jedes Verzeichnis wird per sync_directory abgeglichen (neue/geänderte Dateien
+    schreiben, verschwundene Dateien und Unterverzeichnisse entfernen); die
+    Verzeichnis-Rollups führt sync_directory inkrementell nach, ohne das Laufwerk
+    neu zu berechnen. recursive=False gleicht nur base_path selbst ab. Gibt
+    (Verzeichnisse, Dateien) zurück.
+    """
+    dir_count = file_count = 0
+    if not os.path.isdir(base_path):
+        # Verzeichnis gibt es nicht mehr: samt Inhalt entfernen
+        writer.submit(producer, 'delete_directory', drive_id, base_path)
+    for root, dirs, files in os.walk(base_path, topdown=True):
+        current_dir = os.path.normpath(root)
+        files_batch = []
+        for file in files:
+            full_path = os.path.join(current_dir, file)
+            try:
+                st = os.stat(full_path)
+            except OSError as e:
+                logger.error(f"[Core Scan Fehler] OS-Fehler bei {full_path}: {e}")
+                continue
+            hash_val = calculate_hash(full_path) if HASHING else None
+            files_batch.append((file, st.st_size, hash_val, st.st_mtime_ns, st.st_ctime_ns))
+        writer.submit(producer, 'sync_directory', drive_id, current_dir, files_batch, list(dirs))
+        dir_count += 1
+        file_count += len(files_batch)
+        if not recursive:
+            break
+    writer.flush()
+    return dir_count, file_count
+
+
 def run_scan(base_path, force_restart=False):
     logger.debug(f"[Core Scan DEBUG] Entering run_scan for {base_path}, force_restart={force_restart}") # Geändert auf logger.debug
     db = None
@@ -54,7 +90,8 @@ def run_scan(base_path, force_restart=False):
     ]
 
     try:
-        db = get_db_instance()
+        db = get_db_for_drive(drive_name_for_db)
+        writer = get_write_queue(db)
         logger.debug(f"[Core Scan DEBUG] DB instance obtained: {db}") # Geändert auf logger.debug
 
         # --- Laufwerksspezifische Scan-Logik ---
@@ -96,6 +133,10 @@ def run_scan(base_path, force_restart=False):
     logger.info(f"[Core Scan] Verwende Laufwerk: {drive_name_for_db} (ID: {drive_id})") # Geändert auf logger.info
 
     # --- Logik zur Wiederaufnahme / Neustart ---
+    if not force_restart and drive_purge.pending_purge(db, drive_id):
+        # Abgebrochenes Löschen (--restart): Laufwerksdaten sind unvollständig, erst zu Ende löschen
+        logger.warning(f"[Core Scan] Unterbrochenes Löschen für {drive_name_for_db} gefunden - wird fortgesetzt, danach Neustart.")
+        force_restart = True
     resuming = False
     resume_dir = None
     if not force_restart: # Nur nach resume_dir suchen, wenn kein Neustart erzwungen wird
@@ -114,7 +155,18 @@ def run_scan(base_path, force_restart=False):
         # WICHTIG: Lösche NUR die Daten des spezifischen Laufwerks!
         if drive_id:
             logger.info(f"[Core Scan] Lösche alte Daten für Laufwerk {drive_name_for_db} (ID: {drive_id})")
-            if db.clear_drive_data(drive_id):
+            cleared = False
+            if DATABASE_LAYOUT == 'sharded':
+                # Shard-Layout: Shard-Datei löschen statt Zeilen, danach in einen leeren Shard schreiben
+                from shard_manager import get_shard_manager
+                try:
+                    cleared = get_shard_manager().drop_drive(drive_name_for_db)
+                except OSError as e:
+                    logger.warning(f"[Core Scan] Shard von {drive_name_for_db} nicht löschbar ({e}) - lösche zeilenweise")
+                db = get_db_for_drive(drive_name_for_db)
+                writer = get_write_queue(db)
+                drive_id = db.get_or_create_drive(drive_name_for_db)
+            if cleared or db.clear_drive_data(drive_id):
                 logger.info(f"[Core Scan] Alte Daten für Laufwerk {drive_name_for_db} erfolgreich gelöscht")
             else:
                 logger.error(f"[Core Scan] Fehler beim Löschen der alten Daten für Laufwerk {drive_name_for_db}")
@@ -131,12 +183,10 @@ def run_scan(base_path, force_restart=False):
     scanned_dirs_set = set() # Zum Speichern aller gefundenen Verzeichnispfade für Cleanup
     scanned_files_in_dir_set = set() # Zum Speichern der Dateien im aktuellen Verzeichnis für Cleanup
 
-    # Häufiger kleinere Transaktionen durchführen anstatt einer großen
-    transaction_active = False
-    commit_interval = 250  # Nach x Verzeichnissen committen
-    last_commit_time = time.time()
-    max_transaction_time = 60.0  # Maximale Zeit einer Transaktion in Sekunden
-    
+    # Schreibzugriffe laufen über die Write-Queue (Single Writer mit Group Commit).
+    # Fehler einzelner Operationen werden pro Producer gezählt.
+    errors_before = writer.get_stats().get('scanner', {}).get('errors', 0)
+
     try:
         # Durchlaufe das Verzeichnis
         for root, dirs, files in os.walk(base_path, topdown=True):
@@ -158,12 +208,6 @@ def run_scan(base_path, force_restart=False):
             if skip_this_dir:
                 continue  # Zum nächsten Verzeichnis
 
-            # Starte eine neue Transaktion, wenn keine aktiv ist
-            if not transaction_active:
-                db.conn.execute("BEGIN")
-                transaction_active = True
-                last_commit_time = time.time()
-
             # ---- Logik zur Wiederaufnahme v3 ----
             if resuming and resume_dir:
                 # Fall 1: Wir sind strikt VOR dem Fortsetzungspunkt
@@ -203,13 +247,6 @@ def run_scan(base_path, force_restart=False):
                 # --- Verzeichnis-Verarbeitung ---
                 scanned_dirs_set.add(current_dir)
                 dir_count += 1
-                # Verzeichnis in DB eintragen/holen
-                dir_id = db.get_or_create_directory(drive_id, current_dir)
-
-                if not dir_id:
-                    logger.warning(f"[Core Scan Warnung] Konnte Verzeichnis nicht verarbeiten, überspringe: {current_dir}") # Geändert auf logger.warning
-                    dirs[:] = [] # Nicht weiter in dieses fehlerhafte Verzeichnis absteigen
-                    continue # Zum nächsten Eintrag in os.walk
 
                 # --- Datei-Verarbeitung ---
                 scanned_files_in_dir_set.clear()
@@ -223,7 +260,8 @@ def run_scan(base_path, force_restart=False):
                         if not os.access(full_path, os.R_OK) or not os.path.isfile(full_path):
                            continue
 
-                        size = os.path.getsize(full_path)
+                        st = os.stat(full_path)
+                        size = st.st_size
                         
                         # ---- Neue Hashing-Logik ----
                         should_hash = False
@@ -243,7 +281,7 @@ def run_scan(base_path, force_restart=False):
                         # ----------------------------
 
                         # Für optimierte DB-Struktur: nur Dateiname (basename) verwenden
-                        files_batch.append((dir_id, file, size, hash_val))
+                        files_batch.append((file, size, hash_val, st.st_mtime_ns, st.st_ctime_ns))
                         file_count += 1 # Zähler hier erhöhen
 
                     except PermissionError:
@@ -255,9 +293,9 @@ def run_scan(base_path, force_restart=False):
                     except Exception as e:
                         logger.error(f"[Core Scan Fehler] Unerwarteter Fehler bei {full_path}: {e}") # Geändert auf logger.error
 
-                # Verarbeite den Batch für das aktuelle Verzeichnis
-                if files_batch:
-                    db.batch_insert_files(files_batch)
+                # Verzeichnis + Dateien als eine Operation einreihen (Liste wird übergeben, nicht geleert)
+                writer.submit('scanner', 'insert_directory_files', drive_id, current_dir, files_batch)
+                files_batch = []
 
                 # Fortschritt loggen (jetzt alle 1000 Verzeichnisse) und immer anzeigen (Level WARNING)
                 if dir_count % 1000 == 0:
@@ -266,34 +304,21 @@ def run_scan(base_path, force_restart=False):
                 # --- Update Scan Progress regelmäßig (jetzt alle 1000 Verzeichnisse) --- 
                 if dir_count % 1000 == 0:
                      try:
-                         # Committe vorher, um Fehler zu vermeiden
-                         if transaction_active:
-                             logger.info(f"[DB Commit] Committing progress transaction at {dir_count} directories")
-                             db.conn.commit()
-                             transaction_active = False
-                             
-                         db.update_scan_progress(drive_id, current_dir)
+                         # Wird nach den Verzeichnissen davor committet (FIFO)
+                         writer.submit('scanner', 'scan_progress', drive_id, current_dir)
                      except Exception as e:
                          logger.warning(f"[Core Scan Warnung] Fehler beim Speichern des Fortschritts: {e}") # Geändert auf logger.warning
             # else: # Debugging, falls gewünscht
             #    logger.debug(f"[Core Scan Resuming] Verarbeitung übersprungen für {current_dir}") # Geändert auf logger.debug
-            
-            # Überprüfen, ob wir die aktuelle Transaktion committen sollten
-            current_time = time.time()
-            if transaction_active and (
-                dir_count % commit_interval == 0 or  # Entweder basierend auf Anzahl der Verzeichnisse
-                current_time - last_commit_time > max_transaction_time  # Oder basierend auf Zeit
-            ):
-                logger.info(f"[DB Commit] Committing intermediate transaction (dirs: {dir_count}, time: {current_time - last_commit_time:.1f}s)")
-                db.conn.commit()
-                transaction_active = False
 
         # Nach dem gesamten Walk (nur wenn keine Exception auftrat):
-        logger.info("[Core Scan] os.walk beendet. Bereite Commit der Haupt-Transaktion vor...") # Geändert auf logger.info
-        if transaction_active:
-            logger.info(f"[DB Commit] Committing final walk transaction (scanner_core.py)") # Geändert auf logger.info
-        db.conn.commit() # Alle Änderungen speichern
-        transaction_active = False
+        logger.info("[Core Scan] os.walk beendet. Warte auf Commit der Write-Queue...") # Geändert auf logger.info
+        # Verzeichnis-Rollups bucht insert_directory_files pro Verzeichnis mit
+        writer.flush()
+        scanner_errors = writer.get_stats().get('scanner', {}).get('errors', 0) - errors_before
+        if scanner_errors:
+            logger.error(f"[Core Scan FEHLER] {scanner_errors} Schreiboperationen fehlgeschlagen.")
+            return False
         # Log über gefundene Dateien/Verzeichnisse NACH erfolgreichem Commit
         logger.info(f"[Core Scan] {dir_count} Verzeichnisse und {file_count} Dateien verarbeitet und committet.") # Geändert auf logger.info
 
@@ -323,9 +348,8 @@ def run_scan(base_path, force_restart=False):
         # Optional: Stacktrace loggen
         import traceback
         logger.error(traceback.format_exc()) # Geändert auf logger.error
-        if transaction_active:
-            logger.warning("[Core Scan] Rollback Transaktion aufgrund eines Fehlers.") # Geändert auf logger.warning
-            db.conn.rollback() # Änderungen verwerfen
+        # Bereits eingereihte Operationen noch abschließen, damit der Fortsetzungspunkt stimmt
+        writer.flush()
         return False # Fehler signalisieren
 
     # Erfolgreicher Abschluss (nur wenn kein Fehler beim letzten Commit auftrat)
@@ -336,23 +360,11 @@ def run_scan(base_path, force_restart=False):
     
     # Erweiterte Statistiken für optimierte DB
     try:
-        # Extension-Statistiken für dieses Laufwerk
-        db.cursor.execute("""
-            SELECT e.name, e.category, COUNT(f.id) as count 
-            FROM extensions e 
-            JOIN files f ON e.id = f.extension_id 
-            JOIN directories d ON f.directory_id = d.id 
-            WHERE d.drive_id = ?
-            GROUP BY e.id 
-            HAVING count > 0
-            ORDER BY count DESC 
-            LIMIT 10
-        """, (drive_id,))
-        
-        ext_stats = db.cursor.fetchall()
+        # Extension-Statistiken für dieses Laufwerk (Trigger-gepflegte file_stats)
+        ext_stats = db.get_extension_stats(drive_id, limit=10)
         if ext_stats:
             logger.info("[Core Scan] Top Extensions auf diesem Laufwerk:")
-            for ext, category, count in ext_stats:
+            for ext, category, count, _ in ext_stats:
                 logger.info(f"  {ext:12} ({category:10}): {count:>8,} Dateien")
         
         # Performance-Statistiken
@@ -413,8 +425,8 @@ def main():
     global_hashing = CONFIG.get('hashing', False)
     hash_dirs = CONFIG.get('hash_directories', [])
 
-    # DB-Instanz holen
-    db = get_db_instance()
+    # DB-Instanz holen (im Shard-Layout die des gescannten Laufwerks)
+    db = get_db_for_drive(os.path.splitdrive(scan_path)[0] + "/")
     
     # Interaktive Abfrage für Scan-Modus (nur wenn keine Argumente und interaktive Konsole)
     if not args.restart and not args.scheduled and sys.stdout.isatty():
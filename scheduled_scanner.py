@@ -11,6 +11,7 @@ import json
 # Importiere zentrale Funktionen und Konstanten
 from utils import logger, CONFIG, PROJECT_DIR, load_config, save_config
 from models import get_db_instance
+import db_maintenance
 
 # Datei zum Tracking der letzten Ausfuehrungen
 _LAST_RUN_FILE = os.path.join(PROJECT_DIR, '.scheduled_last_runs.json')
@@ -300,6 +301,16 @@ def check_and_run_scheduled_scans():
                 logger.error(f"[Scheduled Scan] Scan konnte nicht gestartet werden: {scan_config.get('scan_type')}")
 
 
+def run_maintenance_if_due():
+    """DB-Wartung (ANALYZE, incremental_vacuum, integrity_check) nach Scans und im Leerlauf."""
+    if not CONFIG.get('maintenance_enabled', True):
+        return
+    try:
+        db_maintenance.run_if_due(get_db_instance())
+    except Exception as e:
+        logger.error(f"[Scheduled Scanner] Fehler bei der DB-Wartung: {e}")
+
+
 def run_scheduler_loop(interval=30, stop_event=None):
     """Laeuft als Endlosschleife und prueft regelmaessig auf faellige Scans.
 
@@ -316,6 +327,7 @@ def run_scheduler_loop(interval=30, stop_event=None):
                 logger.info("[Scheduled Scanner] Stop-Signal empfangen, beende Scheduler.")
                 break
             check_and_run_scheduled_scans()
+            run_maintenance_if_due()
             # Warte in kleinen Schritten, um Stop-Signal schneller zu erkennen
             for _ in range(interval):
                 if stop_event and stop_event.is_set():
@@ -343,6 +355,7 @@ def main():
     else:
         logger.info("[Scheduled Scanner] Einmalige Pruefung auf faellige Scans.")
         check_and_run_scheduled_scans()
+        run_maintenance_if_due()
         logger.info("[Scheduled Scanner] Pruefung abgeschlossen.")
 
 
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Optionales Shard-Layout: eine Datenbankdatei pro Laufwerk plus kleiner Katalog.
+
+Experimentell, aktiv nur mit CONFIG 'database_layout': 'sharded' und
+'experimental_sharded_layout': true - GUI, Werkzeuge, Export,
+Integritätsprüfung und Wartung lesen noch Dateien.db. Dann gilt:
+- Scanner und Watchdog schreiben über models.get_db_for_drive() in den Shard
+  ihres Laufwerks. Jeder Shard hat eigenen Writer-Lock, eigene Write-Queue und
+  eigenen Scan-Lock, ein Scan von D: blockiert also keine Watchdog-Schreibzugriffe
+  auf C: und Laufwerke können parallel gescannt werden.
+- Ein Laufwerk entfernen (drive_purge --drive, Scan mit --restart) ist ein
+  Löschen der Shard-Datei statt eines CASCADE-DELETE über Millionen Zeilen.
+- Laufwerksübergreifende Abfragen laufen über federated_connection(): alle
+  Shards per ATTACH (nur lesend) und TEMP-Views all_* mit UNION ALL.
+
+Jeder Shard hat das normale Schema (Migrationen, Statistik, Suchindex) mit genau
+einem Laufwerk. IDs sind nur innerhalb eines Shards eindeutig, die Views
+liefern daher zusätzlich shard_id.
+
+    python shard_manager.py --split            # Laufwerke aus Dateien.db in Shards verschieben
+    python shard_manager.py --list
+    python shard_manager.py --drop "D:/"
+"""
+
+import argparse
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+
+import models
+from utils import logger, DB_PATH, CONFIG, PROJECT_DIR
+
+SHARD_DIR = CONFIG.get('shard_dir') or os.path.join(PROJECT_DIR, "shards")
+CATALOG_NAME = "catalog.db"
+
+# Laufwerksübergreifende Views (Name -> SELECT je Shard, {s} = Schema-Alias, {n} = shard_id)
+FEDERATED_VIEWS = {
+    'all_drives': "SELECT {n} AS shard_id, id, name FROM {s}.drives",
+    'all_directories': ("SELECT {n} AS shard_id, d.id, d.drive_id, d.parent_id, d.directory_name, p.full_path "
+                        "FROM {s}.directories d JOIN {s}.directory_paths p ON p.id = d.id"),
+    'all_files': ("SELECT {n} AS shard_id, f.id, f.directory_id, f.filename, "
+                  "CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END AS extension, "
+                  "e.category, f.size, f.hash, f.mtime_ns, f.ctime_ns "
+                  "FROM {s}.files f LEFT JOIN {s}.extensions e ON e.id = f.extension_id"),
+    'all_file_stats': ("SELECT {n} AS shard_id, s.drive_id, "
+                       "CASE WHEN e.name IS NULL OR e.name = '[none]' THEN '' ELSE e.name END AS extension, "
+                       "e.category, s.file_count, s.total_size "
+                       "FROM {s}.file_stats s LEFT JOIN {s}.extensions e ON e.id = s.extension_id"),
+}
+
+
+def shard_file_name(drive_name):
+    """Dateiname eines Shards: 'C:/' -> 'C.db', '/' -> 'root.db'."""
+    return (re.sub(r'[^A-Za-z0-9]+', '_', drive_name).strip('_') or "root") + ".db"
+
+
+class ShardManager:
+    """Katalog der Laufwerks-Shards und Zugriff auf deren DBManager-Instanzen."""
+
+    def __init__(self, shard_dir=None):
+        self.shard_dir = shard_dir or SHARD_DIR
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.catalog_path = os.path.join(self.shard_dir, CATALOG_NAME)
+        self._lock = threading.RLock()
+        self._shards = {}  # drive_name -> DBManager
+        self.catalog = sqlite3.connect(self.catalog_path, check_same_thread=False, timeout=30)
+        self.catalog.execute("PRAGMA journal_mode = WAL")
+        self.catalog.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                drive_name TEXT PRIMARY KEY,
+                file_name TEXT UNIQUE NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.catalog.commit()
+
+    def drives(self):
+        """[(drive_name, shard_path), ...] aller registrierten Shards."""
+        with self._lock:
+            rows = self.catalog.execute("SELECT drive_name, file_name FROM shards ORDER BY drive_name").fetchall()
+        return [(name, os.path.join(self.shard_dir, file_name)) for name, file_name in rows]
+
+    def shard_path(self, drive_name, create=True):
+        """Pfad des Shards eines Laufwerks; legt den Katalogeintrag bei Bedarf an."""
+        with self._lock:
+            row = self.catalog.execute("SELECT file_name FROM shards WHERE drive_name = ?", (drive_name,)).fetchone()
+            if row:
+                return os.path.join(self.shard_dir, row[0])
+            if not create:
+                return None
+            base = shard_file_name(drive_name)
+            file_name, suffix = base, 1
+            while self.catalog.execute("SELECT 1 FROM shards WHERE file_name = ?", (file_name,)).fetchone():
+                suffix += 1
+                file_name = f"{base[:-3]}_{suffix}.db"
+            self.catalog.execute("INSERT INTO shards (drive_name, file_name, created_at) VALUES (?, ?, ?)",
+                                 (drive_name, file_name, time.time()))
+            self.catalog.commit()
+            logger.info(f"[Shard] Neuer Shard für {drive_name}: {file_name}")
+            return os.path.join(self.shard_dir, file_name)
+
+    def get_shard(self, drive_name):
+        """DBManager des Laufwerks-Shards (eigener Lock, eigene Write-Queue)."""
+        with self._lock:
+            db = self._shards.get(drive_name)
+            if db is None:
+                db = models.DBManager(self.shard_path(drive_name), lock=threading.RLock())
+                db.get_or_create_drive(drive_name)
+                db.conn.commit()
+                self._shards[drive_name] = db
+            return db
+
+    def open_shards(self):
+        """Aktuell geöffnete Shard-Instanzen (z.B. für Checkpoints)."""
+        with self._lock:
+            return list(self._shards.values())
+
+    def _close_shard(self, drive_name):
+        db = self._shards.pop(drive_name, None)
+        if db is None:
+            return
+        with models._write_queue_lock:
+            writer = models._write_queues.pop(db.path, None)
+        if writer:
+            writer.stop()
+        db.close()
+
+    def drop_drive(self, drive_name):
+        """Entfernt ein Laufwerk komplett: Shard-Datei löschen statt CASCADE-DELETE."""
+        with self._lock:
+            path = self.shard_path(drive_name, create=False)
+            if path is None:
+                return False
+            self._close_shard(drive_name)
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            self.catalog.execute("DELETE FROM shards WHERE drive_name = ?", (drive_name,))
+            self.catalog.commit()
+        logger.info(f"[Shard] Laufwerk {drive_name} entfernt ({os.path.basename(path)} gelöscht)")
+        return True
+
+    def federated_connection(self):
+        """Lesende Verbindung mit allen Shards per ATTACH und den Views aus FEDERATED_VIEWS."""
+        conn = sqlite3.connect(pathlib.Path(os.path.abspath(self.catalog_path)).as_uri() + "?mode=ro", uri=True,
+                               check_same_thread=False)
+        shards = self.drives()
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, 'getlimit') else 10
+        if len(shards) > limit:
+            logger.warning(f"[Shard] {len(shards)} Shards, aber nur {limit} ATTACH möglich - Rest fehlt in den Views.")
+            shards = shards[:limit]
+        for n, (_, path) in enumerate(shards):
+            conn.execute(f"ATTACH DATABASE ? AS s{n}", (pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro",))
+        if shards:
+            for view, select in FEDERATED_VIEWS.items():
+                body = " UNION ALL ".join(select.format(s=f"s{n}", n=n) for n in range(len(shards)))
+                conn.execute(f"CREATE TEMP VIEW {view} AS {body}")
+        return conn
+
+    def close(self):
+        with self._lock:
+            for drive_name in list(self._shards):
+                self._close_shard(drive_name)
+            self.catalog.close()
+
+
+def _drive_counts(conn, drive_id):
+    """(Verzeichnisse, Dateien) eines Laufwerks."""
+    return conn.execute("""
+        SELECT (SELECT COUNT(*) FROM directories WHERE drive_id = ?),
+               (SELECT COUNT(*) FROM files f JOIN directories d ON d.id = f.directory_id WHERE d.drive_id = ?)
+    """, (drive_id, drive_id)).fetchone()
+
+
+def _copy_drive(source_path, path, drive_id, drive_name):
+    """Kopiert ein Laufwerk aus der Einzel-DB in einen neuen Shard (IDs bleiben erhalten)."""
+    db = models.DBManager(path, lock=threading.RLock())
+    with db.lock:
+        db.conn.commit()
+        # Kopie ist in sich konsistent; FK-Prüfung erst danach wieder an
+        db.conn.execute("PRAGMA foreign_keys = OFF")
+        db.conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+        # Extension-IDs der Quelle übernehmen (files.extension_id verweist darauf)
+        db.conn.execute("DELETE FROM extensions")
+        db.conn.execute("INSERT INTO extensions SELECT * FROM src.extensions")
+        db.conn.execute("INSERT INTO drives (id, name) VALUES (?, ?)", (drive_id, drive_name))
+        db.conn.execute("""
+            INSERT INTO directories (id, drive_id, parent_id, directory_name, full_path, depth_level)
+            SELECT id, drive_id, parent_id, directory_name, full_path, depth_level
+            FROM src.directories WHERE drive_id = ?
+        """, (drive_id,))
+        db.conn.execute("""
+            INSERT INTO files (id, directory_id, filename, extension_id, size, hash, created_date,
+                               modified_date, attributes, mtime_ns, ctime_ns)
+            SELECT f.id, f.directory_id, f.filename, f.extension_id, f.size, f.hash, f.created_date,
+                   f.modified_date, f.attributes, f.mtime_ns, f.ctime_ns
+            FROM src.files f JOIN src.directories d ON d.id = f.directory_id
+            WHERE d.drive_id = ?
+        """, (drive_id,))
+        db.conn.execute("INSERT INTO scan_progress SELECT * FROM src.scan_progress WHERE drive_id = ?", (drive_id,))
+        db.rebuild_directory_stats(drive_id)
+        db.conn.commit()
+        db.conn.execute("DETACH DATABASE src")
+        db.conn.execute("PRAGMA foreign_keys = ON")
+        # Hashes wurden im Format der Quelle kopiert: in das hash_storage-Format des Shards bringen
+        db._migrate_hash_storage()
+        counts = _drive_counts(db.conn, drive_id)
+    db.close()
+    return counts
+
+
+def split_database(source_path=DB_PATH, manager=None):
+    """Verschiebt die Laufwerke einer Einzel-DB in Laufwerks-Shards (IDs bleiben erhalten).
+
+    Jedes Laufwerk wird kopiert, die Kopie gezählt und erst dann blockweise
+    (drive_purge) aus der Quelle gelöscht. Ein abgebrochener Lauf setzt beim
+    nächsten Aufruf fort: vollständige Shards werden nicht erneut kopiert,
+    begonnene Löschvorgänge zu Ende geführt.
+    """
+    import drive_purge
+    manager = manager or get_shard_manager()
+    source = models.DBManager(source_path)
+    try:
+        for drive_id, drive_name in source.conn.execute("SELECT id, name FROM drives").fetchall():
+            start = time.time()
+            path = manager.shard_path(drive_name)
+            if not drive_purge.pending_purge(source, drive_id):
+                expected = _drive_counts(source.conn, drive_id)
+                if os.path.exists(path):
+                    check = sqlite3.connect(path)
+                    try:
+                        copied = _drive_counts(check, drive_id)
+                    finally:
+                        check.close()
+                    if copied != expected:
+                        logger.warning(f"[Shard] {path} existiert bereits mit anderem Inhalt, überspringe {drive_name}")
+                        continue
+                else:
+                    copied = _copy_drive(source_path, path, drive_id, drive_name)
+                    if copied != expected:
+                        raise RuntimeError(f"Shard für {drive_name} unvollständig: {copied} statt {expected} "
+                                           f"(Verzeichnisse, Dateien) - Quelle bleibt unverändert")
+            # Kopie vollständig: Laufwerk aus der Quelle entfernen
+            drive_purge.purge_drive(source, drive_id)
+            with source.lock:
+                for table, column in (("file_stats", "drive_id"), ("drive_stats", "drive_id"), ("drives", "id")):
+                    source.conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (drive_id,))
+                source.conn.commit()
+            logger.info(f"[Shard] {drive_name} -> {os.path.basename(path)} verschoben ({time.time() - start:.2f}s)")
+    finally:
+        source.close()
+
+
+_shard_manager = None
+_shard_manager_lock = threading.Lock()
+
+
+def get_shard_manager():
+    """Globale ShardManager-Instanz."""
+    global _shard_manager
+    with _shard_manager_lock:
+        if _shard_manager is None:
+            _shard_manager = ShardManager()
+        return _shard_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Laufwerks-Shards verwalten")
+    parser.add_argument("--split", action="store_true", help="Laufwerke aus Dateien.db in Shards verschieben")
+    parser.add_argument("--list", action="store_true", help="Shards und Dateianzahl anzeigen")
+    parser.add_argument("--drop", metavar="LAUFWERK", help="Laufwerk entfernen (Shard-Datei löschen)")
+    args = parser.parse_args()
+    manager = get_shard_manager()
+    if args.split:
+        split_database()
+    if args.drop:
+        print("Entfernt" if manager.drop_drive(args.drop) else "Kein Shard für dieses Laufwerk")
+    if args.list or not (args.split or args.drop):
+        conn = manager.federated_connection()
+        for n, (drive_name, path) in enumerate(manager.drives()):
+            count = conn.execute("SELECT IFNULL(SUM(file_count), 0) FROM all_file_stats WHERE shard_id = ?",
+                                 (n,)).fetchone()[0]
+            print(f"{drive_name:12} {os.path.basename(path):16} {count:>12,} Dateien")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
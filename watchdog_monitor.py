@@ -9,32 +9,22 @@ import time
 import sys
 import logging
 import sqlite3
+import threading
 # *** ENTFERNT: Debug-Import-Check ***
 # try:
 #     with open(DEBUG_FILE, "a") as f: f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - watchdog_monitor: Imported os, time, sys, sqlite3.\n")
 # except: pass
 
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from drive_alias_detector import normalize_path_with_aliases, get_drive_mapping
-
-# Globale Variable für Drive-Mappings (wird einmal geladen)
-_drive_mappings = None
-
-def _get_drive_mappings():
-    """Hole Drive-Mappings (einmal cachen für Performance)"""
-    global _drive_mappings
-    if _drive_mappings is None:
-        _drive_mappings = get_drive_mapping()
-    return _drive_mappings
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from drive_alias_detector import get_alias_resolver
 
 def _normalize_path_for_watchdog(path):
-    """Normalisiert Pfad unter Berücksichtigung von Laufwerk-Aliases"""
+    """Normalisiert Pfad unter Berücksichtigung von Laufwerk-Aliases (Dict-Suche, kein subst/net use)"""
     try:
-        mappings = _get_drive_mappings()
-        normalized_path, is_alias, orig_drive, real_drive = normalize_path_with_aliases(path, mappings)
+        normalized_path, is_alias, orig_drive, real_drive = get_alias_resolver().resolve(path)
         if is_alias:
-            logger.info(f"[Watchdog Alias] Konvertiert {path} -> {normalized_path}")
+            logger.debug(f"[Watchdog Alias] Konvertiert {path} -> {normalized_path}")
         return normalized_path
     except Exception as e:
         logger.warning(f"[Watchdog Alias-Fehler] {path}: {e}")
@@ -63,7 +53,8 @@ except Exception as utils_ex:
     raise # Fehler weiter werfen, damit Hauptskript ihn bemerkt
 
 try:
-    from models import get_db_instance, _db_lock
+    from models import get_db_for_drive, get_write_queue
+    from scanner_core import scan_subtree
     # *** ENTFERNT: Debug-Import-Check ***
     # with open(DEBUG_FILE, "a") as f: f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - watchdog_monitor: Imported from models.\n")
 except Exception as models_ex:
@@ -114,6 +105,363 @@ IGNORE_FILENAMES = [
 ]
 # --- Ende Ignorier-Listen ---
 
+# Ereignisse je Pfad sammeln, bis watchdog_settle_seconds lang Ruhe ist (0 = sofort verarbeiten)
+SETTLE_SECONDS = CONFIG.get('watchdog_settle_seconds', 1.0)
+# Spätestens nach dieser Zeit wird auch ein ständig geänderter Pfad weitergegeben
+MAX_DELAY_SECONDS = CONFIG.get('watchdog_max_delay_seconds', 30.0)
+# Obergrenze gesammelter Pfade; darüber werden Ereignisse verworfen und das
+# Verzeichnis stattdessen gezielt neu gescannt
+MAX_PENDING = CONFIG.get('watchdog_max_pending', 50000)
+
+# Zusammenfassung zweier Ereignisse desselben Pfads (None = heben sich auf)
+_MERGED_KIND = {
+    ('created', 'created'): 'created',
+    ('created', 'modified'): 'created',
+    ('created', 'deleted'): None,
+    ('modified', 'created'): 'modified',
+    ('modified', 'modified'): 'modified',
+    ('modified', 'deleted'): 'deleted',
+    ('deleted', 'created'): 'modified',   # ersetzt: wie eine Änderung behandeln
+    ('deleted', 'modified'): 'modified',
+    ('deleted', 'deleted'): 'deleted',
+}
+
+
+class EventCoalescer:
+    """Fasst Watchdog-Ereignisse je Pfad zusammen, bevor sie die DB erreichen.
+
+    Windows meldet pro Speichern 3-10 Änderungen, ein großer Kopiervorgang
+    hunderte. Statt jedes Ereignis einzeln (stat + Hash + Schreiben) zu
+    verarbeiten, wird pro Pfad nur der Endzustand weitergegeben, sobald
+    settle_seconds lang kein neues Ereignis kam: created+modified -> created,
+    created+deleted -> nichts, modified+deleted -> deleted. Umbenennungen
+    nehmen den gesammelten Zustand der Quelle mit.
+
+    Die Zahl gesammelter Pfade ist auf max_pending begrenzt, der Observer-Thread
+    blockiert also nie. Ist die Grenze erreicht oder meldet das Betriebssystem
+    einen Pufferüberlauf (overflow()), wird das betroffene Verzeichnis für einen
+    gezielten Rescan vorgemerkt; rescan(path, recursive) läuft, sobald die
+    Warteschlange wieder unter die Hälfte gefallen ist.
+
+    dispatch(kind, path, is_directory, src_path, modified) und rescan werden im
+    eigenen Thread aufgerufen (außerhalb des Locks, dürfen also blockieren).
+    """
+
+    def __init__(self, dispatch, settle_seconds=None, max_delay_seconds=None, max_pending=None, rescan=None):
+        self.dispatch = dispatch
+        self.rescan = rescan
+        self.settle_seconds = SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.max_delay_seconds = MAX_DELAY_SECONDS if max_delay_seconds is None else max_delay_seconds
+        self.max_pending = max_pending or MAX_PENDING
+        self.pending = {}  # Pfad -> Eintrag (kind, is_directory, src_path, modified, first, last)
+        self.rescans = {}  # Verzeichnis -> rekursiv (True/False), für gezielten Rescan vorgemerkt
+        self.cond = threading.Condition()
+        self.metrics = {'events_in': {}, 'events_out': {}, 'merged': 0, 'cancelled': 0, 'max_pending': 0,
+                        'dropped': 0, 'os_overflows': 0, 'rescans_queued': 0, 'rescans_done': 0}
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, daemon=True, name="WatchdogCoalescer")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Beendet den Thread und gibt alle gesammelten Ereignisse noch weiter.
+
+        Vorgemerkte Rescans laufen nicht mehr (Dienst beendet sich), sie werden
+        protokolliert; die nächste Integritätsprüfung gleicht sie ab.
+        """
+        if self._thread is not None:
+            with self.cond:
+                self._stop = True
+                self.cond.notify()
+            self._thread.join()
+            self._thread = None
+        self.flush(rescans=False)
+        if self.rescans:
+            logger.warning(f"[Watchdog Coalescer] {len(self.rescans)} vorgemerkte Rescans nicht ausgeführt: "
+                           f"{', '.join(list(self.rescans)[:5])}")
+
+    def add(self, kind, path, is_directory=False, dest_path=None, now=None):
+        """Nimmt ein Ereignis auf ('created', 'modified', 'deleted', 'moved')."""
+        now = time.monotonic() if now is None else now
+        with self.cond:
+            self._count('events_in', kind)
+            if len(self.pending) >= self.max_pending and path not in self.pending:
+                # Warteschlange voll: Ereignis verwerfen, Verzeichnis später abgleichen
+                self.metrics['dropped'] += 1
+                self._drop(path, is_directory)
+                if kind == 'moved':
+                    self._drop(dest_path, is_directory)
+                self.cond.notify()
+                return
+            if kind == 'moved':
+                self._add_move(path, dest_path, is_directory, now)
+            else:
+                entry = self.pending.get(path)
+                if entry is None:
+                    self.pending[path] = self._entry(kind, is_directory, now)
+                else:
+                    self.metrics['merged'] += 1
+                    self._merge(path, entry, kind, now)
+                if kind == 'deleted' and is_directory:
+                    # Gesammelte Ereignisse im gelöschten Verzeichnis sind gegenstandslos
+                    prefix = path.rstrip("\\/") + os.sep
+                    for child in [p for p in self.pending if p.startswith(prefix)]:
+                        del self.pending[child]
+                        self.metrics['cancelled'] += 1
+            self.metrics['max_pending'] = max(self.metrics['max_pending'], len(self.pending))
+            self.cond.notify()
+
+    def overflow(self, path):
+        """Das Betriebssystem hat Ereignisse unter path verloren: Teilbaum neu abgleichen."""
+        with self.cond:
+            self.metrics['os_overflows'] += 1
+            self._queue_rescan(path, recursive=True)
+            self.cond.notify()
+
+    def queue_rescan(self, path, recursive=True):
+        """Merkt ein Verzeichnis für einen gezielten Rescan vor (z.B. unbekannte Quelle einer Verschiebung)."""
+        with self.cond:
+            self._queue_rescan(path, recursive)
+            self.cond.notify()
+
+    def _drop(self, path, is_directory):
+        # Verzeichnis-Ereignis: Teilbaum des Elternverzeichnisses, Datei: nur ihr Verzeichnis
+        self._queue_rescan(os.path.dirname(path), recursive=is_directory)
+
+    def _queue_rescan(self, path, recursive):
+        """Merkt ein Verzeichnis vor; bereits rekursiv vorgemerkte Vorfahren decken es ab."""
+        path = path.rstrip("\\/") or path
+        ancestor = path
+        while True:
+            if self.rescans.get(ancestor) or (ancestor == path and ancestor in self.rescans and not recursive):
+                return
+            parent = os.path.dirname(ancestor)
+            if parent == ancestor:
+                break
+            ancestor = parent
+        if recursive:
+            prefixes = (path + os.sep, path + "/")
+            for covered in [p for p in self.rescans if p.startswith(prefixes)]:
+                del self.rescans[covered]
+        self.rescans[path] = recursive
+        self.metrics['rescans_queued'] += 1
+
+    @staticmethod
+    def _entry(kind, is_directory, now, src_path=None, modified=False, first=None):
+        return {'kind': kind, 'is_directory': is_directory, 'src_path': src_path,
+                'modified': modified, 'first': now if first is None else first, 'last': now}
+
+    def _merge(self, path, entry, kind, now):
+        entry['last'] = now
+        if entry['kind'] == 'moved':
+            if kind == 'deleted':
+                # Umbenannt und dann gelöscht: in der DB steht noch die Quelle
+                del self.pending[path]
+                self.pending[entry['src_path']] = self._entry('deleted', entry['is_directory'], now,
+                                                              first=entry['first'])
+            else:
+                entry['modified'] = True
+            return
+        merged = _MERGED_KIND[(entry['kind'], kind)]
+        if merged is None:
+            del self.pending[path]
+            self.metrics['cancelled'] += 1
+        else:
+            entry['kind'] = merged
+
+    def _add_move(self, src_path, dest_path, is_directory, now):
+        self._add_move_entry(src_path, dest_path, is_directory, now)
+        if is_directory:
+            # Gesammelte Ereignisse im Verzeichnis gehören jetzt zum neuen Pfad und
+            # werden erst nach der Verschiebung selbst weitergegeben
+            prefix = src_path.rstrip("\\/") + os.sep
+            for child in [p for p in self.pending if p.startswith(prefix)]:
+                entry = self.pending.pop(child)
+                entry['first'] = entry['last'] = now
+                self.pending[dest_path.rstrip("\\/") + os.sep + child[len(prefix):]] = entry
+
+    def _add_move_entry(self, src_path, dest_path, is_directory, now):
+        entry = self.pending.pop(src_path, None)
+        if entry is None:
+            self.pending[dest_path] = self._entry('moved', is_directory, now, src_path=src_path)
+            return
+        self.metrics['merged'] += 1
+        if entry['kind'] == 'created':
+            # Temporäre Datei angelegt und umbenannt (typisches Speichern): nur das Ziel anlegen
+            self.pending[dest_path] = self._entry('created', is_directory, now, first=entry['first'])
+        elif entry['kind'] == 'moved':
+            # Kette a -> b -> c: eine Verschiebung a -> c
+            self.pending[dest_path] = self._entry('moved', is_directory, now, src_path=entry['src_path'],
+                                                  modified=entry['modified'], first=entry['first'])
+        else:
+            self.pending[dest_path] = self._entry('moved', is_directory, now, src_path=src_path,
+                                                  modified=True, first=entry['first'])
+
+    def _count(self, key, kind):
+        counts = self.metrics[key]
+        counts[kind] = counts.get(kind, 0) + 1
+
+    def _take_due(self, now, everything=False):
+        """Entnimmt die fälligen Einträge (in Reihenfolge des ersten Ereignisses)."""
+        due = [(path, entry) for path, entry in self.pending.items()
+               if everything or now - entry['last'] >= self.settle_seconds
+               or now - entry['first'] >= self.max_delay_seconds]
+        for path, _ in due:
+            del self.pending[path]
+        due.sort(key=lambda item: item[1]['first'])
+        return due
+
+    def poll(self, now=None):
+        """Gibt alle fälligen Einträge weiter, danach ggf. vorgemerkte Rescans. Gibt die Anzahl Einträge zurück."""
+        now = time.monotonic() if now is None else now
+        with self.cond:
+            due = self._take_due(now)
+        count = self._dispatch(due)
+        self._run_rescans()
+        return count
+
+    def flush(self, rescans=True):
+        """Gibt alle gesammelten Einträge sofort weiter (und führt vorgemerkte Rescans aus)."""
+        with self.cond:
+            due = self._take_due(0, everything=True)
+        count = self._dispatch(due)
+        if rescans:
+            self._run_rescans()
+        return count
+
+    def _run_rescans(self):
+        with self.cond:
+            # Erst wenn der Ansturm vorbei ist, sonst läuft der Rescan gegen laufende Änderungen
+            if not self.rescans or self.rescan is None or len(self.pending) > self.max_pending // 2:
+                return
+            rescans, self.rescans = self.rescans, {}
+        for path, recursive in rescans.items():
+            try:
+                self.rescan(path, recursive)
+            except Exception as e:
+                logger.error(f"[Watchdog Coalescer] Rescan von {path} fehlgeschlagen: {e}")
+            with self.cond:
+                self.metrics['rescans_done'] += 1
+
+    def _dispatch(self, due):
+        for path, entry in due:
+            with self.cond:
+                self._count('events_out', entry['kind'])
+            try:
+                self.dispatch(entry['kind'], path, entry['is_directory'], entry['src_path'], entry['modified'])
+            except Exception as e:
+                logger.error(f"[Watchdog Coalescer] Fehler bei {entry['kind']} {path}: {e}")
+        return len(due)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if self._stop:
+                    return
+                now = time.monotonic()
+                if self.pending:
+                    next_due = min(min(entry['last'] + self.settle_seconds, entry['first'] + self.max_delay_seconds)
+                                   for entry in self.pending.values())
+                    timeout = max(next_due - now, 0.01)
+                elif self.rescans:
+                    timeout = self.settle_seconds
+                else:
+                    timeout = None
+                self.cond.wait(timeout)
+                if self._stop:
+                    return
+            self.poll()
+
+    def get_metrics(self):
+        with self.cond:
+            events_in = sum(self.metrics['events_in'].values())
+            events_out = sum(self.metrics['events_out'].values())
+            return {
+                'events_in': events_in,
+                'events_out': events_out,
+                'events_in_by_kind': dict(self.metrics['events_in']),
+                'events_out_by_kind': dict(self.metrics['events_out']),
+                'merged': self.metrics['merged'],
+                'cancelled': self.metrics['cancelled'],
+                'pending': len(self.pending),
+                'max_pending': self.metrics['max_pending'],
+                'capacity': self.max_pending,
+                'dropped': self.metrics['dropped'],
+                'os_overflows': self.metrics['os_overflows'],
+                'rescans_pending': len(self.rescans),
+                'rescans_queued': self.metrics['rescans_queued'],
+                'rescans_done': self.metrics['rescans_done'],
+                'reduction': 1 - events_out / events_in if events_in else 0.0,
+            }
+
+    def log_metrics(self, label=""):
+        m = self.get_metrics()
+        logger.info(
+            f"[Watchdog Coalescer] {label}{m['events_in']} Ereignisse -> {m['events_out']} weitergegeben "
+            f"({m['reduction']:.0%} eingespart), {m['merged']} zusammengefasst, {m['cancelled']} aufgehoben, "
+            f"{m['pending']} wartend (max {m['max_pending']} von {m['capacity']})"
+        )
+        if m['dropped'] or m['os_overflows']:
+            logger.warning(
+                f"[Watchdog Coalescer] {label}{m['dropped']} Ereignisse verworfen, {m['os_overflows']} Pufferüberläufe, "
+                f"{m['rescans_done']}/{m['rescans_queued']} gezielte Rescans ausgeführt"
+            )
+
+
+class OverflowEvent(FileSystemEvent):
+    """Das Betriebssystem hat Ereignisse unter src_path verworfen (Puffer übergelaufen)."""
+    event_type = 'overflow'
+    is_directory = True
+
+
+_MISSING = object()
+
+# watchdog meldet einen Überlauf des ReadDirectoryChangesW-Puffers nicht, sondern
+# liefert nur keine Ereignisse. Unter Windows wird die leere Antwort (0 Bytes, ohne
+# dass der Observer gestoppt wurde) deshalb als OverflowEvent weitergegeben.
+try:
+    from watchdog.observers.api import BaseObserver, DEFAULT_OBSERVER_TIMEOUT
+    from watchdog.observers.read_directory_changes import WindowsApiEmitter
+    from watchdog.observers.winapi import read_directory_changes, WinAPINativeEvent
+    from watchdog.observers.winapi import _parse_event_buffer as parse_event_buffer
+
+    class _OverflowAwareEmitter(WindowsApiEmitter):
+        def _read_events(self):
+            handle = getattr(self, '_whandle', _MISSING)
+            if handle is _MISSING:
+                # Andere watchdog-Version: Standardverhalten ohne Überlauf-Erkennung
+                return super()._read_events()
+            if not handle:
+                return []
+            buffer, nbytes = read_directory_changes(self._whandle, self.watch.path, recursive=self.watch.is_recursive)
+            if nbytes == 0:
+                if self.should_keep_running():
+                    logger.warning(f"[Watchdog] Ereignispuffer übergelaufen: {self.watch.path}")
+                    self.queue_event(OverflowEvent(self.watch.path))
+                return []
+            return [WinAPINativeEvent(action, src_path) for action, src_path in parse_event_buffer(buffer, nbytes)]
+
+    class _OverflowAwareObserver(BaseObserver):
+        def __init__(self, *, timeout=DEFAULT_OBSERVER_TIMEOUT):
+            super().__init__(_OverflowAwareEmitter, timeout=timeout)
+
+    if not callable(getattr(WindowsApiEmitter, '_read_events', None)):
+        # Emitter liest anders als in watchdog 6.0 (requirements.txt): Standard-Observer verwenden
+        _OverflowAwareObserver = None
+except (ImportError, AttributeError, OSError):
+    _OverflowAwareObserver = None
+
+
+def create_observer():
+    """Observer für watchdog_service; unter Windows mit Erkennung von Pufferüberläufen."""
+    return _OverflowAwareObserver() if _OverflowAwareObserver is not None else Observer()
+
+
 class FSHandler(FileSystemEventHandler):
     """Behandelt Dateisystemereignisse und aktualisiert die Datenbank."""
     def __init__(self, path_to_watch):
@@ -134,14 +482,18 @@ class FSHandler(FileSystemEventHandler):
         
         self.db = None # Wird bei Bedarf initialisiert
         self.drive_id = None # Wird bei Bedarf initialisiert
+        self.writer = None # Gemeinsame Write-Queue (Single Writer)
         self._initialize_db()
+        # Ereignisse je Pfad zusammenfassen, nur der Endzustand erreicht die DB
+        self.coalescer = EventCoalescer(self._apply_event, rescan=self._rescan).start() if SETTLE_SECONDS > 0 else None
 
     def _initialize_db(self):
         """Initialisiert die DB-Verbindung und holt die drive_id."""
         try:
-            self.db = get_db_instance() # Verwendet Standardpfad aus utils
+            self.db = get_db_for_drive(self.drive_name) # Dateien.db oder Shard des Laufwerks
             if self.db:
                 self.drive_id = self.db.get_or_create_drive(self.drive_name)
+                self.writer = get_write_queue(self.db)
                 if self.drive_id is None:
                     logger.error(f"[Watchdog-Fehler] Konnte drive_id für {self.drive_name} nicht ermitteln.")
             else:
@@ -244,188 +596,176 @@ class FSHandler(FileSystemEventHandler):
         # *** NEU: Prüfung am Anfang ***
         if self._is_ignored(event.src_path):
             return
-
-        if not self._reinitialize_db_if_needed(): return
-        try:
-            # WICHTIG: Verwende Alias-bewusste Pfad-Normalisierung
-            src_path = _normalize_path_for_watchdog(event.src_path)
-            if event.is_directory:
-                self._handle_new_directory(src_path)
-            else:
-                self._insert_or_update_file(src_path)
-        except Exception as e:
-            logger.error(f"[Watchdog Create-Fehler] {event.src_path}: {e}")
+        # WICHTIG: Verwende Alias-bewusste Pfad-Normalisierung
+        self._queue_event('created', _normalize_path_for_watchdog(event.src_path), event.is_directory)
 
     def on_modified(self, event):
         """Behandelt das Ändern von Dateien."""
         # *** NEU: Prüfung am Anfang ***
-        if self._is_ignored(event.src_path):
+        if self._is_ignored(event.src_path) or event.is_directory:
             return
-
-        if not self._reinitialize_db_if_needed(): return
-        try:
-            # WICHTIG: Verwende Alias-bewusste Pfad-Normalisierung
-            src_path = _normalize_path_for_watchdog(event.src_path)
-            if not event.is_directory:
-                if os.path.exists(src_path):
-                    self._insert_or_update_file(src_path)
-        except Exception as e:
-            logger.error(f"[Watchdog Modify-Fehler] {event.src_path}: {e}")
+        self._queue_event('modified', _normalize_path_for_watchdog(event.src_path), False)
 
     def on_moved(self, event):
         """Behandelt das Verschieben/Umbenennen von Dateien oder Verzeichnissen."""
         # *** NEU: Prüfung am Anfang (Quelle UND Ziel) ***
         if self._is_ignored(event.src_path) or self._is_ignored(event.dest_path):
             return
-
-        if not self._reinitialize_db_if_needed(): return
-
-        # WICHTIG: Verwende Alias-bewusste Pfad-Normalisierung
-        src_path = _normalize_path_for_watchdog(event.src_path)
-        dest_path = _normalize_path_for_watchdog(event.dest_path)
-        with _db_lock:
-            try:
-                if event.is_directory:
-                    logger.info(f"[Watchdog Move] Verzeichnis verschoben/umbenannt: {src_path} -> {dest_path}. Manuelle Prüfung/Rescan empfohlen.")
-                else:
-                    # Datei umbenannt/verschoben - für neue DB-Struktur
-                    src_filename = os.path.basename(src_path)
-                    dest_filename = os.path.basename(dest_path)
-                    src_dir = os.path.dirname(src_path)
-                    dest_dir = os.path.dirname(dest_path)
-                    
-                    # Finde die Datei in der optimierten Struktur
-                    src_filename_only, src_ext = os.path.splitext(src_filename)
-                    src_ext = src_ext if src_ext else '[none]'
-                    
-                    # Finde die alte directory_id
-                    self.db.cursor.execute("SELECT id FROM directories WHERE drive_id = ? AND full_path = ?", (self.drive_id, src_dir.replace("\\", "/")))
-                    src_dir_row = self.db.cursor.fetchone()
-                    if not src_dir_row:
-                        logger.warning(f"[Watchdog Move] Quell-Verzeichnis nicht gefunden: {src_dir}. Lege Ziel als neue Datei an.")
-                        self._insert_or_update_file(dest_path)
-                        return
-                    src_dir_id = src_dir_row[0]
-                    
-                    # Finde Extension-ID
-                    ext_id = self.db.get_or_create_extension(src_ext)
-                    
-                    # Finde die Datei
-                    self.db.cursor.execute(
-                        "SELECT id FROM files WHERE directory_id = ? AND filename = ? AND extension_id = ?",
-                        (src_dir_id, src_filename_only, ext_id)
-                    )
-                    file_row = self.db.cursor.fetchone()
-                    if not file_row:
-                        logger.warning(f"[Watchdog Move] Datei nicht in DB gefunden: {src_path}. Lege Ziel als neue Datei an.")
-                        self._insert_or_update_file(dest_path)
-                        return
-                    file_id = file_row[0]
-                    
-                    # Erstelle/hole neues Zielverzeichnis
-                    dest_dir_id = self.db.get_or_create_directory_optimized(self.drive_id, dest_dir.replace("\\", "/"))
-                    
-                    # Parse neuen Dateinamen
-                    dest_filename_only, dest_ext = os.path.splitext(dest_filename)
-                    dest_ext = dest_ext if dest_ext else '[none]'
-                    dest_ext_id = self.db.get_or_create_extension(dest_ext)
-                    
-                    # Loesche evtl. existierende Zieldatei (Rename-Pattern: temp -> final)
-                    self.db.cursor.execute(
-                        "DELETE FROM files WHERE directory_id = ? AND filename = ? AND id != ?",
-                        (dest_dir_id, dest_filename_only, file_id)
-                    )
-
-                    # Update die Datei
-                    self.db.cursor.execute(
-                        "UPDATE files SET directory_id = ?, filename = ?, extension_id = ? WHERE id = ?",
-                        (dest_dir_id, dest_filename_only, dest_ext_id, file_id)
-                    )
-                    
-                    # Commit the transaction
-                    self.db.conn.commit()
-                    # REAL-TIME FIX: Force WAL Checkpoint für sofortige Sichtbarkeit
-                    self.db.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
-                    
-                    logger.info(f"[Watchdog Move] Datei verschoben/umbenannt: {src_path} -> {dest_path}")
-
-            except sqlite3.Error as e:
-                logger.error(f"[Watchdog Move DB-Fehler] Transaktion fehlgeschlagen für {src_path} -> {dest_path}: {e}. Rollback wird durchgeführt.")
-                try:
-                    self.db.conn.rollback()
-                except Exception as rb_ex:
-                    logger.error(f"[Watchdog Move DB-Fehler] Kritisch: Rollback fehlgeschlagen! {rb_ex}")
-            except Exception as e:
-                logger.error(f"[Watchdog Move-Fehler] {src_path} -> {dest_path}: {e}")
+        self._queue_event('moved', _normalize_path_for_watchdog(event.src_path), event.is_directory,
+                          _normalize_path_for_watchdog(event.dest_path))
 
     def on_deleted(self, event):
         """Behandelt das Löschen von Dateien oder Verzeichnissen."""
         # *** NEU: Prüfung am Anfang ***
         if self._is_ignored(event.src_path):
             return
+        self._queue_event('deleted', _normalize_path_for_watchdog(event.src_path), event.is_directory)
+
+    def on_overflow(self, event):
+        """Ereignisse gingen verloren: Teilbaum gezielt neu abgleichen statt ganzes Laufwerk."""
+        path = _normalize_path_for_watchdog(event.src_path)
+        if self.coalescer is not None:
+            self.coalescer.overflow(path)
+        else:
+            self._rescan(path, True)
 
+    def _rescan(self, path, recursive):
+        """Gleicht ein Verzeichnis (bzw. den Teilbaum) mit dem Dateisystem ab."""
         if not self._reinitialize_db_if_needed(): return
+        dirs, files = scan_subtree(self.writer, self.drive_id, path, producer='watchdog', recursive=recursive)
+        logger.info(f"[Watchdog Rescan] {path} abgeglichen: {dirs} Verzeichnisse, {files} Dateien")
+
+    def _queue_event(self, kind, path, is_directory, dest_path=None):
+        """Reicht ein Ereignis an den Coalescer weiter (bzw. direkt, wenn abgeschaltet)."""
+        if self.coalescer is not None:
+            self.coalescer.add(kind, path, is_directory, dest_path)
+        elif kind == 'moved':
+            self._apply_event(kind, dest_path, is_directory, path)
+        else:
+            self._apply_event(kind, path, is_directory)
 
-        # WICHTIG: Verwende Alias-bewusste Pfad-Normalisierung
-        src_path = _normalize_path_for_watchdog(event.src_path)
-        
-        # *** NEU: Globalen Lock und manuelle Transaktion verwenden ***
-        with _db_lock:
+    def flush(self):
+        """Gibt gesammelte Ereignisse sofort an die Write-Queue weiter."""
+        if self.coalescer is not None:
+            self.coalescer.flush()
+
+    def stop(self):
+        """Beendet den Coalescer (gesammelte Ereignisse werden noch geschrieben)."""
+        if self.coalescer is not None:
+            self.coalescer.stop()
+
+    def _apply_event(self, kind, path, is_directory, src_path=None, modified=False):
+        """Verarbeitet den Endzustand eines Pfads (vom Coalescer bzw. direkt aufgerufen)."""
+        if not self._reinitialize_db_if_needed(): return
+        if kind == 'created':
             try:
-                deleted_rows = 0
-                
-                if event.is_directory:
-                    # Lösche Verzeichnis-Eintrag (CASCADE löst auch Dateien)
-                    deleted_rows = self.db.cursor.execute(
-                        "DELETE FROM directories WHERE full_path = ? AND drive_id = ?", (src_path.replace("\\", "/"), self.drive_id)
-                    ).rowcount
-                    if deleted_rows > 0:
-                        logger.info(f"[Watchdog Delete] Verzeichnis gelöscht: {src_path} (Kaskade löscht auch Dateien)")
+                if is_directory:
+                    self._handle_new_directory(path)
                 else:
-                    # Lösche Datei-Eintrag - neue Struktur
-                    filename = os.path.basename(src_path)
-                    dir_path = os.path.dirname(src_path)
-                    filename_only, ext = os.path.splitext(filename)
-                    ext = ext if ext else '[none]'
-                    
-                    # SQL mit JOIN für optimierte Struktur
-                    delete_sql = """
-                        DELETE FROM files 
-                        WHERE filename = ? 
-                        AND extension_id = (SELECT id FROM extensions WHERE name = ?)
-                        AND directory_id = (SELECT id FROM directories WHERE full_path = ? AND drive_id = ?)
-                    """
-                    deleted_rows = self.db.cursor.execute(
-                        delete_sql, (filename_only, ext, dir_path.replace("\\", "/"), self.drive_id)
-                    ).rowcount
-                    if deleted_rows > 0:
-                        logger.info(f"[Watchdog Delete] Datei gelöscht: {src_path}")
-
-                # Nur committen, wenn etwas gelöscht wurde und kein Fehler auftrat
-                if deleted_rows > 0:
-                    self.db.conn.commit()
-                    # REAL-TIME FIX: Force WAL Checkpoint für sofortige Sichtbarkeit
-                    self.db.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
-
-
-            except sqlite3.Error as e:
-                logger.error(f"[Watchdog Delete DB-Fehler] Transaktion fehlgeschlagen für {event.src_path}: {e}. Rollback wird durchgeführt.")
-                try:
-                    self.db.conn.rollback()
-                except Exception as rb_ex:
-                    logger.error(f"[Watchdog Delete DB-Fehler] Kritisch: Rollback fehlgeschlagen! {rb_ex}")
+                    self._insert_or_update_file(path)
             except Exception as e:
-                 logger.error(f"[Watchdog Delete-Fehler] {event.src_path}: {e}")
+                logger.error(f"[Watchdog Create-Fehler] {path}: {e}")
+        elif kind == 'modified':
+            try:
+                if os.path.exists(path):
+                    self._insert_or_update_file(path)
+            except Exception as e:
+                logger.error(f"[Watchdog Modify-Fehler] {path}: {e}")
+        elif kind == 'moved':
+            self._handle_move(src_path, path, is_directory, modified)
+        elif kind == 'deleted':
+            self._handle_delete(path, is_directory)
+
+    def _handle_move(self, src_path, dest_path, is_directory, modified=False):
+        """Reiht die Verschiebung ein, ohne auf den Commit zu warten (Group Commit bei Massen-Umbenennungen).
+
+        Ob die Quelle bekannt war, entscheidet der Writer; Folgearbeit (Hash des neu
+        angelegten Ziels, Rescan eines unbekannten Verzeichnisses) stößt die Rückmeldung an.
+        """
+        try:
+            if is_directory:
+                self.writer.submit('watchdog', 'move_directory', self.drive_id, src_path, dest_path,
+                                   on_done=lambda request: self._directory_moved(request, src_path, dest_path))
+                return
+            try:
+                st = os.stat(dest_path)
+                size, mtime_ns, ctime_ns = st.st_size, st.st_mtime_ns, st.st_ctime_ns
+            except OSError:
+                size = mtime_ns = ctime_ns = None
+            # Hash nur, wenn sich der Inhalt geändert hat; bei unbekannter Quelle folgt er nach
+            hash_val = calculate_hash(dest_path) if HASHING and modified and size is not None else None
+            self.writer.submit('watchdog', 'move_or_upsert_file', self.drive_id, src_path, dest_path,
+                               size, hash_val, mtime_ns, ctime_ns, modified,
+                               on_done=lambda request: self._file_moved(request, src_path, dest_path))
+        except Exception as e:
+            logger.error(f"[Watchdog Move-Fehler] {src_path} -> {dest_path}: {e}")
+
+    def _file_moved(self, request, src_path, dest_path):
+        """Rückmeldung der Write-Queue (Writer-Thread) für move_or_upsert_file."""
+        if request.error is not None:
+            logger.error(f"[Watchdog Move DB-Fehler] {src_path} -> {dest_path}: {request.error}")
+        elif request.result:
+            logger.info(f"[Watchdog Move] Datei verschoben/umbenannt: {src_path} -> {dest_path}")
+        else:
+            logger.warning(f"[Watchdog Move] Quelle nicht in DB gefunden: {src_path}. Ziel als neue Datei angelegt.")
+            if HASHING:
+                self._follow_up('modified', dest_path)
+
+    def _directory_moved(self, request, src_path, dest_path):
+        """Rückmeldung der Write-Queue (Writer-Thread) für move_directory."""
+        if request.error is not None:
+            logger.error(f"[Watchdog Move DB-Fehler] {src_path} -> {dest_path}: {request.error}")
+        elif request.result is not None:
+            logger.info(f"[Watchdog Move] Verzeichnis verschoben/umbenannt: {src_path} -> {dest_path} "
+                        f"({request.result} Verzeichnisse umgeschrieben)")
+            return
+        else:
+            logger.warning(f"[Watchdog Move] Quelle nicht in DB gefunden: {src_path}. Scanne Ziel neu.")
+        self._follow_up('rescan', dest_path)
+
+    def _follow_up(self, kind, path):
+        """Folgearbeit aus einer Rückmeldung: nie im Writer-Thread selbst schreiben (er würde auf sich warten)."""
+        if self.coalescer is not None:
+            if kind == 'rescan':
+                self.coalescer.queue_rescan(path)
+            else:
+                self.coalescer.add(kind, path)
+            return
+        if kind == 'rescan':
+            target = lambda: self._rescan(path, True)
+        else:
+            target = lambda: self._insert_or_update_file(path)
+        threading.Thread(target=target, name="WatchdogFollowUp", daemon=True).start()
+
+    @staticmethod
+    def _log_result(label, message):
+        """on_done-Rückmeldung der Write-Queue: protokolliert erst nach dem Commit."""
+        def log(request):
+            if request.error is not None:
+                logger.error(f"[Watchdog {label} DB-Fehler] {message}: {request.error}")
+            else:
+                logger.info(f"[Watchdog {label}] {message}")
+        return log
+
+    def _handle_delete(self, src_path, is_directory):
+        # Löschung über die Write-Queue (Commit erfolgt gebündelt im Writer-Thread)
+        try:
+            if is_directory:
+                # Lösche Verzeichnis-Eintrag (CASCADE löst auch Dateien)
+                self.writer.submit('watchdog', 'delete_directory', self.drive_id, src_path,
+                                   on_done=self._log_result('Delete', f"Verzeichnis gelöscht: {src_path} (Kaskade löscht auch Dateien)"))
+            else:
+                self.writer.submit('watchdog', 'delete_file', self.drive_id, src_path,
+                                   on_done=self._log_result('Delete', f"Datei gelöscht: {src_path}"))
+        except Exception as e:
+             logger.error(f"[Watchdog Delete-Fehler] {src_path}: {e}")
 
 
     def _handle_new_directory(self, dir_path):
         """Fügt ein neues Verzeichnis zur Datenbank hinzu."""
         # Keine Notwendigkeit für try/except hier, da in on_created bereits vorhanden
-        dir_id = self.db.get_or_create_directory_optimized(self.drive_id, dir_path.replace("\\", "/"))
-        if dir_id:
-            logger.info(f"[Watchdog Create] Verzeichnis hinzugefügt: {dir_path}")
-        else:
-            logger.error(f"[Watchdog Create-Fehler] Konnte Verzeichnis nicht hinzufügen: {dir_path}")
+        self.writer.submit('watchdog', 'create_directory', self.drive_id, dir_path.replace("\\", "/"),
+                           on_done=self._log_result('Create', f"Verzeichnis hinzugefügt: {dir_path}"))
 
 
     def _insert_or_update_file(self, filepath):
@@ -436,35 +776,17 @@ class FSHandler(FileSystemEventHandler):
 
         # Keine Notwendigkeit für try/except hier, da in on_created/on_modified bereits vorhanden
         abs_path = os.path.normpath(filepath)
-        dir_path = os.path.dirname(abs_path)
-        filename = os.path.basename(abs_path)
-
-        # Stelle sicher, dass das Verzeichnis existiert (kann bei schnellen Operationen fehlen)
-        dir_id = self.db.get_or_create_directory_optimized(self.drive_id, dir_path.replace("\\", "/"))
-        if not dir_id:
-             logger.warning(f"[Watchdog Update-Fehler] Konnte Verzeichnis für Datei nicht finden/erstellen: {dir_path}")
-             return
 
         try:
             # Prüfen ob Datei noch existiert und lesbar ist
             if not os.path.isfile(abs_path):
                  logger.warning(f"[Watchdog Update-Info] Datei nicht (mehr) vorhanden oder kein Zugriff: {abs_path}")
-                 # Optional: Versuch, die Datei aus der DB zu löschen, falls sie existiert
-                 filename_only, ext = os.path.splitext(filename)
-                 ext = ext if ext else '[none]'
-                 with _db_lock:
-                     ext_id = self.db.get_or_create_extension(ext)
-                     deleted_rows = self.db.cursor.execute(
-                         "DELETE FROM files WHERE directory_id = ? AND filename = ? AND extension_id = ?",
-                         (dir_id, filename_only, ext_id)
-                     ).rowcount
-                     if deleted_rows > 0:
-                         self.db.conn.commit()
-                         self.db.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
-                         logger.info(f"[Watchdog Update] Fehlenden Dateieintrag entfernt: {abs_path}")
+                 # Evtl. vorhandenen Eintrag entfernen
+                 self.writer.submit('watchdog', 'delete_file', self.drive_id, abs_path)
                  return
 
-            size = os.path.getsize(abs_path)
+            st = os.stat(abs_path)
+            size = st.st_size
             hash_val = calculate_hash(abs_path) if HASHING else None
             # Prüfe, ob Hash-Berechnung erfolgreich war (wenn Hashing aktiviert ist)
             if HASHING and hash_val is None:
@@ -472,35 +794,19 @@ class FSHandler(FileSystemEventHandler):
                 # Entscheiden: Überspringen oder ohne Hash speichern? -> Aktuell: Ohne Hash speichern
                 pass # Speichert None als Hash
 
-            # Verwende optimierte Datei-Einfügung
-            with _db_lock:
-                file_id = self.db.insert_file_optimized(
-                    dir_id, filename, size, hash_val,
-                    created_date=None, modified_date=None
-                )
-                if file_id:
-                    self.db.conn.commit()
-                    self.db.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
-                    logger.info(f"[Watchdog Update] Datei hinzugefügt/geändert: {abs_path} (Size: {size}, Hash: {hash_val[:8] if hash_val else 'N/A'})")
-                else:
-                    logger.warning(f"[Watchdog Update] Datei-Einfügung fehlgeschlagen: {abs_path}")
+            # Verzeichnis + Datei werden im Writer-Thread angelegt/aktualisiert
+            self.writer.submit(
+                'watchdog', 'upsert_file', self.drive_id, abs_path, size, hash_val,
+                st.st_mtime_ns, st.st_ctime_ns,
+                on_done=self._log_result('Update', f"Datei hinzugefügt/geändert: {abs_path} "
+                                                   f"(Size: {size}, Hash: {hash_val[:8] if hash_val else 'N/A'})")
+            )
 
         except PermissionError:
              logger.error(f"[Watchdog Update-Fehler] Keine Leseberechtigung für: {abs_path}")
         except FileNotFoundError:
              logger.error(f"[Watchdog Update-Fehler] Datei nicht gefunden (trotz vorheriger Prüfung): {abs_path}")
              # Versuch, die Datei aus der DB zu löschen
-             filename_only, ext = os.path.splitext(filename)
-             ext = ext if ext else '[none]'
-             with _db_lock:
-                 ext_id = self.db.get_or_create_extension(ext)
-                 deleted_rows = self.db.cursor.execute(
-                     "DELETE FROM files WHERE directory_id = ? AND filename = ? AND extension_id = ?",
-                     (dir_id, filename_only, ext_id)
-                 ).rowcount
-                 if deleted_rows > 0:
-                     self.db.conn.commit()
-                     self.db.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
-                     logger.info(f"[Watchdog Update] Fehlenden Dateieintrag entfernt: {abs_path}")
+             self.writer.submit('watchdog', 'delete_file', self.drive_id, abs_path)
         except Exception as e:
             logger.error(f"[Watchdog Update-Fehler] Unerwarteter Fehler bei {abs_path}: {e}")
@@ -27,9 +27,10 @@ except ImportError:
 
 # --- Importiere eigene Module ---
 try:
-    from watchdog_monitor import FSHandler
+    from watchdog_monitor import FSHandler, create_observer
     # Entferne Debug-Kommentare
-    from models import get_db_instance
+    from models import get_db_instance, get_db_metrics, stop_write_queues, CheckpointManager, DATABASE_LAYOUT
+    from db_snapshot import SnapshotRefresher
     # Entferne Debug-Kommentare
     from utils import logger, CONFIG, get_available_drives
     # Entferne Debug-Kommentare
@@ -52,14 +53,17 @@ except Exception as general_ex: # Fange auch andere Fehler beim Import ab
 
 # --- Globale Variablen ---
 observer = None
+handlers = [] # FSHandler je Pfad (mit Event-Coalescer)
+checkpointers = [] # WAL-Checkpoints im Hintergrund, einer pro DB-Datei (Handler checkpointen nie selbst)
+snapshotter = None # Lese-Snapshot für Analyse-Werkzeuge (db_snapshot)
 stop_event = threading.Event()
 
 
 # --- Funktionen ---
 def start_monitoring():
     """Startet die Überwachung für die konfigurierten Pfade oder alle Laufwerke."""
-    global observer
-    observer = Observer()
+    global observer, handlers, checkpointers, snapshotter
+    observer = create_observer() # unter Windows mit Überlauf-Erkennung
     paths_to_watch = []
 
     # NEU: Nur kanonische Laufwerke überwachen (ohne Aliases wie T:\)
@@ -95,12 +99,14 @@ def start_monitoring():
         # return False # Signalisiert, dass nichts gestartet wurde
 
     scheduled_count = 0
+    handlers = []
     for path in set(paths_to_watch): # set() um Duplikate zu vermeiden
         path = os.path.normpath(path)
         if os.path.isdir(path):
             try:
                 event_handler = FSHandler(path) # Handler für jeden Pfad separat
                 observer.schedule(event_handler, path, recursive=True)
+                handlers.append(event_handler)
                 logger.info(f"Überwachung für '{path}' gestartet.")
                 scheduled_count += 1
             except Exception as e:
@@ -113,6 +119,13 @@ def start_monitoring():
          # return False # Signalisiert, dass nichts gestartet wurde
 
     try:
+        if not checkpointers:
+            # Im Shard-Layout schreibt jedes Laufwerk in seine eigene Datei
+            databases = [handler.db for handler in handlers if handler.db] if DATABASE_LAYOUT == 'sharded' else [get_db_instance()]
+            for db in {db.path: db for db in databases}.values():
+                checkpointers.append(CheckpointManager(db).start())
+        if snapshotter is None:
+            snapshotter = SnapshotRefresher().start()
         logger.info("Versuche Observer zu starten...")
         observer.start()
         # Kurze Pause, um sicherzustellen, dass der Thread läuft
@@ -129,11 +142,25 @@ def start_monitoring():
 
 def stop_monitoring():
     """Stoppt die Überwachung."""
-    global observer
+    global observer, handlers, checkpointers, snapshotter
     if observer and observer.is_alive():
         logger.info("Stoppe Observer...")
         observer.stop()
         observer.join() # Warten, bis der Observer-Thread beendet ist
+        # Gesammelte Ereignisse noch an die Write-Queue geben
+        for handler in handlers:
+            handler.stop()
+            if handler.coalescer:
+                handler.coalescer.log_metrics(f"{handler.drive_name}: ")
+        handlers = []
+        # Ausstehende Schreiboperationen committen und Writer beenden
+        stop_write_queues()
+        for checkpointer in checkpointers:
+            checkpointer.stop()
+        checkpointers = []
+        if snapshotter:
+            snapshotter.stop()
+            snapshotter = None
         logger.info("Observer gestoppt.")
     else:
         logger.info("Kein aktiver Observer zum Stoppen gefunden.")
@@ -202,6 +229,20 @@ def main_service_loop():
                     if heartbeat_counter % 600 == 0:
                         scheduler_status = "aktiv" if (scheduler_thread and scheduler_thread.is_alive()) else "inaktiv"
                         logger.info(f"Watchdog Service Heartbeat - Service laeuft normal (Scheduler: {scheduler_status})")
+                        for checkpointer in checkpointers:
+                            checkpointer.log_metrics()
+                        for writer in {id(handler.writer): handler.writer for handler in handlers if handler.writer}.values():
+                            writer.log_stats()
+                        events = {}
+                        for handler in handlers:
+                            if handler.coalescer:
+                                handler.coalescer.log_metrics(f"{handler.drive_name}: ")
+                                events[handler.drive_name] = handler.coalescer.get_metrics()
+                        # DB-Messwerte für die GUI (Diagnose > DB-Metriken) ablegen
+                        try:
+                            get_db_metrics().dump(extra={'watchdog_events': events})
+                        except OSError as e:
+                            logger.warning(f"DB-Metriken konnten nicht geschrieben werden: {e}")
 
                         # Scheduler neu starten wenn er abgestuerzt ist
                         if scheduler_thread and not scheduler_thread.is_alive():